@@ -16,6 +16,7 @@ WELCOME_MESSAGE = (
     
     "<b>💬 Global Commands</b>\n"
     "Type <code>/stop</code> to exit any mode and return here.\n"
+    "Type <code>/undo</code> to revert your last stock or price change.\n"
     "You can type <code>/start</code>, <code>/hello</code>, or <code>/help</code> anytime to see this message."
 )
 
@@ -1,6 +1,7 @@
-from telegram import Update
-from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 from services import ingredients 
+from services.units import canonical_unit, is_known_unit
 import re
 import logging
 
@@ -127,6 +128,23 @@ STOCK_USAGE_REGEX_MODIFIED = re.compile(
     r"(?P<name>.+?)$"                             # Capture ingredient name
 )
 
+# P3.E3c: MULTI-ITEM USAGE / RESTOCK (one batched write)
+# Examples: "Used 500g flour, 200g sugar, 3 eggs", "Restocked 10kg flour and 5kg sugar"
+MULTI_STOCK_REGEX = re.compile(
+    r"(?i)"                                                     # Case-insensitive
+    r"^(?P<action>used|consumed|made with|added|put in|restocked)\s+"  # Match action verb
+    r"(?P<items>\d.*(?:,|\s+and\s+\d).*)$"                        # At least two items (comma or 'and')
+)
+
+# Splits the item list on commas, and on 'and' when a quantity follows (so 'salt and pepper' stays one name)
+MULTI_STOCK_SEPARATOR_REGEX = re.compile(r"(?i)\s*,\s*(?:and\s+)?|\s+and\s+(?=\d)")
+
+# One item: quantity, optional unit, optional 'of (the)', name. E.g. "500g flour", "3 eggs", "2 kg of sugar"
+MULTI_STOCK_ITEM_REGEX = re.compile(
+    r"(?i)^(?P<quantity>\d+(\.\d+)?)\s*"                        # Capture numeric quantity
+    r"(?P<rest>.+)$"                                            # Unit and/or name
+)
+
 INVENTORY_REPORT_REGEX = re.compile(
     r"(?i)"                                     # Case-insensitive
     r"^(?:show|display|list)\s+(?:my\s+)?(inventory|stock|all)\?*$" # Match show/list/display inventory/stock/all
@@ -147,7 +165,8 @@ INGREDIENTS_MANAGER_WELCOME_MESSAGE = (
     "   e.g. <code>What is the status of Flour?</code>\n\n"
     
     "2. **Ingredient Usage:** Decrement stock automatically.\n"
-    "   e.g. <code>Used 50g of sugar</code> or <code>Consumed 2 eggs</code>\n\n"
+    "   e.g. <code>Used 50g of sugar</code> or <code>Consumed 2 eggs</code>\n"
+    "   Several at once: <code>Used 500g flour, 200g sugar, 3 eggs</code>\n\n"
     
     "3. **Combined Set:** Update Stock and Price atomically.\n"
     "   e.g. <code>Flour stock 15kg price 1.25</code>\n\n"
@@ -166,6 +185,9 @@ INGREDIENTS_MANAGER_WELCOME_MESSAGE = (
     "7. **Show Inventory:** Shows all Ingredients in Inventory\n"
     "   e.g. <code>Show Inventory</code>\n\n"
     
+    "8. **Undo:** Reverts your last stock or price change (repeat to go further back).\n"
+    "   e.g. <code>/undo</code>\n\n"
+    
     "To exit the mode, type <code>STOP</code>."
 )
 
@@ -179,7 +201,8 @@ INGREDIENTS_MANAGER_FALLBACK_MESSAGE = (
     "   e.g. <code>What is the status of Flour?</code>\n\n"
     
     "2. **Ingredient Usage:** Decrement stock automatically.\n"
-    "   e.g. <code>Used 50g of sugar</code> or <code>Consumed 2 eggs</code>\n\n"
+    "   e.g. <code>Used 50g of sugar</code> or <code>Consumed 2 eggs</code>\n"
+    "   Several at once: <code>Used 500g flour, 200g sugar, 3 eggs</code>\n\n"
     
     "3. **Combined Set:** Update Stock and Price atomically.\n"
     "   e.g. <code>Flour stock 15kg price 1.25</code>\n\n"
@@ -196,9 +219,18 @@ INGREDIENTS_MANAGER_FALLBACK_MESSAGE = (
     "7. **Show Inventory:** Shows all Ingredients in Inventory\n"
     "   e.g. <code>Show Inventory</code>\n\n"
     
+    "8. **Undo:** Reverts your last stock or price change (repeat to go further back).\n"
+    "   e.g. <code>/undo</code>\n\n"
+    
     "Type <code>STOP</code> to exit Manager Mode."
 )
 
+def _audit_user(update: Update) -> str | int | None:
+    """The identity stamped on stock writes and used to find a user's /undo history: the username, or the numeric ID without one."""
+    if not update.effective_user:
+        return None
+    return update.effective_user.username or update.effective_user.id
+
 async def enter_manager_mode(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """
     Starts the conversation when the user types the entry command.
@@ -262,7 +294,7 @@ async def _handle_purchase_action(update: Update, data: dict, user_id: str | int
     
     try:
         quantity = float(data['quantity'])
-        unit = data['unit'].strip()
+        unit = canonical_unit(data['unit'])
         total_cost = float(data['cost'])
     except (ValueError, KeyError) as e:
         logging.error(f"Purchase data error for '{name}': Invalid quantity/cost format. Exception: {e}")
@@ -272,15 +304,16 @@ async def _handle_purchase_action(update: Update, data: dict, user_id: str | int
 
     # Use the robust service function which handles existing/new ingredient logic
     success, status_message = await ingredients.process_ingredient_purchase(
-        name, quantity, unit, total_cost, user_id
+        name, quantity, unit, total_cost, user_id, update.update_id
     )
 
     if success:
         if status_message.startswith("NEW_INGREDIENT_ADDED:"):
             new_id = status_message.split(":")[1]
             return f"🎉 **New Ingredient Added**\n\n**ID:** `{new_id}`\n**Name:** {name}\n**Stock:** {quantity} {unit}\n**Cost:** {total_cost:.2f} €"
-        else: # STOCK_ADJUSTED or STOCK_ADJUSTED_AND_PRICE_UPDATED
-            return f"✅ **Purchase Processed**\n\n**Name:** {name}\n**Status:** {status_message.replace('_', ' ')}."
+        else: # STOCK_ADJUSTED or STOCK_ADJUSTED_AND_PRICE_UPDATED (possibly followed by a note line)
+            status, _, note = status_message.partition("\n")
+            return f"✅ **Purchase Processed**\n\n**Name:** {name}\n**Status:** {status.replace('_', ' ')}." + (f"\n{note}" if note else "")
     else:
         logging.error(f"Purchase failed for '{name}'. Status: {status_message}")
         return f"❌ Purchase failed for '{name}'. Reason: {status_message}. Check logs."
@@ -297,7 +330,7 @@ async def _handle_price_update_action(update: Update, data: dict) -> str:
     # Retrieve quantity and unit, even if they're discarded by the current service function, 
     # as the new regex requires them for matching.
     input_quantity_str = data.get('quantity')
-    input_unit = data.get('unit', '').strip()
+    input_unit = canonical_unit(data.get('unit', ''))
     
     # Attempt to safely convert the cost (price)
     try:
@@ -316,7 +349,7 @@ async def _handle_price_update_action(update: Update, data: dict) -> str:
         return "❌ Input error: Quantity must be a valid number."
 
     # Retrieve User ID for auditing
-    user_id = update.effective_user.username if update.effective_user else None
+    user_id = _audit_user(update)
         
     logging.info(f"ACTION: Price statement detected for {user_input_name}. Input: {input_quantity} {input_unit} now costs {new_price} € (User: {user_id}).")
 
@@ -327,7 +360,8 @@ async def _handle_price_update_action(update: Update, data: dict) -> str:
         input_quantity=input_quantity, 
         input_unit=input_unit, 
         new_price=new_price, 
-        user_id=user_id
+        user_id=user_id,
+        update_id=update.update_id
     ):
         return f"💰 Unit cost updated for **{user_input_name}** to {new_price:.2f} € per {input_unit} (based on input)."
     else:
@@ -365,9 +399,8 @@ async def _handle_stock_check_action(update: Update, data: dict) -> str:
         return f"❌ Ingredient **{user_input_name}** was not found in inventory."
 
     # 3. Extract required info for the reply
-    # Note: Using INGREDIENT_QUANTITY constant for stock and INGREDIENT_UNIT for unit
-    stock = ingredient_record.get(ingredients.INGREDIENT_QUANTITY, 'N/A')
-    unit = ingredient_record.get(ingredients.INGREDIENT_UNIT, 'N/A')
+    stock = ingredient_record.quantity
+    unit = ingredient_record.unit or 'N/A'
     
     return (
         f"✅ **Stock for {user_input_name}**:\n\n"
@@ -380,7 +413,7 @@ async def _handle_stock_set_action(update: Update, data: dict) -> str:
     Passes the input directly to the set_ingredient_stock service function.
     """
     user_input_name = data.get('name', '').strip()
-    input_unit = data.get('unit', '').strip()
+    input_unit = canonical_unit(data.get('unit', ''))
 
     # Safely convert quantity
     try:
@@ -393,7 +426,7 @@ async def _handle_stock_set_action(update: Update, data: dict) -> str:
     if input_quantity < 0:
         return "❌ Stock value cannot be set to a negative amount."
 
-    user_id = update.effective_user.username if update.effective_user else None
+    user_id = _audit_user(update)
         
     logging.info(f"ACTION: Stock set detected for {user_input_name} to {input_quantity} {input_unit} (User: {user_id}).")
 
@@ -402,7 +435,8 @@ async def _handle_stock_set_action(update: Update, data: dict) -> str:
         name=user_input_name, 
         input_quantity=input_quantity, 
         input_unit=input_unit, 
-        user_id=user_id
+        user_id=user_id,
+        update_id=update.update_id
     )
     
     if success:
@@ -420,7 +454,7 @@ async def _handle_stock_adjustment_action(update: Update, data: dict) -> str:
     """
     user_input_name = data.get('name', '').strip()
     action = data.get('action', '').strip() # Retrieve the action (increase/decrease/adjust)
-    input_unit = data.get('unit', '').strip()
+    input_unit = canonical_unit(data.get('unit', ''))
 
     # Safely convert quantity
     try:
@@ -433,7 +467,7 @@ async def _handle_stock_adjustment_action(update: Update, data: dict) -> str:
     if input_quantity <= 0:
         return "❌ Input error: The quantity to adjust by must be greater than zero."
 
-    user_id = update.effective_user.username if update.effective_user else None
+    user_id = _audit_user(update)
 
     logging.info(f"ACTION: Stock adjustment detected for {user_input_name}: {action} by {input_quantity} {input_unit} (User: {user_id}).")
     
@@ -454,7 +488,8 @@ async def _handle_stock_adjustment_action(update: Update, data: dict) -> str:
         input_quantity=input_quantity,
         input_unit=input_unit,
         is_addition= is_addition,
-        user_id=user_id
+        user_id=user_id,
+        update_id=update.update_id
     )
 
     if success:
@@ -499,7 +534,7 @@ async def handle_combined_inventory_set(update: Update, data: dict) -> str:
     
     # 1a. Extract Stock Data
     stock_qty_str = data.get('stock_quantity' if is_stock_first else 'stock_quantity_2')
-    stock_unit = data.get('stock_unit' if is_stock_first else 'stock_unit_2').strip()
+    stock_unit = canonical_unit(data.get('stock_unit' if is_stock_first else 'stock_unit_2'))
     
     # 1b. Extract Price Data
     price_cost_str = data.get('price_cost' if is_stock_first else 'price_cost_2')
@@ -517,7 +552,7 @@ async def handle_combined_inventory_set(update: Update, data: dict) -> str:
         return "❌ Input Error: Both stock quantity and price must be valid numbers."
         
 
-    user_id = update.effective_user.id
+    user_id = _audit_user(update)
     logging.info(f"ACTION: Combined inventory set detected for '{ingredient_name}'.")
 
     # --- 2. Call the SINGLE ATOMIC service function ---
@@ -527,7 +562,8 @@ async def handle_combined_inventory_set(update: Update, data: dict) -> str:
         stock_qty_input=stock_qty,
         stock_unit_input=stock_unit,
         price_cost_input=price_cost,
-        user_id=user_id
+        user_id=user_id,
+        update_id=update.update_id
     )
 
     # 3. Final Reply
@@ -537,7 +573,7 @@ async def handle_stock_usage(update: Update, data: dict) -> str:
         
     # 1. Extract and Validate Input
     name = data.get('name', '').strip()
-    input_unit = (data.get('unit') or '').strip()
+    input_unit = canonical_unit(data.get('unit') or '')
     
     try:
         input_qty = float(data.get('quantity'))
@@ -551,7 +587,8 @@ async def handle_stock_usage(update: Update, data: dict) -> str:
         input_quantity=input_qty,
         input_unit=input_unit,
         is_addition=False,
-        user_id=update.effective_user.id
+        user_id=_audit_user(update),
+        update_id=update.update_id
     )
     return message
 
@@ -560,7 +597,7 @@ async def handle_stock_addition(update: Update, data: dict) -> None:
        
     # 1. Extract and Validate Input
     name = data.get('name', '').strip()
-    input_unit = (data.get('unit') or '').strip()
+    input_unit = canonical_unit(data.get('unit') or '')
     
     try:
         input_qty = float(data.get('quantity'))
@@ -574,21 +611,97 @@ async def handle_stock_addition(update: Update, data: dict) -> None:
         input_quantity=input_qty,
         input_unit=input_unit,
         is_addition=True,
-        user_id=update.effective_user.id
+        user_id=_audit_user(update),
+        update_id=update.update_id
     )
     await update.message.reply_html(message)
     
+def _parse_stock_items(items_text: str) -> list[tuple[str, float, str]] | None:
+    """Parses "500g flour, 200g sugar, 3 eggs" into (name, quantity, unit) tuples. Returns None if an item is unreadable."""
+    items = []
+    for part in MULTI_STOCK_SEPARATOR_REGEX.split(items_text.strip()):
+        if not part:
+            continue
+        match = MULTI_STOCK_ITEM_REGEX.match(part.strip())
+        if not match:
+            return None
+        words = match.group('rest').split()
+        # The first word is a unit only if it is a known one ("3 eggs" has no unit)
+        unit = ""
+        if len(words) > 1 and is_known_unit(words[0]):
+            unit = canonical_unit(words.pop(0))
+        if words and words[0].lower() == 'of':
+            words.pop(0)
+        if words and words[0].lower() == 'the':
+            words.pop(0)
+        if not words:
+            return None
+        items.append((" ".join(words), float(match.group('quantity')), unit))
+    return items
+
+async def handle_multi_stock_adjustment(update: Update, data: dict) -> str:
+    """
+    P3.E3c: Handles several usages/additions in one message, committed in a single write.
+    """
+    # 1. Extract and Validate Input
+    is_addition = data.get('action', '').lower() in ('added', 'put in', 'restocked')
+    items = _parse_stock_items(data.get('items', ''))
+    if not items:
+        return "❌ Input Error: Could not read the item list. Example: `Used 500g flour, 200g sugar, 3 eggs`"
+
+    user_id = _audit_user(update)
+    logging.info(f"ACTION: Multi-item stock {'addition' if is_addition else 'usage'} detected: {items} (User: {user_id}).")
+
+    # 2. Call the bulk adjustment service (all items or none)
+    success, message = await ingredients.adjust_ingredient_stock_bulk(
+        items=items,
+        is_addition=is_addition,
+        user_id=user_id,
+        update_id=update.update_id
+    )
+    return message
+
+# Callback data of the inventory report's page buttons: "inv_page:<page>"
+INVENTORY_PAGE_CALLBACK_PREFIX = "inv_page:"
+
+def _inventory_page_keyboard(page: int, page_count: int) -> InlineKeyboardMarkup | None:
+    """Previous/next buttons for a report page (None when everything fits on one page)."""
+    if page_count <= 1:
+        return None
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton("◀️ Previous", callback_data=f"{INVENTORY_PAGE_CALLBACK_PREFIX}{page - 1}"))
+    if page < page_count - 1:
+        buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"{INVENTORY_PAGE_CALLBACK_PREFIX}{page + 1}"))
+    return InlineKeyboardMarkup([buttons])
+
 async def handle_inventory_report(update: Update, data: dict) -> None:
     """
     P3.E7: Handles the request to display the full list of ingredients and stock levels.
+    The report is paged; the buttons under it are handled by handle_inventory_page_callback.
     """
-    # 1. Call the service function
-    success, message = await ingredients.generate_full_inventory_report()
+    # 1. Call the service function (first page)
+    success, message, page, page_count = await ingredients.generate_inventory_report_page(0)
 
     # 2. Reply to the user using HTML
-    await update.message.reply_html(message)
+    await update.message.reply_html(message, reply_markup=_inventory_page_keyboard(page, page_count))
+
+async def handle_inventory_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Shows another page of the inventory report when a Previous/Next button is pressed
+    (the message is edited in place).
+    """
+    query = update.callback_query
+    await query.answer()
     
-    # Optional: If the report is long, send it as a file/document instead of a chat message.
+    try:
+        requested_page = int(query.data.removeprefix(INVENTORY_PAGE_CALLBACK_PREFIX))
+    except ValueError:
+        logging.warning(f"INVENTORY PAGE: Ignoring malformed callback data '{query.data}'.")
+        return
+    
+    success, message, page, page_count = await ingredients.generate_inventory_report_page(requested_page)
+    await query.edit_message_text(message, parse_mode="HTML", reply_markup=_inventory_page_keyboard(page, page_count))
 
 # --- Main Dispatcher ---
 
@@ -597,7 +710,7 @@ async def dispatch_nlp_action(update: Update, context: ContextTypes.DEFAULT_TYPE
     Parses the incoming natural language message and calls the appropriate handler function.
     """
     text = update.message.text.strip()
-    user_id = update.effective_user.username
+    user_id = _audit_user(update)
     text = update.message.text.strip()
     reply = ""
 
@@ -627,6 +740,9 @@ async def dispatch_nlp_action(update: Update, context: ContextTypes.DEFAULT_TYPE
         elif match := STATUS_CHECK_REGEX.match(text):
             reply = await handle_unified_status_check(update, match.groupdict())
         
+        elif match := MULTI_STOCK_REGEX.match(text):
+            reply = await handle_multi_stock_adjustment(update, match.groupdict())
+        
         elif match := STOCK_USAGE_REGEX_MODIFIED.match(text):
             reply = await handle_stock_usage(update, match.groupdict())
             
@@ -654,8 +770,9 @@ async def dispatch_nlp_action(update: Update, context: ContextTypes.DEFAULT_TYPE
         logging.critical(f"USER {user_id} - CRITICAL DISPATCH ERROR for message '{text}'. Exception: {e}", exc_info=True)
         reply = "💥 A critical system error occurred while processing your request. Please inform the system administrator."
 
-    # Send the final reply
-    await update.message.reply_text(reply, parse_mode="HTML")
+    # Send the final reply (handlers that reply themselves, e.g. the paged report, return None)
+    if reply:
+        await update.message.reply_text(reply, parse_mode="HTML")
     
     # Stay in the manager mode state
     return INGREDIENT_MANAGER_MODE
@@ -678,4 +795,31 @@ INGREDIENTS_MANAGER_MODE_CONVERSATION_HANDLER = ConversationHandler(
     
     # We use a specific keyword 'STOP' to leave the mode
     fallbacks=[MessageHandler(filters.Regex(r'(?i)^STOP$'), exit_manager_mode)],
-)
\ No newline at end of file
+)
+
+async def handle_undo_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    /undo: Reverts the user's last stock or price change. Works inside and outside the manager mode.
+    """
+    user_id = _audit_user(update)
+    logging.info(f"ACTION: Undo requested (User: {user_id}).")
+    if user_id is None:
+        await update.message.reply_text("❌ Cannot tell who you are, so there is nothing to undo.")
+        return
+
+    try:
+        success, message = await ingredients.revert_last_transaction(user_id, update.update_id)
+        reply = message if success else f"❌ {message}"
+    except Exception as e:
+        logging.critical(f"USER {user_id} - CRITICAL UNDO ERROR. Exception: {e}", exc_info=True)
+        reply = "💥 A critical system error occurred while undoing. Please inform the system administrator."
+    await update.message.reply_text(reply, parse_mode="HTML")
+
+# /undo, registered globally so it works in and out of the manager mode
+UNDO_COMMAND_HANDLER = CommandHandler("undo", handle_undo_command)
+
+# Page buttons of the inventory report. Registered globally so they keep working after STOP.
+INVENTORY_REPORT_PAGE_HANDLER = CallbackQueryHandler(
+    handle_inventory_page_callback,
+    pattern=rf"^{INVENTORY_PAGE_CALLBACK_PREFIX}\d+$"
+)
@@ -1,6 +1,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters
 from services import recipe
+from services.units import canonical_unit
 import logging
 import re
 
@@ -22,7 +23,7 @@ RECIPE_MANAGER_WELCOME_MESSAGE = (
     "This mode allows you to create, view, and analyze your recipes.\n\n"
     "<b>Available Commands:</b>\n"
     "• <b>Add Recipe:</b> <code>Add recipe Sourdough Loaf (Yield: 2 loaves)</code>\n"
-    "• <b>Add Ingredient:</b> <code>To Sourdough Loaf, add 500g Flour</code>\n"
+    "• <b>Add Ingredients:</b> <code>To Sourdough Loaf, add 500g Flour, 10g Salt</code>\n"
     "• <b>Check Cost:</b> <code>Cost of Sourdough Loaf</code>\n"
     "• <b>Check Capacity:</b> <code>How many loaves of Sourdough can I make?</code>\n"
     "• <b>Show Recipe:</b> <code>Show recipe Sourdough Loaf</code>\n\n"
@@ -35,6 +36,16 @@ ADD_INGREDIENT_REGEX = re.compile(
     r"(?:\s*add|\s*require|\s*use)\s*"      # Match action verb (add/require/use)
     r"(?P<required_quantity>\d+(\.\d+)?)\s*"# Capture numeric quantity (optional space)
     r"(?P<required_unit>\w+)\s+"            # Capture unit (mandatory space)
+    r"(?P<ingredient_name>.+?)$"            # Capture ingredient name (and any further components)
+)
+
+# Further components after the first ("..., 10g Salt and 2 unit Eggs"): split only where a quantity follows
+COMPONENT_SEPARATOR_REGEX = re.compile(r"(?i)\s*,\s*(?:and\s+)?(?=\d)|\s+and\s+(?=\d)")
+
+# One further component, in the same form as the first: quantity, unit, ingredient name
+COMPONENT_REGEX = re.compile(
+    r"(?i)^(?P<required_quantity>\d+(\.\d+)?)\s*"# Capture numeric quantity (optional space)
+    r"(?P<required_unit>\w+)\s+"            # Capture unit (mandatory space)
     r"(?P<ingredient_name>.+?)$"            # Capture ingredient name
 )
 
@@ -126,25 +137,32 @@ async def handle_add_ingredient_to_recipe(update: Update, data: dict) -> int:
     """
         
     recipe_name = data.get('recipe_name', '').strip()
-    ingredient_name = data.get('ingredient_name', '').strip()
-    required_unit = data.get('required_unit', '').strip()
-
-    try:
-        required_quantity = float(data.get('required_quantity'))
-    except (ValueError, TypeError):
-        return "❌ Input Error: The required quantity must be a valid number."
-        
+    # The first component comes from the main pattern; any others follow its ingredient name
+    first_name, *others = COMPONENT_SEPARATOR_REGEX.split(data.get('ingredient_name', '').strip())
+    parts = [{**data, 'ingredient_name': first_name}]
+    for other in others:
+        match = COMPONENT_REGEX.match(other.strip())
+        if not match:
+            return f"❌ Input Error: Could not read the component <code>{other.strip()}</code>. Use a quantity, a unit and a name (e.g. <code>10g Salt</code>)."
+        parts.append(match.groupdict())
+
+    components = []
+    for part in parts:
+        try:
+            required_quantity = float(part.get('required_quantity'))
+        except (ValueError, TypeError):
+            return "❌ Input Error: The required quantity must be a valid number."
+        # Store the canonical spelling ('Grams' -> 'g'), like the stock commands do
+        components.append((part.get('ingredient_name', '').strip(), required_quantity, canonical_unit(part.get('required_unit', ''))))
     
     user_id = update.effective_user.id if update.effective_user else None
     
-    logging.info(f"ACTION: Add Ingredient to Recipe detected: {recipe_name} -> {required_quantity} {required_unit} {ingredient_name}.")
+    logging.info(f"ACTION: Add Ingredient to Recipe detected: {recipe_name} -> {len(components)} component(s).")
 
-    # Call the service function
-    success, message = await recipe.add_recipe_component(
+    # Call the service function (all Map IDs are reserved together and the rows written in one append)
+    success, message = await recipe.add_recipe_components(
         recipe_name=recipe_name,
-        ing_name=ingredient_name,
-        req_quantity=required_quantity,
-        req_unit=required_unit,
+        components=components,
         user_id=user_id
     )
 
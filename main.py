@@ -14,8 +14,13 @@ logger = logging.getLogger(__name__)
 
 # Import the necessary handlers and conversation state machine
 from bot.handlers import send_global_welcome, global_fallback_handler
-from bot.ingredients_handler import INGREDIENTS_MANAGER_MODE_CONVERSATION_HANDLER
+from bot.ingredients_handler import INGREDIENTS_MANAGER_MODE_CONVERSATION_HANDLER, INVENTORY_REPORT_PAGE_HANDLER, UNDO_COMMAND_HANDLER
 from bot.recipe_handler import RECIPE_MANAGER_MODE_CONVERSATION_HANDLER
+from sheets import queries
+from services import units, alerts, ingredients, ledger, undo
+from sheets.async_client import close_async_sheets_client
+from sheets.executor import get_sheets_io_stats, shutdown_sheets_executor
+from sheets.rate_limit import get_rate_limit_stats
 
 
 # --- Configuration ---
@@ -54,6 +59,18 @@ application.add_handler(INGREDIENTS_MANAGER_MODE_CONVERSATION_HANDLER)
 
 application.add_handler(RECIPE_MANAGER_MODE_CONVERSATION_HANDLER) 
 
+# 🔑 Register the Previous/Next buttons of the paged inventory report
+application.add_handler(INVENTORY_REPORT_PAGE_HANDLER)
+
+# 🔑 Register /undo (reverts the user's last stock or price change, in any mode)
+application.add_handler(UNDO_COMMAND_HANDLER)
+
+# 🔑 Deliver low-stock alerts to the configured chat (without one they are only logged)
+if alerts.LOW_STOCK_ALERT_CHAT_ID:
+    alerts.set_alert_sender(
+        lambda text: application.bot.send_message(chat_id=alerts.LOW_STOCK_ALERT_CHAT_ID, text=text, parse_mode="HTML")
+    )
+
 # 🔑 Register the Global Fallback Handler (must be registered last)
 # It handles all remaining text messages that are not commands
 application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, global_fallback_handler))
@@ -73,6 +90,55 @@ async def root():
     logger.info("Root endpoint hit: Service is running.")
     return "<h1>Telegram Bakery Bot Backend is running and awaiting webhook! 🚀</h1>"
 
+@app.on_event("startup")
+async def start_storage():
+    """
+    Prepares the storage backend (in mirror mode this fills the local database and starts the background sync;
+    a standalone SQLite database gets its Config defaults), creates the Stock_Ledger tab if needed,
+    compiles the unit aliases, loads the undo index and materializes the stock snapshot from the ledger.
+    """
+    await queries.start_storage_backend()
+    # Every stock change is appended to the ledger, so refuse to start without it
+    if not await ledger.prepare_stock_ledger():
+        raise RuntimeError(f"The {ledger.STOCK_LEDGER_SHEET} tab could not be created or validated; see the LEDGER SETUP messages above.")
+    # Unit aliases are compiled once here; unit lookups never read the sheet afterwards
+    await units.load_unit_aliases()
+    # Each user's undo history is loaded once; /undo then never reads a history tab
+    await undo.load_undo_index()
+    # Catch the Ingredients snapshot up with the stock ledger and keep doing so in the background
+    await ingredients.start_stock_snapshots()
+
+@app.on_event("shutdown")
+async def flush_sheet_writes():
+    """
+    Catches the stock snapshot up with the ledger, sends pending low-stock alerts, saves the undo histories, flushes any stock updates
+    still waiting in the Sheets write-behind queue before the process exits, then closes the async Sheets
+    connection pool.
+    """
+    # Fold any ledger events the snapshot is missing into Ingredients while the backend is still up
+    if not await ingredients.stop_stock_snapshots():
+        logger.warning("The Ingredients snapshot could not be caught up with the stock ledger during shutdown.")
+    # Send any low-stock alert still waiting for its debounce window
+    if not await alerts.flush_low_stock_alerts():
+        logger.warning("A pending low-stock alert could not be sent during shutdown.")
+    # Undo stacks are saved in the background; let those writes reach the queue before it is flushed
+    if not await undo.flush_undo_writes():
+        logger.warning("Some undo histories could not be saved during shutdown.")
+    if not await queries.flush_pending_writes():
+        logger.error("Some queued Sheets updates could not be written during shutdown.")
+    # Nothing goes through the async transport after the flush, so its connection pool can be closed
+    await close_async_sheets_client()
+    # The flush above runs on the Sheets I/O executor, so only stop it afterwards
+    shutdown_sheets_executor()
+
+@app.get("/metrics/sheets")
+async def sheets_metrics():
+    """
+    Reports Sheets I/O backlog (in-flight calls, queue depth, wait times), quota throttling/retries
+    and table cache hit rates.
+    """
+    return {"io": get_sheets_io_stats(), "rate_limit": get_rate_limit_stats(), "cache": queries.get_table_cache_stats()}
+
 @app.post("/webhook")
 async def telegram_webhook(request: Request):
     """
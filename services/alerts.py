@@ -0,0 +1,92 @@
+import os
+import html
+import asyncio
+import logging
+
+# --- Configuration Constants ---
+# Telegram chat that receives low-stock alerts (a user, group or channel ID). Unset = alerts are only logged.
+LOW_STOCK_ALERT_CHAT_ID = os.getenv("LOW_STOCK_ALERT_CHAT_ID", "")
+# Alerts raised within this window are sent together, so a burst of usage produces one message
+LOW_STOCK_ALERT_DEBOUNCE_SECONDS = float(os.getenv("LOW_STOCK_ALERT_DEBOUNCE_SECONDS", "60"))
+
+
+# --- Low-Stock Alerts ---
+# Checked by the stock write path against the quantity it just wrote (see ingredients._record_inventory_change),
+# so alerting never reads the sheet. An ingredient alerts once when it drops to or below its reorder
+# level and is re-armed when a later write takes it back above.
+
+_alert_sender = None # async (text) -> None, registered at startup
+_below_reorder_level: set[str] = set() # IDs already alerted (or waiting to be) and not restocked since
+_pending_alerts: dict[str, tuple[str, float, str, float]] = {} # ID -> (name, quantity, unit, reorder level)
+_alert_flush_task: asyncio.Task | None = None
+
+def set_alert_sender(sender) -> None:
+    """Registers the coroutine function that delivers an alert message (e.g. a bound bot.send_message)."""
+    global _alert_sender
+    _alert_sender = sender
+
+def check_stock_level(ingredient_id: str, name: str, quantity: float, unit: str, reorder_level: float) -> None:
+    """
+    Compares a just-written stock quantity with the ingredient's reorder level (0 = no threshold)
+    and queues an alert when it has crossed it. Never blocks: the alert is sent after the debounce window.
+    """
+    if reorder_level <= 0 or quantity > reorder_level:
+        # No threshold, or restocked: the next drop alerts again
+        if ingredient_id in _below_reorder_level:
+            logging.info(f"LOW STOCK CLEARED: '{name}' is back above its reorder level ({quantity:.2f} > {reorder_level:.2f} {unit}).")
+        _below_reorder_level.discard(ingredient_id)
+        _pending_alerts.pop(ingredient_id, None)
+        return
+
+    if ingredient_id in _pending_alerts:
+        # Still waiting to be sent: report the latest quantity
+        _pending_alerts[ingredient_id] = (name, quantity, unit, reorder_level)
+        return
+    if ingredient_id in _below_reorder_level:
+        return # Already alerted for this drop
+
+    logging.warning(f"LOW STOCK: '{name}' is at {quantity:.2f} {unit} (reorder level {reorder_level:.2f} {unit}).")
+    _below_reorder_level.add(ingredient_id)
+    _pending_alerts[ingredient_id] = (name, quantity, unit, reorder_level)
+    _schedule_alert_flush()
+
+def _schedule_alert_flush() -> None:
+    global _alert_flush_task
+    if _alert_flush_task is not None and not _alert_flush_task.done():
+        return # The running window will pick this alert up
+    try:
+        _alert_flush_task = asyncio.get_running_loop().create_task(_flush_after_window())
+    except RuntimeError:
+        logging.error("LOW STOCK ALERT ERROR: No running event loop to send the alert from.")
+
+async def _flush_after_window() -> None:
+    await asyncio.sleep(LOW_STOCK_ALERT_DEBOUNCE_SECONDS)
+    await flush_low_stock_alerts()
+
+def format_low_stock_alert(alerts: list[tuple[str, float, str, float]]) -> str:
+    """Builds the alert message (HTML) for (name, quantity, unit, reorder level) tuples."""
+    lines = [
+        f"• <b>{html.escape(name)}</b>: {quantity:.2f} {html.escape(unit)} left (reorder level {reorder_level:.2f})"
+        for name, quantity, unit, reorder_level in sorted(alerts, key=lambda alert: alert[0].lower())
+    ]
+    return "⚠️ <b>Low Stock</b>\n" + "\n".join(lines)
+
+async def flush_low_stock_alerts() -> bool:
+    """Sends every pending alert in one message now. Returns True if there was nothing to send or it was sent."""
+    if not _pending_alerts:
+        return True
+    alerts = dict(_pending_alerts)
+    _pending_alerts.clear()
+
+    if _alert_sender is None:
+        logging.warning(f"LOW STOCK ALERT NOT SENT: No alert chat configured (LOW_STOCK_ALERT_CHAT_ID). {len(alerts)} item(s) low.")
+        return True
+    try:
+        await _alert_sender(format_low_stock_alert(list(alerts.values())))
+    except Exception as e:
+        logging.error(f"LOW STOCK ALERT FAILED: Could not send the alert for {len(alerts)} item(s). Exception: {e}")
+        # Re-arm them, so the next stock change tries again
+        _below_reorder_level.difference_update(alerts)
+        return False
+    logging.info(f"LOW STOCK ALERT SENT: {len(alerts)} item(s).")
+    return True
@@ -0,0 +1,60 @@
+import time
+import logging
+
+# Suggestions scoring below this (0..1, shared trigrams over all trigrams) are not offered
+FUZZY_MIN_SCORE = 0.3
+
+def _trigrams(text: str) -> set[str]:
+    """Character trigrams of a name, padded so short words and word starts count ('flour' -> '  f', ' fl', 'flo', ...)."""
+    padded = f"  {' '.join(text.lower().split())} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class NameIndex:
+    """
+    A trigram index over a list of names for "did you mean" lookups.
+
+    Built once per table refresh (it is stored with the decoded table). A search only visits
+    names sharing at least one trigram with the query, so it stays well under a millisecond
+    for tables of a few thousand names.
+    """
+    __slots__ = ("names", "_name_trigrams", "_postings")
+
+    def __init__(self, names):
+        self.names: list[str] = list(dict.fromkeys(n for n in names if n))
+        self._name_trigrams: list[set[str]] = [_trigrams(n) for n in self.names]
+        self._postings: dict[str, list[int]] = {} # trigram -> positions of the names containing it
+        for position, trigrams in enumerate(self._name_trigrams):
+            for trigram in trigrams:
+                self._postings.setdefault(trigram, []).append(position)
+
+    def search(self, query: str, limit: int = 3, min_score: float = FUZZY_MIN_SCORE) -> list[tuple[str, float]]:
+        """Returns up to `limit` (name, score) pairs, best first. Score 1.0 = same trigrams."""
+        started_at = time.perf_counter()
+        query_trigrams = _trigrams(query)
+        shared: dict[int, int] = {}
+        for trigram in query_trigrams:
+            for position in self._postings.get(trigram, ()):
+                shared[position] = shared.get(position, 0) + 1
+
+        scored = []
+        for position, count in shared.items():
+            # Jaccard similarity of the two trigram sets
+            score = count / (len(query_trigrams) + len(self._name_trigrams[position]) - count)
+            if score >= min_score:
+                scored.append((self.names[position], score))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        logging.debug(f"FUZZY SEARCH: '{query}' -> {scored[:limit]} in {(time.perf_counter() - started_at) * 1000:.3f} ms.")
+        return scored[:limit]
+
+    def best_match(self, query: str, min_score: float = FUZZY_MIN_SCORE) -> tuple[str, float] | None:
+        matches = self.search(query, limit=1, min_score=min_score)
+        return matches[0] if matches else None
+
+def format_suggestions(names: list[str]) -> str:
+    """Formats suggestions for a reply (' Did you mean **a** or **b**?'), or '' when there are none."""
+    if not names:
+        return ""
+    quoted = [f"**{name}**" for name in names]
+    if len(quoted) == 1:
+        return f" Did you mean {quoted[0]}?"
+    return f" Did you mean {', '.join(quoted[:-1])} or {quoted[-1]}?"
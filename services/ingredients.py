@@ -1,6 +1,19 @@
+import os
 import uuid
+import weakref
+import bisect
+import asyncio
+import contextlib
+import dataclasses
+from dataclasses import dataclass
 from datetime import datetime
 from sheets import queries # Accesses the sheet read/write functions
+from sheets.columnar import ColumnarTable
+from services.units import canonical_unit
+from services.fuzzy import NameIndex, format_suggestions
+from services.alerts import check_stock_level
+from services import ledger, undo
+from services.ledger import StockEvent, new_stock_event
 import logging
 
 # --- Configuration Constants ---
@@ -17,6 +30,10 @@ INGREDIENT_NAME = 'Name'
 INGREDIENT_UNIT = 'Unit'
 INGREDIENT_QUANTITY = 'Quantity'
 INGREDIENT_COST_PER_UNIT = 'Cost Per Unit'
+INGREDIENT_REORDER_LEVEL = 'Reorder Level' # Optional; blank or 0 = no low-stock alert
+# The columns the lookup paths read (the audit columns are left out of projected reads); the
+# optional Reorder Level column is added only if the tab has it (see _ingredient_lookup_columns)
+INGREDIENT_LOOKUP_COLUMNS = [INGREDIENT_ID, INGREDIENT_NAME, INGREDIENT_UNIT, INGREDIENT_QUANTITY, INGREDIENT_COST_PER_UNIT]
 
 #UNITS TABLE COLUMNS
 UNITS_FROM_UNIT = 'From_Unit'
@@ -27,83 +44,715 @@ UNITS_Conversion_Rate = 'Conversion_Rate'
 PRICE_HISTORY_INGREDIENT_ID = 'ingredients_Id'
 OLD_COST_PER_UNIT = 'old_cost_per_unit'
 NEW_COST_PER_UNIT = 'new_cost_per_unit'
+PRICE_HISTORY_LAST_UPDATED = 'Last_Updated'
+PRICE_HISTORY_UPDATED_BY = 'Updated_By_User'
+PRICE_HISTORY_COLUMNS = [PRICE_HISTORY_INGREDIENT_ID, OLD_COST_PER_UNIT, NEW_COST_PER_UNIT, PRICE_HISTORY_LAST_UPDATED, PRICE_HISTORY_UPDATED_BY]
+
+
+# --- Typed Records ---
+# Each tab is decoded once per loaded copy (see queries.get_decoded_table): names and units are
+# normalized and numbers parsed up front, so lookups and reports work on ready-made values.
+
+@dataclass(slots=True, frozen=True)
+class Ingredient:
+    id: str
+    name: str
+    unit: str
+    quantity: float
+    cost_per_unit: float
+    key: str # Normalized name (stripped, lowercase)
+    unit_key: str # Canonical unit (see services.units)
+    reorder_level: float = 0.0 # Stock (in unit) at or below which a low-stock alert is sent; 0 = none
+
+@dataclass(slots=True, frozen=True)
+class UnitRule:
+    from_unit: str # Canonical
+    to_unit: str # Canonical
+    rate: float
+
+@dataclass(slots=True, frozen=True)
+class PriceHistoryEntry:
+    ingredient_id: str
+    old_cost: float
+    new_cost: float
+    last_updated: str
+    updated_by: str
+
+class IngredientTable:
+    """The decoded Ingredients tab: rows in sheet order, lookups by normalized name and by ID, and a fuzzy name index."""
+    __slots__ = ("ingredients", "by_key", "by_id", "positions", "malformed", "name_index")
+
+    def __init__(self):
+        self.ingredients: list[Ingredient] = []
+        self.positions: dict[str, int] = {} # ID -> record position of the first decoded row with that ID
+        self.by_key: dict[str, Ingredient] = {}
+        self.by_id: dict[str, Ingredient] = {}
+        self.malformed: dict[str, str] = {} # Normalized name -> name, for rows that failed to decode
+        self.name_index: NameIndex | None = None # Built once the rows are decoded
+
+class UnitRuleTable:
+    """
+    The Units tab compiled into a conversion graph: (from, to) -> rate for every pair of units
+    connected by a chain of rules (g -> kg -> lb), plus the dimension each unit belongs to.
+    Units in different dimensions (mass, volume, count, ...) have no rate.
+    """
+    __slots__ = ("rules", "rates", "dimensions")
+
+    def __init__(self):
+        self.rules: list[UnitRule] = []
+        self.rates: dict[tuple[str, str], float] = {}
+        self.dimensions: dict[str, str] = {} # Canonical unit -> dimension name
+
+    def rate(self, from_unit: str, to_unit: str) -> float | None:
+        return self.rates.get((canonical_unit(from_unit), canonical_unit(to_unit)))
+
+    def dimension(self, unit: str) -> str | None:
+        return self.dimensions.get(canonical_unit(unit))
+
+# Units used to name a connected group of units; groups with none of these are named after a member
+KNOWN_DIMENSIONS = {
+    'mass': {'mg', 'g', 'kg', 'oz', 'lb'},
+    'volume': {'ml', 'cl', 'dl', 'l', 'tsp', 'tbsp', 'cup', 'fl oz'},
+    'count': {'unit', 'dozen'},
+}
+
+# Relative difference at which two routes between the same units count as inconsistent
+UNIT_CYCLE_TOLERANCE = 1e-6
+
+# Malformed rows already logged, so a bad row is reported once rather than on every reload
+_reported_malformed_rows: set[tuple[str, str, str]] = set()
+
+def _report_malformed_row(sheet_name: str, row_label: str, problem: str) -> None:
+    key = (sheet_name, row_label, problem)
+    if key in _reported_malformed_rows:
+        return
+    _reported_malformed_rows.add(key)
+    logging.warning(f"DATA INTEGRITY WARNING: {sheet_name} {row_label}: {problem}")
+
+def normalize_name(value) -> str:
+    """The form names and units are compared in (stripped, lowercase)."""
+    return str(value).strip().lower()
+
+def _parse_number(value) -> float:
+    """Parses a numeric cell; blank cells count as 0. Raises ValueError for anything else."""
+    if value is None or value == "":
+        return 0.0
+    return float(value)
+
+def decode_ingredients(records: list[dict]) -> IngredientTable:
+    """Decodes Ingredients records. Rows without an ID/name or with non-numeric stock/cost are left out."""
+    table = IngredientTable()
+    for position, record in enumerate(records):
+        row_label = f"row {position + 2}"
+        name = str(record.get(INGREDIENT_NAME, "")).strip()
+        ingredient_id = str(record.get(INGREDIENT_ID, "")).strip()
+        if not name or not ingredient_id:
+            if name or ingredient_id:
+                _report_malformed_row(INGREDIENTS_SHEET, row_label, "missing ID or name (row skipped)")
+            continue
+        try:
+            quantity = _parse_number(record.get(INGREDIENT_QUANTITY))
+            cost_per_unit = _parse_number(record.get(INGREDIENT_COST_PER_UNIT))
+        except (ValueError, TypeError) as e:
+            _report_malformed_row(INGREDIENTS_SHEET, row_label, f"'{name}' has a non-numeric stock or cost ({e}) (row skipped)")
+            table.malformed[normalize_name(name)] = name
+            continue
+        try:
+            reorder_level = _parse_number(record.get(INGREDIENT_REORDER_LEVEL))
+        except (ValueError, TypeError):
+            # A bad threshold only disables the alert; the row itself is fine
+            _report_malformed_row(INGREDIENTS_SHEET, row_label, f"'{name}' has a non-numeric reorder level (no low-stock alert)")
+            reorder_level = 0.0
+        unit = str(record.get(INGREDIENT_UNIT, "")).strip()
+        ingredient = Ingredient(ingredient_id, name, unit, quantity, cost_per_unit, normalize_name(name), canonical_unit(unit), reorder_level)
+        table.ingredients.append(ingredient)
+        # The first row with a name/ID wins, like the row-by-row search did
+        table.by_key.setdefault(ingredient.key, ingredient)
+        table.by_id.setdefault(normalize_name(ingredient_id), ingredient)
+        table.positions.setdefault(ingredient_id, position)
+    table.name_index = NameIndex(ingredient.name for ingredient in table.ingredients)
+    return table
+
+# The last compiled graph, reused when a reload of the Units tab brings back the same rules
+_compiled_unit_rules: UnitRuleTable | None = None
+
+def decode_unit_rules(records: list[dict]) -> UnitRuleTable:
+    """Decodes Units records and compiles them into a conversion graph (see _compile_unit_graph)."""
+    global _compiled_unit_rules
+    table = UnitRuleTable()
+    for position, record in enumerate(records):
+        row_label = f"row {position + 2}"
+        from_unit = canonical_unit(record.get(UNITS_FROM_UNIT, ""))
+        to_unit = canonical_unit(record.get(UNITS_To_Unit, ""))
+        if not from_unit or not to_unit:
+            continue
+        try:
+            rate = float(record.get(UNITS_Conversion_Rate))
+        except (ValueError, TypeError):
+            _report_malformed_row(UNITS_SHEET, row_label, f"invalid rate for {from_unit} -> {to_unit} (row skipped)")
+            continue
+        if rate == 0:
+            _report_malformed_row(UNITS_SHEET, row_label, f"zero rate for {from_unit} -> {to_unit} (row skipped)")
+            continue
+        table.rules.append(UnitRule(from_unit, to_unit, rate))
+    if _compiled_unit_rules is not None and _compiled_unit_rules.rules == table.rules:
+        return _compiled_unit_rules
+    _compile_unit_graph(table)
+    _compiled_unit_rules = table
+    logging.info(f"UNIT GRAPH COMPILED: {len(table.rules)} rule(s), {len(table.dimensions)} unit(s), {len(table.rates)} rate(s).")
+    return table
+
+def _compile_unit_graph(table: UnitRuleTable) -> None:
+    """
+    Fills table.rates with the transitive closure of the rules, one connected group (dimension) at a time.
+    
+    Each unit gets a factor relative to its group's first unit (rate(a, b) = factor[b] / factor[a]).
+    A rule that disagrees with the factors already derived closes an inconsistent cycle and is
+    reported. Rules given in the sheet keep their exact rate, direct before inverse.
+    """
+    # 1. Adjacency lists: each rule is an edge both ways
+    edges: dict[str, list[tuple[str, float, int]]] = {}
+    for position, rule in enumerate(table.rules):
+        edges.setdefault(rule.from_unit, []).append((rule.to_unit, rule.rate, position))
+        edges.setdefault(rule.to_unit, []).append((rule.from_unit, 1.0 / rule.rate, position))
+    
+    # 2. Walk each connected group, assigning factors and checking every edge against them
+    for root in edges:
+        if root in table.dimensions:
+            continue
+        factors = {root: 1.0}
+        queue = [root]
+        for unit in queue:
+            for neighbour, rate, position in edges[unit]:
+                expected = factors[unit] * rate
+                if neighbour not in factors:
+                    factors[neighbour] = expected
+                    queue.append(neighbour)
+                elif abs(factors[neighbour] - expected) > UNIT_CYCLE_TOLERANCE * abs(expected):
+                    rule = table.rules[position]
+                    _report_malformed_row(UNITS_SHEET, f"row {position + 2}", f"rule {rule.from_unit} -> {rule.to_unit} = {rule.rate} contradicts the other rules (inconsistent cycle); other conversions use the first route found")
+        
+        name = next((dimension for dimension, units in KNOWN_DIMENSIONS.items() if units & factors.keys()), min(factors))
+        for unit in factors:
+            table.dimensions[unit] = name
+        
+        # 3. All pairs within the group
+        for from_unit, from_factor in factors.items():
+            for to_unit, to_factor in factors.items():
+                if from_unit != to_unit:
+                    table.rates[(from_unit, to_unit)] = to_factor / from_factor
+    
+    # 4. Rates given in the sheet win over derived ones (direct rules over inverses)
+    for rule in reversed(table.rules):
+        table.rates[(rule.to_unit, rule.from_unit)] = 1.0 / rule.rate
+    for rule in reversed(table.rules):
+        table.rates[(rule.from_unit, rule.to_unit)] = rule.rate
+
+def decode_price_history(records: list[dict]) -> list[PriceHistoryEntry]:
+    """Decodes Price_History records, oldest first."""
+    entries = []
+    for position, record in enumerate(records):
+        try:
+            entries.append(PriceHistoryEntry(
+                str(record.get(PRICE_HISTORY_INGREDIENT_ID, "")).strip(),
+                _parse_number(record.get(OLD_COST_PER_UNIT)),
+                _parse_number(record.get(NEW_COST_PER_UNIT)),
+                str(record.get(PRICE_HISTORY_LAST_UPDATED, "")),
+                str(record.get(PRICE_HISTORY_UPDATED_BY, "")).strip(),
+            ))
+        except (ValueError, TypeError) as e:
+            _report_malformed_row(PRICE_HISTORY_SHEET, f"row {position + 2}", f"non-numeric cost ({e}) (row skipped)")
+    return entries
+
+def decode_ingredient_columns(records: list[dict]) -> ColumnarTable:
+    """Columnar Ingredients tab for whole-table aggregates (valuation)."""
+    return ColumnarTable.from_records(records, [INGREDIENT_QUANTITY, INGREDIENT_COST_PER_UNIT], [INGREDIENT_ID, INGREDIENT_UNIT])
+
+def decode_price_history_columns(records: list[dict]) -> ColumnarTable:
+    """Columnar Price_History rows: costs as float arrays, ingredient IDs, dates and users as categories."""
+    return ColumnarTable.from_records(records, [OLD_COST_PER_UNIT, NEW_COST_PER_UNIT], [PRICE_HISTORY_INGREDIENT_ID, PRICE_HISTORY_LAST_UPDATED, PRICE_HISTORY_UPDATED_BY])
+
+async def _ingredient_lookup_columns() -> list[str]:
+    """
+    The columns to project from Ingredients. Asking for a column the tab doesn't have would make
+    every projected read refresh the header row, so Reorder Level is only asked for when it exists.
+    """
+    headers = await queries.get_headers(INGREDIENTS_SHEET)
+    if headers and INGREDIENT_REORDER_LEVEL in headers:
+        return INGREDIENT_LOOKUP_COLUMNS + [INGREDIENT_REORDER_LEVEL]
+    return INGREDIENT_LOOKUP_COLUMNS
+
+async def get_ingredient_table() -> IngredientTable | None:
+    """Returns the decoded Ingredients tab, or None if it could not be read."""
+    return await queries.get_decoded_table(INGREDIENTS_SHEET, decode_ingredients, columns=await _ingredient_lookup_columns())
+
+
+# --- Inventory Aggregate: Valuation Kept Up to Date by the Writes ---
+
+# Ingredients per page of the inventory report (Telegram messages are capped at 4096 characters)
+INVENTORY_PAGE_SIZE = int(os.getenv("INVENTORY_PAGE_SIZE", "25"))
+
+class InventoryAggregate:
+    """
+    Running totals over the Ingredients tab plus a name-sorted index for paging.
+
+    Rebuilt from the tab only when its generation changes (a reload or an outside edit, see
+    queries.get_table_generation); our own stock and price writes are applied as deltas.
+    """
+    __slots__ = ("generation", "items", "sorted_keys", "total_value", "unit_totals", "malformed")
+
+    def __init__(self):
+        self.generation: int | None = None # None = not built (or the backend can't tell; always rebuild)
+        self.items: dict[str, Ingredient] = {} # ID -> current state
+        self.sorted_keys: list[tuple[str, str]] = [] # (name key, ID), sorted
+        self.total_value = 0.0
+        self.unit_totals: dict[str, float] = {} # Canonical unit -> total quantity
+        self.malformed: list[str] = [] # Names of rows that could not be decoded
+
+    @property
+    def item_count(self) -> int:
+        return len(self.items)
+
+    def rebuild(self, table: IngredientTable, columns: ColumnarTable, generation: int | None) -> None:
+        """
+        Recomputes everything from the decoded tab. Totals are summed over its columnar copy,
+        restricted to the rows the report lists (one per ID), so the incremental updates in
+        apply() keep them in step.
+        """
+        self.items = {}
+        for ingredient in table.ingredients:
+            self.items.setdefault(ingredient.id, ingredient)
+        self.sorted_keys = sorted((ingredient.key, ingredient_id) for ingredient_id, ingredient in self.items.items())
+        listed = columns.mask_positions(table.positions.values())
+        self.total_value = columns.sum_product(INGREDIENT_QUANTITY, INGREDIENT_COST_PER_UNIT, listed)
+        self.unit_totals = {}
+        for unit, quantity in columns.group_sum(INGREDIENT_UNIT, INGREDIENT_QUANTITY, listed).items():
+            unit_key = canonical_unit(unit)
+            self.unit_totals[unit_key] = self.unit_totals.get(unit_key, 0.0) + quantity
+        self.malformed = sorted(table.malformed.values(), key=str.lower)
+        self.generation = generation
+        logging.info(f"INVENTORY AGGREGATE REBUILT: {self.item_count} item(s), total value {self.total_value:.2f}.")
+
+    def apply(self, ingredient: Ingredient) -> None:
+        """Replaces (or adds) one ingredient's state, adjusting the totals by the difference."""
+        old = self.items.get(ingredient.id)
+        if old is None:
+            bisect.insort(self.sorted_keys, (ingredient.key, ingredient.id))
+        else:
+            self.total_value -= old.quantity * old.cost_per_unit
+            self.unit_totals[old.unit_key] = self.unit_totals.get(old.unit_key, 0.0) - old.quantity
+        self.total_value += ingredient.quantity * ingredient.cost_per_unit
+        self.unit_totals[ingredient.unit_key] = self.unit_totals.get(ingredient.unit_key, 0.0) + ingredient.quantity
+        self.items[ingredient.id] = ingredient
+
+    def page(self, page: int, page_size: int = INVENTORY_PAGE_SIZE) -> list[Ingredient]:
+        start = page * page_size
+        return [self.items[ingredient_id] for _, ingredient_id in self.sorted_keys[start:start + page_size]]
+
+    def page_count(self, page_size: int = INVENTORY_PAGE_SIZE) -> int:
+        return max(1, -(-len(self.sorted_keys) // page_size))
+
+_inventory = InventoryAggregate()
+
+async def get_inventory_aggregate() -> InventoryAggregate | None:
+    """Returns the inventory aggregate, rebuilding it first if the Ingredients tab was reloaded. None on a read error."""
+    generation = queries.get_table_generation(INGREDIENTS_SHEET)
+    if generation is not None and generation == _inventory.generation:
+        return _inventory
+    
+    # Load the full tab (so it is cached and has a generation), then rebuild from its decoded views
+    await queries.get_tables([INGREDIENTS_SHEET])
+    table = await get_ingredient_table()
+    columns = await queries.get_decoded_table(INGREDIENTS_SHEET, decode_ingredient_columns, columns=await _ingredient_lookup_columns())
+    if table is None or columns is None:
+        logging.error(f"DATABASE READ FAILED: Could not read {INGREDIENTS_SHEET} for the inventory aggregate.")
+        return None
+    _inventory.rebuild(table, columns, queries.get_table_generation(INGREDIENTS_SHEET))
+    return _inventory
+
+def _inventory_fields(updates: dict) -> dict:
+    """Maps written Ingredients cells to Ingredient fields, parsed the way a reload would see them."""
+    fields = {}
+    if INGREDIENT_QUANTITY in updates:
+        fields['quantity'] = float(updates[INGREDIENT_QUANTITY])
+    if INGREDIENT_COST_PER_UNIT in updates:
+        fields['cost_per_unit'] = float(updates[INGREDIENT_COST_PER_UNIT])
+    return fields
+
+def _record_inventory_change(ingredient: Ingredient, **changes) -> None:
+    """
+    Applies a successful write (e.g. quantity=..., cost_per_unit=...) to the aggregate and checks
+    a written quantity against the ingredient's reorder level. The aggregate part is skipped while
+    it isn't built; it will be built from the tab on first use.
+    """
+    if 'quantity' in changes:
+        check_stock_level(ingredient.id, ingredient.name, changes['quantity'], ingredient.unit, ingredient.reorder_level)
+    if _inventory.generation is None:
+        return
+    current = _inventory.items.get(ingredient.id, ingredient)
+    _inventory.apply(dataclasses.replace(current, **changes))
+
+
+
+# --- Stock Locks: One Change per Ingredient at a Time ---
+# A stock command reads the current quantity, computes the new one and commits it. The awaits in
+# between (ledger append, row write) would let a second command for the same ingredient read the
+# same old quantity, so commands hold their ingredients' locks from the read through the commit.
+
+_stock_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = weakref.WeakValueDictionary() # Normalized name -> lock (dropped when unused)
+
+@contextlib.asynccontextmanager
+async def _locked_stock(names):
+    """Holds the stock locks of the named ingredients (taken in sorted order, so bulk commands can't deadlock)."""
+    async with contextlib.AsyncExitStack() as stack:
+        for key in sorted({normalize_name(name) for name in names}):
+            lock = _stock_locks.get(key)
+            if lock is None:
+                lock = _stock_locks[key] = asyncio.Lock()
+            await stack.enter_async_context(lock)
+        yield
+
+
+# --- Stock Ledger: Events First, Snapshot Second ---
+# Every stock/cost change is appended to the ledger (services.ledger); that append is the only
+# write a command waits for. The ledger is the record of truth; Quantity / Cost Per Unit in
+# Ingredients are a snapshot of each ingredient's latest event. The snapshot rows are staged on
+# the write-behind queue (the cached tab shows them at once, the sheet gets them in a batch). If a
+# snapshot write fails, materialize_stock_snapshot() catches the rows up from the last checkpoint.
+
+# Seconds between background catch-ups of the snapshot (0 = only at startup and shutdown)
+LEDGER_SNAPSHOT_SECONDS = float(os.getenv("LEDGER_SNAPSHOT_SECONDS", "300"))
+# Snapshot values closer than this to the ledger's count as equal (cells are stored with 4 decimals)
+LEDGER_SNAPSHOT_TOLERANCE = 5e-5
+
+class _SnapshotGate:
+    """
+    Stock commits share the gate; materialization takes it exclusively, so it never writes a row
+    from an older event while a commit is writing that row from a newer one.
+    """
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self._commits = 0
+        self._materializing = False
+
+    @contextlib.asynccontextmanager
+    async def commit(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._materializing)
+            self._commits += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._commits -= 1
+                self._condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def exclusive(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: not self._materializing)
+            # Claim the gate first, so new commits wait instead of starving us
+            self._materializing = True
+            await self._condition.wait_for(lambda: self._commits == 0)
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._materializing = False
+                self._condition.notify_all()
+
+_snapshot_gate = _SnapshotGate()
+_snapshot_lagging = False # A snapshot write failed after its events were recorded
+_snapshot_task: asyncio.Task | None = None
+
+SNAPSHOT_BEHIND_MESSAGE = "The inventory sheet is behind the stock ledger and could not be caught up. Nothing was changed; please try again shortly."
+
+def _snapshot_pending_note() -> str:
+    """A line for the reply when a committed change is in the ledger but not yet in the Ingredients sheet."""
+    if not _snapshot_lagging:
+        return ""
+    return "\n⚠️ Saved to the stock ledger, but the Ingredients sheet could not be updated yet; it will catch up automatically."
+
+async def _commit_stock_change(events: list[StockEvent], row_updates: dict[str, dict], user_id: str | int | None = None, record_undo: bool = True) -> bool:
+    """
+    Records events in the ledger, then stages the Ingredients row updates (ingredient ID -> cells)
+    that snapshot them. Returns False only if the events could not be recorded (nothing was
+    changed); if the rows can't even be staged they are caught up from the ledger straight away,
+    and if that fails as well the change stays pending (see _snapshot_pending_note).
+    With record_undo, the events become the user's latest undoable transaction.
+    """
+    if not await _commit_to_ledger(events, row_updates, user_id):
+        return False
+    if _snapshot_lagging:
+        # Catch the rows up from the ledger right away; if that fails too, callers report it (_snapshot_pending_note)
+        await materialize_stock_snapshot()
+    if record_undo:
+        undo.remember_transaction(user_id, events)
+    return True
+
+async def _commit_to_ledger(events: list[StockEvent], row_updates: dict[str, dict], user_id: str | int | None) -> bool:
+    async with _snapshot_gate.commit():
+        # 1. The ledger append is the commit point
+        try:
+            if not await ledger.append_stock_events(events, user_id):
+                return False
+        except Exception as e:
+            logging.error(f"LEDGER APPEND FAILED: {len(events)} event(s) not recorded. Exception: {e}")
+            return False
+
+        # 2. The snapshot follows the ledger: staged now, written with the next write-behind batch
+        try:
+            written = await queries.stage_row_updates(INGREDIENTS_SHEET, row_updates, user_id=user_id)
+        except Exception as e:
+            logging.error(f"SNAPSHOT WRITE FAILED: Exception: {e}")
+            _mark_snapshot_lagging(len(events))
+            return True
+        if written.done():
+            # Written directly (the cache could not stage it), so the outcome is already known
+            _check_snapshot_write(written, len(events))
+        else:
+            written.add_done_callback(lambda future: _check_snapshot_write(future, len(events)))
+        return True
+
+def _check_snapshot_write(written: asyncio.Future, event_count: int) -> None:
+    """Marks the snapshot as lagging if a staged row write failed."""
+    if written.cancelled() or written.exception() is not None or not written.result():
+        _mark_snapshot_lagging(event_count)
+
+def _mark_snapshot_lagging(event_count: int) -> None:
+    """Notes that recorded events are missing from the Ingredients rows, so they get materialized from the ledger."""
+    global _snapshot_lagging
+    _snapshot_lagging = True
+    logging.warning(f"SNAPSHOT LAGGING: {event_count} recorded event(s) are not in {INGREDIENTS_SHEET} yet; they will be materialized from the ledger.")
+
+async def materialize_stock_snapshot() -> bool:
+    """
+    Brings the Ingredients snapshot up to date with the ledger.
+
+    Only the ledger rows after the checkpoint are read. For each ingredient in them, the row is
+    rewritten (in one batch) if it differs from the latest event; then the checkpoint moves to
+    the last row read. Returns True if the snapshot is up to date.
+    """
+    global _snapshot_lagging
+    async with _snapshot_gate.exclusive():
+        # 1. Read only the events after the checkpoint
+        checkpoint = await ledger.read_checkpoint()
+        if checkpoint is None:
+            logging.error("SNAPSHOT FAILED: The ledger checkpoint is unavailable; not replaying the ledger.")
+            return False
+        result = await ledger.read_events_after(checkpoint)
+        if result is None or (result[1] == checkpoint == 1 and _snapshot_lagging):
+            # A lagging snapshot means the ledger has events, so an empty answer from row 1 is a failed read
+            logging.error(f"SNAPSHOT FAILED: Could not read the ledger after row {checkpoint}.")
+            return False
+        events, last_row = result
+        if last_row == checkpoint:
+            logging.debug(f"SNAPSHOT UP TO DATE: No ledger events after row {checkpoint}.")
+            _snapshot_lagging = False
+            return True
+
+        # 2. The latest event per ingredient is its current state
+        latest: dict[str, StockEvent] = {}
+        for event in events:
+            latest[normalize_name(event.ingredient_id)] = event
+
+        # 3. Rewrite only the rows that don't match it
+        table = await get_ingredient_table()
+        if table is None:
+            logging.error(f"SNAPSHOT FAILED: Could not read {INGREDIENTS_SHEET}.")
+            return False
+        row_updates: dict[str, dict] = {}
+        for key, event in latest.items():
+            ingredient = table.by_id.get(key)
+            if ingredient is None:
+                logging.warning(f"SNAPSHOT SKIPPED: Ledger ingredient '{event.ingredient_id}' has no row in {INGREDIENTS_SHEET}.")
+                continue
+            fields = {}
+            if abs(ingredient.quantity - event.quantity_after) > LEDGER_SNAPSHOT_TOLERANCE:
+                fields[INGREDIENT_QUANTITY] = f"{event.quantity_after:.4f}"
+            if abs(ingredient.cost_per_unit - event.cost_per_unit) > LEDGER_SNAPSHOT_TOLERANCE:
+                fields[INGREDIENT_COST_PER_UNIT] = f"{event.cost_per_unit:.4f}"
+            if fields:
+                row_updates[ingredient.id] = fields
+
+        if row_updates:
+            if not await queries.update_rows_by_id(INGREDIENTS_SHEET, row_updates, user_id=ledger.STOCK_LEDGER_SHEET):
+                logging.error(f"SNAPSHOT FAILED: Could not write {len(row_updates)} row(s) to {INGREDIENTS_SHEET}.")
+                return False
+            for ingredient_id, fields in row_updates.items():
+                _record_inventory_change(table.by_id[normalize_name(ingredient_id)], **_inventory_fields(fields))
+
+        # 4. Staged snapshot writes must be in the sheet before the checkpoint claims them
+        if not await queries.flush_pending_writes():
+            logging.error(f"SNAPSHOT FAILED: Staged {INGREDIENTS_SHEET} writes could not be flushed; the checkpoint stays at row {checkpoint}.")
+            return False
+
+        # 5. Move the checkpoint past what was just folded in
+        if not await ledger.write_checkpoint(last_row):
+            logging.warning(f"SNAPSHOT CHECKPOINT NOT SAVED: The next run re-reads the ledger from row {checkpoint + 1}.")
+        _snapshot_lagging = False
+        logging.info(f"SNAPSHOT MATERIALIZED: {len(events)} event(s) from ledger rows {checkpoint + 1}-{last_row}, {len(row_updates)} row(s) rewritten.")
+        return True
+
+async def _snapshot_loop() -> None:
+    while True:
+        await asyncio.sleep(LEDGER_SNAPSHOT_SECONDS)
+        try:
+            await materialize_stock_snapshot()
+        except Exception as e:
+            logging.error(f"SNAPSHOT FAILED: Background materialization raised. Exception: {e}", exc_info=True)
+
+async def start_stock_snapshots() -> None:
+    """Catches the snapshot up once (e.g. after a crash between a ledger append and its row write) and starts the background catch-up."""
+    global _snapshot_task
+    await materialize_stock_snapshot()
+    if LEDGER_SNAPSHOT_SECONDS > 0 and _snapshot_task is None:
+        _snapshot_task = asyncio.create_task(_snapshot_loop())
+        logging.info(f"SNAPSHOT: Background materialization every {LEDGER_SNAPSHOT_SECONDS:.0f}s.")
+
+async def stop_stock_snapshots() -> bool:
+    """Stops the background catch-up and runs a final one. Returns True if the snapshot is up to date."""
+    global _snapshot_task
+    if _snapshot_task is not None:
+        _snapshot_task.cancel()
+        _snapshot_task = None
+    return await materialize_stock_snapshot()
+
 
 async def get_conversion_rate(from_unit: str, to_unit: str) -> float | None:
     """
     Retrieves the conversion rate between two specified units from the Units table (asynchronously).
     
-    If no direct conversion is found, it attempts the reverse conversion.
+    Rates come from the compiled conversion graph, so reverse rules and chains of rules
+    (e.g. g -> kg -> lb) are covered by the same dictionary lookup.
     
     Returns the rate (float) if found, otherwise None.
     """
     logging.debug(f"START CONVERSION LOOKUP: Checking rate from '{from_unit}' to '{to_unit}'.")
     
-    # 1. Standardize inputs
-    from_unit_clean = from_unit.strip().lower()
-    to_unit_clean = to_unit.strip().lower()
+    # 1. Standardize inputs (aliases such as 'grams' or 'litres' map to their canonical unit)
+    from_unit_clean = canonical_unit(from_unit)
+    to_unit_clean = canonical_unit(to_unit)
     
     # Check for same unit identity (rate is 1.0)
     if from_unit_clean == to_unit_clean:
         logging.debug("UNIT MATCH: Units are identical, returning rate 1.0.")
         return 1.0
 
-    # 2. Get all conversion rules from the database (UNITS_SHEET)
+    # 2. Get the compiled conversion graph (rebuilt only when the Units rules change)
     try:
-        # Await the asynchronous query function
-        conversion_rules = await queries.get_all_records(UNITS_SHEET) 
+        unit_rules = await queries.get_decoded_table(UNITS_SHEET, decode_unit_rules, columns=[UNITS_FROM_UNIT, UNITS_To_Unit, UNITS_Conversion_Rate])
     except Exception as e:
         logging.error(f"DATABASE READ FAILED: Could not fetch conversion rules from {UNITS_SHEET}. Exception: {e}")
         return None
+    if unit_rules is None:
+        logging.error(f"DATABASE READ FAILED: Could not fetch conversion rules from {UNITS_SHEET}.")
+        return None
 
-    # 3. Search for the direct conversion (From -> To)
-    # ... (Rest of your existing logic for finding direct conversion remains the same) ...
-    for rule in conversion_rules:
-        # Data integrity check: Ensure all required columns exist in the record
-        if all(key in rule for key in [UNITS_FROM_UNIT, UNITS_To_Unit, UNITS_Conversion_Rate]):
-            rule_from = rule[UNITS_FROM_UNIT].strip().lower()
-            rule_to = rule[UNITS_To_Unit].strip().lower()
+    # 3. Look up the rate
+    rate = unit_rules.rate(from_unit_clean, to_unit_clean)
+    if rate is not None:
+        logging.info(f"RATE FOUND: {from_unit_clean} -> {to_unit_clean} = {rate}.")
+        return rate
 
-            if rule_from == from_unit_clean and rule_to == to_unit_clean:
-                try:
-                    # Safely convert the rate to a float
-                    rate = float(rule[UNITS_Conversion_Rate])
-                    logging.info(f"DIRECT RATE FOUND: {rule_from} -> {rule_to} = {rate}.")
-                    return rate
-                except ValueError:
-                    # Handle cases where the rate value in the sheet is not a valid number
-                    logging.warning(f"DATA INTEGRITY WARNING: Invalid rate value found for {rule_from} to {rule_to}. Skipping record.")
-                    continue
-
-    # 4. Search for the reverse conversion (To -> From) and calculate the inverse rate
-    # ... (Rest of your existing logic for finding inverse conversion remains the same) ...
-    for rule in conversion_rules:
-        if all(key in rule for key in [UNITS_FROM_UNIT, UNITS_To_Unit, UNITS_Conversion_Rate]):
-            rule_from = rule[UNITS_FROM_UNIT].strip().lower()
-            rule_to = rule[UNITS_To_Unit].strip().lower()
-
-            # Reverse check: Find rule where the TO unit is the rule's FROM and the FROM unit is the rule's TO
-            if rule_from == to_unit_clean and rule_to == from_unit_clean:
-                try:
-                    direct_rate = float(rule[UNITS_Conversion_Rate])
-                    if direct_rate == 0:
-                        raise ZeroDivisionError("Rate is zero.")
-                        
-                    # Calculate inverse rate: 1 / (Direct Rate)
-                    inverse_rate = 1.0 / direct_rate
-                    logging.info(f"INVERSE RATE FOUND: {rule_from} -> {rule_to} rule used. Calculated inverse rate is {inverse_rate}.")
-                    return inverse_rate
-                except (ValueError, ZeroDivisionError) as e:
-                    # Handle invalid number format or division by zero
-                    logging.warning(f"DATA INTEGRITY WARNING: Invalid or zero rate found for reverse lookup ({rule_from} to {rule_to}). Exception: {e}")
-                    continue
-                    
-    # 5. No conversion rule found
-    logging.warning(f"RATE NOT FOUND: No conversion rule found between {from_unit_clean} and {to_unit_clean}.")
+    # 4. No conversion rule found (unknown unit, or units of different dimensions)
+    from_dimension, to_dimension = unit_rules.dimension(from_unit_clean), unit_rules.dimension(to_unit_clean)
+    if from_dimension and to_dimension:
+        logging.warning(f"RATE NOT FOUND: {from_unit_clean} ({from_dimension}) and {to_unit_clean} ({to_dimension}) cannot be converted.")
+    else:
+        logging.warning(f"RATE NOT FOUND: No conversion rule found between {from_unit_clean} and {to_unit_clean}.")
     return None
 
 
+# --- Price History: Latest Change per Ingredient ---
+# Price_History only grows, so it is never downloaded whole. The newest entry per ingredient is kept
+# in memory: entries are recorded as log_price_history writes them, and an ingredient not seen yet is
+# looked up by reading the tab backwards from its end (queries.get_tail_records) until it turns up.
+# That backwards scan happens at most once per process: when it reaches the first row or
+# PRICE_HISTORY_MAX_TAIL_ROWS, every ingredient still unknown has no change in the scanned rows.
+
+# Rows in the first tail read of a lookup (each further read goes back twice as far)
+PRICE_HISTORY_TAIL_ROWS = int(os.getenv("PRICE_HISTORY_TAIL_ROWS", "100"))
+# How far back a lookup reads at most; older changes are treated as no change
+PRICE_HISTORY_MAX_TAIL_ROWS = int(os.getenv("PRICE_HISTORY_MAX_TAIL_ROWS", "5000"))
+
+_latest_price_changes: dict[str, PriceHistoryEntry | None] = {} # Ingredient ID (lowercase) -> newest entry, None = never changed
+_price_history_scanned_rows: int | None = None # Set once a scan has covered that many newest rows (or the whole tab)
+
+def _record_latest_price_changes(entries: list[PriceHistoryEntry]) -> None:
+    """Remembers the newest of the given entries (oldest first) for each ingredient."""
+    for entry in entries:
+        if entry.ingredient_id:
+            _latest_price_changes[entry.ingredient_id.lower()] = entry
+
+def _latest_entries(history: ColumnarTable) -> list[PriceHistoryEntry]:
+    """The newest entry per ingredient in a columnar slice of Price_History (blank costs read as 0), oldest first."""
+    entries = []
+    for position in sorted(history.group_last(PRICE_HISTORY_INGREDIENT_ID).values()):
+        old_cost, new_cost = history.value(OLD_COST_PER_UNIT, position), history.value(NEW_COST_PER_UNIT, position)
+        entries.append(PriceHistoryEntry(
+            history.value(PRICE_HISTORY_INGREDIENT_ID, position),
+            old_cost if old_cost == old_cost else 0.0,
+            new_cost if new_cost == new_cost else 0.0,
+            history.value(PRICE_HISTORY_LAST_UPDATED, position),
+            history.value(PRICE_HISTORY_UPDATED_BY, position),
+        ))
+    return entries
+
+def _record_logged_price_changes(changes: list[tuple[str, float, float]], user_id: str | int | None) -> None:
+    """Remembers price changes just appended to Price_History, stamped like queries.append_rows stamps them."""
+    logged_at = datetime.now().isoformat()
+    updated_by = str(user_id) if user_id is not None else 'SYSTEM'
+    _record_latest_price_changes([
+        PriceHistoryEntry(str(ingredient_id).strip(), round(old_cost, 4), round(new_cost, 4), logged_at, updated_by)
+        for ingredient_id, old_cost, new_cost in changes
+    ])
+
+async def get_latest_price_change(ingredient_id: str) -> PriceHistoryEntry | None:
+    """
+    Returns the newest Price_History entry for an ingredient, or None if its price never changed
+    (or the tab could not be read). Known ingredients are answered from memory; otherwise the cost
+    depends on how far back the last change is, not on how long the history is, and is bounded by
+    PRICE_HISTORY_MAX_TAIL_ROWS. Once one lookup has scanned that far, unknown IDs read nothing.
+    """
+    global _price_history_scanned_rows
+    key = str(ingredient_id).strip().lower()
+    if key in _latest_price_changes:
+        return _latest_price_changes[key]
+    if _price_history_scanned_rows is not None:
+        # Every entry in the scanned rows is remembered, and later ones are recorded as they are logged
+        return None
+
+    count = min(PRICE_HISTORY_TAIL_ROWS, PRICE_HISTORY_MAX_TAIL_ROWS)
+    while True:
+        records = await queries.get_tail_records(PRICE_HISTORY_SHEET, count, columns=PRICE_HISTORY_COLUMNS)
+        if records is None:
+            return None # Empty or unreadable: nothing to remember
+        # Only the newest row per ingredient in the window is turned into an entry
+        _record_latest_price_changes(_latest_entries(decode_price_history_columns(records)))
+        if key in _latest_price_changes:
+            return _latest_price_changes[key]
+        if len(records) < count or count >= PRICE_HISTORY_MAX_TAIL_ROWS:
+            # Read back to the first row (or as far as allowed) without finding it
+            _price_history_scanned_rows = len(records)
+            logging.info(f"PRICE HISTORY: No price change for ID {ingredient_id} in the newest {len(records)} row(s); other unknown IDs won't be searched again.")
+            return None
+        count = min(count * 2, PRICE_HISTORY_MAX_TAIL_ROWS)
+
 # --- Core Service Functions ---
 
+async def _prefetch_tables(*sheet_names: str) -> bool:
+    """
+    Loads the tabs a command is about to read in one round trip; the lookups that follow hit the cache.
+    Returns False if the snapshot is missing recorded events and could not be caught up.
+    """
+    if _snapshot_lagging and not await materialize_stock_snapshot():
+        # Don't compute new stock from a snapshot that is missing recorded events
+        logging.error("SNAPSHOT LAGGING: Stock change refused until the Ingredients snapshot catches up with the ledger.")
+        return False
+    await queries.get_tables([INGREDIENTS_SHEET, UNITS_SHEET, *sheet_names])
+    return True
+
 async def log_price_history(ingredient_id: str, old_cost_per_unit: float, new_cost_per_unit: float, user_id: str | int | None = None) -> bool:
     # Log the start of the history logging operation
     logging.info(f"START LOGGING: Price history for ID: {ingredient_id}. Old: {old_cost_per_unit:.4f}, New: {new_cost_per_unit:.4f}")
@@ -126,6 +775,7 @@ async def log_price_history(ingredient_id: str, old_cost_per_unit: float, new_co
         if success:
             # Log successful completion
             logging.info(f"SUCCESS LOGGING: Price history appended for ID: {ingredient_id}.")
+            _record_logged_price_changes([(ingredient_id, old_cost_per_unit, new_cost_per_unit)], user_id)
             return True
         else:
             # Log failure if the lower-level append_row function returns False
@@ -137,37 +787,54 @@ async def log_price_history(ingredient_id: str, old_cost_per_unit: float, new_co
         logging.error(f"UNEXPECTED ERROR: Failed to log price history for ID {ingredient_id}.", exc_info=True)
         return False
 
+async def log_price_history_bulk(entries: list[tuple[str, float, float]], user_id: str | int | None = None) -> bool:
+    """
+    Logs several price changes at once, e.g. when backfilling history.
+    
+    entries is a list of (ingredient_id, old_cost_per_unit, new_cost_per_unit) tuples.
+    All rows are appended to Price_History in a single request.
+    """
+    logging.info(f"START BULK LOGGING: {len(entries)} price history entries.")
+    
+    # Prepare one data dictionary per entry using the specified column names
+    log_rows = [
+        {
+            PRICE_HISTORY_INGREDIENT_ID: ingredient_id,
+            OLD_COST_PER_UNIT: f"{old_cost:.4f}",
+            NEW_COST_PER_UNIT: f"{new_cost:.4f}",
+        }
+        for ingredient_id, old_cost, new_cost in entries
+    ]
+    
+    success = await queries.append_rows(PRICE_HISTORY_SHEET, log_rows, user_id=user_id)
+    if success:
+        logging.info(f"SUCCESS BULK LOGGING: {len(log_rows)} price history entries appended.")
+        _record_logged_price_changes(entries, user_id)
+    else:
+        logging.error("DATABASE WRITE FAILED: queries.append_rows returned False for bulk price history.")
+    return success
+
 async def get_ingredient_id_by_name(name: str) -> str | None:
     """
     Searches the Ingredients sheet for an ingredient by name (case-insensitive).
     
     Returns the Ingredient ID (e.g., 'ING001') if found, otherwise returns None.
     """
-    search_name = name.strip().lower()
-    logging.info(f"Searching for ingredient by name: '{search_name}'")
+    logging.info(f"Searching for ingredient by name: '{name}'")
     
-    # 1. Get all ingredient records
-    # P2.4: Use the existing queries function
-    all_ingredients = queries.get_all_records(INGREDIENTS_SHEET)
-    
-    # 2. Search for the specific ingredient by name
-    # We iterate and compare the lowercased name from the sheet
-    current_record = next(
-        (i for i in all_ingredients if i[INGREDIENT_NAME].strip().lower() == search_name),
-        None
-    )
-    
-    if current_record:
-        ingredient_id = current_record[INGREDIENT_ID]
-        logging.info(f"Match found for '{search_name}': ID is {ingredient_id}")
-        return ingredient_id
-    else:
-        logging.warning(f"No match found for ingredient name: '{search_name}'")
-        return None
+    ingredient = await _find_ingredient_by_name(name)
+    if ingredient:
+        logging.info(f"Match found for '{name}': ID is {ingredient.id}")
+        return ingredient.id
+    logging.warning(f"No match found for ingredient name: '{name}'")
+    return None
 
-async def add_new_ingredient(name: str, stock: float, unit: str, cost: float, user_id: str | int | None = None) -> str:
+async def add_new_ingredient(name: str, stock: float, unit: str, cost: float, user_id: str | int | None = None, update_id: int | None = None) -> str:
     """
-    Creates a new ingredient record in the Ingredients sheet after generating an ID.
+    Creates a new ingredient record in the Ingredients sheet after generating an ID,
+    and records its initial stock in the stock ledger (a NEW event).
+    
+    The row is written before the event here: the snapshot can only catch up rows that exist.
     
     Returns the new ID on success or 'ERROR_SAVE_FAILED' on failure.
     """
@@ -205,6 +872,13 @@ async def add_new_ingredient(name: str, stock: float, unit: str, cost: float, us
     # 3. Append the data to the Ingredients sheet (P2.6)
     try:
         if await queries.append_row(INGREDIENTS_SHEET, new_ingredient_data, user_id):
+            _record_inventory_change(Ingredient(new_id, name.strip(), unit.strip(), 0.0, 0.0, normalize_name(name), canonical_unit(unit)), **_inventory_fields(new_ingredient_data))
+            new_event = new_stock_event(new_id, ledger.EVENT_NEW, stock, stock, cost, update_id, cost_before=0.0)
+            if await ledger.append_stock_events([new_event], user_id):
+                undo.remember_transaction(user_id, [new_event])
+            else:
+                # The ingredient exists; only its audit trail starts late
+                logging.error(f"LEDGER APPEND FAILED: Ingredient {new_id} was added without its NEW ledger event.")
             logging.info(f"END ADD: Successfully added new ingredient with ID: {new_id}.")
             return new_id
         else:
@@ -217,50 +891,51 @@ async def add_new_ingredient(name: str, stock: float, unit: str, cost: float, us
         return "ERROR_SAVE_FAILED"
 
 
-async def _find_ingredient_by_name(name: str) -> dict | None:
+async def _find_ingredient_by_name(name: str) -> Ingredient | None:
     """
-    Utility function to search for an ingredient record by name (case-insensitive).
+    Utility function to search for an ingredient by name (case-insensitive).
     
-    Returns the full ingredient record (dict) if found, otherwise None.
+    Returns the decoded Ingredient if found, otherwise None.
     """
     logging.debug(f"START LOOKUP: Searching for ingredient by name: '{name}'.")
     
-    # Safely retrieve all ingredient records from the database sheet
+    # Look the name up in the decoded (cached) Ingredients table
     try:
-        all_ingredients = await queries.get_all_records(INGREDIENTS_SHEET)
+        table = await get_ingredient_table()
     except Exception as e:
-        logging.error(f"DATABASE READ FAILED: Could not retrieve all records from {INGREDIENTS_SHEET}. Exception: {e}")
+        logging.error(f"DATABASE READ FAILED: Could not look up ingredient in {INGREDIENTS_SHEET}. Exception: {e}")
         return None
-        
-    # Clean and lowercase the input name once for efficient comparison
-    clean_search_name = name.strip().lower()
-    
-    # Iterate through records to find a case-insensitive match
-    for record in all_ingredients:
-        # Check if the required name column exists in the record
-        logging.info(f"LOOKUP SUCCESS: Found ingredient '{record}'.")
-        if INGREDIENT_NAME in record:
-            # Clean and lowercase the name from the sheet for comparison
-            record_name = record[INGREDIENT_NAME].strip().lower()
-            
-            if record_name == clean_search_name:
-                logging.info(f"LOOKUP SUCCESS: Found ingredient '{name}' with ID {record.get(INGREDIENT_ID, 'N/A')}.")
-                return record
-        else:
-            # Log a warning if a record is missing the required name column
-            logging.warning(f"DATA INTEGRITY WARNING: Found record missing the '{INGREDIENT_NAME}' column.")
-            
-    # If the loop finishes without finding a match
-    logging.info(f"LOOKUP COMPLETE: Ingredient with name '{name}' not found.")
+    if table is None:
+        logging.error(f"DATABASE READ FAILED: Could not look up ingredient in {INGREDIENTS_SHEET}.")
+        return None
+    
+    key = normalize_name(name)
+    ingredient = table.by_key.get(key)
+    if ingredient:
+        logging.info(f"LOOKUP SUCCESS: Found ingredient '{name}' with ID {ingredient.id}.")
+        return ingredient
+    
+    if key in table.malformed:
+        logging.error(f"DATA INTEGRITY ERROR: Ingredient '{name}' exists but its stock or cost is not a number.")
+    else:
+        # No record matched the name
+        logging.info(f"LOOKUP COMPLETE: Ingredient with name '{name}' not found.")
     return None
     
+async def suggest_ingredient_names(name: str, limit: int = 3) -> list[str]:
+    """Returns the ingredient names closest to a name that wasn't found (best first), for "did you mean" replies."""
+    table = await get_ingredient_table()
+    if not table or not table.name_index:
+        return []
+    return [match for match, _ in table.name_index.search(name, limit)]
+
 async def calculate_converted_quantity(input_quantity: float, input_unit: str, target_unit: str) -> float | None:
     """
     Calculates the quantity equivalent of input_quantity in the target_unit.
     Returns the converted float quantity or None if conversion fails.
     """
-    input_unit = input_unit.strip().lower()
-    target_unit = target_unit.strip().lower()
+    input_unit = canonical_unit(input_unit)
+    target_unit = canonical_unit(target_unit)
 
     if input_unit == target_unit or input_unit == '':
         return input_quantity
@@ -282,7 +957,7 @@ async def calculate_converted_quantity(input_quantity: float, input_unit: str, t
         logging.error(f"FATAL CONVERSION ERROR: {e}", exc_info=True)
         return None
         
-async def atomic_combined_update(name: str, stock_qty_input: float, stock_unit_input: str, price_cost_input: float, user_id: str | int | None = None
+async def atomic_combined_update(name: str, stock_qty_input: float, stock_unit_input: str, price_cost_input: float, user_id: str | int | None = None, update_id: int | None = None
 ) -> tuple[bool, str]:
     """
     P3.E2: Atomically sets the ingredient stock to a new absolute quantity 
@@ -290,404 +965,484 @@ async def atomic_combined_update(name: str, stock_qty_input: float, stock_unit_i
     for both values based on the ingredient's base storage unit.
     """
     logging.info(f"START ATOMIC SET: Ing:{name}, Stock:{stock_qty_input} {stock_unit_input}, Price/Unit:{price_cost_input} €/{stock_unit_input}.")
-
-    # 1. Find the existing ingredient record
-    ingredient_record = await _find_ingredient_by_name(name)
-    if not ingredient_record:
-        return False, f"❌ Ingredient **{name}** not found. Cannot update."
+    # Hold the stock lock from the read below until the change is committed
+    async with _locked_stock([name]):
+        # Ingredients and Units in a single read
+        if not await _prefetch_tables():
+            return False, f"❌ {SNAPSHOT_BEHIND_MESSAGE}"
+
+        # 1. Find the existing ingredient record
+        ingredient_record = await _find_ingredient_by_name(name)
+        if not ingredient_record:
+            return False, f"❌ Ingredient **{name}** not found. Cannot update."
     
-    i_id = ingredient_record.get(INGREDIENT_ID)
-    current_unit = ingredient_record.get(INGREDIENT_UNIT)
-    old_price = float(ingredient_record.get(INGREDIENT_COST_PER_UNIT, 0.0)) # For history logging later
+        i_id = ingredient_record.id
+        current_unit = ingredient_record.unit
+        old_price = ingredient_record.cost_per_unit # For history logging later
 
-    # --- 2. Calculate New Stock Quantity (Absolute Set) ---
-    # Convert input stock quantity (e.g., 15 kg) to base unit (e.g., 15000 g)
-    new_stock_qty = await calculate_converted_quantity(stock_qty_input, stock_unit_input, current_unit)
-    if new_stock_qty is None:
-        return False, f"❌ Stock Conversion Failed: Could not convert {stock_unit_input} to {current_unit} for stock set."
+        # --- 2. Calculate New Stock Quantity (Absolute Set) ---
+        # Convert input stock quantity (e.g., 15 kg) to base unit (e.g., 15000 g)
+        new_stock_qty = await calculate_converted_quantity(stock_qty_input, stock_unit_input, current_unit)
+        if new_stock_qty is None:
+            return False, f"❌ Stock Conversion Failed: Could not convert {stock_unit_input} to {current_unit} for stock set."
 
 
-    # --- 3. Calculate New Cost Per Stored Unit (Absolute Set) ---
-    # Goal: Convert price_cost_input (€1.25/kg) to the price per stored unit (€X/g).
+        # --- 3. Calculate New Cost Per Stored Unit (Absolute Set) ---
+        # Goal: Convert price_cost_input (€1.25/kg) to the price per stored unit (€X/g).
     
-    # 3a. Get the conversion factor: How many stored units are in ONE input unit (e.g., 1 kg = 1000 g).
-    # We use calculate_converted_quantity with an input of 1.0 to get this ratio.
-    conversion_rate_for_price = await calculate_converted_quantity(1.0, stock_unit_input, current_unit)
+        # 3a. Get the conversion factor: How many stored units are in ONE input unit (e.g., 1 kg = 1000 g).
+        # We use calculate_converted_quantity with an input of 1.0 to get this ratio.
+        conversion_rate_for_price = await calculate_converted_quantity(1.0, stock_unit_input, current_unit)
     
-    if conversion_rate_for_price is None or conversion_rate_for_price == 0:
-        return False, f"❌ Price Conversion Failed: Invalid conversion rate found between {stock_unit_input} and {current_unit}."
+        if conversion_rate_for_price is None or conversion_rate_for_price == 0:
+            return False, f"❌ Price Conversion Failed: Invalid conversion rate found between {stock_unit_input} and {current_unit}."
 
-    # 3b. Calculation: New Cost = Input Price / Conversion Rate (Cost/Base Unit)
-    # Example: €1.25 / 1000 = €0.00125 per gram
-    new_cost_per_stored_unit = price_cost_input / conversion_rate_for_price
+        # 3b. Calculation: New Cost = Input Price / Conversion Rate (Cost/Base Unit)
+        # Example: €1.25 / 1000 = €0.00125 per gram
+        new_cost_per_stored_unit = price_cost_input / conversion_rate_for_price
 
-    # --- 4. Prepare Atomic Update Data ---
-    updates = {
-        INGREDIENT_QUANTITY: f"{new_stock_qty:.4f}",
-        INGREDIENT_COST_PER_UNIT: f"{new_cost_per_stored_unit:.4f}"
-    }
+        # --- 4. Prepare Atomic Update Data ---
+        updates = {
+            INGREDIENT_QUANTITY: f"{new_stock_qty:.4f}",
+            INGREDIENT_COST_PER_UNIT: f"{new_cost_per_stored_unit:.4f}"
+        }
 
-    # --- 5. Execute Single Atomic Update and Log History ---
+        # --- 5. Execute Single Atomic Update and Log History ---
     
-    update_success = False
-    try:
+        event = new_stock_event(
+            i_id, ledger.EVENT_SET, new_stock_qty - ingredient_record.quantity,
+            new_stock_qty, new_cost_per_stored_unit, update_id, cost_before=old_price,
+        )
         # Using the original sheet variable name: INGREDIENTS_SHEET
-        update_success = await queries.update_row_by_id(INGREDIENTS_SHEET, i_id, updates, user_id=user_id)
-    except Exception as e:
-        logging.error(f"DATABASE WRITE FAILED: Atomic update failed for ID {i_id}. Exception: {e}")
+        update_success = await _commit_stock_change(
+            [event], {i_id: updates}, user_id
+        )
 
-    # 6. Log history only if the atomic update succeeded
-    if update_success:
-        # Assuming history logging happens here if needed.
+        # 6. Log history only if the atomic update succeeded
+        if update_success:
+            _record_inventory_change(ingredient_record, **_inventory_fields(updates))
+            # Assuming history logging happens here if needed.
         
-        return True, (
-            f"✅ **Atomic Update Success for {name}**\n"
-            f"📦 Stock set to: `{new_stock_qty:.4f} {current_unit}`\n"
-            f"💶 Price set to: `{new_cost_per_stored_unit:.4f} per {current_unit}`"
-        )
-    else:
-        return False, f"❌ Failed to execute atomic combined update for {name}."
+            return True, (
+                f"✅ **Atomic Update Success for {name}**\n"
+                f"📦 Stock set to: `{new_stock_qty:.4f} {current_unit}`\n"
+                f"💶 Price set to: `{new_cost_per_stored_unit:.4f} per {current_unit}`"
+                f"{_snapshot_pending_note()}"
+            )
+        else:
+            return False, f"❌ Failed to execute atomic combined update for {name}."
 
 
-async def update_ingredient_cost_per_unit(name: str, input_quantity: float, input_unit: str, new_price: float, user_id: str | int | None = None) -> bool:
+async def update_ingredient_cost_per_unit(name: str, input_quantity: float, input_unit: str, new_price: float, user_id: str | int | None = None, update_id: int | None = None) -> bool:
     """
     Updates the unit cost of an existing ingredient by first calculating the cost
     per the ingredient's stored unit, and then logging the price change.
+    The new cost is recorded in the stock ledger as a COST event (update_id = the Telegram update).
     
     Returns True on success, False on failure (lookup, write, or data error).
     """
     logging.info(f"START PRICE UPDATE: Attempting to set cost for '{name}' based on input: {input_quantity} {input_unit} @ {new_price} €.")
+    # Hold the stock lock from the read below until the change is committed
+    async with _locked_stock([name]):
+        # Ingredients and Units in a single read
+        if not await _prefetch_tables():
+            return False
     
-    # 1. Find the existing ingredient record
-    try:
-        # Assuming _find_ingredient_by_name is the correct lookup utility
-        ingredient = await _find_ingredient_by_name(name)
-    except Exception as e:
-        logging.error(f"DATABASE READ FAILED: Error during lookup for '{name}'. Exception: {e}")
-        return False
+        # 1. Find the existing ingredient record
+        try:
+            # Assuming _find_ingredient_by_name is the correct lookup utility
+            ingredient = await _find_ingredient_by_name(name)
+        except Exception as e:
+            logging.error(f"DATABASE READ FAILED: Error during lookup for '{name}'. Exception: {e}")
+            return False
 
-    if not ingredient:
-        logging.warning(f"PRICE UPDATE ABORTED: Ingredient name '{name}' not found in the sheet.")
-        return False
+        if not ingredient:
+            logging.warning(f"PRICE UPDATE ABORTED: Ingredient name '{name}' not found in the sheet.")
+            return False
     
-    # 2. Safely retrieve necessary ingredient data
-    try:
-        i_id = ingredient[INGREDIENT_ID]
-        current_unit = ingredient[INGREDIENT_UNIT]  # Get the currently stored unit for conversion
-        old_price = float(ingredient.get(INGREDIENT_COST_PER_UNIT, 0.0))  
-    except (ValueError, KeyError, TypeError) as e:
-        logging.error(f"DATA INTEGRITY ERROR: Cannot read ingredient data for ID {i_id}. Exception: {e}")
-        old_price = 0.0 
+        # 2. Retrieve necessary ingredient data
+        i_id = ingredient.id
+        current_unit = ingredient.unit  # Get the currently stored unit for conversion
+        old_price = ingredient.cost_per_unit
 
-    # --- 3. Calculate the new cost per STORED unit using the utility ---
+        # --- 3. Calculate the new cost per STORED unit using the utility ---
     
-    # 3a. Convert input quantity to stored units to get the total purchased quantity in base unit
-    total_purchased_units_stored = await calculate_converted_quantity(input_quantity, input_unit, current_unit)
+        # 3a. Convert input quantity to stored units to get the total purchased quantity in base unit
+        total_purchased_units_stored = await calculate_converted_quantity(input_quantity, input_unit, current_unit)
     
-    if total_purchased_units_stored is None or total_purchased_units_stored == 0:
-        logging.error(f"PRICE CALCULATION FAILED: Conversion failed or input quantity is zero for ID {i_id}.")
-        return False
+        if total_purchased_units_stored is None or total_purchased_units_stored == 0:
+            logging.error(f"PRICE CALCULATION FAILED: Conversion failed or input quantity is zero for ID {i_id}.")
+            return False
         
-    # 3b. Calculate the final cost per ONE stored unit
-    new_cost_per_stored_unit = new_price / total_purchased_units_stored
-    logging.info(f"CALCULATION SUCCESS: New cost per {current_unit}: {new_cost_per_stored_unit:.4f} €.")
+        # 3b. Calculate the final cost per ONE stored unit
+        new_cost_per_stored_unit = new_price / total_purchased_units_stored
+        logging.info(f"CALCULATION SUCCESS: New cost per {current_unit}: {new_cost_per_stored_unit:.4f} €.")
 
-    # 4. Update the 'Ingredients' sheet with the final calculated price
-    updates = {
-        INGREDIENT_COST_PER_UNIT: f"{new_cost_per_stored_unit:.4f}" 
-    }
+        # 4. Update the 'Ingredients' sheet with the final calculated price
+        updates = {
+            INGREDIENT_COST_PER_UNIT: f"{new_cost_per_stored_unit:.4f}" 
+        }
     
-    try:
+        event = new_stock_event(i_id, ledger.EVENT_COST, 0.0, ingredient.quantity, new_cost_per_stored_unit, update_id, cost_before=old_price)
         # update_row_by_id handles finding the row by ID and updating metadata
-        update_success = await queries.update_row_by_id(INGREDIENTS_SHEET, i_id, updates, user_id=user_id)
-    except Exception as e:
-        logging.error(f"DATABASE WRITE FAILED: Could not update ingredient ID {i_id}. Exception: {e}")
-        update_success = False
+        update_success = await _commit_stock_change(
+            [event], {i_id: updates}, user_id
+        )
 
-    # 5. Log the change to the 'Price_History' sheet only if the main update succeeded
-    if update_success:
-        logging.info(f"INGREDIENT UPDATE SUCCESS: Updated cost for ID {i_id} from {old_price:.4f} € to {new_cost_per_stored_unit:.4f} €.")
+        # 5. Log the change to the 'Price_History' sheet only if the main update succeeded
+        if update_success:
+            _record_inventory_change(ingredient, **_inventory_fields(updates))
+            logging.info(f"INGREDIENT UPDATE SUCCESS: Updated cost for ID {i_id} from {old_price:.4f} € to {new_cost_per_stored_unit:.4f} €.")
         
-        # Call the logging function (P3.1.F5)
-        try:
-            await log_price_history(i_id, old_price, new_cost_per_stored_unit, user_id)
-            logging.info(f"HISTORY LOG SUCCESS: Price change logged.") 
-        except Exception as e:
-            logging.error(f"HISTORY LOG EXCEPTION: Failed to log price change for ID {i_id}. Exception: {e}")
-    else:
-        logging.error(f"PRICE UPDATE FAILED: Main database update failed for ID {i_id}.")
+            # Call the logging function (P3.1.F5)
+            try:
+                await log_price_history(i_id, old_price, new_cost_per_stored_unit, user_id)
+                logging.info(f"HISTORY LOG SUCCESS: Price change logged.") 
+            except Exception as e:
+                logging.error(f"HISTORY LOG EXCEPTION: Failed to log price change for ID {i_id}. Exception: {e}")
+        else:
+            logging.error(f"PRICE UPDATE FAILED: Main database update failed for ID {i_id}.")
         
-    logging.info(f"END PRICE UPDATE: Completed for '{name}'. Success: {update_success}")
-    return update_success
+        logging.info(f"END PRICE UPDATE: Completed for '{name}'. Success: {update_success}")
+        return update_success
     
-async def set_ingredient_stock(name: str, input_quantity: float, input_unit: str, user_id: str | int | None = None) -> tuple[bool, str]:
+async def set_ingredient_stock(name: str, input_quantity: float, input_unit: str, user_id: str | int | None = None, update_id: int | None = None) -> tuple[bool, str]:
     """
     Sets the stock of an existing ingredient to an absolute value, handling unit conversion.
+    The change is recorded in the stock ledger (with update_id, the Telegram update) first.
     
     Returns a tuple: (success_bool, status_message).
     """
     logging.info(f"START SET STOCK: Setting stock for '{name}' to {input_quantity} {input_unit} (User: {user_id}).")
+    # Hold the stock lock from the read below until the change is committed
+    async with _locked_stock([name]):
+        # Ingredients and Units in a single read
+        if not await _prefetch_tables():
+            return False, SNAPSHOT_BEHIND_MESSAGE
     
-    # 1. Find the existing ingredient record
-    try:
-        ingredient = await _find_ingredient_by_name(name)
-    except Exception as e:
-        logging.error(f"DATABASE READ FAILED: Error during lookup for '{name}'. Exception: {e}")
-        return False, "Failed to look up ingredient."
+        # 1. Find the existing ingredient record
+        try:
+            ingredient = await _find_ingredient_by_name(name)
+        except Exception as e:
+            logging.error(f"DATABASE READ FAILED: Error during lookup for '{name}'. Exception: {e}")
+            return False, "Failed to look up ingredient."
 
-    if not ingredient:
-        logging.warning(f"SET STOCK ABORTED: Ingredient '{name}' not found.")
-        return False, f"Ingredient '{name}' not found."
+        if not ingredient:
+            logging.warning(f"SET STOCK ABORTED: Ingredient '{name}' not found.")
+            return False, f"Ingredient '{name}' not found."
     
-    # 2. Retrieve necessary data
-    try:
-        i_id = ingredient[INGREDIENT_ID]
-        current_unit = ingredient[INGREDIENT_UNIT]
-        current_quantity = float(ingredient.get(INGREDIENT_QUANTITY, 0.0))
-    except (KeyError, ValueError, TypeError) as e:
-        logging.error(f"DATA INTEGRITY ERROR: Cannot read required fields for ID {i_id}. Exception: {e}")
-        return False, "Database error: Corrupted ingredient data."
-
-    # 3. Calculate the new stock in the STORED unit
-    
-    # 3a. Check for unit mismatch and perform conversion if needed
-    if current_unit.strip().lower() != input_unit.strip().lower():
-        logging.info(f"UNIT MISMATCH: Stored unit '{current_unit}' requires conversion from input unit '{input_unit}'.")
+        # 2. Retrieve necessary data
+        i_id = ingredient.id
+        current_unit = ingredient.unit
+        current_quantity = ingredient.quantity
+
+        # 3. Calculate the new stock in the STORED unit
+    
+        # 3a. Check for unit mismatch and perform conversion if needed
+        if ingredient.unit_key != canonical_unit(input_unit):
+            logging.info(f"UNIT MISMATCH: Stored unit '{current_unit}' requires conversion from input unit '{input_unit}'.")
         
-        try:
-            # Get the rate: (Input Unit -> Stored Unit)
-            rate = await get_conversion_rate(input_unit, current_unit)
-        except Exception as e:
-            logging.error(f"CONVERSION SERVICE ERROR: Failed to query units table. Exception: {e}")
-            return False, "Error occurred while looking up conversion rate."
+            try:
+                # Get the rate: (Input Unit -> Stored Unit)
+                rate = await get_conversion_rate(input_unit, current_unit)
+            except Exception as e:
+                logging.error(f"CONVERSION SERVICE ERROR: Failed to query units table. Exception: {e}")
+                return False, "Error occurred while looking up conversion rate."
 
-        if rate is None:
-            logging.error(f"CONVERSION FAILED: No conversion rate found between {input_unit} and {current_unit}. Aborting.")
-            return False, f"Unit conversion failed: No rate found between {input_unit} and {current_unit}."
+            if rate is None:
+                logging.error(f"CONVERSION FAILED: No conversion rate found between {input_unit} and {current_unit}. Aborting.")
+                return False, f"Unit conversion failed: No rate found between {input_unit} and {current_unit}."
             
-        # Convert the input quantity to the stored inventory unit
-        new_quantity_in_stored_unit = input_quantity * rate
-        logging.info(f"CONVERSION SUCCESS: Converted input Qty: {new_quantity_in_stored_unit:.4f} {current_unit}.")
-    else:
-        # Units match, no conversion needed
-        new_quantity_in_stored_unit = input_quantity
-        logging.info("UNIT MATCH: Units are identical. No conversion needed.")
+            # Convert the input quantity to the stored inventory unit
+            new_quantity_in_stored_unit = input_quantity * rate
+            logging.info(f"CONVERSION SUCCESS: Converted input Qty: {new_quantity_in_stored_unit:.4f} {current_unit}.")
+        else:
+            # Units match, no conversion needed
+            new_quantity_in_stored_unit = input_quantity
+            logging.info("UNIT MATCH: Units are identical. No conversion needed.")
 
-    # 4. Update the 'Ingredients' sheet
-    updates = {
-        # Set the stock to the calculated absolute value (after conversion)
-        INGREDIENT_QUANTITY: f"{new_quantity_in_stored_unit:.4f}"
-    }
+        # 4. Update the 'Ingredients' sheet
+        updates = {
+            # Set the stock to the calculated absolute value (after conversion)
+            INGREDIENT_QUANTITY: f"{new_quantity_in_stored_unit:.4f}"
+        }
     
-    try:
-        update_success = queries.update_row_by_id(INGREDIENTS_SHEET, i_id, updates, user_id=user_id)
-    except Exception as e:
-        logging.error(f"DATABASE WRITE FAILED: Could not update ingredient ID {i_id}. Exception: {e}")
-        return False, "Failed to save stock update to the ingredient record."
+        event = new_stock_event(
+            i_id, ledger.EVENT_SET, new_quantity_in_stored_unit - current_quantity,
+            new_quantity_in_stored_unit, ingredient.cost_per_unit, update_id,
+        )
+        update_success = await _commit_stock_change(
+            [event], {i_id: updates}, user_id
+        )
 
-    if update_success:
-        logging.info(f"END SET STOCK SUCCESS: Stock for ID {i_id} set from {current_quantity:.4f} {current_unit} to {new_quantity_in_stored_unit:.4f} {current_unit}.")
-        return True, f"Stock for **{name}** set to {new_quantity_in_stored_unit:.2f} {current_unit}."
-    else:
-        logging.error(f"DATABASE WRITE FAILED: Update function returned failure for ID {i_id}.")
-        return False, f"Failed to save updates to ingredient '{name}'."
+        if update_success:
+            _record_inventory_change(ingredient, **_inventory_fields(updates))
+            logging.info(f"END SET STOCK SUCCESS: Stock for ID {i_id} set from {current_quantity:.4f} {current_unit} to {new_quantity_in_stored_unit:.4f} {current_unit}.")
+            return True, f"Stock for **{name}** set to {new_quantity_in_stored_unit:.2f} {current_unit}.{_snapshot_pending_note()}"
+        else:
+            logging.error(f"DATABASE WRITE FAILED: Update function returned failure for ID {i_id}.")
+            return False, f"Failed to save updates to ingredient '{name}'."
         
         
-async def process_ingredient_purchase(name: str, quantity: float, unit: str, total_cost: float, user_id: str | int | None = None) -> tuple[bool, str]:
+async def process_ingredient_purchase(name: str, quantity: float, unit: str, total_cost: float, user_id: str | int | None = None, update_id: int | None = None) -> tuple[bool, str]:
     """
     Handles a purchase: checks if ingredient exists, adjusts stock/price, or adds new ingredient.
+    The purchase is recorded in the stock ledger (update_id = the Telegram update) first.
     
     Returns a tuple: (success_bool, status_message).
     """
     # Log the start of the transaction for monitoring, including the user ID
     logging.info(f"START PURCHASE (User: {user_id}): Processing purchase for: {name} | Qty: {quantity} {unit} | Cost: {total_cost} €")
+    # Hold the stock lock from the read below until the change is committed
+    async with _locked_stock([name]):
+        # Ingredients, Units (and Config for new IDs) in a single read
+        if not await _prefetch_tables(queries.CONFIG_SHEET):
+            return False, SNAPSHOT_BEHIND_MESSAGE
 
-    # 1. Attempt to find the ingredient record by its name
-    try:
-        # Use internal lookup function (assumed to be synchronous)
-        existing_record = await _find_ingredient_by_name(name)
-    except Exception as e:
-        # Log critical database error during lookup
-        logging.error(f"DATABASE ERROR: Failed to lookup ingredient '{name}'. Exception: {e}", exc_info=True)
-        return False, "Failed to look up ingredient in the database."
+        # 1. Attempt to find the ingredient record by its name
+        try:
+            # Use internal lookup function (assumed to be synchronous)
+            existing_record = await _find_ingredient_by_name(name)
+        except Exception as e:
+            # Log critical database error during lookup
+            logging.error(f"DATABASE ERROR: Failed to lookup ingredient '{name}'. Exception: {e}", exc_info=True)
+            return False, "Failed to look up ingredient in the database."
     
-    # Calculate the unit cost of the purchased batch
-    # This value is used for both new ingredient creation and price comparison.
-    try:
-        new_unit_cost_batch = total_cost / quantity
-    except ZeroDivisionError:
-        # Handle case where quantity is zero (cannot calculate unit cost)
-        logging.error(f"DATA ERROR: Purchase quantity for '{name}' is zero. Cannot process.")
-        return False, "Data error: Purchase quantity must be greater than zero."
-
-    if existing_record:
-        # --- Existing Ingredient Flow ---
-        logging.info(f"INGREDIENT EXISTS: Found '{name}' with ID {existing_record[INGREDIENT_ID]}")
-
+        # Calculate the unit cost of the purchased batch
+        # This value is used for both new ingredient creation and price comparison.
         try:
-            # Safely extract and convert existing inventory values
-            ingredient_id = existing_record[INGREDIENT_ID]
-            current_unit_cost = float(existing_record[INGREDIENT_COST_PER_UNIT])
-            current_quantity = float(existing_record[INGREDIENT_QUANTITY])
-            current_unit = existing_record[INGREDIENT_UNIT]
-        except (ValueError, KeyError) as e:
-            # Log data integrity issue if required fields are missing or corrupted
-            logging.error(f"DATA INTEGRITY ERROR: Corrupted stock or schema for {name}. Exception: {e}")
-            return False, "Database error: Stock or cost for this ingredient is invalid."
+            new_unit_cost_batch = total_cost / quantity
+        except ZeroDivisionError:
+            # Handle case where quantity is zero (cannot calculate unit cost)
+            logging.error(f"DATA ERROR: Purchase quantity for '{name}' is zero. Cannot process.")
+            return False, "Data error: Purchase quantity must be greater than zero."
+
+        if existing_record:
+            # --- Existing Ingredient Flow ---
+            logging.info(f"INGREDIENT EXISTS: Found '{name}' with ID {existing_record.id}")
+
+            # Existing inventory values (already parsed when the table was decoded)
+            ingredient_id = existing_record.id
+            current_unit_cost = existing_record.cost_per_unit
+            current_quantity = existing_record.quantity
+            current_unit = existing_record.unit
         
-        converted_quantity = quantity 
-        updates = {}
-        new_price_set = False
+            converted_quantity = quantity 
+            updates = {}
+            new_price_set = False
         
-        # 1a. Check for unit mismatch and perform conversion if needed
-        if current_unit.strip().lower() != unit.strip().lower():
-            logging.info(f"UNIT MISMATCH: Stored unit '{current_unit}' requires conversion from purchased unit '{unit}'.")
+            # 1a. Check for unit mismatch and perform conversion if needed
+            if existing_record.unit_key != canonical_unit(unit):
+                logging.info(f"UNIT MISMATCH: Stored unit '{current_unit}' requires conversion from purchased unit '{unit}'.")
             
-            # Query the conversion rate using the service
-            try:
-                # Assuming get_conversion_rate is an async function
-                rate = await get_conversion_rate(unit, current_unit) 
-            except Exception as e:
-                # Log error if conversion service fails
-                logging.error(f"CONVERSION SERVICE ERROR: Failed to query units table. Exception: {e}")
-                return False, "Error occurred while looking up conversion rate."
-
-            if rate is None:
-                # Log error if conversion rate is not found
-                logging.error(f"CONVERSION FAILED: No conversion rate found between {unit} and {current_unit}.")
-                return False, f"Unit conversion failed: No rate found between {unit} and {current_unit}."
+                # Query the conversion rate using the service
+                try:
+                    # Assuming get_conversion_rate is an async function
+                    rate = await get_conversion_rate(unit, current_unit) 
+                except Exception as e:
+                    # Log error if conversion service fails
+                    logging.error(f"CONVERSION SERVICE ERROR: Failed to query units table. Exception: {e}")
+                    return False, "Error occurred while looking up conversion rate."
+
+                if rate is None:
+                    # Log error if conversion rate is not found
+                    logging.error(f"CONVERSION FAILED: No conversion rate found between {unit} and {current_unit}.")
+                    return False, f"Unit conversion failed: No rate found between {unit} and {current_unit}."
                 
-            # Convert the purchased quantity to the stored inventory unit
-            converted_quantity = quantity * rate
-            logging.info(f"CONVERSION SUCCESS: Converted Qty: {converted_quantity:.4f} {current_unit}.")
-        else:
-            logging.info("UNIT MATCH: Units are identical. No conversion needed.")
-
-        # --- Stock Update ---
-        # Calculate the new total stock quantity
-        new_quantity = current_quantity + converted_quantity
-        # Format as string for consistent sheet storage
-        updates[INGREDIENT_QUANTITY] = f"{new_quantity:.4f}" 
-        
-        # --- Price Update Logic (Conditional) ---
-        # Calculate the unit cost of the new purchase in the stored unit
-        new_unit_cost_per_unit = total_cost / converted_quantity
-
-        # Only update the price if the new batch is more expensive than the current stored cost
-        if new_unit_cost_per_unit > current_unit_cost:
-            new_price_set = True
+                # Convert the purchased quantity to the stored inventory unit
+                converted_quantity = quantity * rate
+                logging.info(f"CONVERSION SUCCESS: Converted Qty: {converted_quantity:.4f} {current_unit}.")
+            else:
+                logging.info("UNIT MATCH: Units are identical. No conversion needed.")
+
+            # --- Stock Update ---
+            # Calculate the new total stock quantity
+            new_quantity = current_quantity + converted_quantity
             # Format as string for consistent sheet storage
-            updates[INGREDIENT_COST_PER_UNIT] = f"{new_unit_cost_per_unit:.4f}"
+            updates[INGREDIENT_QUANTITY] = f"{new_quantity:.4f}" 
+        
+            # --- Price Update Logic (Conditional) ---
+            # Calculate the unit cost of the new purchase in the stored unit
+            new_unit_cost_per_unit = total_cost / converted_quantity
+
+            # Only update the price if the new batch is more expensive than the current stored cost
+            if new_unit_cost_per_unit > current_unit_cost:
+                new_price_set = True
+                # Format as string for consistent sheet storage
+                updates[INGREDIENT_COST_PER_UNIT] = f"{new_unit_cost_per_unit:.4f}"
             
-            # Log the price history before the main update (to capture the intent)
-            try:
-                # FIX: Correctly call the async log_price_history function
-                await log_price_history(ingredient_id, current_unit_cost, new_unit_cost_per_unit, user_id)
-            except Exception as e:
-                # Log error but do not fail the main transaction
-                logging.error(f"HISTORY LOG EXCEPTION: Failed to log price change for ID {ingredient_id} prior to update. Exception: {e}")
+                # Log the price history before the main update (to capture the intent)
+                try:
+                    # FIX: Correctly call the async log_price_history function
+                    await log_price_history(ingredient_id, current_unit_cost, new_unit_cost_per_unit, user_id)
+                except Exception as e:
+                    # Log error but do not fail the main transaction
+                    logging.error(f"HISTORY LOG EXCEPTION: Failed to log price change for ID {ingredient_id} prior to update. Exception: {e}")
                 
-            logging.info(f"PRICE SET: New batch ({new_unit_cost_per_unit:.4f} €) is MORE EXPENSIVE than old ({current_unit_cost:.4f} €). Updating Unit Cost.")
-        else:
-            logging.info(f"PRICE KEPT: New batch ({new_unit_cost_per_unit:.4f} €) is cheaper or equal. Unit Cost remains unchanged at {current_unit_cost:.4f} €.")
+                logging.info(f"PRICE SET: New batch ({new_unit_cost_per_unit:.4f} €) is MORE EXPENSIVE than old ({current_unit_cost:.4f} €). Updating Unit Cost.")
+            else:
+                logging.info(f"PRICE KEPT: New batch ({new_unit_cost_per_unit:.4f} €) is cheaper or equal. Unit Cost remains unchanged at {current_unit_cost:.4f} €.")
             
-        # --- Database Update ---
-        # Commit all stock and (if applicable) price changes to the main Ingredients sheet
-        try:
-            update_success = queries.update_row_by_id(INGREDIENTS_SHEET, ingredient_id, updates, user_id)
-        except Exception as e:
-            # Log critical failure on the main database write
-            logging.error(f"DATABASE UPDATE FAILED: Could not update ingredient ID {ingredient_id}. Exception: {e}")
-            return False, "Failed to save updates to the ingredient record."
+            # --- Database Update ---
+            # Record the purchase in the ledger, then commit all stock and (if applicable) price
+            # changes to the main Ingredients sheet
+            event = new_stock_event(
+                ingredient_id, ledger.EVENT_PURCHASE, converted_quantity, new_quantity,
+                new_unit_cost_per_unit if new_price_set else current_unit_cost, update_id, cost_before=current_unit_cost,
+            )
+            update_success = await _commit_stock_change(
+                [event], {ingredient_id: updates}, user_id
+            )
 
-        if not update_success:
-            # Log failure if the lower-level query function returns False
-            logging.error(f"DATABASE WRITE FAILED: Update function returned failure for ID {ingredient_id}.")
-            return False, f"Failed to save updates to ingredient '{name}'."
+            if not update_success:
+                # Log failure if the lower-level query function returns False
+                logging.error(f"DATABASE WRITE FAILED: Update function returned failure for ID {ingredient_id}.")
+                return False, f"Failed to save updates to ingredient '{name}'."
+            _record_inventory_change(existing_record, **_inventory_fields(updates))
             
-        status = "STOCK_ADJUSTED_AND_PRICE_UPDATED" if new_price_set else "STOCK_ADJUSTED"
-        logging.info(f"END PURCHASE: Adjustment complete for '{name}'. Status: {status}")
-        return True, status
+            status = "STOCK_ADJUSTED_AND_PRICE_UPDATED" if new_price_set else "STOCK_ADJUSTED"
+            logging.info(f"END PURCHASE: Adjustment complete for '{name}'. Status: {status}")
+            return True, status + _snapshot_pending_note()
 
-    else:
-        # --- New Ingredient Flow ---
-        logging.info(f"NEW INGREDIENT: Ingredient '{name}' not found. Initiating addition.")
+        else:
+            # --- New Ingredient Flow ---
+            logging.info(f"NEW INGREDIENT: Ingredient '{name}' not found. Initiating addition.")
         
-        # The unit cost of the purchased batch is the initial unit cost
-        initial_unit_cost = new_unit_cost_batch
+            # The unit cost of the purchased batch is the initial unit cost
+            initial_unit_cost = new_unit_cost_batch
         
-        # Add the new ingredient record (P3.1.4 implementation)
-        try:
-            # Pass user_id to ensure proper logging in add_new_ingredient
-            ingredient_id = await add_new_ingredient(name, quantity, unit, initial_unit_cost, user_id)
-        except Exception as e:
-            # Log critical failure on the new ingredient addition
-            logging.error(f"ADD NEW INGREDIENT FAILED: Could not execute add_new_ingredient for '{name}'. Exception: {e}", exc_info=True)
-            return False, "Error occurred while attempting to add new ingredient."
+            # Add the new ingredient record (P3.1.4 implementation)
+            try:
+                # Pass user_id to ensure proper logging in add_new_ingredient
+                ingredient_id = await add_new_ingredient(name, quantity, unit, initial_unit_cost, user_id, update_id)
+            except Exception as e:
+                # Log critical failure on the new ingredient addition
+                logging.error(f"ADD NEW INGREDIENT FAILED: Could not execute add_new_ingredient for '{name}'. Exception: {e}", exc_info=True)
+                return False, "Error occurred while attempting to add new ingredient."
         
-        if ingredient_id and ingredient_id != "ERROR_SAVE_FAILED":
-            logging.info(f"END PURCHASE: New ingredient added successfully with ID: {ingredient_id}")
-            return True, f"NEW_INGREDIENT_ADDED:{ingredient_id}"
-        else:
-            # Handle the specific save failure status returned by add_new_ingredient
-            logging.error(f"DATABASE WRITE FAILED: add_new_ingredient returned failure for '{name}'.")
-            return False, f"Failed to add new ingredient '{name}'."
-
-async def revert_last_transaction(user_id: str | int) -> tuple[bool, str]:
+            if ingredient_id and ingredient_id != "ERROR_SAVE_FAILED":
+                logging.info(f"END PURCHASE: New ingredient added successfully with ID: {ingredient_id}")
+                return True, f"NEW_INGREDIENT_ADDED:{ingredient_id}"
+            else:
+                # Handle the specific save failure status returned by add_new_ingredient
+                logging.error(f"DATABASE WRITE FAILED: add_new_ingredient returned failure for '{name}'.")
+                return False, f"Failed to add new ingredient '{name}'."
+
+# What /undo calls each kind of transaction
+_UNDO_LABELS = {
+    ledger.EVENT_NEW: "new ingredient",
+    ledger.EVENT_PURCHASE: "purchase",
+    ledger.EVENT_ADDITION: "stock addition",
+    ledger.EVENT_USAGE: "stock usage",
+    ledger.EVENT_SET: "stock set",
+    ledger.EVENT_COST: "price change",
+}
+
+async def revert_last_transaction(user_id: str | int, update_id: int | None = None) -> tuple[bool, str]:
     """
-    Finds the last transaction logged by the user in Price_History and reverts its effect
-    on the Ingredients sheet, if possible.
+    Undoes the user's most recent stock transaction (purchase, usage, set, price change, ...).
+    
+    The transaction comes from the per-user undo index (services.undo), so no history tab is read.
+    Its stock deltas are reversed and changed costs restored (unless the cost was changed again
+    since), recorded as UNDO ledger events and written to Ingredients in one batch update.
+    Undoing a new ingredient only takes its stock back out: the row and its price stay.
     
     Returns (success_bool, status_message).
     """
-    str_user_id = str(user_id)
-    logging.info(f"START ROLLBACK: Attempting to revert last transaction for User: {str_user_id}")
+    logging.info(f"START ROLLBACK: Attempting to revert last transaction for User: {user_id}")
     
-    # 1. Find the last relevant transaction logged by this user
-    try:
-        # P3.1.F4 ensures User_ID is logged in Price_History
-        # We need a query that sorts by Timestamp (descending) and filters by User_ID
-        all_logs = queries.get_all_records(PRICE_HISTORY_SHEET)
-        
-        # Filter by User_ID and find the first record (which is the newest by Timestamp column)
-        last_log = next(
-            (log for log in all_logs if log.get('User_ID') == str_user_id), 
-            None
-        )
-        
-    except Exception as e:
-        logging.error(f"DATABASE READ FAILED: Could not read Price_History for rollback. Exception: {e}")
-        return False, "Database error reading history log."
-
-    if not last_log:
-        logging.warning(f"ROLLBACK ABORTED: No recent transaction found for User: {str_user_id}.")
-        return False, "No transactions found in your history to delete."
-
-    i_id = last_log.get(INGREDIENT_ID)
+    # 1. Take the last transaction off the index before anything is awaited, so a second /undo
+    #    can't revert it again; it goes back if the undo fails
+    taken = undo.take_last_transaction(user_id)
+    if taken is None:
+        logging.warning(f"ROLLBACK ABORTED: No recent transaction found for User: {user_id}.")
+        return False, "No transactions found in your history to undo."
+    transaction, position = taken
     
-    # Check if the log is a Stock Adjustment (which impacts the master table)
-    # NOTE: Since we don't have an Event_Type, we assume any log implies a purchase/change.
-    # We must retrieve the old cost recorded in the log.
-    try:
-        logged_old_cost = float(last_log.get(OLD_COST_PER_UNIT, 0.0))
-        logged_new_cost = float(last_log.get(NEW_COST_PER_UNIT, 0.0))
-        
-        # We need a way to link the history log to the stock change. 
-        # For a simple 'Bought' command, one Price_History log corresponds to one stock change.
-        # This implementation requires reading the *entire* Ingredients table to find the current stock
-        # and reverse the quantity based on the difference we originally calculated in P3.1.F2.
+    success, message = await _revert_transaction(transaction, user_id, update_id)
+    if not success:
+        undo.restore_transaction(user_id, transaction, position)
+        return False, message
+    
+    # 2. Done with this transaction
+    if not await undo.save_undo_stack(user_id):
+        logging.warning(f"UNDO INDEX: The undone transaction is removed in memory only for User: {user_id}.")
+    return True, message
+
+async def _revert_transaction(transaction: undo.UndoTransaction, user_id: str | int, update_id: int | None) -> tuple[bool, str]:
+    """Reverses one taken transaction. Returns (success_bool, status_message)."""
+    # 1. Net effect per ingredient (a bulk usage may list the same one twice)
+    net: dict[str, list[float]] = {} # ID -> [total delta, cost before the first step, cost after the last]
+    for step in transaction.steps:
+        effect = net.setdefault(step.ingredient_id, [0.0, step.cost_before, step.cost_after])
+        effect[0] += step.quantity_delta
+        effect[2] = step.cost_after
+    # A new ingredient had no price before, so there is none to go back to
+    restore_costs = ledger.EVENT_NEW not in transaction.event_types
+    
+    # 2. Lock the ingredients it touched, then read their current state
+    table = await get_ingredient_table()
+    if table is None:
+        logging.error("DATABASE READ FAILED: Could not read Ingredients for rollback.")
+        return False, "Database error reading the inventory."
+    names = [table.by_id[key].key for key in map(normalize_name, net) if key in table.by_id]
+    async with _locked_stock(names):
+        if not await _prefetch_tables():
+            return False, SNAPSHOT_BEHIND_MESSAGE
+        table = await get_ingredient_table()
+        if table is None:
+            logging.error("DATABASE READ FAILED: Could not read Ingredients for rollback.")
+            return False, "Database error reading the inventory."
         
-        # --- CRITICAL MISSING DATA ---
-        # The Price_History table currently ONLY logs cost changes, not the quantity added/subtracted.
-        # To accurately revert stock, we need the: (Quantity_Change, Unit_of_Measure_Purchased)
-        # We must update P3.1.F5's log_price_history function *first* to include this data!
+        # 3. Build the reversal
+        events, row_updates, price_reverts, lines, cost_kept = [], {}, [], [], []
+        for ingredient_id, (delta, cost_before, cost_after) in net.items():
+            ingredient = table.by_id.get(normalize_name(ingredient_id))
+            if ingredient is None:
+                logging.error(f"ROLLBACK ABORTED: Ingredient {ingredient_id} from the transaction no longer exists.")
+                return False, f"Cannot undo: ingredient {ingredient_id} no longer exists."
+            fields = {}
+            new_quantity = ingredient.quantity - delta
+            if abs(delta) > LEDGER_SNAPSHOT_TOLERANCE:
+                fields[INGREDIENT_QUANTITY] = f"{new_quantity:.4f}"
+            new_cost = ingredient.cost_per_unit
+            if restore_costs and abs(cost_before - cost_after) > LEDGER_SNAPSHOT_TOLERANCE:
+                if abs(ingredient.cost_per_unit - cost_after) <= LEDGER_SNAPSHOT_TOLERANCE:
+                    new_cost = cost_before
+                    fields[INGREDIENT_COST_PER_UNIT] = f"{new_cost:.4f}"
+                    price_reverts.append((ingredient.id, ingredient.cost_per_unit, new_cost))
+                else:
+                    # Someone set a newer price since; keep it
+                    cost_kept.append(ingredient.name)
+            if not fields:
+                continue
+            row_updates[ingredient.id] = fields
+            events.append(new_stock_event(ingredient.id, ledger.EVENT_UNDO, -delta, new_quantity, new_cost, update_id, cost_before=ingredient.cost_per_unit))
+            line = f"• **{ingredient.name}**: stock `{new_quantity:.4f} {ingredient.unit}`"
+            if INGREDIENT_COST_PER_UNIT in fields:
+                line += f", price back to `{new_cost:.4f}` per {ingredient.unit}"
+            if not restore_costs:
+                line += " (the ingredient stays in the inventory)"
+            lines.append(line)
         
-        logging.critical("ROLLBACK FAILED: Price_History log does not contain QUANTITY CHANGE data required for accurate stock reversal.")
-        return False, "System Error: History log is incomplete. Cannot revert stock quantity."
-
-    except (ValueError, KeyError) as e:
-        logging.error(f"DATA INTEGRITY ERROR: Corrupted log entry ID {last_log.get('Transaction_ID')}. Exception: {e}")
-        return False, "History log entry is corrupted. Cannot revert."
+        # 4. One ledger append and one batched write for every row
+        if row_updates:
+            success = await _commit_stock_change(
+                events, row_updates, user_id, record_undo=False
+            )
+            if not success:
+                return False, "Undo failed: the changes could not be saved. Nothing was changed."
+            for ingredient_id, fields in row_updates.items():
+                _record_inventory_change(table.by_id[normalize_name(ingredient_id)], **_inventory_fields(fields))
+            if price_reverts and not await log_price_history_bulk(price_reverts, user_id):
+                logging.error("HISTORY LOG FAILED: Restored prices were not logged to Price_History.")
+    
+    kind = " + ".join(_UNDO_LABELS.get(event_type, event_type.lower()) for event_type in transaction.event_types)
+    message = f"↩️ **Undone: last {kind}**\n" + ("\n".join(lines) if lines else "Nothing left to change.")
+    if cost_kept:
+        message += f"\nPrice kept for {', '.join(cost_kept)} (it was changed again since)."
+    logging.info(f"END ROLLBACK: Reverted {len(row_updates)} ingredient(s) for User: {user_id}.")
+    return True, message + _snapshot_pending_note()
         
 async def get_ingredient_status(ingredient_name: str) -> tuple[bool, str]:
     """
@@ -703,127 +1458,219 @@ async def get_ingredient_status(ingredient_name: str) -> tuple[bool, str]:
 
     if not ingredient_record:
         logging.warning(f"GET STATUS FAILED: Ingredient '{ingredient_name}' not found.")
-        return False, f"❌ Ingredient **{ingredient_name}** not found in inventory."
+        suggestions = format_suggestions(await suggest_ingredient_names(ingredient_name))
+        return False, f"❌ Ingredient **{ingredient_name}** not found in inventory.{suggestions}"
     
-    # 2. Extract Data (using assumed constants)
-    # Using float(0.0) as default for safety
-    name = ingredient_record.get(INGREDIENT_NAME, "N/A")
-    quantity = float(ingredient_record.get(INGREDIENT_QUANTITY, 0.0))
-    unit = ingredient_record.get(INGREDIENT_UNIT, "units")
-    last_cost = float(ingredient_record.get(INGREDIENT_COST_PER_UNIT, 0.0))
+    # 2. Extract Data (already parsed when the table was decoded)
+    name = ingredient_record.name
+    quantity = ingredient_record.quantity
+    unit = ingredient_record.unit or "units"
+    last_cost = ingredient_record.cost_per_unit
     
-    # 3. Format the Output
+    # 3. Latest price change (from memory, or the end of Price_History)
+    price_change = await get_latest_price_change(ingredient_record.id)
+
+    # 4. Format the Output
     status_message = (
         f"📦 **Current Stock:** {quantity:.2f} {unit} (${last_cost})\n"
                
     )
+    if price_change is not None:
+        status_message += f"💲 **Last Price Change:** ${price_change.old_cost:.4f} → ${price_change.new_cost:.4f} ({price_change.last_updated[:10]})\n"
 
     logging.info(f"END GET STATUS SUCCESS: Status retrieved for {name}")
     return True, status_message
     
-async def adjust_ingredient_stock(name: str, input_quantity: float, input_unit: str, is_addition: bool, user_id: str | int | None = None) -> tuple[bool, str]:
+async def adjust_ingredient_stock(name: str, input_quantity: float, input_unit: str, is_addition: bool, user_id: str | int | None = None, update_id: int | None = None) -> tuple[bool, str]:
     """
     Adjusts the stock level of an ingredient by the given quantity (addition or usage).
+    update_id is the Telegram update that asked for it (recorded in the stock ledger).
     """
     action = "ADDITION" if is_addition else "USAGE"
     logging.info(f"START STOCK {action}: Ing:{name}, Qty:{input_quantity} {input_unit}")
-
-    # 1. Find the existing ingredient record
-    ingredient_record = await _find_ingredient_by_name(name) 
-    if not ingredient_record:
-        return False, f"❌ Ingredient **{name}** not found. Cannot adjust stock."
+    # Hold the stock lock from the read below until the change is committed
+    async with _locked_stock([name]):
+        # Ingredients and Units in a single read
+        if not await _prefetch_tables():
+            return False, f"❌ {SNAPSHOT_BEHIND_MESSAGE}"
+
+        # 1. Find the existing ingredient record
+        ingredient_record = await _find_ingredient_by_name(name) 
+        if not ingredient_record:
+            suggestions = format_suggestions(await suggest_ingredient_names(name))
+            return False, f"❌ Ingredient **{name}** not found. Cannot adjust stock.{suggestions}"
     
-    i_id = ingredient_record.get(INGREDIENT_ID)
-    current_unit = ingredient_record.get(INGREDIENT_UNIT)
-    
-    try:
-        current_stock = float(ingredient_record.get(INGREDIENT_QUANTITY, 0.0))
-    except ValueError:
-        logging.error(f"DATA INTEGRITY ERROR: Current stock is not a number for ID {i_id}")
-        return False, f"❌ Data Error: Cannot read current stock for {name}."
+        i_id = ingredient_record.id
+        current_unit = ingredient_record.unit
+        current_stock = ingredient_record.quantity
 
-    # 2. Calculate the adjustment amount in the ingredient's base unit
-    adjustment_in_base = await calculate_converted_quantity(input_quantity, input_unit, current_unit)
+        # 2. Calculate the adjustment amount in the ingredient's base unit
+        adjustment_in_base = await calculate_converted_quantity(input_quantity, input_unit, current_unit)
     
-    if adjustment_in_base is None:
-        return False, f"❌ Conversion Failed: Cannot convert {input_unit} to {current_unit} for adjustment."
+        if adjustment_in_base is None:
+            return False, f"❌ Conversion Failed: Cannot convert {input_unit} to {current_unit} for adjustment."
 
-    # 3. Calculate the new stock level
-    if is_addition:
-        new_stock = current_stock + adjustment_in_base
-    else:
-        new_stock = current_stock - adjustment_in_base
-        # Optional: Add a check here for negative stock and warn/block if necessary
+        # 3. Calculate the new stock level
+        if is_addition:
+            new_stock = current_stock + adjustment_in_base
+        else:
+            new_stock = current_stock - adjustment_in_base
+            # Optional: Add a check here for negative stock and warn/block if necessary
 
-    # 4. Prepare Atomic Update Data
-    updates = {
-        INGREDIENT_QUANTITY: f"{new_stock:.4f}",
-    }
+        # 4. Prepare Atomic Update Data
+        updates = {
+            INGREDIENT_QUANTITY: f"{new_stock:.4f}",
+        }
 
-    # 5. Execute Single Atomic Update and Log History
-    update_success = False
-    try:
-        update_success = await queries.update_row_by_id(INGREDIENTS_SHEET, i_id, updates, user_id=user_id)
-    except Exception as e:
-        logging.error(f"DATABASE WRITE FAILED: Stock adjustment failed for ID {i_id}. Exception: {e}")
+        # 5. Record the event, then update the snapshot row
+        # Usage arrives in bursts, so the row write goes through the write-behind queue and is
+        # batched with any other stock changes made in the same flush window.
+        event = new_stock_event(
+            i_id, ledger.EVENT_ADDITION if is_addition else ledger.EVENT_USAGE, new_stock - current_stock,
+            new_stock, ingredient_record.cost_per_unit, update_id,
+        )
+        update_success = await _commit_stock_change(
+            [event], {i_id: updates}, user_id
+        )
 
-    # 6. Log history only if the atomic update succeeded
-    if update_success:
-        status_word = "Added" if is_addition else "Used"
+        # 6. Report the new level
+        if update_success:
+            _record_inventory_change(ingredient_record, **_inventory_fields(updates))
+            status_word = "Added" if is_addition else "Used"
         
-        return True, (
-            f"✅ **Stock Updated for {name}**\n"
-            f"{status_word} `{input_quantity:.2f} {input_unit}`. New stock: `{new_stock:.4f} {current_unit}`."
-        )
-    else:
-        return False, f"❌ Failed to execute stock adjustment for {name}."
+            return True, (
+                f"✅ **Stock Updated for {name}**\n"
+                f"{status_word} `{input_quantity:.2f} {input_unit}`. New stock: `{new_stock:.4f} {current_unit}`."
+                f"{_snapshot_pending_note()}"
+            )
+        else:
+            return False, f"❌ Failed to execute stock adjustment for {name}."
 
-async def generate_full_inventory_report() -> tuple[bool, str]:
+async def adjust_ingredient_stock_bulk(items: list[tuple[str, float, str]], is_addition: bool, user_id: str | int | None = None, update_id: int | None = None) -> tuple[bool, str]:
     """
-    Fetches all ingredients and formats them into a comprehensive inventory report.
-    Returns: (success_bool, status_message)
+    Adjusts the stock of several ingredients at once (e.g. "Used 500g flour, 200g sugar, 3 eggs").
+    
+    items is a list of (ingredient_name, quantity, unit) tuples; an empty unit means the
+    ingredient's own unit. Every item is resolved against one snapshot of Ingredients/Units
+    first; if any name or conversion fails, nothing is written. Otherwise all quantities are
+    committed in a single batch update (after one ledger append with an event per item).
+    
+    Returns (success_bool, per-item summary message).
     """
-    logging.info("START FULL INVENTORY REPORT GENERATION.")
-
-    # 1. Fetch All Ingredient Records
-    # Assuming queries.get_all_records(sheet_name) exists
-    all_records = await queries.get_all_records(INGREDIENTS_SHEET) 
-
-    if not all_records:
-        return False, "⚠️ **Inventory is Empty.** Please use the **Record Purchase** command to add ingredients."
+    action = "ADDITION" if is_addition else "USAGE"
+    logging.info(f"START BULK STOCK {action}: {len(items)} item(s) (User: {user_id}).")
+    # Hold the stock lock from the read below until the change is committed
+    async with _locked_stock([name for name, _, _ in items]):
+        # Ingredients and Units in a single read
+        if not await _prefetch_tables():
+            return False, f"❌ {SNAPSHOT_BEHIND_MESSAGE}"
     
-    # 2. Sort and Format Data
-    # Sort by ingredient name for better readability
-    sorted_records = sorted(all_records, key=lambda r: r.get(INGREDIENT_NAME, "").lower())
-
-    report_lines = []
-    total_value = 0.0
+        # 1. One snapshot of both tables for every item
+        table = await get_ingredient_table()
+        unit_rules = await queries.get_decoded_table(UNITS_SHEET, decode_unit_rules, columns=[UNITS_FROM_UNIT, UNITS_To_Unit, UNITS_Conversion_Rate])
+        if table is None or unit_rules is None:
+            logging.error("DATABASE READ FAILED: Could not read Ingredients/Units for the bulk adjustment.")
+            return False, "❌ Database error: Could not read the inventory."
     
-    for record in sorted_records:
-        name = record.get(INGREDIENT_NAME, "N/A")
-        try:
-            quantity = float(record.get(INGREDIENT_QUANTITY, 0.0))
-            unit = record.get(INGREDIENT_UNIT, "units")
-            cost_per_unit = float(record.get(INGREDIENT_COST_PER_UNIT, 0.0))
-            
-            
-            # Format line: Name | Stock | Value
-            report_lines.append(
-                f"• **{name}**: {quantity:.2f} {unit} (${cost_per_unit:.2f})"
-            )
-        except (ValueError, TypeError) as e:
-            logging.warning(f"Skipping malformed ingredient record for {name}: {e}")
-            report_lines.append(f"• **{name}**: ⚠️ Data Error")
-
-
-    # 3. Construct the Final Report Message
+        # 2. Resolve each item to (ingredient, quantity in the ingredient's unit)
+        resolved: list[tuple[Ingredient, float, float, str]] = []
+        errors = []
+        for name, input_quantity, input_unit in items:
+            ingredient = table.by_key.get(normalize_name(name))
+            if ingredient is None:
+                suggestions = table.name_index.search(name, 1) if table.name_index else []
+                hint = f" (did you mean **{suggestions[0][0]}**?)" if suggestions else ""
+                errors.append(f"• **{name}**: not found{hint}")
+                continue
+            input_unit_key = canonical_unit(input_unit)
+            rate = 1.0 if input_unit_key in ("", ingredient.unit_key) else unit_rules.rate(input_unit_key, ingredient.unit_key)
+            if rate is None:
+                errors.append(f"• **{ingredient.name}**: cannot convert {input_unit} to {ingredient.unit}")
+                continue
+            resolved.append((ingredient, input_quantity, input_quantity * rate, input_unit or ingredient.unit))
+    
+        if errors:
+            logging.warning(f"BULK STOCK {action} ABORTED: {len(errors)} item(s) could not be resolved. Nothing was written.")
+            return False, "❌ **No stock was changed.** Please fix these items:\n" + "\n".join(errors)
     
+        # 3. New stock per ingredient (the same ingredient may appear more than once), one event per item
+        new_stock: dict[str, float] = {}
+        events = []
+        for ingredient, _, adjustment_in_base, _ in resolved:
+            current = new_stock.get(ingredient.id, ingredient.quantity)
+            delta = adjustment_in_base if is_addition else -adjustment_in_base
+            new_stock[ingredient.id] = current + delta
+            events.append(new_stock_event(
+                ingredient.id, ledger.EVENT_ADDITION if is_addition else ledger.EVENT_USAGE, delta,
+                current + delta, ingredient.cost_per_unit, update_id,
+            ))
+    
+        # 4. One ledger append, then one batch update for all rows
+        row_updates = {ingredient_id: {INGREDIENT_QUANTITY: f"{quantity:.4f}"} for ingredient_id, quantity in new_stock.items()}
+        update_success = await _commit_stock_change(
+            events, row_updates, user_id
+        )
+    
+        if not update_success:
+            return False, f"❌ Failed to save the stock changes for {len(new_stock)} ingredient(s). Nothing was changed."
+        for ingredient in {ingredient.id: ingredient for ingredient, _, _, _ in resolved}.values():
+            _record_inventory_change(ingredient, **_inventory_fields(row_updates[ingredient.id]))
+    
+        # 5. Per-item summary (each line shows the running stock after that item, as its event records it)
+        status_word = "Added" if is_addition else "Used"
+        lines = [
+            f"• **{ingredient.name}**: {status_word} `{input_quantity:.2f} {unit}`. New stock: `{event.quantity_after:.4f} {ingredient.unit}`."
+            for (ingredient, input_quantity, _, unit), event in zip(resolved, events)
+        ]
+        logging.info(f"END BULK STOCK {action}: {len(resolved)} item(s) across {len(new_stock)} ingredient(s) written in one update.")
+        return True, f"✅ **Stock Updated ({len(resolved)} items)**\n" + "\n".join(lines) + _snapshot_pending_note()
+
+async def generate_inventory_report_page(page: int = 0) -> tuple[bool, str, int, int]:
+    """
+    Formats one page of the inventory report from the inventory aggregate.
+    
+    Only the ingredients on the requested page are formatted, so the cost of a page doesn't
+    grow with the size of the inventory. The page number is clamped to the valid range.
+    Returns: (success_bool, status_message, page, page_count)
+    """
+    logging.info(f"START INVENTORY REPORT PAGE {page}.")
+
+    # 1. Get the aggregate (rebuilt only if the Ingredients tab was reloaded)
+    aggregate = await get_inventory_aggregate()
+    if aggregate is None:
+        return False, "❌ Database error: Could not read the inventory.", 0, 1
+    if not aggregate.items and not aggregate.malformed:
+        return False, "⚠️ **Inventory is Empty.** Please use the **Record Purchase** command to add ingredients.", 0, 1
+    
+    # 2. Format the requested page (already sorted by name)
+    page_count = aggregate.page_count()
+    page = min(max(page, 0), page_count - 1)
+    report_lines = [
+        f"• **{ingredient.name}**: {ingredient.quantity:.2f} {ingredient.unit or 'units'} (${ingredient.cost_per_unit:.2f})"
+        for ingredient in aggregate.page(page)
+    ]
+    # Rows that failed to decode are listed once, on the last page
+    if page == page_count - 1:
+        report_lines += [f"• **{name}**: ⚠️ Data Error" for name in aggregate.malformed]
+    
+    # 3. Construct the Report Message (totals come straight from the aggregate)
+    unit_summary = ", ".join(f"{quantity:.2f} {unit or 'units'}" for unit, quantity in sorted(aggregate.unit_totals.items()))
     report_message = (
-        "📈 **Current Inventory Report**\n\n"
+        f"📈 **Current Inventory Report** (page {page + 1}/{page_count})\n\n"
         "**Stock Details:**\n"
         f"{' \n'.join(report_lines)}\n\n"
-            
+        f"🧾 **Items:** {aggregate.item_count}\n"
+        f"⚖️ **Totals per Unit:** {unit_summary}\n"
+        f"💶 **Total Stock Value:** ${aggregate.total_value:.2f}"
     )
 
-    logging.info("END FULL INVENTORY REPORT SUCCESS.")
-    return True, report_message
\ No newline at end of file
+    logging.info(f"END INVENTORY REPORT PAGE {page + 1}/{page_count} SUCCESS.")
+    return True, report_message, page, page_count
+
+async def generate_full_inventory_report() -> tuple[bool, str]:
+    """
+    Returns the first page of the inventory report (see generate_inventory_report_page).
+    Returns: (success_bool, status_message)
+    """
+    success, message, _, _ = await generate_inventory_report_page(0)
+    return success, message
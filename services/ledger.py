@@ -0,0 +1,176 @@
+import os
+import uuid
+import logging
+from dataclasses import dataclass
+from sheets import queries
+
+# --- Configuration Constants ---
+STOCK_LEDGER_SHEET = os.getenv("STOCK_LEDGER_SHEET", "Stock_Ledger")
+# Config key holding the last ledger row already folded into the Ingredients snapshot
+LEDGER_CHECKPOINT_KEY = "LEDGER_CHECKPOINT"
+
+#STOCK LEDGER TABLE COLUMNS (Last_Updated / Updated_By_User are stamped by append_rows)
+LEDGER_EVENT_ID = 'Event_ID'
+LEDGER_INGREDIENT_ID = 'Ingredient_ID'
+LEDGER_EVENT_TYPE = 'Event_Type'
+LEDGER_QUANTITY_DELTA = 'Quantity_Delta' # In the ingredient's stored unit
+LEDGER_QUANTITY_AFTER = 'Quantity_After'
+LEDGER_COST_PER_UNIT = 'Cost_Per_Unit' # Cost per stored unit after the event
+LEDGER_COST_BEFORE = 'Cost_Before' # ... and before it (so every event can be reversed on its own)
+LEDGER_UPDATE_ID = 'Update_ID' # Telegram update_id of the message that caused it
+LEDGER_UPDATED_BY = queries.UPDATED_BY_COLUMN
+
+LEDGER_COLUMNS = [
+    LEDGER_EVENT_ID, LEDGER_INGREDIENT_ID, LEDGER_EVENT_TYPE, LEDGER_QUANTITY_DELTA,
+    LEDGER_QUANTITY_AFTER, LEDGER_COST_PER_UNIT, LEDGER_COST_BEFORE, LEDGER_UPDATE_ID, LEDGER_UPDATED_BY,
+]
+# Header row of a new Stock_Ledger tab (the columns above plus the Last_Updated stamp)
+LEDGER_SHEET_HEADERS = LEDGER_COLUMNS[:-1] + [queries.LAST_UPDATED_COLUMN, LEDGER_UPDATED_BY]
+
+# Event types
+EVENT_NEW = "NEW" # Ingredient created with its initial stock
+EVENT_PURCHASE = "PURCHASE"
+EVENT_ADDITION = "ADDITION"
+EVENT_USAGE = "USAGE"
+EVENT_SET = "SET" # Stock (and possibly cost) set to an absolute value
+EVENT_COST = "COST" # Cost per unit changed, stock unchanged
+EVENT_UNDO = "UNDO" # Reverses an earlier transaction (see services.undo)
+
+
+# --- Ledger Events ---
+# The ledger is append-only: every stock or cost change is one row, never edited afterwards.
+# Quantity_After / Cost_Per_Unit make each event self-contained, so the current state of an
+# ingredient is simply its latest event, and the Ingredients tab is a snapshot of that.
+
+@dataclass(slots=True, frozen=True)
+class StockEvent:
+    ingredient_id: str
+    event_type: str
+    quantity_delta: float
+    quantity_after: float
+    cost_per_unit: float
+    cost_before: float
+    update_id: str = ""
+    updated_by: str = ""
+    event_id: str = ""
+    row: int = 0 # Sheet row of a decoded event (0 = not written yet)
+
+def new_stock_event(ingredient_id: str, event_type: str, quantity_delta: float, quantity_after: float, cost_per_unit: float, update_id: int | str | None = None, cost_before: float | None = None) -> StockEvent:
+    """Builds an event ready to append (with a fresh event ID). cost_before defaults to an unchanged cost."""
+    return StockEvent(
+        ingredient_id, event_type, quantity_delta, quantity_after, cost_per_unit,
+        cost_per_unit if cost_before is None else cost_before,
+        update_id="" if update_id is None else str(update_id), event_id=uuid.uuid4().hex[:12],
+    )
+
+def _event_row(event: StockEvent) -> dict:
+    return {
+        LEDGER_EVENT_ID: event.event_id,
+        LEDGER_INGREDIENT_ID: event.ingredient_id,
+        LEDGER_EVENT_TYPE: event.event_type,
+        LEDGER_QUANTITY_DELTA: f"{event.quantity_delta:.4f}",
+        LEDGER_QUANTITY_AFTER: f"{event.quantity_after:.4f}",
+        LEDGER_COST_PER_UNIT: f"{event.cost_per_unit:.4f}",
+        LEDGER_COST_BEFORE: f"{event.cost_before:.4f}",
+        LEDGER_UPDATE_ID: event.update_id,
+    }
+
+async def append_stock_events(events: list[StockEvent], user_id: str | int | None = None) -> bool:
+    """Appends events to the ledger in one request. Returns True on success."""
+    if not events:
+        return True
+    success = await queries.append_rows(STOCK_LEDGER_SHEET, [_event_row(event) for event in events], user_id)
+    if success:
+        logging.info(f"LEDGER APPEND: {len(events)} event(s) recorded ({', '.join(sorted({e.event_type for e in events}))}).")
+    else:
+        logging.error(f"LEDGER APPEND FAILED: {len(events)} event(s) could not be recorded.")
+    return success
+
+def decode_stock_events(records: list[dict], first_row: int = 2) -> list[StockEvent]:
+    """Decodes ledger records read from first_row onwards. Rows that can't be parsed are skipped (and logged)."""
+    events = []
+    for position, record in enumerate(records):
+        row = first_row + position
+        ingredient_id = str(record.get(LEDGER_INGREDIENT_ID, "")).strip()
+        if not ingredient_id:
+            continue
+        try:
+            events.append(StockEvent(
+                ingredient_id,
+                str(record.get(LEDGER_EVENT_TYPE, "")).strip(),
+                float(record.get(LEDGER_QUANTITY_DELTA) or 0),
+                float(record.get(LEDGER_QUANTITY_AFTER) or 0),
+                float(record.get(LEDGER_COST_PER_UNIT) or 0),
+                float(record.get(LEDGER_COST_BEFORE) or record.get(LEDGER_COST_PER_UNIT) or 0),
+                str(record.get(LEDGER_UPDATE_ID, "")).strip(),
+                str(record.get(LEDGER_UPDATED_BY, "")).strip(),
+                str(record.get(LEDGER_EVENT_ID, "")).strip(),
+                row,
+            ))
+        except (ValueError, TypeError) as e:
+            logging.warning(f"DATA INTEGRITY WARNING: {STOCK_LEDGER_SHEET} row {row}: unreadable event ({e}) (row skipped)")
+    return events
+
+
+# --- Setup: The Ledger Tab and Its Checkpoint ---
+
+async def prepare_stock_ledger() -> bool:
+    """
+    Startup check that every stock change can be recorded: creates the Stock_Ledger tab on an install
+    that doesn't have it yet (or checks its columns) and adds the LEDGER_CHECKPOINT key to Config if
+    it is missing. Returns False if either is not possible; stock commands would all fail then.
+    """
+    # 1. The tab every stock change is appended to
+    if not await queries.ensure_table(STOCK_LEDGER_SHEET, LEDGER_SHEET_HEADERS):
+        logging.error(f"LEDGER SETUP FAILED: {STOCK_LEDGER_SHEET} is missing or lacks columns, see the messages above.")
+        return False
+
+    # 2. The checkpoint starts at row 1 (only the header row), i.e. nothing folded into the snapshot yet
+    if await queries.read_config_value(LEDGER_CHECKPOINT_KEY) is None:
+        row = {queries.CONFIG_KEY_COLUMN: LEDGER_CHECKPOINT_KEY, queries.CONFIG_VALUE_COLUMN: "1"}
+        if not await queries.append_row(queries.CONFIG_SHEET, row, user_id=STOCK_LEDGER_SHEET):
+            logging.error(f"LEDGER SETUP FAILED: Could not add '{LEDGER_CHECKPOINT_KEY}' to {queries.CONFIG_SHEET}.")
+            return False
+        logging.warning(f"LEDGER SETUP: Added '{LEDGER_CHECKPOINT_KEY}' = 1 to {queries.CONFIG_SHEET}.")
+    return True
+
+
+# --- Checkpoint: How Far the Snapshot Has Caught Up ---
+
+async def read_checkpoint() -> int | None:
+    """
+    Returns the last ledger row folded into the snapshot (1 = none yet, i.e. only the header row),
+    or None if it could not be read, is missing (see prepare_stock_ledger) or is invalid.
+    """
+    value = await queries.read_config_value(LEDGER_CHECKPOINT_KEY)
+    if value is None:
+        logging.error(f"LEDGER CHECKPOINT ERROR: '{LEDGER_CHECKPOINT_KEY}' could not be read from {queries.CONFIG_SHEET}.")
+        return None
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        logging.error(f"LEDGER CHECKPOINT ERROR: '{LEDGER_CHECKPOINT_KEY}' is invalid ({value!r}); fix it in {queries.CONFIG_SHEET}.")
+        return None
+
+async def write_checkpoint(row: int) -> bool:
+    return await queries.update_config_value(LEDGER_CHECKPOINT_KEY, str(row))
+
+async def read_events_after(row: int) -> tuple[list[StockEvent], int] | None:
+    """
+    Reads the ledger rows after `row` (only that tail is downloaded). Returns (events, last row read),
+    where the last row is `row` itself when nothing is new, or None if the ledger could not be read.
+
+    Row `row` is read along as an anchor: it was already folded in, so getting no rows back at all
+    means the read failed rather than that nothing is new. Row 1 (the header) can't serve as one,
+    so from there an empty answer is taken as an empty ledger.
+    """
+    first_row = max(row, 2)
+    records = await queries.get_all_records(STOCK_LEDGER_SHEET, columns=LEDGER_COLUMNS, row_range=(first_row, None))
+    if records is None:
+        if row >= 2:
+            logging.error(f"LEDGER READ FAILED: Could not read {STOCK_LEDGER_SHEET} from row {row}.")
+            return None
+        return [], row
+    if row >= 2:
+        records = records[1:] # Drop the anchor
+    return decode_stock_events(records, row + 1), row + len(records)
@@ -4,6 +4,7 @@ from sheets import queries
 from typing import Dict, Any, Optional
 import logging
 from services import ingredients
+from services.fuzzy import NameIndex, format_suggestions
 
 # Define Sheet and Column Constants (These must be consistent with P7.1.D1)
 RECIPES_MASTER_SHEET = 'Recipes'
@@ -64,52 +65,73 @@ async def add_recipe_component(recipe_name: str, ing_name: str, req_quantity: fl
     """
     Links a single ingredient to a recipe and writes the component to the Map sheet.
     """
-    logging.info(f"START ADD COMPONENT: Recipe:{recipe_name}, Ing:{ing_name} ({req_quantity} {req_unit})")
+    return await add_recipe_components(recipe_name, [(ing_name, req_quantity, req_unit)], user_id=user_id)
 
-    # 1. Find the Recipe_ID
-    # We need a utility to find a recipe record by name (which we don't have yet - MUST create)
-    recipe_record = await find_recipe_by_name(recipe_name) # *** NEW UTILITY REQUIRED ***
+async def add_recipe_components(recipe_name: str, components: list[tuple[str, float, str]], user_id: int | str | None = None) -> tuple[bool, str]:
+    """
+    Links several ingredients to a recipe at once (e.g. importing a full recipe).
+    
+    components is a list of (ingredient_name, required_quantity, required_unit) tuples.
+    Every component is resolved first; the Map rows are then written in a single append.
+    Nothing is written if any ingredient is missing.
+    """
+    logging.info(f"START ADD COMPONENTS: Recipe:{recipe_name}, {len(components)} component(s)")
 
+    # 1. Find the Recipe_ID
+    recipe_record = await find_recipe_by_name(recipe_name)
     if not recipe_record:
-        return False, f"Recipe **{recipe_name}** not found. Please create the recipe first."
+        suggestions = format_suggestions(await suggest_recipe_names(recipe_name))
+        return False, f"Recipe **{recipe_name}** not found.{suggestions} Please create the recipe first."
     
-    recipe_id = recipe_record.get(RECIPE_ID_KEY) # RECIPE_ID_KEY assumed from P7.2.C2
-
-    # 2. Find the Ingredient_ID
-    # Uses the existing utility from Phase 3
-    ingredient_record = await ingredients._find_ingredient_by_name(ing_name)
-
-    if not ingredient_record:
-        # PENDING ENHANCEMENT: Prompt user to create missing ingredient (P7.2.C3.E)
-        return False, f"Ingredient **{ing_name}** not found in your inventory. Please add it first."
-
-    ingredient_id = ingredient_record.get(ingredients.INGREDIENT_ID) # Using existing constant
-
-    # 3. Generate Unique Map_ID
-    map_id = await queries.get_next_unique_id(MAP_ID_CONFIG_KEY, MAP_ID_PREFIX)
-    if not map_id:
-        return False, "Failed to generate unique Map ID."
-
-    # 4. Prepare Data and Append Row
-    new_map_data = {
-        'Map_ID': map_id,
-        'Recipe_ID': recipe_id,
-        'Ingredient_ID': ingredient_id,
-        'Required_Quantity': f"{req_quantity:.2f}",
-        'Required_Unit': req_unit,
-    }
-
-    success = await queries.append_row(MAP_SHEET, new_map_data, user_id=user_id)
+    recipe_id = recipe_record.get(RECIPE_ID_KEY)
+
+    # 2. Resolve every Ingredient_ID before writing anything
+    resolved = []
+    missing = []
+    for ing_name, req_quantity, req_unit in components:
+        ingredient_record = await ingredients._find_ingredient_by_name(ing_name)
+        if not ingredient_record:
+            missing.append(ing_name)
+            continue
+        resolved.append((ingredient_record.id, ing_name, req_quantity, req_unit))
+    
+    if missing:
+        suggestions = "".join([format_suggestions(await ingredients.suggest_ingredient_names(ing_name, limit=1)) for ing_name in missing])
+        return False, f"Ingredient(s) not found in your inventory: **{', '.join(missing)}**.{suggestions} Please add them first."
+
+    # 3. Reserve all Map_IDs at once (at most one Config write) and prepare the rows
+    map_ids = await queries.reserve_unique_ids(MAP_ID_CONFIG_KEY, MAP_ID_PREFIX, len(resolved))
+    if not map_ids:
+        return False, "Failed to generate unique Map IDs."
+    new_map_rows = []
+    for map_id, (ingredient_id, _, req_quantity, req_unit) in zip(map_ids, resolved):
+        new_map_rows.append({
+            'Map_ID': map_id,
+            'Recipe_ID': recipe_id,
+            'Ingredient_ID': ingredient_id,
+            'Required_Quantity': f"{req_quantity:.2f}",
+            'Required_Unit': req_unit,
+        })
+
+    # 4. Append all Map rows in one request
+    success = await queries.append_rows(MAP_SHEET, new_map_rows, user_id=user_id)
 
     if success:
-        return True, f"✅ Added **{req_quantity} {req_unit}** of **{ing_name}** to **{recipe_name}**."
+        added = ", ".join(f"**{req_quantity} {req_unit}** of **{ing_name}**" for _, ing_name, req_quantity, req_unit in resolved)
+        return True, f"✅ Added {added} to **{recipe_name}**."
     else:
-        return False, "Failed to link ingredient to recipe in the database."
-        
+        return False, "Failed to link ingredients to recipe in the database."
+
 async def find_recipe_by_name(name: str) -> dict | None:
     """Finds the recipe record in Recipes_Master by name."""
-    # Uses the general query utility for finding records
-    records = await queries.find_records(RECIPES_MASTER_SHEET, RECIPE_NAME_KEY, name)
-    
-    # Return the first matching record or None
-    return records[0] if records else None
\ No newline at end of file
+    # Uses the indexed query utility (first matching record or None)
+    return await queries.find_record(RECIPES_MASTER_SHEET, RECIPE_NAME_KEY, name)
+
+def decode_recipe_names(records: list[dict]) -> NameIndex:
+    """Fuzzy index over the recipe names (rebuilt when the Recipes tab is reloaded)."""
+    return NameIndex(str(record.get(RECIPE_NAME_KEY, "")).strip() for record in records)
+
+async def suggest_recipe_names(name: str, limit: int = 3) -> list[str]:
+    """Returns the recipe names closest to a name that wasn't found (best first)."""
+    index = await queries.get_decoded_table(RECIPES_MASTER_SHEET, decode_recipe_names, columns=[RECIPE_NAME_KEY])
+    return [match for match, _ in index.search(name, limit)] if index else []
@@ -0,0 +1,160 @@
+import os
+import json
+import asyncio
+import logging
+from dataclasses import dataclass
+from sheets import queries
+from services.ledger import StockEvent
+
+# --- Configuration Constants ---
+# Tab persisting each user's undo stack (columns: User, Transactions), one row per user
+UNDO_INDEX_SHEET = os.getenv("UNDO_INDEX_SHEET", "Undo_Index")
+# Transactions remembered per user (/undo can be repeated this many times)
+UNDO_DEPTH = int(os.getenv("UNDO_DEPTH", "5"))
+
+#UNDO INDEX TABLE COLUMNS
+UNDO_USER = 'User'
+UNDO_TRANSACTIONS = 'Transactions' # JSON list, oldest first
+
+
+# --- Per-User Undo Index ---
+# Each user's last UNDO_DEPTH stock transactions, newest last. A transaction is everything one
+# command committed (e.g. all items of a bulk usage), kept as the ledger events it wrote, which
+# carry the stock delta and the cost before/after. So /undo is a pop from this index: it never
+# reads Price_History or the ledger. The index lives in memory and is written through to
+# UNDO_INDEX_SHEET (loaded once at startup) in the background, so stock commands never wait
+# for that write while holding their stock locks.
+
+@dataclass(slots=True, frozen=True)
+class UndoStep:
+    ingredient_id: str
+    quantity_delta: float
+    cost_before: float
+    cost_after: float
+
+@dataclass(slots=True, frozen=True)
+class UndoTransaction:
+    update_id: str
+    event_types: tuple[str, ...]
+    steps: tuple[UndoStep, ...]
+
+_undo_index: dict[str, list[UndoTransaction]] = {} # User key -> transactions, oldest first
+_persisted_users: set[str] = set() # Users that already have a row in UNDO_INDEX_SHEET
+_persist_locks: dict[str, asyncio.Lock] = {} # User key -> lock (one write per user at a time)
+_persist_tasks: set[asyncio.Task] = set() # Background writes still running
+
+def _user_key(user_id: str | int) -> str:
+    return str(user_id).strip().lower()
+
+def _encode(transactions: list[UndoTransaction]) -> str:
+    return json.dumps([
+        {
+            "update_id": transaction.update_id,
+            "types": list(transaction.event_types),
+            "steps": [[s.ingredient_id, round(s.quantity_delta, 4), round(s.cost_before, 4), round(s.cost_after, 4)] for s in transaction.steps],
+        }
+        for transaction in transactions
+    ], separators=(",", ":"))
+
+def _decode(text: str) -> list[UndoTransaction]:
+    return [
+        UndoTransaction(
+            str(item.get("update_id", "")),
+            tuple(item.get("types", ())),
+            tuple(UndoStep(str(i), float(d), float(b), float(a)) for i, d, b, a in item.get("steps", ())),
+        )
+        for item in json.loads(text)
+    ]
+
+async def load_undo_index() -> int:
+    """Loads every user's undo stack from UNDO_INDEX_SHEET. Called once at startup. Returns the number of users."""
+    records = await queries.get_all_records(UNDO_INDEX_SHEET, columns=[UNDO_USER, UNDO_TRANSACTIONS]) or []
+    _undo_index.clear()
+    _persisted_users.clear()
+    for position, record in enumerate(records):
+        user_key = _user_key(record.get(UNDO_USER, ""))
+        if not user_key:
+            continue
+        _persisted_users.add(user_key)
+        try:
+            _undo_index[user_key] = _decode(str(record.get(UNDO_TRANSACTIONS) or "[]"))[-UNDO_DEPTH:]
+        except (ValueError, TypeError) as e:
+            logging.warning(f"DATA INTEGRITY WARNING: {UNDO_INDEX_SHEET} row {position + 2}: unreadable undo stack ({e}) (row skipped)")
+    logging.info(f"UNDO INDEX: Loaded undo history for {len(_undo_index)} user(s) from '{UNDO_INDEX_SHEET}'.")
+    return len(_undo_index)
+
+async def _persist(user_key: str, user_id: str | int | None) -> bool:
+    """
+    Writes one user's stack to UNDO_INDEX_SHEET (a queued row update, or an append for a new user).
+    Writes for the same user are serialized, and each one sends the stack as it is when it starts,
+    so the last write always leaves the newest stack behind (and a new user gets only one row).
+    """
+    async with _persist_locks.setdefault(user_key, asyncio.Lock()):
+        data = {UNDO_TRANSACTIONS: _encode(_undo_index.get(user_key, []))}
+        try:
+            if user_key in _persisted_users:
+                return await queries.queue_row_update(UNDO_INDEX_SHEET, user_key, data, user_id=user_id)
+            if await queries.append_row(UNDO_INDEX_SHEET, {UNDO_USER: user_key, **data}, user_id):
+                _persisted_users.add(user_key)
+                return True
+            return False
+        except Exception as e:
+            logging.error(f"UNDO INDEX WRITE FAILED for user '{user_key}'. Exception: {e}")
+            return False
+
+async def _persist_in_background(user_key: str, user_id: str | int | None) -> bool:
+    if not await _persist(user_key, user_id):
+        logging.warning(f"UNDO INDEX: Transaction kept in memory only for user '{user_key}'.")
+        return False
+    return True
+
+def remember_transaction(user_id: str | int | None, events: list[StockEvent]) -> None:
+    """
+    Pushes the events one command committed onto the user's undo stack (undo events themselves are
+    not remembered). The stack changes in memory right away, so this can be called while holding
+    stock locks; it is written to UNDO_INDEX_SHEET by a background task (see flush_undo_writes).
+    """
+    if user_id is None or not events:
+        return
+    user_key = _user_key(user_id)
+    transaction = UndoTransaction(
+        events[0].update_id,
+        tuple(dict.fromkeys(event.event_type for event in events)),
+        tuple(UndoStep(event.ingredient_id, event.quantity_delta, event.cost_before, event.cost_per_unit) for event in events),
+    )
+    stack = _undo_index.setdefault(user_key, [])
+    stack.append(transaction)
+    del stack[:-UNDO_DEPTH]
+    try:
+        task = asyncio.get_running_loop().create_task(_persist_in_background(user_key, user_id))
+    except RuntimeError:
+        logging.error(f"UNDO INDEX ERROR: No running event loop to save the undo stack of user '{user_key}'.")
+        return
+    _persist_tasks.add(task)
+    task.add_done_callback(_persist_tasks.discard)
+
+async def flush_undo_writes() -> bool:
+    """Waits for every background undo stack write (e.g. on shutdown). Returns True if all of them succeeded."""
+    results = await asyncio.gather(*list(_persist_tasks))
+    return all(results)
+
+def take_last_transaction(user_id: str | int) -> tuple[UndoTransaction, int] | None:
+    """
+    Removes the user's most recent transaction from the index in memory (without awaiting, so a
+    second /undo can't take the same one) and returns it with its position in the stack.
+    Follow up with save_undo_stack() once it is undone, or restore_transaction() if that failed.
+    """
+    stack = _undo_index.get(_user_key(user_id))
+    if not stack:
+        return None
+    return stack.pop(), len(stack)
+
+def restore_transaction(user_id: str | int, transaction: UndoTransaction, position: int) -> None:
+    """Puts a taken transaction back where it was (transactions remembered meanwhile stay newer)."""
+    stack = _undo_index.setdefault(_user_key(user_id), [])
+    stack.insert(min(position, len(stack)), transaction)
+    del stack[:-UNDO_DEPTH]
+
+async def save_undo_stack(user_id: str | int) -> bool:
+    """Writes the user's stack to UNDO_INDEX_SHEET (after a transaction was taken). Returns True if saved."""
+    return await _persist(_user_key(user_id), user_id)
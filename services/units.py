@@ -0,0 +1,79 @@
+import os
+import logging
+from sheets import queries
+
+# --- Configuration Constants ---
+# Optional tab with extra aliases (columns: Alias, Unit), e.g. "Unit_Aliases". Unset = bundled defaults only.
+UNIT_ALIASES_SHEET = os.getenv("UNIT_ALIASES_SHEET", "")
+
+#UNIT ALIASES TABLE COLUMNS
+UNIT_ALIAS = 'Alias'
+UNIT_ALIAS_UNIT = 'Unit'
+
+# Canonical unit -> the spellings users type for it (the canonical form is always included)
+DEFAULT_UNIT_ALIASES = {
+    'mg': ['milligram', 'milligrams', 'milligramme', 'milligrammes'],
+    'g': ['gr', 'grs', 'gram', 'grams', 'gramme', 'grammes'],
+    'kg': ['kgs', 'kilo', 'kilos', 'kilogram', 'kilograms', 'kilogramme', 'kilogrammes'],
+    'oz': ['ounce', 'ounces'],
+    'lb': ['lbs', 'pound', 'pounds'],
+    'ml': ['mls', 'millilitre', 'millilitres', 'milliliter', 'milliliters'],
+    'cl': ['centilitre', 'centilitres', 'centiliter', 'centiliters'],
+    'dl': ['decilitre', 'decilitres', 'deciliter', 'deciliters'],
+    'l': ['ltr', 'ltrs', 'litre', 'litres', 'liter', 'liters'],
+    'tsp': ['tsps', 'teaspoon', 'teaspoons'],
+    'tbsp': ['tbsps', 'tbs', 'tablespoon', 'tablespoons'],
+    'cup': ['cups'],
+    'unit': ['units', 'pc', 'pcs', 'piece', 'pieces', 'each', 'ea'],
+    'dozen': ['doz', 'dozens'],
+}
+
+def _alias_key(unit) -> str:
+    """Lowercase, trimmed, single-spaced, without a trailing dot ('Tbsp.' -> 'tbsp')."""
+    return " ".join(str(unit).lower().split()).rstrip(".")
+
+def _compile_aliases(aliases: dict[str, list[str]]) -> dict[str, str]:
+    """Flattens {canonical: [aliases]} into one {alias: canonical} lookup."""
+    lookup = {}
+    for canonical, spellings in aliases.items():
+        canonical_key = _alias_key(canonical)
+        for spelling in [canonical, *spellings]:
+            lookup[_alias_key(spelling)] = canonical_key
+    return lookup
+
+# The compiled lookup. Starts with the bundled defaults; load_unit_aliases adds the sheet's aliases.
+_alias_lookup: dict[str, str] = _compile_aliases(DEFAULT_UNIT_ALIASES)
+
+def canonical_unit(unit) -> str:
+    """
+    Returns the canonical spelling of a unit ('Grams' -> 'g', 'litres' -> 'l').
+    Units without an alias are returned normalized (lowercase, trimmed).
+    """
+    key = _alias_key(unit)
+    return _alias_lookup.get(key, key)
+
+def is_known_unit(unit) -> bool:
+    """Returns True if the word is a unit (or an alias of one) in the alias table."""
+    return _alias_key(unit) in _alias_lookup
+
+async def load_unit_aliases() -> int:
+    """
+    Recompiles the alias lookup from the defaults plus the UNIT_ALIASES_SHEET tab (if configured).
+    Called once at startup; conversions afterwards never read the sheet. Returns the number of aliases.
+    """
+    global _alias_lookup
+    aliases = {canonical: list(spellings) for canonical, spellings in DEFAULT_UNIT_ALIASES.items()}
+    default_lookup = _compile_aliases(DEFAULT_UNIT_ALIASES)
+
+    if UNIT_ALIASES_SHEET:
+        records = await queries.get_all_records(UNIT_ALIASES_SHEET, columns=[UNIT_ALIAS, UNIT_ALIAS_UNIT]) or []
+        for record in records:
+            alias, canonical = str(record.get(UNIT_ALIAS, "")).strip(), str(record.get(UNIT_ALIAS_UNIT, "")).strip()
+            if alias and canonical:
+                # The target may itself be a default alias ('grams' -> 'g')
+                aliases.setdefault(default_lookup.get(_alias_key(canonical), canonical), []).append(alias)
+        logging.info(f"UNIT ALIASES: Loaded {len(records)} alias(es) from '{UNIT_ALIASES_SHEET}'.")
+
+    _alias_lookup = _compile_aliases(aliases)
+    logging.info(f"UNIT ALIASES: {len(_alias_lookup)} spellings map to {len(set(_alias_lookup.values()))} units.")
+    return len(_alias_lookup)
@@ -0,0 +1,120 @@
+import os
+import asyncio
+import logging
+from urllib.parse import quote
+import httpx
+import gspread
+from google.auth.transport.requests import Request
+from sheets.client import load_service_account_credentials
+
+# Base URL of the Sheets values API. Point it at a local fake server to run without Google
+# (e.g. SHEETS_API_BASE_URL=http://127.0.0.1:8081/v4/spreadsheets with SHEETS_API_AUTH=none).
+SHEETS_API_BASE_URL = os.getenv("SHEETS_API_BASE_URL", "https://sheets.googleapis.com/v4/spreadsheets")
+
+# 'service_account' signs requests with sheets_key.json, 'none' sends them unauthenticated (fake endpoints only)
+SHEETS_API_AUTH = os.getenv("SHEETS_API_AUTH", "service_account").lower()
+
+# Size of the keep-alive connection pool shared by all concurrent requests
+ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv("SHEETS_ASYNC_MAX_CONNECTIONS", "20"))
+ASYNC_HTTP_TIMEOUT_SECONDS = float(os.getenv("SHEETS_ASYNC_TIMEOUT_SECONDS", "30"))
+
+class AsyncSheetsClient:
+    """
+    A small asyncio client for the Sheets values API, built on one pooled httpx.AsyncClient.
+
+    Error responses are raised as gspread.exceptions.APIError so callers handle both
+    transports the same way.
+    """
+
+    def __init__(self, base_url: str = SHEETS_API_BASE_URL, credentials=None, transport: httpx.AsyncBaseTransport | None = None):
+        self.base_url = base_url.rstrip("/")
+        self.credentials = credentials
+        self._token_lock = asyncio.Lock()
+        self._http = httpx.AsyncClient(
+            timeout=ASYNC_HTTP_TIMEOUT_SECONDS,
+            limits=httpx.Limits(max_connections=ASYNC_HTTP_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_HTTP_MAX_CONNECTIONS),
+            transport=transport,
+        )
+
+    async def _auth_headers(self) -> dict:
+        """Returns the Authorization header, refreshing the access token when it has expired."""
+        if self.credentials is None:
+            return {}
+        if not self.credentials.valid:
+            async with self._token_lock:
+                # Re-check inside the lock so concurrent requests only refresh once
+                if not self.credentials.valid:
+                    # google-auth refreshes synchronously, so keep it off the event loop
+                    await asyncio.to_thread(self.credentials.refresh, Request())
+                    logging.debug("ASYNC SHEETS: Access token refreshed.")
+        return {"Authorization": f"Bearer {self.credentials.token}"}
+
+    async def request(self, method: str, path: str, params: dict | None = None, json: dict | None = None) -> dict:
+        """Sends one request to the values API and returns the decoded JSON body."""
+        response = await self._http.request(
+            method, f"{self.base_url}/{path}", params=params, json=json, headers=await self._auth_headers()
+        )
+        if response.status_code == 401 and self.credentials is not None:
+            # The token was revoked or expired early: force a refresh and retry once
+            self.credentials.token = None
+            response = await self._http.request(
+                method, f"{self.base_url}/{path}", params=params, json=json, headers=await self._auth_headers()
+            )
+        if response.is_error:
+            # APIError only needs .json() and .text, which httpx responses provide
+            raise gspread.exceptions.APIError(response)
+        return response.json() if response.content else {}
+
+    async def values_get(self, spreadsheet_id: str, range_name: str) -> list[list[str]]:
+        """Returns the cell values of a range (rows of formatted strings; trailing blanks trimmed)."""
+        body = await self.request("GET", f"{spreadsheet_id}/values/{quote(range_name)}")
+        return body.get("values", [])
+
+    async def values_batch_get(self, spreadsheet_id: str, ranges: list[str]) -> list[list[list[str]]]:
+        """Returns the cell values of several ranges fetched in one request (in the order requested)."""
+        body = await self.request("GET", f"{spreadsheet_id}/values:batchGet", params={"ranges": ranges})
+        return [value_range.get("values", []) for value_range in body.get("valueRanges", [])]
+
+    async def values_batch_update(self, spreadsheet_id: str, data: list[dict]) -> dict:
+        """Writes several ranges in one request (ranges must include the sheet name)."""
+        return await self.request(
+            "POST", f"{spreadsheet_id}/values:batchUpdate",
+            json={"valueInputOption": "RAW", "data": data},
+        )
+
+    async def values_append(self, spreadsheet_id: str, range_name: str, rows: list[list[str]]) -> dict:
+        """Appends rows after the table found at range_name, like gspread's append_rows."""
+        return await self.request(
+            "POST", f"{spreadsheet_id}/values/{quote(range_name)}:append",
+            params={"valueInputOption": "RAW"},
+            json={"values": rows},
+        )
+
+    async def get_sheet_properties(self, spreadsheet_id: str) -> list[dict]:
+        """Returns the properties of every worksheet (title, gridProperties, ...) from the spreadsheet metadata."""
+        body = await self.request("GET", spreadsheet_id, params={"fields": "sheets.properties"})
+        return [sheet.get("properties", {}) for sheet in body.get("sheets", [])]
+
+    async def aclose(self) -> None:
+        """Closes the pooled connections."""
+        await self._http.aclose()
+
+# The process-wide async client (created lazily on first use and then reused)
+_async_sheets_client: AsyncSheetsClient | None = None
+
+def get_async_sheets_client() -> AsyncSheetsClient:
+    """Returns the shared AsyncSheetsClient, loading credentials on first use (unless auth is disabled)."""
+    global _async_sheets_client
+
+    if _async_sheets_client is None:
+        credentials = load_service_account_credentials() if SHEETS_API_AUTH != "none" else None
+        _async_sheets_client = AsyncSheetsClient(credentials=credentials)
+    return _async_sheets_client
+
+async def close_async_sheets_client() -> None:
+    """Closes the shared client's pooled connections (if it was ever created); the next use opens a new one."""
+    global _async_sheets_client
+
+    if _async_sheets_client is not None:
+        client, _async_sheets_client = _async_sheets_client, None
+        await client.aclose()
@@ -1,14 +1,25 @@
 import os
+import threading
 import gspread
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
 
 # The name of the file containing the service account JSON data.
 # This MUST match the 'Filename' you set in Render's Secret Files!
 SERVICE_ACCOUNT_FILE = "sheets_key.json"
 
-def get_sheets_client():
+# Size of the pooled HTTP connections kept open to the Google APIs.
+# Worker threads share one client, so the pool should be at least as large as the thread count.
+HTTP_POOL_SIZE = int(os.getenv("SHEETS_HTTP_POOL_SIZE", "10"))
+
+# The process-wide client (created lazily on first use and then reused)
+_sheets_client: gspread.client.Client | None = None
+_sheets_client_lock = threading.Lock()
+
+def load_service_account_credentials() -> Credentials:
     """
-    Authenticates with Google Sheets using the Service Account JSON key.
+    Loads the Service Account credentials used to authenticate with Google Sheets.
     
     The key file is loaded from the secure location where Render makes it available.
     """
@@ -32,11 +43,44 @@ def get_sheets_client():
     )
 
     print("✅ SUCCESS: Google Sheets Service Account Key loaded correctly!")
+    return credentials
+
+def _build_sheets_client() -> gspread.client.Client:
+    """Authenticates with Google Sheets and builds the gspread client on a pooled session."""
+    credentials = load_service_account_credentials()
+
+    # Build a pooled, self-refreshing HTTP session
+    # AuthorizedSession refreshes the access token automatically when it expires (or on a 401)
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
      
-    # 4. Return the gspread client object
-    return gspread.client.Client(auth=credentials)
+    # Return the gspread client object
+    return gspread.client.Client(auth=credentials, session=session)
+
+def get_sheets_client() -> gspread.client.Client:
+    """
+    Returns the process-wide gspread client, authenticating on first use.
+    
+    The same client (and its pooled HTTP session) is shared by every caller and thread.
+    """
+    global _sheets_client
+    
+    if _sheets_client is None:
+        with _sheets_client_lock:
+            # Re-check inside the lock so concurrent first calls only authenticate once
+            if _sheets_client is None:
+                _sheets_client = _build_sheets_client()
+    return _sheets_client
+
+def reset_sheets_client() -> None:
+    """Discards the shared client so the next call re-reads the key and re-authenticates."""
+    global _sheets_client
+    
+    with _sheets_client_lock:
+        _sheets_client = None
 
 # Example usage (you'll use this in your services):
 # sheets_client = get_sheets_client()
 # spreadsheet = sheets_client.open("Your Bakery Project Spreadsheet Name")
-# worksheet = spreadsheet.worksheet("Ingredients")
\ No newline at end of file
+# worksheet = spreadsheet.worksheet("Ingredients")
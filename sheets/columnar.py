@@ -0,0 +1,138 @@
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError: # Fall back to the standard library 'array' module (same API, plain loops)
+    np = None
+
+HAS_NUMPY = np is not None
+
+class ColumnarTable:
+    """
+    A read-only, column-oriented copy of a tab.
+
+    Numeric columns are float64 arrays (blank or unparsable cells become NaN). Text columns
+    (names, units, IDs) are categorical: one array of integer codes plus the list of distinct,
+    interned values. With NumPy the operations below are vectorized; without it they run over
+    'array' buffers, which still avoids a dict per row.
+
+    Masks returned by mask_positions are NumPy bool arrays, or lists of bools without NumPy.
+    """
+    __slots__ = ("length", "numeric", "codes", "categories", "_category_index")
+
+    def __init__(self, length: int):
+        self.length = length
+        self.numeric: dict = {} # column -> float64 array
+        self.codes: dict = {} # column -> int32 array of category codes
+        self.categories: dict[str, list[str]] = {} # column -> distinct values (code = position)
+        self._category_index: dict[str, dict[str, int]] = {} # column -> {value: code}
+
+    @classmethod
+    def from_records(cls, records: list[dict], numeric_columns: list[str], categorical_columns: list[str]) -> "ColumnarTable":
+        """Builds the table from get_all_records-style dicts (text values are stripped)."""
+        table = cls(len(records))
+        for column in numeric_columns:
+            values = array('d', (_to_float(record.get(column)) for record in records))
+            table.numeric[column] = np.frombuffer(values, dtype=np.float64) if HAS_NUMPY else values
+        for column in categorical_columns:
+            index: dict[str, int] = {}
+            categories: list[str] = []
+            codes = array('i')
+            for record in records:
+                value = str(record.get(column, "")).strip()
+                code = index.get(value)
+                if code is None:
+                    code = index[value] = len(categories)
+                    categories.append(sys.intern(value))
+                codes.append(code)
+            table.codes[column] = np.frombuffer(codes, dtype=np.int32) if HAS_NUMPY else codes
+            table.categories[column] = categories
+            table._category_index[column] = index
+        return table
+
+    def __len__(self) -> int:
+        return self.length
+
+    # --- Cell Access ---
+
+    def value(self, column: str, position: int):
+        """Returns one cell: a float for numeric columns, the text for categorical ones."""
+        if column in self.numeric:
+            return float(self.numeric[column][position])
+        return self.categories[column][self.codes[column][position]]
+
+    # --- Filters ---
+
+    def mask_positions(self, positions):
+        """Selects the rows at the given positions (e.g. the rows a typed decode kept)."""
+        if HAS_NUMPY:
+            mask = np.zeros(self.length, dtype=bool)
+            mask[list(positions)] = True
+            return mask
+        mask = [False] * self.length
+        for position in positions:
+            mask[position] = True
+        return mask
+
+    def positions(self, mask=None) -> list[int]:
+        """Returns the row positions selected by a mask (all rows without one), in sheet order."""
+        if mask is None:
+            return list(range(self.length))
+        if HAS_NUMPY:
+            return np.flatnonzero(mask).tolist()
+        return [i for i, selected in enumerate(mask) if selected]
+
+    # --- Aggregates (NaN cells are skipped) ---
+
+    def sum_product(self, column_a: str, column_b: str, mask=None) -> float:
+        """Sum of column_a * column_b over the selected rows (e.g. quantity * cost per unit)."""
+        a, b = self.numeric[column_a], self.numeric[column_b]
+        if HAS_NUMPY:
+            products = a * b
+            return float(np.nansum(products if mask is None else products[mask]))
+        total = 0.0
+        for i in range(self.length):
+            product = a[i] * b[i]
+            if product == product and (mask is None or mask[i]):
+                total += product
+        return total
+
+    def group_sum(self, by: str, column: str, mask=None) -> dict[str, float]:
+        """Sums a numeric column per value of a categorical column."""
+        codes, values, categories = self.codes[by], self.numeric[column], self.categories[by]
+        if HAS_NUMPY:
+            selected = ~np.isnan(values) if mask is None else (mask & ~np.isnan(values))
+            totals = np.bincount(codes[selected], weights=values[selected], minlength=len(categories))
+            present = np.bincount(codes[selected], minlength=len(categories)) > 0
+            return {categories[code]: float(totals[code]) for code in np.flatnonzero(present)}
+        totals: dict[str, float] = {}
+        for i in range(self.length):
+            value = values[i]
+            if value == value and (mask is None or mask[i]):
+                key = categories[codes[i]]
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def group_last(self, by: str, mask=None) -> dict[str, int]:
+        """Returns the position of the last selected row for each value of a categorical column."""
+        codes, categories = self.codes[by], self.categories[by]
+        if HAS_NUMPY:
+            selected = np.arange(self.length) if mask is None else np.flatnonzero(mask)
+            # np.unique on the reversed codes finds each code's first hit from the end
+            found, reversed_positions = np.unique(codes[selected][::-1], return_index=True)
+            last_positions = selected[len(selected) - 1 - reversed_positions]
+            return {categories[code]: int(position) for code, position in zip(found.tolist(), last_positions.tolist())}
+        last: dict[str, int] = {}
+        for i in self.positions(mask):
+            last[categories[codes[i]]] = i
+        return last
+
+def _to_float(value) -> float:
+    """Parses a numeric cell; blanks and anything unparsable become NaN."""
+    if value is None or value == "":
+        return float("nan")
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return float("nan")
@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads reserved for blocking Sheets calls. They are separate from the default executor,
+# so a slow Sheets API backs up here instead of starving the rest of the FastAPI/PTB process.
+SHEETS_IO_MAX_WORKERS = int(os.getenv("SHEETS_IO_MAX_WORKERS", "8"))
+
+# Maximum number of Sheets calls allowed to run at the same time against one worksheet
+SHEETS_IO_PER_WORKSHEET_LIMIT = int(os.getenv("SHEETS_IO_PER_WORKSHEET_LIMIT", "2"))
+
+_executor = ThreadPoolExecutor(max_workers=SHEETS_IO_MAX_WORKERS, thread_name_prefix="sheets-io")
+_worksheet_slots: dict[str, asyncio.Semaphore] = {}
+
+class _IOStats:
+    """Counters describing the Sheets I/O backlog."""
+    __slots__ = ("in_flight", "queued", "completed", "failed", "total_wait_seconds", "max_wait_seconds")
+
+    def __init__(self):
+        self.in_flight = 0 # Calls currently running
+        self.queued = 0 # Calls waiting for a worksheet slot or a free thread
+        self.completed = 0
+        self.failed = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def record_wait(self, wait_seconds: float) -> None:
+        """Records how long one call waited before it started running."""
+        self.total_wait_seconds += wait_seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+_stats = _IOStats()
+_worksheet_stats: dict[str, _IOStats] = {}
+
+def _stats_snapshot(stats: _IOStats) -> dict:
+    """Converts a stats object to a plain dict (with the average wait time)."""
+    started = stats.completed + stats.failed + stats.in_flight
+    return {
+        "in_flight": stats.in_flight,
+        "queued": stats.queued,
+        "completed": stats.completed,
+        "failed": stats.failed,
+        "avg_wait_seconds": stats.total_wait_seconds / started if started else 0.0,
+        "max_wait_seconds": stats.max_wait_seconds,
+    }
+
+def get_sheets_io_stats() -> dict:
+    """Returns the current in-flight count, queue depth and wait-time stats, overall and per worksheet."""
+    return {
+        **_stats_snapshot(_stats),
+        "worksheets": {name: _stats_snapshot(stats) for name, stats in _worksheet_stats.items()},
+    }
+
+@asynccontextmanager
+async def sheets_io_slot(worksheet: str):
+    """
+    Admits one Sheets call for a worksheet, waiting while the worksheet is at its concurrency limit.
+
+    Yields a callback that must be invoked when the call actually starts running; everything
+    before that counts as queue time.
+    """
+    slots = _worksheet_slots.setdefault(worksheet, asyncio.Semaphore(SHEETS_IO_PER_WORKSHEET_LIMIT))
+    worksheet_stats = _worksheet_stats.setdefault(worksheet, _IOStats())
+    requested_at = time.monotonic()
+    started = False
+
+    def mark_started() -> None:
+        nonlocal started
+        if started:
+            return
+        started = True
+        wait_seconds = time.monotonic() - requested_at
+        for stats in (_stats, worksheet_stats):
+            stats.queued -= 1
+            stats.in_flight += 1
+            stats.record_wait(wait_seconds)
+
+    for stats in (_stats, worksheet_stats):
+        stats.queued += 1
+    try:
+        async with slots:
+            yield mark_started
+    except BaseException:
+        for stats in (_stats, worksheet_stats):
+            if started:
+                stats.in_flight -= 1
+                stats.failed += 1
+            else:
+                stats.queued -= 1
+        raise
+    else:
+        for stats in (_stats, worksheet_stats):
+            if started:
+                stats.in_flight -= 1
+                stats.completed += 1
+            else:
+                stats.queued -= 1
+
+async def run_sheets_io(worksheet: str, func, *args):
+    """Runs a blocking Sheets call on the dedicated executor, subject to the worksheet's admission limit."""
+    async with sheets_io_slot(worksheet) as mark_started:
+
+        def timed_call():
+            # Runs on the executor thread: the call has now left the queue
+            loop.call_soon_threadsafe(mark_started)
+            return func(*args)
+
+        loop = asyncio.get_running_loop()
+        started_at = time.monotonic()
+        result = await loop.run_in_executor(_executor, timed_call)
+        # Make sure the stats are settled even if the thread-safe callback hasn't run yet
+        mark_started()
+        logging.debug(f"SHEETS IO: Call on '{worksheet}' finished in {time.monotonic() - started_at:.3f}s.")
+        return result
+
+def shutdown_sheets_executor() -> None:
+    """Stops accepting new calls and waits for running ones to finish."""
+    _executor.shutdown(wait=True)
@@ -0,0 +1,268 @@
+import os
+import json
+import asyncio
+import logging
+import gspread
+from sheets import queries
+from sheets.sqlite_backend import SQLiteBackend, SQLITE_DB_PATH, LAST_UPDATED_COLUMN, _quote, _normalize_key
+
+# Worksheets of the bakery spreadsheet kept in the local mirror (comma-separated)
+MIRROR_SHEETS = [
+    name.strip()
+    for name in os.getenv("MIRROR_SHEETS", "Config,Ingredients,Units,Price_History,Stock_Ledger,Undo_Index,Recipes,Recipe_Ingredients_Map").split(",")
+    if name.strip()
+]
+
+# Seconds between background syncs with Google Sheets
+MIRROR_SYNC_SECONDS = float(os.getenv("MIRROR_SYNC_SECONDS", "30"))
+
+def _canonical(value) -> str:
+    """Returns a cell value in the form used for comparisons (numericised like get_all_records)."""
+    return str(gspread.utils.numericise("" if value is None else str(value), default_blank=""))
+
+def _content_hash(record: dict, headers: list[str]) -> str:
+    """Fingerprint of a row's values in the sheet's columns (extra local-only columns are ignored)."""
+    return json.dumps([_canonical(record.get(header, "")) for header in headers])
+
+class MirrorBackend(SQLiteBackend):
+    """
+    Serves every read and write from the local SQLite database and keeps Google Sheets in step
+    in the background, so the sheet stays the staff's human-readable view.
+
+    Each local write records the row in an outbox (in the same transaction). Every
+    MIRROR_SYNC_SECONDS the sync job handles each mirrored worksheet in four steps:
+      1. It downloads the sheet.
+      2. It pulls rows that were changed or added by hand.
+      3. It appends new local rows in one request.
+      4. It writes changed cells of updated rows in one batch_update.
+
+    Rows are matched by their ID (first column). To detect hand edits, the job compares each
+    sheet row with the content it had at the last sync. When a row changed on both sides,
+    the newer Last_Updated stamp wins. A hand edit that doesn't touch Last_Updated keeps
+    the older stamp, so the local change wins. Tabs whose first column isn't unique (logs
+    such as Price_History) are append-only: local rows are pushed, and hand edits stay in
+    the sheet.
+    """
+
+    def __init__(self, path: str = SQLITE_DB_PATH, sheet_names: list[str] | None = None):
+        super().__init__(path)
+        self.sheet_names = list(sheet_names or MIRROR_SHEETS)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS _mirror_outbox ("
+            "table_name TEXT, operation TEXT, row_key INTEGER, seq INTEGER, "
+            "PRIMARY KEY (table_name, operation, row_key))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS _mirror_synced ("
+            "table_name TEXT, row_key TEXT, content_hash TEXT, "
+            "PRIMARY KEY (table_name, row_key))"
+        )
+        # Every outbox entry carries a sequence number, so a sync only clears entries it actually pushed
+        self._seq = self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM _mirror_outbox").fetchone()[0]
+        self._sync_lock = asyncio.Lock()
+        self._sync_task: asyncio.Task | None = None
+
+    # --- Outbox ---
+
+    def _after_write(self, table: str, rowid: int, operation: str) -> None:
+        if table not in self.sheet_names:
+            return
+        if operation == "update" and self._conn.execute(
+            "SELECT 1 FROM _mirror_outbox WHERE table_name = ? AND operation = 'append' AND row_key = ?", (table, rowid)
+        ).fetchone():
+            # The pending append will push the row's latest content anyway
+            return
+        self._seq += 1
+        self._conn.execute(
+            "INSERT INTO _mirror_outbox (table_name, operation, row_key, seq) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (table_name, operation, row_key) DO UPDATE SET seq = excluded.seq",
+            (table, operation, rowid, self._seq),
+        )
+
+    def _raw_rows(self, table: str) -> list[tuple[int, dict]]:
+        """Returns (rowid, record) for every local row, with the stored (un-numericised) values."""
+        columns = self._get_columns(table)
+        column_sql = ", ".join(_quote(c) for c in columns)
+        rows = self._conn.execute(f"SELECT rowid, {column_sql} FROM {_quote(table)} ORDER BY rowid").fetchall()
+        return [(row[0], dict(zip(columns, ("" if v is None else v for v in row[1:])))) for row in rows]
+
+    def _overwrite_local_row(self, table: str, rowid: int | None, record: dict) -> None:
+        """Writes a sheet row into the local table as-is (no audit stamp, no outbox entry)."""
+        columns = self._ensure_columns(table, record)
+        self._bump_generation(table)
+        if rowid is None:
+            column_sql = ", ".join(_quote(c) for c in columns)
+            placeholders = ", ".join("?" for _ in columns)
+            self._conn.execute(
+                f"INSERT INTO {_quote(table)} ({column_sql}) VALUES ({placeholders})",
+                [str(record.get(c, "")) for c in columns],
+            )
+        else:
+            set_sql = ", ".join(f"{_quote(c)} = ?" for c in record)
+            self._conn.execute(f"UPDATE {_quote(table)} SET {set_sql} WHERE rowid = ?", (*[str(v) for v in record.values()], rowid))
+
+    def _set_synced(self, table: str, row_key: str, content_hash: str) -> None:
+        self._conn.execute(
+            "INSERT INTO _mirror_synced (table_name, row_key, content_hash) VALUES (?, ?, ?) "
+            "ON CONFLICT (table_name, row_key) DO UPDATE SET content_hash = excluded.content_hash",
+            (table, row_key, content_hash),
+        )
+
+    # --- Sync ---
+
+    async def _sync_table(self, sheet_name: str) -> None:
+        """Runs one pull/push cycle for a worksheet. Raises on Sheets errors (the outbox is kept for the next run)."""
+        # 1. Download the current state of the sheet
+        remote = await queries._fetch_records(sheet_name, False)
+        headers = list(remote[0].keys()) if remote else (await queries._get_sheet_schema(sheet_name, False, refresh=True)).headers
+        if not headers:
+            logging.warning(f"MIRROR SYNC: '{sheet_name}' has no header row; skipping.")
+            return
+        id_column = headers[0]
+        remote_keys = [_normalize_key(record.get(id_column, "")) for record in remote]
+        keyed = all(remote_keys) and len(set(remote_keys)) == len(remote_keys)
+        remote_positions: dict[str, int] = {}
+        for position, key in enumerate(remote_keys):
+            remote_positions.setdefault(key, position)
+
+        with self._lock:
+            # 2. First sync of this tab: take the sheet as the starting point
+            if not self._get_columns(sheet_name):
+                self.load_records(sheet_name, remote) if remote else self._ensure_columns(sheet_name, headers)
+                if keyed:
+                    with self._conn:
+                        self._conn.execute("BEGIN")
+                        for key, record in zip(remote_keys, remote):
+                            self._set_synced(sheet_name, key, _content_hash(record, headers))
+                logging.info(f"MIRROR SYNC: Bootstrapped '{sheet_name}' with {len(remote)} row(s) from Google Sheets.")
+                return
+
+            outbox = self._conn.execute(
+                "SELECT operation, row_key, seq FROM _mirror_outbox WHERE table_name = ?", (sheet_name,)
+            ).fetchall()
+            dirty_rowids = {row_key for _, row_key, _ in outbox}
+            synced = dict(self._conn.execute(
+                "SELECT row_key, content_hash FROM _mirror_synced WHERE table_name = ?", (sheet_name,)
+            ).fetchall())
+            local_rows = self._raw_rows(sheet_name)
+            local_by_key: dict[str, tuple[int, dict]] = {}
+            for rowid, record in local_rows:
+                local_by_key.setdefault(_normalize_key(record.get(id_column, "")), (rowid, record))
+
+            # 3. Pull rows that changed in the sheet since the last sync
+            pulled = 0
+            if keyed:
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    for key, record in zip(remote_keys, remote):
+                        remote_hash = _content_hash(record, headers)
+                        if synced.get(key) == remote_hash:
+                            continue # Unchanged in the sheet
+                        local = local_by_key.get(key)
+                        if local is None:
+                            # Row added by hand
+                            self._overwrite_local_row(sheet_name, None, record)
+                        elif _content_hash(local[1], headers) == remote_hash:
+                            pass # Both sides already agree
+                        elif local[0] in dirty_rowids:
+                            # Changed on both sides: the newer version stamp wins
+                            remote_version = str(record.get(LAST_UPDATED_COLUMN, ""))
+                            local_version = str(local[1].get(LAST_UPDATED_COLUMN, ""))
+                            if remote_version <= local_version:
+                                logging.warning(f"MIRROR CONFLICT: '{sheet_name}' row {key}: keeping local version {local_version} over sheet version {remote_version}.")
+                                continue
+                            logging.warning(f"MIRROR CONFLICT: '{sheet_name}' row {key}: taking sheet version {remote_version} over local version {local_version}.")
+                            self._conn.execute("DELETE FROM _mirror_outbox WHERE table_name = ? AND row_key = ?", (sheet_name, local[0]))
+                            dirty_rowids.discard(local[0])
+                            self._overwrite_local_row(sheet_name, local[0], record)
+                        else:
+                            self._overwrite_local_row(sheet_name, local[0], record)
+                        self._set_synced(sheet_name, key, remote_hash)
+                        pulled += 1
+
+            # 4. Collect the local changes to push
+            local_by_rowid = dict(self._raw_rows(sheet_name)) if pulled else dict(local_rows)
+            schema = queries._SheetSchema(headers)
+            appends: list[tuple[int, int, dict]] = []
+            updates_list = []
+            pushed: list[tuple[str, int, int, dict]] = []
+            for operation, rowid, seq in sorted(outbox, key=lambda entry: (entry[0] != "append", entry[1])):
+                record = local_by_rowid.get(rowid)
+                if record is None or rowid not in dirty_rowids:
+                    continue
+                key = _normalize_key(record.get(id_column, ""))
+                row_position = remote_positions.get(key) if operation == "update" else None
+                if row_position is None:
+                    # New row (or one deleted from the sheet by hand): append it
+                    appends.append((rowid, seq, record))
+                    pushed.append((operation, rowid, seq, record))
+                    continue
+                changed = {
+                    header: record[header]
+                    for header in headers
+                    if header in record and _canonical(record[header]) != _canonical(remote[row_position].get(header, ""))
+                }
+                cell_updates, _ = queries._build_cell_updates(schema, row_position + 2, changed)
+                updates_list.extend(cell_updates)
+                pushed.append((operation, rowid, seq, record))
+
+        # 5. Push in at most two requests: one append and one batch_update
+        if appends:
+            await queries._append_values(sheet_name, False, [[str(record.get(header, "")) for header in headers] for _, _, record in appends])
+        if updates_list:
+            await queries._write_cells(sheet_name, False, updates_list)
+
+        # 6. Clear what was pushed, unless the row was written again in the meantime
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                for operation, rowid, seq, record in pushed:
+                    self._conn.execute(
+                        "DELETE FROM _mirror_outbox WHERE table_name = ? AND operation = ? AND row_key = ? AND seq = ?",
+                        (sheet_name, operation, rowid, seq),
+                    )
+                    if keyed:
+                        self._set_synced(sheet_name, _normalize_key(record.get(id_column, "")), _content_hash(record, headers))
+        if pulled or pushed:
+            logging.info(f"MIRROR SYNC: '{sheet_name}' pulled {pulled} row(s), appended {len(appends)}, updated {len(pushed) - len(appends)}.")
+
+    async def sync_once(self) -> bool:
+        """Syncs every mirrored worksheet once. Returns True if all of them succeeded."""
+        success = True
+        async with self._sync_lock:
+            for sheet_name in self.sheet_names:
+                try:
+                    await self._sync_table(sheet_name)
+                except Exception as e:
+                    logging.error(f"MIRROR SYNC FAILED for '{sheet_name}': {e}", exc_info=True)
+                    success = False
+        return success
+
+    async def _sync_loop(self) -> None:
+        while True:
+            await asyncio.sleep(MIRROR_SYNC_SECONDS)
+            await self.sync_once()
+
+    # --- StorageBackend Lifecycle ---
+
+    async def start(self) -> None:
+        """Syncs once (so a fresh database is filled from the sheets) and starts the background sync."""
+        await self.sync_once()
+        if self._sync_task is None:
+            self._sync_task = asyncio.create_task(self._sync_loop())
+            logging.info(f"MIRROR SYNC: Background sync every {MIRROR_SYNC_SECONDS:.0f}s for {self.sheet_names}.")
+
+    async def ensure_table(self, sheet_name: str, headers: list[str], use_cron_sheet: bool = False) -> bool:
+        """Makes sure the table exists locally and, for a mirrored worksheet, in the Google Sheet too."""
+        if not await super().ensure_table(sheet_name, headers, use_cron_sheet):
+            return False
+        if use_cron_sheet or sheet_name not in self.sheet_names:
+            return True
+        return await queries._sheets_ensure_table(sheet_name, headers)
+
+    async def flush_pending_writes(self) -> bool:
+        """Stops the background sync and pushes any remaining local changes."""
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            self._sync_task = None
+        return await self.sync_once()
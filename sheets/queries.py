@@ -3,7 +3,15 @@ import gspread
 from datetime import datetime
 import os
 import asyncio
-from sheets.client import get_sheets_client 
+import threading
+import time
+import contextlib
+import itertools
+from sheets.client import get_sheets_client, reset_sheets_client
+from sheets.async_client import get_async_sheets_client
+from sheets.executor import run_sheets_io, sheets_io_slot
+from sheets.rate_limit import READ, WRITE, call_with_rate_limit
+from sheets.storage import StorageBackend
 
 # Configure logging for the module
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -18,44 +26,108 @@ CONFIG_SHEET = "Config"
 CONFIG_KEY_COLUMN = 'Key'
 CONFIG_VALUE_COLUMN = 'Value'
 
-# Check if the primary sheet key is set
-if not GOOGLE_SHEETS_NAME_BAKERY:
+# 'sheets' (default) stores everything in Google Sheets; 'sqlite' uses a local database file
+# instead; 'mirror' serves from the local database and syncs it with Google Sheets in the
+# background (see sheets.sqlite_backend, sheets.mirror and the Storage Backend Selection section below).
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sheets").lower()
+
+# Check if the primary sheet key is set (not needed when running on the local database)
+if not GOOGLE_SHEETS_NAME_BAKERY and STORAGE_BACKEND != "sqlite":
     raise ValueError("GOOGLE_SHEETS_NAME_BAKERY environment variable is not set!")
 
 # --- P2.3 Implementation: Synchronous Sheet Accessors ---
 
+# Process-wide handle registry. Opening a spreadsheet and resolving a tab each cost a
+# metadata round trip, so the resolved objects are kept for the life of the process.
+_spreadsheet_handles: dict[str, gspread.Spreadsheet] = {}
+_worksheet_handles: dict[tuple[str, str], gspread.Worksheet] = {}
+_handles_lock = threading.Lock()
+
 def get_sheets_client_sync() -> gspread.client.Client:
-    """Returns the synchronous GSpread client."""
-    # The synchronous client must be retrieved once per execution if running in a worker thread
+    """Returns the shared synchronous GSpread client."""
+    # The client is created once and shared by all worker threads (see sheets.client)
     return get_sheets_client()
 
+def _get_spreadsheet_by_key(spreadsheet_key: str) -> gspread.Spreadsheet:
+    """Returns the cached spreadsheet object for a key, opening it on first use."""
+    spreadsheet = _spreadsheet_handles.get(spreadsheet_key)
+    if spreadsheet is None:
+        with _handles_lock:
+            spreadsheet = _spreadsheet_handles.get(spreadsheet_key)
+            if spreadsheet is None:
+                # Opens the spreadsheet using the unique key (one metadata round trip)
+                spreadsheet = get_sheets_client_sync().open_by_key(spreadsheet_key)
+                _spreadsheet_handles[spreadsheet_key] = spreadsheet
+    return spreadsheet
+
+def _get_spreadsheet_key(use_cron_sheet: bool) -> str:
+    """Returns the spreadsheet key for the primary or analytics spreadsheet."""
+    if use_cron_sheet:
+        if not GOOGLE_SHEETS_NAME_ANALYTICS:
+            raise ValueError("CRON spreadsheet name is not configured.")
+        return GOOGLE_SHEETS_NAME_ANALYTICS
+    return GOOGLE_SHEETS_NAME_BAKERY
+
 def get_primary_spreadsheet() -> gspread.Spreadsheet:
     """Returns the main project spreadsheet object (Live Data)."""
-    client = get_sheets_client_sync()
-    # Opens the spreadsheet using the unique key
-    return client.open_by_key(GOOGLE_SHEETS_NAME_BAKERY)
+    return _get_spreadsheet_by_key(_get_spreadsheet_key(False))
 
 def get_cron_spreadsheet() -> gspread.Spreadsheet:
     """Returns the spreadsheet object used for cron job aggregates (Read-Only Data)."""
-    if not GOOGLE_SHEETS_NAME_ANALYTICS:
-        raise ValueError("CRON spreadsheet name is not configured.")
-    client = get_sheets_client_sync()
-    # Opens the analytics spreadsheet
-    return client.open_by_key(GOOGLE_SHEETS_NAME_ANALYTICS)
+    return _get_spreadsheet_by_key(_get_spreadsheet_key(True))
+
+def invalidate_worksheet_handle(sheet_name: str, use_cron_sheet: bool = False) -> None:
+    """Drops the cached handles for a tab so the next access re-resolves them from the API."""
+    spreadsheet_key = _get_spreadsheet_key(use_cron_sheet)
+    with _handles_lock:
+        _worksheet_handles.pop((spreadsheet_key, sheet_name), None)
+        # The spreadsheet handle is dropped too (the tab may have been renamed or re-created)
+        _spreadsheet_handles.pop(spreadsheet_key, None)
+    # A re-created tab may have a different header row
+    invalidate_sheet_schema(sheet_name, use_cron_sheet)
+    logging.info(f"HANDLE RESET: Cached handles for worksheet '{sheet_name}' discarded.")
+
+def _reset_sheets_handles() -> None:
+    """Discards the shared client and every handle opened through it, so the next access re-authenticates."""
+    reset_sheets_client()
+    with _handles_lock:
+        _worksheet_handles.clear()
+        _spreadsheet_handles.clear()
+    logging.info("HANDLE RESET: Sheets client and all cached handles discarded.")
+
+def _is_auth_error(error: Exception) -> bool:
+    """Returns True when the API rejected the credentials themselves (not just access to one tab)."""
+    return isinstance(error, gspread.exceptions.APIError) and error.code == 401
+
+def _is_stale_handle_error(error: Exception) -> bool:
+    """Returns True for errors that mean a cached handle (or its credentials) is no longer valid."""
+    if isinstance(error, gspread.exceptions.WorksheetNotFound):
+        return True
+    # 401/403 responses mean the token or the sharing settings changed under us
+    return isinstance(error, gspread.exceptions.APIError) and error.code in (401, 403)
 
 def get_worksheet_sync(sheet_name: str, use_cron_sheet: bool = False) -> gspread.Worksheet:
-    """Returns a specific worksheet (tab) object synchronously."""
+    """Returns a specific worksheet (tab) object synchronously (cached after the first lookup)."""
     
     sheet_type = "CRON (Analytics)" if use_cron_sheet else "PRIMARY (Bakery)"
-    logging.debug(f"Attempting to retrieve worksheet: '{sheet_name}' from {sheet_type} spreadsheet.")
     
     try:
-        # Get the correct spreadsheet object
-        spreadsheet = get_cron_spreadsheet() if use_cron_sheet else get_primary_spreadsheet()
+        spreadsheet_key = _get_spreadsheet_key(use_cron_sheet)
+        
+        # 1. Serve the handle from the registry when it has already been resolved
+        worksheet = _worksheet_handles.get((spreadsheet_key, sheet_name))
+        if worksheet is not None:
+            return worksheet
         
-        # Get the specific worksheet by name
+        logging.debug(f"Attempting to retrieve worksheet: '{sheet_name}' from {sheet_type} spreadsheet.")
+        
+        # 2. Get the correct spreadsheet object and the specific worksheet by name
+        spreadsheet = _get_spreadsheet_by_key(spreadsheet_key)
         worksheet = spreadsheet.worksheet(sheet_name)
         
+        with _handles_lock:
+            _worksheet_handles[(spreadsheet_key, sheet_name)] = worksheet
+        
         logging.debug(f"Successfully retrieved worksheet: '{sheet_name}'.")
         return worksheet
         
@@ -68,210 +140,1270 @@ def get_worksheet_sync(sheet_name: str, use_cron_sheet: bool = False) -> gspread
         # Catch any other connection or API errors
         logging.error(f"FATAL Error retrieving spreadsheet or worksheet: {e}", exc_info=True)
         raise
+
+def _run_on_worksheet(sheet_name: str, use_cron_sheet: bool, operation):
+    """
+    Runs operation(worksheet) synchronously using the cached handle.
+    
+    If the handle turns out to be stale (tab not found or an auth error), it is
+    re-resolved once and the operation is retried.
+    """
+    sheet = get_worksheet_sync(sheet_name, use_cron_sheet)
+    try:
+        return operation(sheet)
+    except Exception as e:
+        if not _is_stale_handle_error(e):
+            raise
+        logging.warning(f"STALE HANDLE: Re-resolving worksheet '{sheet_name}' after error: {e}")
+        if _is_auth_error(e):
+            # The token refresh did not help (e.g. the key was rotated): rebuild the client from the key file
+            _reset_sheets_handles()
+        invalidate_worksheet_handle(sheet_name, use_cron_sheet)
+        return operation(get_worksheet_sync(sheet_name, use_cron_sheet))
+    
+# --- Table Cache: Read-Through Cache for get_all_records ---
+
+# Default lifetime (seconds) of a cached tab. Tabs not listed in TABLE_CACHE_TTL_SECONDS use this value.
+DEFAULT_TABLE_CACHE_TTL_SECONDS = float(os.getenv("SHEETS_CACHE_TTL_SECONDS", "300"))
+
+# Per-tab lifetimes. A TTL of 0 disables caching for that tab.
+# Units rarely change, while Config holds ID counters that people occasionally edit by hand.
+TABLE_CACHE_TTL_SECONDS: dict[str, float] = {
+    "Units": 3600.0,
+    CONFIG_SHEET: 60.0,
+}
+
+class _CachedTable:
+    """
+    A cached copy of one worksheet's records (row 2 of the sheet is records[0]).
+    
+    'indexes' maps a column name to {normalized value: [record positions]}. Indexes are
+    built on first use for a column and discarded with the table when it is refreshed.
+    'decoded' holds typed views of the records (decoder -> result, see get_decoded_table);
+    they are dropped whenever the records are patched. 'generation' is unique per download,
+    so it changes when the tab is reloaded but not when our own writes patch it.
+    """
+    __slots__ = ("records", "loaded_at", "indexes", "decoded", "generation")
+    _generations = itertools.count(1)
+
+    def __init__(self, records: list[dict]):
+        self.records = records
+        self.loaded_at = time.monotonic()
+        self.indexes: dict[str, dict[str, list[int]]] = {}
+        self.decoded: dict = {}
+        self.generation = next(_CachedTable._generations)
+
+_table_cache: dict[tuple[bool, str], _CachedTable] = {}
+# Projected reads (some columns and/or rows) fetched while the full tab wasn't cached, keyed by
+# (columns, row_range) -> (loaded_at, records, decoded views). They share the tab's TTL and are
+# dropped on any write to the tab.
+_projection_cache: dict[tuple[bool, str], dict[tuple, tuple[float, list[dict], dict]]] = {}
+_table_load_locks: dict[tuple[bool, str], asyncio.Lock] = {}
+_table_cache_stats: dict[str, dict[str, int]] = {}
+
+def set_table_cache_ttl(sheet_name: str, ttl_seconds: float) -> None:
+    """Sets the cache lifetime for one tab (0 disables caching for it)."""
+    TABLE_CACHE_TTL_SECONDS[sheet_name] = float(ttl_seconds)
+    # Apply the new lifetime from the next read onwards
+    invalidate_table_cache(sheet_name)
+
+def _get_table_ttl(sheet_name: str) -> float:
+    """Returns the configured cache lifetime of a tab."""
+    return TABLE_CACHE_TTL_SECONDS.get(sheet_name, DEFAULT_TABLE_CACHE_TTL_SECONDS)
+
+def _record_cache_event(sheet_name: str, event: str) -> None:
+    """Increments one of the hit/miss/patch/invalidation counters for a tab."""
+    stats = _table_cache_stats.setdefault(sheet_name, {"hits": 0, "misses": 0, "patches": 0, "invalidations": 0})
+    stats[event] += 1
+
+def get_table_cache_stats() -> dict[str, dict[str, int]]:
+    """Returns a snapshot of the per-tab cache counters (hits, misses, patches, invalidations)."""
+    return {sheet_name: dict(stats) for sheet_name, stats in _table_cache_stats.items()}
+
+def _get_fresh_cached_table(sheet_name: str, use_cron_sheet: bool) -> _CachedTable | None:
+    """Returns the cached table if it exists and has not expired."""
+    entry = _table_cache.get((use_cron_sheet, sheet_name))
+    if entry is None:
+        return None
+    if time.monotonic() - entry.loaded_at > _get_table_ttl(sheet_name):
+        return None
+    return entry
+
+def invalidate_table_cache(sheet_name: str | None = None, use_cron_sheet: bool = False) -> None:
+    """Drops the cached copy of one tab (or of every tab when no name is given)."""
+    if sheet_name is None:
+        _table_cache.clear()
+        _projection_cache.clear()
+        logging.info("CACHE RESET: All cached tables discarded.")
+        return
+    _projection_cache.pop((use_cron_sheet, sheet_name), None)
+    if _table_cache.pop((use_cron_sheet, sheet_name), None) is not None:
+        _record_cache_event(sheet_name, "invalidations")
+        logging.debug(f"CACHE INVALIDATED: Cached copy of '{sheet_name}' discarded.")
+
+def _numericise_cell(value) -> int | float | str:
+    """Converts a written value the same way gspread's get_all_records would read it back."""
+    return gspread.utils.numericise(str(value), default_blank="")
+
+def _patch_cached_row(sheet_name: str, use_cron_sheet: bool, row_num: int, written: dict) -> None:
+    """Applies a successful row write to the cached table (row_num is the 1-based sheet row)."""
+    _projection_cache.pop((use_cron_sheet, sheet_name), None)
+    entry = _table_cache.get((use_cron_sheet, sheet_name))
+    if entry is None:
+        return
+    position = row_num - 2 # Row 1 holds the headers
+    if not 0 <= position < len(entry.records):
+        # The written row is outside what we have cached, so the copy can't be trusted
+        invalidate_table_cache(sheet_name, use_cron_sheet)
+        return
+    record = entry.records[position]
+    entry.decoded.clear()
+    for header, value in written.items():
+        if header in record:
+            new_value = _numericise_cell(value)
+            # Move the row to its new key in any index built over this column
+            index = entry.indexes.get(header)
+            if index is not None:
+                _remove_from_index(index, record[header], position)
+                index.setdefault(_normalize_index_key(new_value), []).append(position)
+            record[header] = new_value
+    _record_cache_event(sheet_name, "patches")
+
+def _patch_cached_append(sheet_name: str, use_cron_sheet: bool, first_row_num: int | None, new_records: list[dict]) -> None:
+    """Adds successfully appended rows to the cached table (first_row_num is where the first one landed)."""
+    _projection_cache.pop((use_cron_sheet, sheet_name), None)
+    entry = _table_cache.get((use_cron_sheet, sheet_name))
+    if entry is None:
+        return
+    if first_row_num != len(entry.records) + 2:
+        # The rows did not land directly after the cached rows (or we don't know where they landed)
+        invalidate_table_cache(sheet_name, use_cron_sheet)
+        return
+    entry.decoded.clear()
+    for new_record in new_records:
+        record = {header: _numericise_cell(value) for header, value in new_record.items()}
+        entry.records.append(record)
+        # Add the new row to every index already built for this table
+        position = len(entry.records) - 1
+        for column, index in entry.indexes.items():
+            index.setdefault(_normalize_index_key(record.get(column)), []).append(position)
+    _record_cache_event(sheet_name, "patches")
+
+def _row_from_append_response(response: dict | None) -> int | None:
+    """Extracts the 1-based row number from an append response ('Sheet!A12:G12' -> 12)."""
+    try:
+        updated_range = response["updates"]["updatedRange"]
+        first_cell = updated_range.split("!")[-1].split(":")[0]
+        return gspread.utils.a1_to_rowcol(first_cell)[0]
+    except (KeyError, TypeError, IndexError, gspread.exceptions.IncorrectCellLabel):
+        return None
     
+# --- Header Schema Cache: Column Positions per Worksheet ---
+
+# Audit columns injected into every write. A tab without them is not treated as having a stale header row.
+LAST_UPDATED_COLUMN = 'Last_Updated'
+UPDATED_BY_COLUMN = 'Updated_By_User'
+METADATA_COLUMNS = (LAST_UPDATED_COLUMN, UPDATED_BY_COLUMN)
+
+class _SheetSchema:
+    """The header row of a worksheet: ordered headers plus header -> column letter / 1-based index."""
+    __slots__ = ("headers", "column_letters", "column_indexes")
+
+    def __init__(self, headers: list[str]):
+        self.headers = list(headers)
+        self.column_indexes: dict[str, int] = {}
+        self.column_letters: dict[str, str] = {}
+        for col_index, header in enumerate(self.headers, start=1):
+            # Keep the first occurrence for duplicated headers (matches list.index)
+            if header not in self.column_indexes:
+                self.column_indexes[header] = col_index
+                self.column_letters[header] = gspread.utils.rowcol_to_a1(1, col_index)[:-1]
+
+    def cell_a1(self, header: str, row_num: int) -> str:
+        """Returns the A1 reference of header's cell in a given row (e.g. 'D12')."""
+        return f"{self.column_letters[header]}{row_num}"
+
+_header_cache: dict[tuple[bool, str], _SheetSchema] = {}
+
+def _seed_sheet_schema(sheet_name: str, use_cron_sheet: bool, records: list[dict]) -> None:
+    """Stores the header row implied by freshly downloaded records (saves a later row_values call)."""
+    if records and (use_cron_sheet, sheet_name) not in _header_cache:
+        # get_all_records keys every record by the full header row, in sheet order
+        _header_cache[(use_cron_sheet, sheet_name)] = _SheetSchema(list(records[0].keys()))
+
+async def _get_sheet_schema(sheet_name: str, use_cron_sheet: bool, refresh: bool = False) -> _SheetSchema:
+    """Returns the cached header schema of a worksheet, reading row 1 only when missing (or on refresh)."""
+    schema = _header_cache.get((use_cron_sheet, sheet_name))
+    if schema is None or refresh:
+        schema = _SheetSchema(await _fetch_header_row(sheet_name, use_cron_sheet))
+        _header_cache[(use_cron_sheet, sheet_name)] = schema
+        logging.debug(f"HEADER SCHEMA LOADED: '{sheet_name}' has columns {schema.headers}.")
+    return schema
+
+def invalidate_sheet_schema(sheet_name: str, use_cron_sheet: bool = False) -> None:
+    """Drops the cached header row of a tab so the next write re-reads it."""
+    _header_cache.pop((use_cron_sheet, sheet_name), None)
+
+async def _resolve_sheet_schema(sheet_name: str, use_cron_sheet: bool, columns) -> _SheetSchema:
+    """
+    Returns the header schema, refreshing it once if a (non-audit) column being written is unknown.
+    
+    An unknown column usually means someone added it to the sheet after the schema was cached.
+    """
+    schema = await _get_sheet_schema(sheet_name, use_cron_sheet)
+    unknown = [c for c in columns if c not in schema.column_indexes and c not in METADATA_COLUMNS]
+    if unknown:
+        logging.info(f"HEADER SCHEMA REFRESH: Unknown column(s) {unknown} for '{sheet_name}'. Re-reading header row.")
+        schema = await _get_sheet_schema(sheet_name, use_cron_sheet, refresh=True)
+    return schema
+
+def _build_cell_updates(schema: _SheetSchema, row_num: int, fields: dict) -> tuple[list[dict], dict]:
+    """Builds batch_update payloads for one row. Returns (updates_list, fields actually written)."""
+    updates_list = []
+    written = {}
+    for header, value in fields.items():
+        if header not in schema.column_indexes:
+            # Header not found in sheet, ignore this field
+            continue
+        updates_list.append({
+            'range': schema.cell_a1(header, row_num),
+            'values': [[str(value)]] # Values must be a list of lists of strings
+        })
+        written[header] = value
+    return updates_list, written
+
+# --- Table Indexes: Key Lookups over Cached Tables ---
+
+def _normalize_index_key(value) -> str:
+    """Normalizes a cell value for index lookups (the same case-insensitive match find_records uses)."""
+    return str(value).strip().lower() if value is not None else ""
+
+def _remove_from_index(index: dict[str, list[int]], old_value, position: int) -> None:
+    """Removes one record position from the index bucket of its old value."""
+    key = _normalize_index_key(old_value)
+    positions = index.get(key)
+    if positions and position in positions:
+        positions.remove(position)
+        if not positions:
+            del index[key]
+
+def _get_column_index(entry: _CachedTable, column: str) -> dict[str, list[int]]:
+    """Returns the index for a column, building it from the cached records on first use."""
+    index = entry.indexes.get(column)
+    if index is None:
+        index = {}
+        for position, record in enumerate(entry.records):
+            if column in record:
+                index.setdefault(_normalize_index_key(record[column]), []).append(position)
+        entry.indexes[column] = index
+    return index
+
+def _get_id_column(entry: _CachedTable) -> str | None:
+    """Returns the name of the first column (the row ID by convention), if the table has rows."""
+    return next(iter(entry.records[0]), None) if entry.records else None
+
+def _get_cached_row_number(sheet_name: str, use_cron_sheet: bool, column: str | None, value) -> int | None:
+    """
+    Returns the 1-based sheet row of the first record whose column matches value, using a
+    fresh cached table. Returns None when the tab isn't cached or the value isn't indexed,
+    in which case callers fall back to a server-side search.
+    """
+    entry = _get_fresh_cached_table(sheet_name, use_cron_sheet)
+    if entry is None:
+        return None
+    if column is None:
+        column = _get_id_column(entry)
+        if column is None:
+            return None
+    positions = _get_column_index(entry, column).get(_normalize_index_key(value))
+    if not positions:
+        return None
+    return positions[0] + 2 # Row 1 holds the headers
+    
+# --- Sheets Transport: gspread on the Sheets I/O Executor or Native asyncio ---
+
+# 'gspread' runs the blocking gspread client on the bounded Sheets I/O executor; 'async' talks to the
+# Sheets values API directly from the event loop (see sheets.async_client).
+SHEETS_TRANSPORT = os.getenv("SHEETS_TRANSPORT", "gspread").lower()
+
+def _use_async_transport() -> bool:
+    """Returns True when Sheets I/O should go through the native asyncio client."""
+    return SHEETS_TRANSPORT == "async"
+
+async def _run_gspread(sheet_name: str, use_cron_sheet: bool, kind: str, operation):
+    """
+    Runs a blocking gspread operation on the dedicated Sheets I/O executor (see sheets.executor),
+    within the read or write quota (see sheets.rate_limit).
+    """
+    return await call_with_rate_limit(
+        kind, sheet_name, lambda: run_sheets_io(sheet_name, _run_on_worksheet, sheet_name, use_cron_sheet, operation)
+    )
+
+async def _run_async_io(sheet_name: str, kind: str, request):
+    """Awaits request(client) on the native asyncio client, under the same admission limit and quota."""
+    async def admitted_request():
+        async with sheets_io_slot(sheet_name) as mark_started:
+            mark_started()
+            return await request(get_async_sheets_client())
+    return await call_with_rate_limit(kind, sheet_name, admitted_request)
+
+def _records_from_values(values: list[list[str]]) -> list[dict]:
+    """Builds get_all_records-style dicts (header row as keys, numericised cells) from raw values."""
+    if not values:
+        return []
+    headers = values[0]
+    records = []
+    for row in values[1:]:
+        # The API trims trailing blank cells, so pad every row to the header width
+        padded = list(row) + [""] * (len(headers) - len(row))
+        records.append(dict(zip(headers, gspread.utils.numericise_all(padded[:len(headers)], default_blank=""))))
+    return records
+
+async def _fetch_records(sheet_name: str, use_cron_sheet: bool) -> list[dict]:
+    """Downloads every record of a worksheet (header row as keys)."""
+    if _use_async_transport():
+        spreadsheet_key = _get_spreadsheet_key(use_cron_sheet)
+        values = await _run_async_io(sheet_name, READ, lambda client: client.values_get(spreadsheet_key, f"'{sheet_name}'"))
+        return _records_from_values(values)
+    # get_all_records() uses the column headers as dictionary keys
+    return await _run_gspread(sheet_name, use_cron_sheet, READ, lambda sheet: sheet.get_all_records())
+
+async def _fetch_value_ranges(label: str, use_cron_sheet: bool, ranges: list[str]) -> list[list[list[str]]]:
+    """Reads several absolute A1 ranges ('Sheet'!A1:B2) in a single values:batchGet request."""
+    spreadsheet_key = _get_spreadsheet_key(use_cron_sheet)
+    if _use_async_transport():
+        return await _run_async_io(label, READ, lambda client: client.values_batch_get(spreadsheet_key, ranges))
+    response = await call_with_rate_limit(READ, label, lambda: run_sheets_io(
+        label, lambda: _get_spreadsheet_by_key(spreadsheet_key).values_batch_get(ranges)
+    ))
+    return [value_range.get("values", []) for value_range in response.get("valueRanges", [])]
+
+async def _fetch_many_records(sheet_names: list[str], use_cron_sheet: bool) -> dict[str, list[dict]]:
+    """Downloads every record of several worksheets in a single values:batchGet request."""
+    ranges = [gspread.utils.absolute_range_name(sheet_name) for sheet_name in sheet_names]
+    value_ranges = await _fetch_value_ranges("+".join(sheet_names), use_cron_sheet, ranges)
+    return {sheet_name: _records_from_values(values) for sheet_name, values in zip(sheet_names, value_ranges)}
+
+async def _fetch_projection(sheet_name: str, use_cron_sheet: bool, columns: list[str] | None, row_range: tuple[int, int | None] | None) -> list[dict]:
+    """
+    Downloads only some columns and/or rows of a worksheet in one batchGet request
+    (adjacent columns are read as a single range).
+    
+    row_range is (first_row, last_row) in sheet row numbers (data starts at row 2); last_row None
+    means "to the end". Columns missing from the sheet come back blank.
+    """
+    schema = await _resolve_sheet_schema(sheet_name, use_cron_sheet, columns or [])
+    if columns is None:
+        columns = schema.headers
+    first_row, last_row = row_range or (2, None)
+    first_row = max(first_row, 2) # Never read the header row as data
+    end = "" if last_row is None else str(last_row)
+    
+    # 1. Group the wanted column positions into runs of adjacent columns
+    runs: list[list[int]] = []
+    for col_index in sorted({schema.column_indexes[c] for c in columns if c in schema.column_indexes}):
+        if runs and col_index == runs[-1][1] + 1:
+            runs[-1][1] = col_index
+        else:
+            runs.append([col_index, col_index])
+    if not runs:
+        return []
+    letter = lambda col_index: gspread.utils.rowcol_to_a1(1, col_index)[:-1]
+    ranges = [gspread.utils.absolute_range_name(sheet_name, f"{letter(start)}{first_row}:{letter(stop)}{end}") for start, stop in runs]
+    
+    # 2. Read all runs at once and stitch them back into rows (the API trims trailing blanks)
+    value_ranges = await _fetch_value_ranges(sheet_name, use_cron_sheet, ranges)
+    row_count = max((len(values) for values in value_ranges), default=0)
+    rows = []
+    for i in range(row_count):
+        cells: dict[int, str] = {}
+        for (start, _), values in zip(runs, value_ranges):
+            for offset, value in enumerate(values[i] if i < len(values) else []):
+                cells[start + offset] = value
+        rows.append([cells.get(schema.column_indexes.get(c), "") for c in columns])
+    return _records_from_values([list(columns)] + rows)
+
+async def _fetch_header_row(sheet_name: str, use_cron_sheet: bool) -> list[str]:
+    """Reads row 1 (the headers) of a worksheet."""
+    if _use_async_transport():
+        spreadsheet_key = _get_spreadsheet_key(use_cron_sheet)
+        values = await _run_async_io(sheet_name, READ, lambda client: client.values_get(spreadsheet_key, f"'{sheet_name}'!1:1"))
+        return values[0] if values else []
+    return await _run_gspread(sheet_name, use_cron_sheet, READ, lambda sheet: sheet.row_values(1))
+
+async def _fetch_grid_row_count(sheet_name: str, use_cron_sheet: bool) -> int:
+    """
+    Reads a worksheet's current grid size (rowCount) from the spreadsheet metadata; the cached
+    worksheet handle's row_count goes stale as rows are appended. The grid counts blank rows too.
+    """
+    spreadsheet_key = _get_spreadsheet_key(use_cron_sheet)
+    if _use_async_transport():
+        properties = await _run_async_io(sheet_name, READ, lambda client: client.get_sheet_properties(spreadsheet_key))
+    else:
+        metadata = await call_with_rate_limit(READ, sheet_name, lambda: run_sheets_io(
+            sheet_name, lambda: _get_spreadsheet_by_key(spreadsheet_key).fetch_sheet_metadata(params={"fields": "sheets.properties"})
+        ))
+        properties = [sheet.get("properties", {}) for sheet in metadata.get("sheets", [])]
+    for sheet_properties in properties:
+        if sheet_properties.get("title") == sheet_name:
+            return int(sheet_properties.get("gridProperties", {}).get("rowCount", 0))
+    raise gspread.exceptions.WorksheetNotFound(sheet_name)
+
+def _find_row_number(sheet: gspread.Worksheet, value: str, col_index: int) -> int | None:
+    """Runs a gspread find in one column and returns the 1-based row, or None if not found."""
+    try:
+        cell = sheet.find(value, in_column=col_index)
+    except gspread.exceptions.APIError:
+        raise
+    except gspread.exceptions.GSpreadException:
+        # Older gspread versions raise CellNotFound instead of returning None
+        return None
+    return cell.row if cell is not None else None
+
+async def _find_row(sheet_name: str, use_cron_sheet: bool, value: str, col_index: int) -> int | None:
+    """Searches one column for an exact value and returns its 1-based row, or None if not found."""
+    if _use_async_transport():
+        # The values API has no search, so read just that column and scan it
+        letter = gspread.utils.rowcol_to_a1(1, col_index)[:-1]
+        spreadsheet_key = _get_spreadsheet_key(use_cron_sheet)
+        column = await _run_async_io(sheet_name, READ, lambda client: client.values_get(spreadsheet_key, f"'{sheet_name}'!{letter}:{letter}"))
+        for row_num, cells in enumerate(column, start=1):
+            if cells and cells[0] == value:
+                return row_num
+        return None
+    return await _run_gspread(sheet_name, use_cron_sheet, READ, lambda sheet: _find_row_number(sheet, value, col_index))
+
+async def _write_cells(sheet_name: str, use_cron_sheet: bool, updates_list: list[dict]) -> None:
+    """Writes a list of {'range': A1, 'values': [[...]]} updates to a worksheet in one batch_update."""
+    if _use_async_transport():
+        data = [
+            {'range': gspread.utils.absolute_range_name(sheet_name, update['range']), 'values': update['values']}
+            for update in updates_list
+        ]
+        spreadsheet_key = _get_spreadsheet_key(use_cron_sheet)
+        await _run_async_io(sheet_name, WRITE, lambda client: client.values_batch_update(spreadsheet_key, data))
+        return
+    await _run_gspread(sheet_name, use_cron_sheet, WRITE, lambda sheet: sheet.batch_update(updates_list))
+
+async def _append_values(sheet_name: str, use_cron_sheet: bool, all_row_values: list[list[str]]) -> int | None:
+    """Appends rows of values to a worksheet in one request and returns the row the first one landed on."""
+    if _use_async_transport():
+        spreadsheet_key = _get_spreadsheet_key(use_cron_sheet)
+        response = await _run_async_io(sheet_name, WRITE, lambda client: client.values_append(spreadsheet_key, f"'{sheet_name}'!A1", all_row_values))
+    else:
+        response = await _run_gspread(sheet_name, use_cron_sheet, WRITE, lambda sheet: sheet.append_rows(all_row_values))
+    return _row_from_append_response(response)
+
 # --- P3.1.2 Implementation: Core DB Abstraction Utilities ---
 
-async def get_all_records(sheet_name: str, use_cron_sheet: bool = False) -> list[dict] | None:
-    """Retrieves all records from a worksheet asynchronously (running GSpread synchronously in a thread)."""
+async def _load_table(sheet_name: str, use_cron_sheet: bool = False) -> _CachedTable:
+    """
+    Returns the cached table for a tab, downloading it when the cached copy is missing or expired.
+    
+    Raises on API errors. When caching is disabled for the tab, a fresh uncached table is returned.
+    """
+    # 1. Caching disabled for this tab: always download
+    if _get_table_ttl(sheet_name) <= 0:
+        return _CachedTable(await _fetch_records(sheet_name, use_cron_sheet))
+    
+    # 2. Serve from the cache when possible
+    entry = _get_fresh_cached_table(sheet_name, use_cron_sheet)
+    if entry is not None:
+        _record_cache_event(sheet_name, "hits")
+        return entry
     
-    def sync_get_records():
-        """Synchronous wrapper for GSpread call."""
-        sheet = get_worksheet_sync(sheet_name, use_cron_sheet)
-        # get_all_records() uses the column headers as dictionary keys
-        return sheet.get_all_records()
+    # 3. Concurrent misses for the same tab wait for a single download
+    cache_key = (use_cron_sheet, sheet_name)
+    async with _table_load_locks.setdefault(cache_key, asyncio.Lock()):
+        entry = _get_fresh_cached_table(sheet_name, use_cron_sheet)
+        if entry is not None:
+            _record_cache_event(sheet_name, "hits")
+            return entry
         
+        _record_cache_event(sheet_name, "misses")
+        # Staged updates must reach the sheet before it is re-read, or the new copy would drop them
+        await _flush_pending_writes(sheet_name, use_cron_sheet)
+        records = await _fetch_records(sheet_name, use_cron_sheet)
+        entry = _CachedTable(records)
+        _table_cache[cache_key] = entry
+        _seed_sheet_schema(sheet_name, use_cron_sheet, records)
+        _last_data_rows[cache_key] = len(records) + 1
+        logging.debug(f"CACHE MISS: Loaded {len(records)} records from '{sheet_name}'.")
+        return entry
+
+async def _sheets_get_tables(sheet_names: list[str], use_cron_sheet: bool = False) -> dict[str, list[dict] | None]:
+    """
+    Retrieves all records of several worksheets at once (e.g. everything a command is about to read).
+    
+    Tabs with a fresh cached copy are served from the cache; all the others are downloaded
+    together in one batchGet request and cached like get_all_records would.
+    """
+    names = list(dict.fromkeys(sheet_names))
+    tables: dict[str, _CachedTable] = {}
     try:
-        # Run the synchronous GSpread call in a separate thread
-        records = await asyncio.to_thread(sync_get_records)
-        return records if records else None
+        # 1. Serve what we can from the cache
+        for sheet_name in names:
+            if _get_table_ttl(sheet_name) > 0:
+                entry = _get_fresh_cached_table(sheet_name, use_cron_sheet)
+                if entry is not None:
+                    _record_cache_event(sheet_name, "hits")
+                    tables[sheet_name] = entry
+        
+        # 2. Download the rest together, holding their load locks (in a fixed order) so
+        #    concurrent get_all_records calls for the same tabs wait for this download
+        missing = sorted(name for name in names if name not in tables)
+        if missing:
+            async with contextlib.AsyncExitStack() as stack:
+                for sheet_name in missing:
+                    await stack.enter_async_context(_table_load_locks.setdefault((use_cron_sheet, sheet_name), asyncio.Lock()))
+                # Another caller may have loaded some of them while we waited
+                to_fetch = []
+                for sheet_name in missing:
+                    entry = _get_fresh_cached_table(sheet_name, use_cron_sheet) if _get_table_ttl(sheet_name) > 0 else None
+                    if entry is not None:
+                        _record_cache_event(sheet_name, "hits")
+                        tables[sheet_name] = entry
+                    else:
+                        to_fetch.append(sheet_name)
+                
+                if to_fetch:
+                    for sheet_name in to_fetch:
+                        await _flush_pending_writes(sheet_name, use_cron_sheet)
+                    fetched = await _fetch_many_records(to_fetch, use_cron_sheet)
+                    for sheet_name, records in fetched.items():
+                        entry = _CachedTable(records)
+                        if _get_table_ttl(sheet_name) > 0:
+                            _record_cache_event(sheet_name, "misses")
+                            _table_cache[(use_cron_sheet, sheet_name)] = entry
+                        _seed_sheet_schema(sheet_name, use_cron_sheet, records)
+                        _last_data_rows[(use_cron_sheet, sheet_name)] = len(records) + 1
+                        tables[sheet_name] = entry
+                    logging.debug(f"BATCH READ: Loaded {to_fetch} in one request.")
+    except Exception as e:
+        logging.error(f"GET TABLES ERROR for {names}: {e}")
+    
+    # Return new lists so callers can't reorder the cached rows
+    return {
+        sheet_name: list(tables[sheet_name].records) if sheet_name in tables and tables[sheet_name].records else None
+        for sheet_name in names
+    }
+
+def _project_records(records: list[dict], columns: list[str] | None, row_range: tuple[int, int | None] | None) -> list[dict]:
+    """Cuts records down to some columns and/or a slice of sheet rows (row 2 is records[0])."""
+    if row_range is not None:
+        first_row, last_row = row_range
+        records = records[max(first_row, 2) - 2:None if last_row is None else max(last_row - 1, 0)]
+    if columns is None:
+        return list(records)
+    return [{column: record.get(column, "") for column in columns} for record in records]
+
+async def _load_projection(sheet_name: str, use_cron_sheet: bool, columns: list[str] | None, row_range: tuple[int, int | None] | None) -> list[dict]:
+    """
+    Returns some columns/rows of a tab: cut from the full cached table when it is fresh, otherwise
+    from the projection cache, otherwise downloaded with _fetch_projection (and cached).
+    """
+    entry = _get_fresh_cached_table(sheet_name, use_cron_sheet) if _get_table_ttl(sheet_name) > 0 else None
+    if entry is not None:
+        _record_cache_event(sheet_name, "hits")
+        return _project_records(entry.records, columns, row_range)
+    return (await _load_projection_entry(sheet_name, use_cron_sheet, columns, row_range))[1]
+
+async def _load_projection_entry(sheet_name: str, use_cron_sheet: bool, columns: list[str] | None, row_range: tuple[int, int | None] | None) -> tuple[float, list[dict], dict]:
+    """Returns the (loaded_at, records, decoded views) projection cache entry, downloading it on a miss."""
+    projection_key = (tuple(columns) if columns is not None else None, row_range)
+    projections = _projection_cache.setdefault((use_cron_sheet, sheet_name), {})
+    cached = projections.get(projection_key)
+    if cached is not None and time.monotonic() - cached[0] <= _get_table_ttl(sheet_name):
+        _record_cache_event(sheet_name, "hits")
+        return cached
+    
+    _record_cache_event(sheet_name, "misses")
+    records = await _fetch_projection(sheet_name, use_cron_sheet, columns, row_range)
+    cached = (time.monotonic(), records, {})
+    if _get_table_ttl(sheet_name) > 0:
+        _projection_cache.setdefault((use_cron_sheet, sheet_name), {})[projection_key] = cached
+    logging.debug(f"PROJECTED READ: Loaded {len(records)} rows of {columns or 'all columns'} from '{sheet_name}'.")
+    return cached
+
+async def _sheets_get_all_records(sheet_name: str, use_cron_sheet: bool = False, columns: list[str] | None = None, row_range: tuple[int, int | None] | None = None) -> list[dict] | None:
+    """
+    Retrieves all records from a worksheet asynchronously.
+    
+    Results are served from the table cache while it is fresh; only a miss downloads the tab.
+    With columns and/or row_range, only that part of the tab is read (see _load_projection).
+    """
+    try:
+        if columns is not None or row_range is not None:
+            records = await _load_projection(sheet_name, use_cron_sheet, columns, row_range)
+            return list(records) or None
+        entry = await _load_table(sheet_name, use_cron_sheet)
+        # Return a new list so callers can't reorder the cached rows
+        return list(entry.records) if entry.records else None
     except Exception as e:
         logging.error(f"GET ALL RECORDS ERROR in {sheet_name}: {e}")
         return None
 
-async def find_records(sheet_name: str, filter_column: str, filter_value: str) -> list[dict] | None:
-    """Finds and returns a list of records (rows) matching a filter asynchronously."""
+async def _sheets_get_decoded_table(sheet_name: str, decoder, use_cron_sheet: bool = False, columns: list[str] | None = None):
+    """
+    Returns decoder(records) for a tab, computed once per loaded copy of the tab.
+    
+    The result is kept next to the cached records and recomputed only after the tab is
+    reloaded or patched by a write. With columns, an uncached tab is read with a projection.
+    """
+    try:
+        entry = _get_fresh_cached_table(sheet_name, use_cron_sheet) if _get_table_ttl(sheet_name) > 0 else None
+        if entry is None and columns is not None:
+            _, records, decoded = await _load_projection_entry(sheet_name, use_cron_sheet, columns, None)
+        else:
+            if entry is None:
+                entry = await _load_table(sheet_name, use_cron_sheet)
+            else:
+                _record_cache_event(sheet_name, "hits")
+            records, decoded = entry.records, entry.decoded
+        if decoder not in decoded:
+            decoded[decoder] = decoder(records)
+        return decoded[decoder]
+    except Exception as e:
+        logging.error(f"GET DECODED TABLE ERROR in {sheet_name}: {e}")
+        return None
+
+async def _sheets_get_headers(sheet_name: str, use_cron_sheet: bool = False) -> list[str] | None:
+    """Returns the header row of a worksheet from the schema cache (row 1 is read only if it isn't cached)."""
+    try:
+        return list((await _get_sheet_schema(sheet_name, use_cron_sheet)).headers) or None
+    except Exception as e:
+        logging.error(f"GET HEADERS ERROR in {sheet_name}: {e}")
+        return None
+
+def _sheets_get_table_generation(sheet_name: str, use_cron_sheet: bool = False) -> int | None:
+    """Returns the generation of the fresh cached copy of a tab, or None if it isn't cached."""
+    entry = _get_fresh_cached_table(sheet_name, use_cron_sheet) if _get_table_ttl(sheet_name) > 0 else None
+    return entry.generation if entry is not None else None
+
+async def _sheets_find_records(sheet_name: str, filter_column: str, filter_value: str, use_cron_sheet: bool = False, columns: list[str] | None = None) -> list[dict] | None:
+    """
+    Finds and returns a list of records (rows) matching a filter asynchronously.
+    
+    With columns, only those columns are returned; when the tab isn't cached, only those
+    columns (plus the filter column) are downloaded.
+    """
     logging.debug(f"DB QUERY: Finding records in '{sheet_name}' where {filter_column} == '{filter_value}'.")
     try:
-        # 1. Fetch all records from the sheet
-        all_records = await get_all_records(sheet_name) 
-        if not all_records:
+        if columns is not None and _get_fresh_cached_table(sheet_name, use_cron_sheet) is None:
+            # Projected lookup: scan just the needed columns
+            fetch_columns = list(dict.fromkeys([*columns, filter_column]))
+            key = _normalize_index_key(filter_value)
+            records = await _load_projection(sheet_name, use_cron_sheet, fetch_columns, None)
+            matches = [record for record in records if _normalize_index_key(record.get(filter_column)) == key]
+            return _project_records(matches, columns, None) or None
+        
+        # 1. Fetch the (cached) table for the sheet
+        entry = await _load_table(sheet_name, use_cron_sheet)
+        if not entry.records:
             return None
         
-        # 2. Filter records based on the criteria (case-insensitive and strict match)
-        filter_value_clean = str(filter_value).strip().lower()
-        matching_records = []
-        for record in all_records:
-            record_value = record.get(filter_column)
-            # Match if the cleaned record value equals the cleaned filter value
-            if record_value is not None and str(record_value).strip().lower() == filter_value_clean:
-                matching_records.append(record)
-                
-        return matching_records if matching_records else None
+        # 2. Look the value up in the column index (case-insensitive and strict match)
+        positions = _get_column_index(entry, filter_column).get(_normalize_index_key(filter_value))
+        if not positions:
+            return None
+        return _project_records([entry.records[position] for position in positions], columns, None)
     
     except Exception as e:
         logging.error(f"FIND RECORDS ERROR in {sheet_name}: {e}")
         return None
 
-async def update_row_by_filter(sheet_name: str, filter_column: str, filter_value: str, updates: dict) -> bool:
+async def find_record(sheet_name: str, filter_column: str, filter_value: str, use_cron_sheet: bool = False, columns: list[str] | None = None) -> dict | None:
+    """Returns the first record whose filter_column matches filter_value (case-insensitive), or None."""
+    records = await find_records(sheet_name, filter_column, filter_value, use_cron_sheet, columns)
+    return records[0] if records else None
+
+async def _sheets_update_row_by_filter(sheet_name: str, filter_column: str, filter_value: str, updates: dict) -> bool:
     """Updates the first row in a sheet that matches the filter criteria asynchronously."""
     logging.debug(f"DB WRITE: Attempting to update row in '{sheet_name}' where {filter_column} == '{filter_value}'.")
     
-    def sync_update_by_filter():
-        """Synchronous wrapper using GSpread's find and batch_update."""
-        sheet = get_worksheet_sync(sheet_name, False) # Assumes non-cron sheet for writing
+    try:
+        # 1. Get the column positions (cached header schema)
+        schema = await _resolve_sheet_schema(sheet_name, False, [filter_column, *updates]) # Assumes non-cron sheet for writing
         
-        # 1. Find the cell containing the filter value
+        # 2. Find the row containing the filter value (cached index first, else a search of that column)
         filter_value_str = str(filter_value)
-        try:
-            # GSpread's find is the most efficient way to locate a row synchronously
-            cell = sheet.find(filter_value_str, in_column=sheet.row_values(1).index(filter_column) + 1)
-        except gspread.exceptions.CellNotFound:
-            logging.warning(f"UPDATE FAILED: Value '{filter_value_str}' not found in column '{filter_column}' in sheet '{sheet_name}'.")
-            return False
-
-        row_num = cell.row # The 1-based row index to update
-        headers = sheet.row_values(1) # Get headers for column indexing
+        row_num = _get_cached_row_number(sheet_name, False, filter_column, filter_value)
+        if row_num is None:
+            filter_col_index = schema.column_indexes.get(filter_column)
+            row_num = await _find_row(sheet_name, False, filter_value_str, filter_col_index) if filter_col_index else None
+            if row_num is None:
+                logging.warning(f"UPDATE FAILED: Value '{filter_value_str}' not found in column '{filter_column}' in sheet '{sheet_name}'.")
+                return False
 
-        updates_list = []
-        for header, value in updates.items():
-            try:
-                col_index = headers.index(header) + 1 # 1-based column index
-                updates_list.append({
-                    'range': f"{gspread.utils.rowcol_to_a1(row_num, col_index)}",
-                    'values': [[str(value)]] # Values must be a list of lists of strings
-                })
-            except ValueError:
-                # Header not found, skip this update field
-                pass
-        
-        if updates_list:
-            sheet.batch_update(updates_list)
-            return True
-        return False
-        
-    try:
-        # Run the synchronous update logic in a separate thread
-        success = await asyncio.to_thread(sync_update_by_filter)
-        if success:
-            logging.info(f"DB WRITE SUCCESS: Row matching {filter_column}='{filter_value}' updated in {sheet_name}.")
-            return True
-        else:
+        # 3. Build the A1 ranges locally and write them
+        updates_list, written = _build_cell_updates(schema, row_num, updates)
+        if not updates_list:
             return False
+        await _write_cells(sheet_name, False, updates_list)
+        
+        # Keep the cached copy of the tab in step with the sheet
+        _patch_cached_row(sheet_name, False, row_num, written)
+        logging.info(f"DB WRITE SUCCESS: Row matching {filter_column}='{filter_value}' updated in {sheet_name}.")
+        return True
             
     except Exception as e:
         logging.error(f"UPDATE ROW ERROR in {sheet_name}: {e}")
+        # The write may or may not have landed, so the cached copy can't be trusted
+        invalidate_table_cache(sheet_name)
         return False
 
 # --- P3.1.2 Implementation: Legacy/ID-Based Utilities (Refactored to ASYNC) ---
 
-async def update_row_by_id(sheet_name: str, row_id: str, data: dict, user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+async def _sheets_update_row_by_id(sheet_name: str, row_id: str, data: dict, user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
     """Updates the specified row (found by ID assumed to be in the first column) with new data, asynchronously."""
     
-    # NOTE: This function's logic is highly similar to update_row_by_filter if the ID is known to be in column 1.
-    # For consistency, we keep the original logic structure but wrap it in a thread.
-    
     logging.info(f"Attempting to update row ID {row_id} in sheet: {sheet_name} (User: {user_id})")
     
-    def sync_update_by_id():
-        """Synchronous wrapper for GSpread's update by ID logic."""
-        
-        # 1. Prepare data with metadata
-        data_with_metadata = data.copy()
-        data_with_metadata['Last_Updated'] = datetime.now().isoformat()
-        data_with_metadata['Updated_By_User'] = str(user_id) if user_id is not None else 'SYSTEM'
-
-        sheet = get_worksheet_sync(sheet_name, use_cron_sheet)
-        
-        try:
-            # 2. Find the row number using gspread.Worksheet.find (assumes ID in first column)
-            cell = sheet.find(row_id)
-            row_num = cell.row # 1-based row index
-            
-            # 3. Get the column headers
-            headers = sheet.row_values(1)
-            
-            updates_list = []
-            for header, value in data_with_metadata.items():
-                try:
-                    col_index = headers.index(header) + 1 # 1-based column index
-                    updates_list.append({
-                        'range': f"{gspread.utils.rowcol_to_a1(row_num, col_index)}",
-                        'values': [[str(value)]]
-                    })
-                except ValueError:
-                    # Header not found in sheet, ignore this field
-                    pass
-            
-            # 4. Perform batch update
-            if updates_list:
-                sheet.batch_update(updates_list)
-                return True
-            else:
-                logging.warning(f"Update skipped for ID {row_id}: No valid fields provided after metadata injection.")
+    # 1. Prepare data with metadata
+    data_with_metadata = data.copy()
+    data_with_metadata[LAST_UPDATED_COLUMN] = datetime.now().isoformat()
+    data_with_metadata[UPDATED_BY_COLUMN] = str(user_id) if user_id is not None else 'SYSTEM'
+    
+    try:
+        # 2. Find the row number (cached ID index first, else a search of the first column)
+        row_num = _get_cached_row_number(sheet_name, use_cron_sheet, None, row_id)
+        if row_num is None:
+            row_num = await _find_row(sheet_name, use_cron_sheet, str(row_id), 1) # 1-based row index
+            if row_num is None:
+                logging.warning(f"Update failed: Row with ID {row_id} not found in sheet {sheet_name}.")
                 return False
-
-        except gspread.exceptions.CellNotFound:
-            logging.warning(f"Update failed: Row with ID {row_id} not found in sheet {sheet_name}.")
+        
+        # 3. Get the column positions (cached header schema) and build the A1 ranges locally
+        schema = await _resolve_sheet_schema(sheet_name, use_cron_sheet, data_with_metadata)
+        updates_list, written = _build_cell_updates(schema, row_num, data_with_metadata)
+        if not updates_list:
+            logging.warning(f"Update skipped for ID {row_id}: No valid fields provided after metadata injection.")
             return False
         
-        except Exception:
-            # Catch all other errors within the sync block
-            raise
+        # 4. Perform batch update
+        await _write_cells(sheet_name, use_cron_sheet, updates_list)
+        
+        # Keep the cached copy of the tab in step with the sheet
+        _patch_cached_row(sheet_name, use_cron_sheet, row_num, written)
+        logging.info(f"Successfully updated row ID {row_id} in sheet: {sheet_name}")
+        return True
     
-    try:
-        # Run the synchronous update logic in a separate thread
-        success = await asyncio.to_thread(sync_update_by_id)
-        if success:
-            logging.info(f"Successfully updated row ID {row_id} in sheet: {sheet_name}")
-            return True
-        return False
     except Exception as e:
         logging.error(f"FATAL Error during sheet update for ID {row_id} in {sheet_name}.", exc_info=True)
+        # The write may or may not have landed, so the cached copy can't be trusted
+        invalidate_table_cache(sheet_name, use_cron_sheet)
         return False  
 
 
+async def _sheets_update_rows_by_id(sheet_name: str, row_updates: dict[str, dict], user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+    """
+    Updates several rows (row ID -> data) in a single batch_update, asynchronously.
+    
+    Every ID is resolved before anything is written: if one is missing, no row is updated.
+    """
+    if not row_updates:
+        return True
+    logging.info(f"Attempting to update {len(row_updates)} row(s) in sheet: {sheet_name} (User: {user_id})")
+    
+    # 1. Prepare the metadata shared by every row
+    metadata = {
+        LAST_UPDATED_COLUMN: datetime.now().isoformat(),
+        UPDATED_BY_COLUMN: str(user_id) if user_id is not None else 'SYSTEM',
+    }
+    
+    try:
+        # Queued single-row updates to this sheet must land first, or their flush could undo ours
+        await _flush_pending_writes(sheet_name, use_cron_sheet)
+        
+        # 2. Resolve every row number from the (cached) table's ID index
+        await _load_table(sheet_name, use_cron_sheet)
+        row_nums = {row_id: _get_cached_row_number(sheet_name, use_cron_sheet, None, row_id) for row_id in row_updates}
+        missing = [row_id for row_id, row_num in row_nums.items() if row_num is None]
+        if missing:
+            logging.warning(f"Bulk update aborted: Row ID(s) {missing} not found in sheet {sheet_name}. Nothing was written.")
+            return False
+        
+        # 3. Build the cell updates for all rows against one schema
+        schema = await _resolve_sheet_schema(sheet_name, use_cron_sheet, {column for data in row_updates.values() for column in data} | set(metadata))
+        updates_list = []
+        patches = []
+        for row_id, data in row_updates.items():
+            row_cells, written = _build_cell_updates(schema, row_nums[row_id], {**data, **metadata})
+            updates_list.extend(row_cells)
+            patches.append((row_nums[row_id], written))
+        
+        # 4. One batch_update for everything
+        await _write_cells(sheet_name, use_cron_sheet, updates_list)
+        
+        # Keep the cached copy of the tab in step with the sheet
+        for row_num, written in patches:
+            _patch_cached_row(sheet_name, use_cron_sheet, row_num, written)
+        logging.info(f"Successfully updated {len(row_updates)} row(s) ({len(updates_list)} cells) in sheet: {sheet_name}")
+        return True
+    
+    except Exception as e:
+        logging.error(f"FATAL Error during bulk sheet update in {sheet_name}.", exc_info=True)
+        # The write may or may not have landed, so the cached copy can't be trusted
+        invalidate_table_cache(sheet_name, use_cron_sheet)
+        return False
+
 async def append_row(sheet_name: str, data: dict, user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
     """Appends a new row to the specified sheet asynchronously."""
-    logging.info(f"Attempting to append new row to sheet: {sheet_name} (User: {user_id})")
+    # A single row is just a one-element bulk append
+    return await append_rows(sheet_name, [data], user_id, use_cron_sheet)
+
+async def _sheets_append_rows(sheet_name: str, rows: list[dict], user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+    """
+    Appends several rows to the specified sheet in a single API request, asynchronously.
+    
+    Each dict is mapped to the sheet's columns by header name; missing columns are left empty.
+    """
+    if not rows:
+        return True
+    logging.info(f"Attempting to append {len(rows)} row(s) to sheet: {sheet_name} (User: {user_id})")
     
-    def sync_append_row():
-        """Synchronous wrapper for GSpread's append_row logic."""
+    # 1. Prepare the metadata shared by every row
+    metadata = {
+        LAST_UPDATED_COLUMN: datetime.now().isoformat(),
+        UPDATED_BY_COLUMN: str(user_id) if user_id is not None else 'SYSTEM',
+    }
         
-        # 1. Prepare data with metadata
-        data_with_metadata = data.copy()
-        data_with_metadata['Last_Updated'] = datetime.now().isoformat()
-        data_with_metadata['Updated_By_User'] = str(user_id) if user_id is not None else 'SYSTEM'
+    try:
+        # 2. Get the column headers once (cached header schema)
+        headers = (await _resolve_sheet_schema(sheet_name, use_cron_sheet, {column for row in rows for column in row})).headers
         
-        sheet = get_worksheet_sync(sheet_name, use_cron_sheet)
+        # 3. Build each row's list of values in the correct column order
+        all_row_values = []
+        for data in rows:
+            data_with_metadata = {**data, **metadata}
+            # Retrieve each value from the input data, default to an empty string
+            all_row_values.append([str(data_with_metadata.get(header, "")) for header in headers])
         
-        # 2. Get the column headers from the first row
-        headers = sheet.row_values(1)
+        logging.debug(f"Rows prepared for append (Sheet: {sheet_name}): {all_row_values}")
         
-        # 3. Build the list of values in the correct column order
-        row_values = []
-        for header in headers:
-            # Retrieve the value from the input data, default to an empty string
-            value = data_with_metadata.get(header, "")
-            row_values.append(str(value))
+        # 4. Append all rows to the sheet in one request
+        first_row_num = await _append_values(sheet_name, use_cron_sheet, all_row_values)
         
-        logging.debug(f"Row prepared for append (Sheet: {sheet_name}): {row_values}")
+        # Keep the cached copy of the tab in step with the sheet
+        _patch_cached_append(sheet_name, use_cron_sheet, first_row_num, [dict(zip(headers, row_values)) for row_values in all_row_values])
+        if first_row_num is not None:
+            _last_data_rows[(use_cron_sheet, sheet_name)] = first_row_num + len(all_row_values) - 1
+        logging.info(f"Successfully appended {len(rows)} row(s) to sheet: {sheet_name}")
+        return True
         
-        # 4. Append the row to the sheet
-        sheet.append_row(row_values)
-        return True # Indicate successful append
+    except Exception as e:
+        logging.error(f"FATAL Error during sheet append to {sheet_name}.", exc_info=True)
+        # The append may or may not have landed, so the cached copy can't be trusted
+        invalidate_table_cache(sheet_name, use_cron_sheet)
+        return False
         
+# --- Tail Reads: The Last Rows of Append-Only Tabs ---
+
+# Rows read per step when scanning back from the end of the grid for a tab's last data row
+TAIL_PROBE_ROWS = int(os.getenv("SHEETS_TAIL_PROBE_ROWS", "200"))
+
+# Last row with data per tab, learned from full loads, appends and tail reads. It may fall behind
+# rows other writers append; tail reads read on to the end of the tab, so they catch up.
+_last_data_rows: dict[tuple[bool, str], int] = {}
+
+async def _find_last_data_row(sheet_name: str, use_cron_sheet: bool) -> int:
+    """
+    Finds a tab's last row with data by scanning back from the end of its grid in growing windows
+    (the grid includes blank rows, e.g. the 1000 a new tab starts with). Returns 1 for a header-only tab.
+    """
+    end = await _fetch_grid_row_count(sheet_name, use_cron_sheet)
+    window = TAIL_PROBE_ROWS
+    while end >= 2:
+        start = max(end - window + 1, 2)
+        values = (await _fetch_value_ranges(sheet_name, use_cron_sheet, [gspread.utils.absolute_range_name(sheet_name, f"{start}:{end}")]))[0]
+        if values:
+            # Blank rows after the data are trimmed from the response, blank rows before it are not
+            return start + len(values) - 1
+        end = start - 1
+        window *= 2
+    return 1
+
+async def _read_tail(sheet_name: str, use_cron_sheet: bool, last_row: int, count: int) -> list[dict]:
+    """Reads every column from `count` rows before last_row to the end of the tab, and remembers where it ended."""
+    if last_row < 2:
+        return []
+    first_row = max(last_row - count + 1, 2)
+    records = await _load_projection(sheet_name, use_cron_sheet, None, (first_row, None))
+    if records:
+        _last_data_rows[(use_cron_sheet, sheet_name)] = first_row + len(records) - 1
+    return records
+
+async def _sheets_get_tail_records(sheet_name: str, count: int, use_cron_sheet: bool = False, columns: list[str] | None = None) -> list[dict] | None:
+    """
+    Returns the last `count` records of a worksheet (oldest first) without downloading the rest.
+    
+    Once the tab's last data row is known this is one request for the rows from there on
+    (whole rows, so a row with blank wanted columns still counts). Only the first tail read of a
+    tab has to find its end (see _find_last_data_row).
+    """
+    if count <= 0:
+        return None
     try:
-        # Run the synchronous append logic in a separate thread
-        success = await asyncio.to_thread(sync_append_row)
-        if success:
-            logging.info(f"Successfully appended row to sheet: {sheet_name}")
-            return True
-        return False
+        # 1. A fresh cached copy of the whole tab already has the tail
+        entry = _get_fresh_cached_table(sheet_name, use_cron_sheet) if _get_table_ttl(sheet_name) > 0 else None
+        if entry is not None:
+            _record_cache_event(sheet_name, "hits")
+            return _project_records(entry.records[-count:], columns, None) or None
+        
+        # 2. Read from just before the last row we know of to the end of the tab
+        known_last_row = _last_data_rows.get((use_cron_sheet, sheet_name))
+        if known_last_row is None:
+            records = await _read_tail(sheet_name, use_cron_sheet, await _find_last_data_row(sheet_name, use_cron_sheet), count)
+        else:
+            records = await _read_tail(sheet_name, use_cron_sheet, known_last_row, count)
+            if not records and known_last_row >= 2:
+                # Rows were deleted since: find the end again
+                logging.info(f"TAIL READ: '{sheet_name}' ends before row {known_last_row}; locating its last row again.")
+                records = await _read_tail(sheet_name, use_cron_sheet, await _find_last_data_row(sheet_name, use_cron_sheet), count)
         
+        # 3. Keep the last `count` rows (more arrive when other writers appended since)
+        return _project_records(records[-count:], columns, None) or None
     except Exception as e:
-        logging.error(f"FATAL Error during sheet append to {sheet_name}.", exc_info=True)
+        logging.error(f"GET TAIL RECORDS ERROR in {sheet_name}: {e}")
+        return None
+
+# --- Table Setup: Tabs the App Adds Itself ---
+
+# Grid rows given to a tab created by ensure_table (appends grow it as needed)
+NEW_TABLE_ROWS = 1000
+
+async def _sheets_ensure_table(sheet_name: str, headers: list[str], use_cron_sheet: bool = False) -> bool:
+    """Creates a worksheet with the given header row if it doesn't exist, or checks an existing one has every header."""
+    spreadsheet_key = _get_spreadsheet_key(use_cron_sheet)
+    
+    def ensure() -> list[str]:
+        spreadsheet = _get_spreadsheet_by_key(spreadsheet_key)
+        try:
+            header_row = spreadsheet.worksheet(sheet_name).row_values(1)
+        except gspread.exceptions.WorksheetNotFound:
+            worksheet = spreadsheet.add_worksheet(title=sheet_name, rows=NEW_TABLE_ROWS, cols=len(headers))
+            # On an empty worksheet the appended row becomes the header row
+            worksheet.append_row(headers)
+            logging.warning(f"TABLE CREATED: Worksheet '{sheet_name}' was missing and has been added with columns {headers}.")
+            return []
+        return [header for header in headers if header not in header_row]
+    
+    try:
+        missing = await call_with_rate_limit(WRITE, sheet_name, lambda: run_sheets_io(sheet_name, ensure))
+    except Exception as e:
+        logging.error(f"TABLE SETUP FAILED: Could not check or create worksheet '{sheet_name}'. Exception: {e}", exc_info=True)
+        return False
+    # The tab may be new, so nothing cached about it can be trusted
+    invalidate_sheet_schema(sheet_name, use_cron_sheet)
+    invalidate_table_cache(sheet_name, use_cron_sheet)
+    if missing:
+        logging.error(f"TABLE SETUP FAILED: Worksheet '{sheet_name}' is missing the column(s) {missing}; add them to its header row.")
         return False
+    return True
+
+# --- Write-Behind Queue: Coalesced Row Updates ---
+
+# How long queued row updates wait for company before being flushed as one batch_update.
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv("SHEETS_WRITE_BEHIND_FLUSH_SECONDS", "0.25"))
+
+class _PendingWrites:
+    """Cell updates waiting to be flushed to one worksheet, plus the callers waiting on them."""
+    __slots__ = ("cells", "waiters")
+
+    def __init__(self):
+        self.cells: dict[str, str] = {} # A1 -> value (a later write to the same cell replaces the earlier one)
+        self.waiters: list[asyncio.Future] = []
+
+_pending_writes: dict[tuple[bool, str], _PendingWrites] = {}
+_flush_tasks: dict[tuple[bool, str], asyncio.Task] = {}
+# Serializes flushes per worksheet so an older batch can never land after a newer one
+_flush_locks: dict[tuple[bool, str], asyncio.Lock] = {}
+
+async def _sheets_queue_row_update(sheet_name: str, row_id: str, data: dict, user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+    """
+    Queues an update of the row with the given ID (first column) and waits until it is written.
+    
+    Updates queued within WRITE_BEHIND_FLUSH_SECONDS of each other are sent to the worksheet
+    in a single batch_update. The cached table is patched immediately, so reads made while the
+    write is pending already see the new values. Returns True once the batch has been written.
+    A row the cache can't resolve (e.g. caching is off for the tab) is written directly instead.
+    """
+    logging.info(f"Queueing update of row ID {row_id} in sheet: {sheet_name} (User: {user_id})")
+    waiter = await _queue_row_updates(sheet_name, {row_id: data}, user_id, use_cron_sheet)
+    if waiter is None:
+        # Earlier queued updates go first, so they can't land on top of this one
+        await _flush_pending_writes(sheet_name, use_cron_sheet)
+        return await _sheets_update_row_by_id(sheet_name, row_id, data, user_id, use_cron_sheet)
+    # Wait until the batch containing this update is durable
+    return await waiter
+
+async def _sheets_stage_row_updates(sheet_name: str, row_updates: dict[str, dict], user_id: str | int | None = None, use_cron_sheet: bool = False) -> asyncio.Future:
+    """
+    Queues updates of several rows (row ID -> data) without waiting for the write: the cached table
+    is patched before this returns, and the returned future resolves once the batch is written.
+    Rows the cache can't resolve are written directly instead (the future is then already done).
+    """
+    logging.info(f"Staging update of {len(row_updates)} row(s) in sheet: {sheet_name} (User: {user_id})")
+    waiter = await _queue_row_updates(sheet_name, row_updates, user_id, use_cron_sheet)
+    if waiter is None:
+        waiter = asyncio.get_running_loop().create_future()
+        waiter.set_result(await _sheets_update_rows_by_id(sheet_name, row_updates, user_id, use_cron_sheet))
+    return waiter
+
+async def _queue_row_updates(sheet_name: str, row_updates: dict[str, dict], user_id: str | int | None, use_cron_sheet: bool) -> asyncio.Future | None:
+    """
+    Merges row updates into the worksheet's pending batch and patches the cached table.
+    Returns a future that resolves when the batch is written, or None (nothing queued) if a row
+    could not be resolved from the cached table; callers then write the rows directly.
+    """
+    cache_key = (use_cron_sheet, sheet_name)
+    
+    # 1. Prepare the metadata shared by every row
+    metadata = {
+        LAST_UPDATED_COLUMN: datetime.now().isoformat(),
+        UPDATED_BY_COLUMN: str(user_id) if user_id is not None else 'SYSTEM',
+    }
+    
+    try:
+        # 2. Resolve the row numbers from the (cached) table's ID index
+        await _load_table(sheet_name, use_cron_sheet)
+        row_nums = {row_id: _get_cached_row_number(sheet_name, use_cron_sheet, None, row_id) for row_id in row_updates}
         
+        # 3. Resolve the column positions (only reads the header row if the schema isn't cached yet)
+        schema = await _resolve_sheet_schema(sheet_name, use_cron_sheet, {column for data in row_updates.values() for column in data} | set(metadata))
+    except Exception as e:
+        logging.error(f"QUEUED UPDATE FAILED: Could not resolve row ID(s) {list(row_updates)} in {sheet_name}. Exception: {e}")
+        return None
+    
+    missing = [row_id for row_id, row_num in row_nums.items() if row_num is None]
+    if missing:
+        logging.info(f"QUEUED UPDATE: Row ID(s) {missing} are not in the cached copy of {sheet_name}; writing directly.")
+        return None
+    
+    updates_list = []
+    patches = []
+    for row_id, data in row_updates.items():
+        row_cells, written = _build_cell_updates(schema, row_nums[row_id], {**data, **metadata})
+        updates_list.extend(row_cells)
+        patches.append((row_nums[row_id], written))
+    if not updates_list:
+        logging.warning(f"Update skipped for ID(s) {list(row_updates)}: No valid fields provided after metadata injection.")
+        return None
+    
+    # 4. Merge into the pending batch for this worksheet (last writer wins per cell)
+    pending = _pending_writes.setdefault(cache_key, _PendingWrites())
+    for update in updates_list:
+        pending.cells[update['range']] = update['values'][0][0]
+    waiter = asyncio.get_running_loop().create_future()
+    pending.waiters.append(waiter)
+    
+    # Patch the cache now so follow-up commands in the same burst build on these values
+    for row_num, written in patches:
+        _patch_cached_row(sheet_name, use_cron_sheet, row_num, written)
+    
+    # 5. Make sure a flush is scheduled for this worksheet
+    if cache_key not in _flush_tasks:
+        _flush_tasks[cache_key] = asyncio.create_task(_flush_after_window(sheet_name, use_cron_sheet))
+    return waiter
+
+async def _flush_after_window(sheet_name: str, use_cron_sheet: bool) -> None:
+    """Waits for the write-behind window to close and then flushes the worksheet's pending updates."""
+    try:
+        await asyncio.sleep(WRITE_BEHIND_FLUSH_SECONDS)
+    finally:
+        _flush_tasks.pop((use_cron_sheet, sheet_name), None)
+        await _flush_pending_writes(sheet_name, use_cron_sheet)
+
+async def _flush_pending_writes(sheet_name: str, use_cron_sheet: bool) -> bool:
+    """Sends all pending cell updates for one worksheet in a single batch_update and resolves the waiters."""
+    cache_key = (use_cron_sheet, sheet_name)
+    async with _flush_locks.setdefault(cache_key, asyncio.Lock()):
+        pending = _pending_writes.pop(cache_key, None)
+        if pending is None or not pending.cells:
+            return True
+        
+        updates_list = [{'range': a1, 'values': [[value]]} for a1, value in pending.cells.items()]
+        try:
+            await _write_cells(sheet_name, use_cron_sheet, updates_list)
+            logging.info(f"WRITE-BEHIND FLUSH: {len(updates_list)} cell(s) from {len(pending.waiters)} update(s) written to {sheet_name}.")
+            success = True
+        except Exception as e:
+            logging.error(f"WRITE-BEHIND FLUSH FAILED for {sheet_name}: {e}", exc_info=True)
+            # The cache was patched optimistically, so it no longer matches the sheet
+            invalidate_table_cache(sheet_name, use_cron_sheet)
+            success = False
+    
+    for waiter in pending.waiters:
+        if not waiter.done():
+            waiter.set_result(success)
+    return success
+
+async def _sheets_flush_pending_writes() -> bool:
+    """Immediately flushes every worksheet's queued updates (e.g. on shutdown). Returns True if all succeeded."""
+    results = [await _flush_pending_writes(sheet_name, use_cron_sheet) for use_cron_sheet, sheet_name in list(_pending_writes)]
+    return all(results)
+        
+# --- Storage Backend Selection ---
+
+class SheetsBackend(StorageBackend):
+    """The Google Sheets implementation: cached reads, schema-aware batched writes and the write-behind queue."""
+
+    async def get_all_records(self, sheet_name, use_cron_sheet=False, columns=None, row_range=None):
+        return await _sheets_get_all_records(sheet_name, use_cron_sheet, columns, row_range)
+
+    async def get_tables(self, sheet_names, use_cron_sheet=False):
+        return await _sheets_get_tables(sheet_names, use_cron_sheet)
+
+    async def get_decoded_table(self, sheet_name, decoder, use_cron_sheet=False, columns=None):
+        return await _sheets_get_decoded_table(sheet_name, decoder, use_cron_sheet, columns)
+
+    async def get_headers(self, sheet_name, use_cron_sheet=False):
+        return await _sheets_get_headers(sheet_name, use_cron_sheet)
+
+    def get_table_generation(self, sheet_name, use_cron_sheet=False):
+        return _sheets_get_table_generation(sheet_name, use_cron_sheet)
+
+    async def get_tail_records(self, sheet_name, count, use_cron_sheet=False, columns=None):
+        return await _sheets_get_tail_records(sheet_name, count, use_cron_sheet, columns)
+
+    async def find_records(self, sheet_name, filter_column, filter_value, use_cron_sheet=False, columns=None):
+        return await _sheets_find_records(sheet_name, filter_column, filter_value, use_cron_sheet, columns)
+
+    async def update_row_by_filter(self, sheet_name, filter_column, filter_value, updates):
+        return await _sheets_update_row_by_filter(sheet_name, filter_column, filter_value, updates)
+
+    async def update_row_by_id(self, sheet_name, row_id, data, user_id=None, use_cron_sheet=False):
+        return await _sheets_update_row_by_id(sheet_name, row_id, data, user_id, use_cron_sheet)
+
+    async def update_rows_by_id(self, sheet_name, row_updates, user_id=None, use_cron_sheet=False):
+        return await _sheets_update_rows_by_id(sheet_name, row_updates, user_id, use_cron_sheet)
+
+    async def append_rows(self, sheet_name, rows, user_id=None, use_cron_sheet=False):
+        return await _sheets_append_rows(sheet_name, rows, user_id, use_cron_sheet)
+
+    async def queue_row_update(self, sheet_name, row_id, data, user_id=None, use_cron_sheet=False):
+        return await _sheets_queue_row_update(sheet_name, row_id, data, user_id, use_cron_sheet)
+
+    async def stage_row_updates(self, sheet_name, row_updates, user_id=None, use_cron_sheet=False):
+        return await _sheets_stage_row_updates(sheet_name, row_updates, user_id, use_cron_sheet)
+
+    async def ensure_table(self, sheet_name, headers, use_cron_sheet=False):
+        return await _sheets_ensure_table(sheet_name, headers, use_cron_sheet)
+
+    async def flush_pending_writes(self):
+        return await _sheets_flush_pending_writes()
+
+_storage_backend: StorageBackend | None = None
+
+def get_storage_backend() -> StorageBackend:
+    """Returns the backend selected by STORAGE_BACKEND (created on first use)."""
+    global _storage_backend
+    if _storage_backend is None:
+        if STORAGE_BACKEND == "sqlite":
+            from sheets.sqlite_backend import SQLiteBackend
+            _storage_backend = SQLiteBackend()
+        elif STORAGE_BACKEND == "mirror":
+            from sheets.mirror import MirrorBackend
+            _storage_backend = MirrorBackend()
+        else:
+            if STORAGE_BACKEND != "sheets":
+                logging.warning(f"STORAGE BACKEND: Unknown backend '{STORAGE_BACKEND}', falling back to Google Sheets.")
+            _storage_backend = SheetsBackend()
+    return _storage_backend
+
+async def start_storage_backend() -> None:
+    """Prepares the active backend before serving requests (e.g. the mirror's initial sync)."""
+    await get_storage_backend().start()
+
+def set_storage_backend(backend: StorageBackend | None) -> None:
+    """Replaces the active backend (None goes back to the STORAGE_BACKEND default on next use)."""
+    global _storage_backend
+    _storage_backend = backend
+
+# --- Public Record API (dispatches to the active storage backend) ---
+
+async def get_all_records(sheet_name: str, use_cron_sheet: bool = False, columns: list[str] | None = None, row_range: tuple[int, int | None] | None = None) -> list[dict] | None:
+    """
+    Retrieves all records from a worksheet asynchronously.
+    
+    columns limits each record to those columns; row_range = (first_row, last_row) limits the
+    result to those sheet rows (data starts at row 2, last_row None = to the end).
+    """
+    return await get_storage_backend().get_all_records(sheet_name, use_cron_sheet, columns, row_range)
+
+async def get_tables(sheet_names: list[str], use_cron_sheet: bool = False) -> dict[str, list[dict] | None]:
+    """
+    Retrieves all records of several worksheets in one round trip, keyed by sheet name
+    (None for an empty or unreadable tab). Useful to prefetch every tab a command needs.
+    """
+    return await get_storage_backend().get_tables(sheet_names, use_cron_sheet)
+
+async def get_decoded_table(sheet_name: str, decoder, use_cron_sheet: bool = False, columns: list[str] | None = None):
+    """
+    Returns decoder(records) for a tab (e.g. typed records plus lookup dicts), decoding each
+    loaded copy of the tab only once. Returns None if the tab could not be read.
+    """
+    return await get_storage_backend().get_decoded_table(sheet_name, decoder, use_cron_sheet, columns)
+
+async def get_headers(sheet_name: str, use_cron_sheet: bool = False) -> list[str] | None:
+    """Returns the columns of a tab in sheet order (e.g. to check for an optional column), or None if unreadable."""
+    return await get_storage_backend().get_headers(sheet_name, use_cron_sheet)
+
+def get_table_generation(sheet_name: str, use_cron_sheet: bool = False) -> int | None:
+    """
+    Returns a number that changes whenever a tab is reloaded or changed outside this process
+    (but not by our own writes), or None if unknown. Lets callers keep derived state up to date
+    incrementally and rebuild it only when the generation moves.
+    """
+    return get_storage_backend().get_table_generation(sheet_name, use_cron_sheet)
+
+async def get_tail_records(sheet_name: str, count: int, use_cron_sheet: bool = False, columns: list[str] | None = None) -> list[dict] | None:
+    """
+    Retrieves the last `count` records of a worksheet (oldest first), or None if it is empty or
+    could not be read. Only those rows are downloaded, so for append-only tabs (e.g. Price_History)
+    the cost stays the same however long the tab grows.
+    """
+    return await get_storage_backend().get_tail_records(sheet_name, count, use_cron_sheet, columns)
+
+async def find_records(sheet_name: str, filter_column: str, filter_value: str, use_cron_sheet: bool = False, columns: list[str] | None = None) -> list[dict] | None:
+    """Finds and returns a list of records (rows) matching a filter asynchronously (case-insensitive), optionally only some columns."""
+    return await get_storage_backend().find_records(sheet_name, filter_column, filter_value, use_cron_sheet, columns)
+
+async def update_row_by_filter(sheet_name: str, filter_column: str, filter_value: str, updates: dict) -> bool:
+    """Updates the first row in a sheet that matches the filter criteria asynchronously."""
+    return await get_storage_backend().update_row_by_filter(sheet_name, filter_column, filter_value, updates)
+
+async def update_row_by_id(sheet_name: str, row_id: str, data: dict, user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+    """Updates the row whose ID (first column) is row_id with new data, asynchronously."""
+    return await get_storage_backend().update_row_by_id(sheet_name, row_id, data, user_id, use_cron_sheet)
+
+async def update_rows_by_id(sheet_name: str, row_updates: dict[str, dict], user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+    """Updates several rows (row ID -> data) in one operation; nothing is written if any ID is missing."""
+    return await get_storage_backend().update_rows_by_id(sheet_name, row_updates, user_id, use_cron_sheet)
+
+async def append_rows(sheet_name: str, rows: list[dict], user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+    """Appends several rows to the specified sheet in one operation, asynchronously."""
+    return await get_storage_backend().append_rows(sheet_name, rows, user_id, use_cron_sheet)
+
+async def queue_row_update(sheet_name: str, row_id: str, data: dict, user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+    """Updates a row by ID, letting the backend batch it with other updates. Returns True once written."""
+    return await get_storage_backend().queue_row_update(sheet_name, row_id, data, user_id, use_cron_sheet)
+
+async def stage_row_updates(sheet_name: str, row_updates: dict[str, dict], user_id: str | int | None = None, use_cron_sheet: bool = False) -> asyncio.Future:
+    """
+    Updates several rows (row ID -> data) without waiting for the write: reads see the new values
+    once this returns, and the returned future resolves to True when they are written.
+    """
+    return await get_storage_backend().stage_row_updates(sheet_name, row_updates, user_id, use_cron_sheet)
+
+async def ensure_table(sheet_name: str, headers: list[str], use_cron_sheet: bool = False) -> bool:
+    """Creates a tab with this header row if it doesn't exist; False if it can't be created or lacks a column."""
+    return await get_storage_backend().ensure_table(sheet_name, headers, use_cron_sheet)
+
+async def flush_pending_writes() -> bool:
+    """Immediately writes out anything the backend is holding (e.g. on shutdown). Returns True if all succeeded."""
+    return await get_storage_backend().flush_pending_writes()
+
 # --- P7.1.D4 Implementation: Config Utilities ---
 
 async def read_config_value(key: str) -> str | None:
@@ -311,40 +1443,110 @@ async def update_config_value(key: str, new_value: str) -> bool:
         logging.error(f"CONFIG WRITE ERROR for key '{key}': {e}")
         return False
         
-async def get_next_unique_id(key: str, prefix: str) -> str | None:
-    """
-    Retrieves the next ID from the Config sheet, increments the counter, and returns the ID.
-    This operation handles the read-increment-write sequence atomically (via locking/single thread).
-    """
-    # 1. READ: Safely retrieve the current ID string (e.g., 'REC001')
+# --- ID Allocation: Block Reservation per Config Key ---
+
+# How many IDs one Config write reserves. IDs left unused when the process stops become gaps:
+# Sheets has no compare-and-write, so the counter is never moved back (another process may have
+# reserved the IDs after ours in the meantime).
+ID_BLOCK_SIZE = int(os.getenv("SHEETS_ID_BLOCK_SIZE", "20"))
+
+class _IdBlock:
+    """A range of reserved IDs for one Config key: next_num up to (not including) end_num."""
+    __slots__ = ("prefix", "next_num", "end_num", "padding_len")
+
+    def __init__(self, prefix: str, next_num: int, end_num: int, padding_len: int):
+        self.prefix = prefix
+        self.next_num = next_num
+        self.end_num = end_num
+        self.padding_len = padding_len
+
+    def remaining(self) -> int:
+        return self.end_num - self.next_num
+
+    def format(self, num: int) -> str:
+        return self.prefix + str(num).zfill(self.padding_len)
+
+# Reserved blocks and the locks that serialize allocation, per Config key
+_id_blocks: dict[str, _IdBlock] = {}
+_id_locks: dict[str, asyncio.Lock] = {}
+
+async def _reserve_id_block(key: str, prefix: str, count: int) -> _IdBlock | None:
+    """Reserves `count` IDs for a Config key by moving its counter forward in one write."""
+    # 1. READ: Safely retrieve the next free ID string (e.g., 'REC001')
+    # Read it fresh: the cached Config copy would not show a block another process reserved since
+    invalidate_table_cache(CONFIG_SHEET)
     current_id_str = await read_config_value(key)
     if not current_id_str:
         logging.error(f"ID GENERATION ERROR: Config key '{key}' not found or read failed.")
         return None
 
-    # 2. CALCULATE: Extract number, increment, and pad back to string
+    # 2. CALCULATE: Extract the number and the padding
     try:
         # Assumes format is always [PREFIX][NUMBER]
+        current_id_str = str(current_id_str)
         current_num = int(current_id_str.replace(prefix, ''))
-        next_num = current_num + 1
-        
         # Determine padding length from the current ID string
         padding_len = len(current_id_str) - len(prefix)
-        next_id_str = prefix + str(next_num).zfill(padding_len)
-        
     except ValueError as e:
         logging.error(f"ID GENERATION ERROR: ID Formatting error for {current_id_str}: {e}")
         return None
-        
-    # 3. WRITE: Update the Config sheet with the NEXT ID
+
+    block = _IdBlock(prefix, current_num, current_num + count, padding_len)
+
+    # 3. WRITE: Move the Config counter past the whole block
     try:
-        if await update_config_value(key, next_id_str):
-            # Return the CURRENT ID string, as the NEXT ID has been reserved for the future
-            logging.info(f"Generated and reserved new ID: {current_id_str}")
-            return current_id_str
-        else:
-            logging.error(f"ID GENERATION FAILED: Could not write next ID {next_id_str} for key {key}. Rollback needed.")
-            return None
+        if await update_config_value(key, block.format(block.end_num)):
+            logging.info(f"ID BLOCK RESERVED: {block.format(block.next_num)}..{block.format(block.end_num - 1)} for key {key}.")
+            return block
+        logging.error(f"ID GENERATION FAILED: Could not reserve {count} IDs for key {key}.")
+        return None
     except Exception as e:
         logging.error(f"ID GENERATION FATAL ERROR: DB Write error for Config key {key}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+async def reserve_unique_ids(key: str, prefix: str, count: int) -> list[str] | None:
+    """
+    Returns `count` new unique IDs for a Config key (e.g. 'NEXT_MAP_ID').
+    
+    IDs are handed out from a block reserved in memory; the Config sheet is only written
+    when the block runs out, and then once for the whole shortfall (at least ID_BLOCK_SIZE).
+    Returns None if the IDs could not be reserved.
+    """
+    if count <= 0:
+        return []
+    lock = _id_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        block = _id_blocks.get(key)
+        if block is not None and block.prefix != prefix:
+            # The prefix changed, so the old block no longer applies
+            block = None
+        
+        ids = []
+        while block is not None and block.remaining() > 0 and len(ids) < count:
+            ids.append(block.format(block.next_num))
+            block.next_num += 1
+        
+        shortfall = count - len(ids)
+        if shortfall:
+            new_block = await _reserve_id_block(key, prefix, max(ID_BLOCK_SIZE, shortfall))
+            if new_block is None:
+                # Put back what we took so those IDs are not lost
+                if block is not None:
+                    block.next_num -= len(ids)
+                return None
+            block = new_block
+            _id_blocks[key] = block
+            for _ in range(shortfall):
+                ids.append(block.format(block.next_num))
+                block.next_num += 1
+        
+        logging.info(f"Generated new ID(s) for {key}: {ids[0]}" + (f" .. {ids[-1]}" if len(ids) > 1 else ""))
+        return ids
+
+async def get_next_unique_id(key: str, prefix: str) -> str | None:
+    """
+    Returns the next unique ID for a Config key (e.g. 'REC001').
+    Served from the in-memory reserved block; see reserve_unique_ids.
+    """
+    ids = await reserve_unique_ids(key, prefix, 1)
+    return ids[0] if ids else None
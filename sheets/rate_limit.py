@@ -0,0 +1,130 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import gspread
+
+# Per-minute request budgets. Google's default quota is 60 read and 60 write requests per
+# minute per user; raise these if the project has been granted more.
+SHEETS_READ_REQUESTS_PER_MINUTE = float(os.getenv("SHEETS_READ_REQUESTS_PER_MINUTE", "60"))
+SHEETS_WRITE_REQUESTS_PER_MINUTE = float(os.getenv("SHEETS_WRITE_REQUESTS_PER_MINUTE", "60"))
+
+# How many requests of one kind may go out back-to-back before the per-minute rate applies
+SHEETS_RATE_BURST = float(os.getenv("SHEETS_RATE_BURST", "10"))
+
+# Exponential backoff for 429/5xx responses: 1s, 2s, 4s, ... (each with random jitter),
+# never sleeping longer than the max delay and giving up once the total budget is spent.
+SHEETS_RETRY_BASE_SECONDS = float(os.getenv("SHEETS_RETRY_BASE_SECONDS", "1"))
+SHEETS_RETRY_MAX_DELAY_SECONDS = float(os.getenv("SHEETS_RETRY_MAX_DELAY_SECONDS", "32"))
+SHEETS_RETRY_MAX_TOTAL_SECONDS = float(os.getenv("SHEETS_RETRY_MAX_TOTAL_SECONDS", "60"))
+
+READ = "read"
+WRITE = "write"
+
+class TokenBucket:
+    """
+    An asyncio token bucket: requests take one token each, and tokens refill continuously
+    at the per-minute rate up to the burst capacity.
+    """
+
+    def __init__(self, requests_per_minute: float, capacity: float):
+        self.rate = requests_per_minute / 60.0 # Tokens per second
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> float:
+        """Takes one token, sleeping until one is available. Returns the seconds spent waiting."""
+        waited = 0.0
+        # The lock keeps callers in arrival order, so a burst drains at exactly the quota rate
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1.0:
+                delay = (1.0 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self.tokens -= 1.0
+        return waited
+
+    def drain(self) -> None:
+        """Empties the bucket after the API reported we are over quota."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+_buckets = {
+    READ: TokenBucket(SHEETS_READ_REQUESTS_PER_MINUTE, SHEETS_RATE_BURST),
+    WRITE: TokenBucket(SHEETS_WRITE_REQUESTS_PER_MINUTE, SHEETS_RATE_BURST),
+}
+
+# Counters per request kind: 'throttled' = had to wait for a token, 'retried' = re-sent after
+# a 429/5xx, 'gave_up' = still failing when the retry budget ran out
+_rate_limit_stats: dict[str, dict[str, int]] = {
+    kind: {"requests": 0, "throttled": 0, "retried": 0, "gave_up": 0} for kind in (READ, WRITE)
+}
+
+def get_rate_limit_stats() -> dict[str, dict[str, int]]:
+    """Returns a snapshot of the request/throttled/retried counters per request kind."""
+    return {kind: dict(counters) for kind, counters in _rate_limit_stats.items()}
+
+def _error_status(error: Exception) -> int | None:
+    """Returns the HTTP status behind a Sheets API error, or None for other exceptions."""
+    if not isinstance(error, gspread.exceptions.APIError):
+        return None
+    if isinstance(error.code, int) and error.code > 0:
+        return error.code
+    # Responses that weren't JSON get code -1, so fall back to the HTTP status itself
+    return getattr(error.response, "status_code", None)
+
+def is_retryable_error(error: Exception) -> bool:
+    """Returns True for quota (429) and server-side (5xx) errors, which are worth retrying."""
+    status = _error_status(error)
+    return status is not None and (status == 429 or status >= 500)
+
+def _backoff_delay(attempt: int) -> float:
+    """Returns the sleep before retry number `attempt` (0-based): exponential with full jitter."""
+    ceiling = min(SHEETS_RETRY_MAX_DELAY_SECONDS, SHEETS_RETRY_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(ceiling / 2, ceiling)
+
+async def call_with_rate_limit(kind: str, description: str, request):
+    """
+    Awaits request() once a token of the given kind ('read' or 'write') is available.
+
+    429 and 5xx errors are retried with jittered exponential backoff until
+    SHEETS_RETRY_MAX_TOTAL_SECONDS is used up; the last error is then re-raised.
+    Other errors are raised immediately.
+    """
+    bucket = _buckets[kind]
+    counters = _rate_limit_stats[kind]
+    started_at = time.monotonic()
+    attempt = 0
+
+    while True:
+        if await bucket.acquire() > 0:
+            counters["throttled"] += 1
+        counters["requests"] += 1
+        try:
+            return await request()
+        except Exception as e:
+            if not is_retryable_error(e):
+                raise
+            if _error_status(e) == 429:
+                # Our budget is out of step with Google's; stop everyone else from piling on
+                bucket.drain()
+            delay = _backoff_delay(attempt)
+            elapsed = time.monotonic() - started_at
+            if elapsed + delay > SHEETS_RETRY_MAX_TOTAL_SECONDS:
+                counters["gave_up"] += 1
+                logging.error(f"RATE LIMIT: Giving up on {kind} '{description}' after {attempt + 1} attempts ({elapsed:.1f}s): {e}")
+                raise
+            counters["retried"] += 1
+            logging.warning(f"RATE LIMIT: {kind} '{description}' failed with {_error_status(e)}; retrying in {delay:.2f}s (attempt {attempt + 1}).")
+            await asyncio.sleep(delay)
+            attempt += 1
@@ -0,0 +1,352 @@
+import os
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+import gspread
+from sheets.storage import StorageBackend
+
+# Where the local database lives (created on first use)
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "bakery.db")
+
+LAST_UPDATED_COLUMN = 'Last_Updated'
+UPDATED_BY_COLUMN = 'Updated_By_User'
+
+# Config rows a new database starts with: the ID counters (next free ID) and the stock ledger
+# checkpoint. A Google Sheets install has them in its Config tab; the mirror copies them from there.
+CONFIG_SHEET = 'Config'
+CONFIG_KEY_COLUMN = 'Key'
+CONFIG_VALUE_COLUMN = 'Value'
+SQLITE_CONFIG_DEFAULTS = {
+    'NEXT_ING_ID': 'ING001',
+    'NEXT_RECIPE_ID': 'REC001',
+    'NEXT_MAP_ID': 'MAP001',
+    'LEDGER_CHECKPOINT': '1',
+}
+
+def _quote(identifier: str) -> str:
+    """Quotes a table/column name for SQL (headers may contain spaces or punctuation)."""
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+def _normalize_key(value) -> str:
+    """Normalizes a filter value the same way the Sheets index does (see queries._normalize_index_key)."""
+    return str(value).strip().lower()
+
+def _match_expression(column: str) -> str:
+    """SQL for the normalized form of a column. Indexes are built on this exact expression."""
+    return f"lower(trim({_quote(column)}))"
+
+def _is_name_column(column: str) -> bool:
+    """Returns True for name columns ('Name', 'Ingredient_Name', ...), which get an index up front."""
+    return column == 'Name' or column.endswith('_Name')
+
+class SQLiteBackend(StorageBackend):
+    """
+    Stores every worksheet as a SQLite table in one local file.
+
+    Columns mirror the sheet headers and are added the first time a write uses them.
+    Values are stored as text, like the Sheets cells, and numericised on read. The ID (first)
+    column and the name columns are indexed; any other column gets an index the first time
+    it is used as a filter.
+
+    Queries run directly on the event loop: they are local and take well under a millisecond,
+    which is cheaper than a thread hop.
+
+    start() seeds a new database's Config with SQLITE_CONFIG_DEFAULTS; other tables are created
+    by the first write (or filled with load_records).
+    """
+
+    def __init__(self, path: str = SQLITE_DB_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        self._columns: dict[str, list[str]] = {} # table -> columns in order
+        self._indexed: set[tuple[str, str]] = set()
+        self._generations: dict[str, int] = {} # table -> bumped when rows change other than through our writes
+        logging.info(f"SQLITE BACKEND: Using database at '{path}'.")
+
+    # --- Table and Column Helpers ---
+
+    @staticmethod
+    def table_name(sheet_name: str, use_cron_sheet: bool = False) -> str:
+        """Returns the SQL table holding a worksheet (tabs of the analytics spreadsheet are prefixed)."""
+        return f"cron__{sheet_name}" if use_cron_sheet else sheet_name
+
+    def _get_columns(self, table: str) -> list[str]:
+        """Returns the columns of a table in order (empty if the table doesn't exist yet)."""
+        columns = self._columns.get(table)
+        if columns is None:
+            info = self._conn.execute(f"PRAGMA table_info({_quote(table)})").fetchall()
+            columns = [row[1] for row in info]
+            if columns:
+                self._columns[table] = columns
+        return columns
+
+    def _ensure_index(self, table: str, column: str) -> None:
+        """Creates the normalized-match index for a column if it doesn't exist yet."""
+        if (table, column) in self._indexed:
+            return
+        index_name = _quote(f"idx__{table}__{column}")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {_quote(table)} ({_match_expression(column)})")
+        self._indexed.add((table, column))
+
+    def _ensure_columns(self, table: str, columns) -> list[str]:
+        """Creates the table and/or adds missing columns so every given column exists. Returns all columns."""
+        existing = self._get_columns(table)
+        missing = [c for c in dict.fromkeys(columns) if c not in existing]
+        if not missing:
+            return existing
+        if not existing:
+            column_sql = ", ".join(_quote(c) for c in missing)
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} ({column_sql})")
+            logging.info(f"SQLITE BACKEND: Created table '{table}' with columns {missing}.")
+        else:
+            for column in missing:
+                self._conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(column)}")
+            logging.info(f"SQLITE BACKEND: Added column(s) {missing} to '{table}'.")
+        columns = existing + missing
+        self._columns[table] = columns
+        # The first column holds the row IDs; name columns are the other common lookups
+        for column in columns:
+            if column == columns[0] or _is_name_column(column):
+                self._ensure_index(table, column)
+        return columns
+
+    def _rows_to_records(self, columns: list[str], rows) -> list[dict]:
+        """Builds get_all_records-style dicts (blank for NULL, numericised cells)."""
+        return [
+            dict(zip(columns, gspread.utils.numericise_all(["" if v is None else str(v) for v in row], default_blank="")))
+            for row in rows
+        ]
+
+    def _select(self, table: str, where: str = "", params: tuple = (), columns: list[str] | None = None, row_range: tuple[int, int | None] | None = None) -> list[dict]:
+        existing = self._get_columns(table)
+        if not existing:
+            return []
+        columns = existing if columns is None else list(columns)
+        # Columns the table doesn't have come back blank, like on Sheets
+        column_sql = ", ".join(_quote(c) if c in existing else "''" for c in columns)
+        limit_sql = ""
+        if row_range is not None:
+            # Sheet row 2 is the first data row, i.e. OFFSET 0
+            first_row, last_row = row_range
+            offset = max(first_row, 2) - 2
+            limit = -1 if last_row is None else max(last_row - 1 - offset, 0)
+            limit_sql = f" LIMIT {int(limit)} OFFSET {int(offset)}"
+        rows = self._conn.execute(f"SELECT {column_sql} FROM {_quote(table)} {where} ORDER BY rowid{limit_sql}", params).fetchall()
+        return self._rows_to_records(columns, rows)
+
+    def _after_write(self, table: str, rowid: int, operation: str) -> None:
+        """Hook called inside the write transaction for every row written ('update' or 'append')."""
+
+    def _first_match_rowid(self, table: str, match_column: str, match_value) -> int | None:
+        """Returns the rowid of the first row (in insertion order) whose match_column matches, or None."""
+        if match_column not in self._get_columns(table):
+            return None
+        self._ensure_index(table, match_column)
+        row = self._conn.execute(
+            f"SELECT rowid FROM {_quote(table)} WHERE {_match_expression(match_column)} = ? ORDER BY rowid LIMIT 1",
+            (_normalize_key(match_value),),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def _update_rowids(self, table: str, updates: list[tuple[int, dict]]) -> None:
+        """Writes (rowid, fields) pairs in one transaction."""
+        self._ensure_columns(table, [c for _, fields in updates for c in fields])
+        with self._conn:
+            self._conn.execute("BEGIN")
+            for rowid, fields in updates:
+                set_sql = ", ".join(f"{_quote(c)} = ?" for c in fields)
+                self._conn.execute(
+                    f"UPDATE {_quote(table)} SET {set_sql} WHERE rowid = ?",
+                    (*[str(v) for v in fields.values()], rowid),
+                )
+                self._after_write(table, rowid, "update")
+
+    def _update_first_match(self, table: str, match_column: str, match_value, fields: dict) -> bool:
+        """Updates the first row (in insertion order) whose match_column matches. Returns False if none does."""
+        rowid = self._first_match_rowid(table, match_column, match_value)
+        if rowid is None:
+            return False
+        self._update_rowids(table, [(rowid, fields)])
+        return True
+
+    @staticmethod
+    def _metadata(user_id: str | int | None) -> dict:
+        return {
+            LAST_UPDATED_COLUMN: datetime.now().isoformat(),
+            UPDATED_BY_COLUMN: str(user_id) if user_id is not None else 'SYSTEM',
+        }
+
+    def _bump_generation(self, table: str) -> None:
+        self._generations[table] = self._generations.get(table, 0) + 1
+
+    # --- StorageBackend Operations ---
+
+    def get_table_generation(self, sheet_name: str, use_cron_sheet: bool = False) -> int | None:
+        # Only load_records (and the mirror's pulls) change a table behind the API's back
+        return self._generations.get(self.table_name(sheet_name, use_cron_sheet), 0)
+
+    async def get_headers(self, sheet_name: str, use_cron_sheet: bool = False) -> list[str] | None:
+        try:
+            with self._lock:
+                return list(self._get_columns(self.table_name(sheet_name, use_cron_sheet))) or None
+        except sqlite3.Error as e:
+            logging.error(f"GET HEADERS ERROR in {sheet_name} (SQLite): {e}")
+            return None
+
+    async def get_all_records(self, sheet_name: str, use_cron_sheet: bool = False, columns: list[str] | None = None, row_range: tuple[int, int | None] | None = None) -> list[dict] | None:
+        try:
+            with self._lock:
+                records = self._select(self.table_name(sheet_name, use_cron_sheet), columns=columns, row_range=row_range)
+            return records or None
+        except sqlite3.Error as e:
+            logging.error(f"GET ALL RECORDS ERROR in {sheet_name} (SQLite): {e}")
+            return None
+
+    async def get_tail_records(self, sheet_name: str, count: int, use_cron_sheet: bool = False, columns: list[str] | None = None) -> list[dict] | None:
+        if count <= 0:
+            return None
+        table = self.table_name(sheet_name, use_cron_sheet)
+        try:
+            with self._lock:
+                if not self._get_columns(table):
+                    return None
+                row_total = self._conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}").fetchone()[0]
+                # Data starts at sheet row 2, so the last row is row_total + 1
+                records = self._select(table, columns=columns, row_range=(row_total - count + 2, None))
+            return records or None
+        except sqlite3.Error as e:
+            logging.error(f"GET TAIL RECORDS ERROR in {sheet_name} (SQLite): {e}")
+            return None
+
+    async def find_records(self, sheet_name: str, filter_column: str, filter_value: str, use_cron_sheet: bool = False, columns: list[str] | None = None) -> list[dict] | None:
+        table = self.table_name(sheet_name, use_cron_sheet)
+        try:
+            with self._lock:
+                if filter_column not in self._get_columns(table):
+                    return None
+                self._ensure_index(table, filter_column)
+                records = self._select(table, f"WHERE {_match_expression(filter_column)} = ?", (_normalize_key(filter_value),), columns=columns)
+            return records or None
+        except sqlite3.Error as e:
+            logging.error(f"FIND RECORDS ERROR in {sheet_name} (SQLite): {e}")
+            return None
+
+    async def update_row_by_filter(self, sheet_name: str, filter_column: str, filter_value: str, updates: dict) -> bool:
+        try:
+            with self._lock:
+                updated = self._update_first_match(self.table_name(sheet_name), filter_column, filter_value, updates)
+            if not updated:
+                logging.warning(f"UPDATE FAILED: Value '{filter_value}' not found in column '{filter_column}' in table '{sheet_name}'.")
+            return updated
+        except sqlite3.Error as e:
+            logging.error(f"UPDATE ROW ERROR in {sheet_name} (SQLite): {e}")
+            return False
+
+    async def update_row_by_id(self, sheet_name: str, row_id: str, data: dict, user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+        table = self.table_name(sheet_name, use_cron_sheet)
+        try:
+            with self._lock:
+                columns = self._get_columns(table)
+                updated = bool(columns) and self._update_first_match(table, columns[0], row_id, {**data, **self._metadata(user_id)})
+            if not updated:
+                logging.warning(f"Update failed: Row with ID {row_id} not found in table {sheet_name}.")
+            return updated
+        except sqlite3.Error as e:
+            logging.error(f"FATAL Error during SQLite update for ID {row_id} in {sheet_name}: {e}")
+            return False
+
+    async def update_rows_by_id(self, sheet_name: str, row_updates: dict[str, dict], user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+        table = self.table_name(sheet_name, use_cron_sheet)
+        metadata = self._metadata(user_id)
+        try:
+            with self._lock:
+                columns = self._get_columns(table)
+                rowids = {row_id: self._first_match_rowid(table, columns[0], row_id) if columns else None for row_id in row_updates}
+                missing = [row_id for row_id, rowid in rowids.items() if rowid is None]
+                if missing:
+                    logging.warning(f"Bulk update aborted: Row ID(s) {missing} not found in table {sheet_name}. Nothing was written.")
+                    return False
+                self._update_rowids(table, [(rowids[row_id], {**data, **metadata}) for row_id, data in row_updates.items()])
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"FATAL Error during SQLite bulk update in {sheet_name}: {e}")
+            return False
+
+    async def append_rows(self, sheet_name: str, rows: list[dict], user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+        if not rows:
+            return True
+        table = self.table_name(sheet_name, use_cron_sheet)
+        metadata = self._metadata(user_id)
+        try:
+            with self._lock:
+                columns = self._ensure_columns(table, [c for row in rows for c in row] + list(metadata))
+                column_sql = ", ".join(_quote(c) for c in columns)
+                placeholders = ", ".join("?" for _ in columns)
+                # One transaction for all rows, like the single append request on Sheets
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    for row in rows:
+                        cursor = self._conn.execute(
+                            f"INSERT INTO {_quote(table)} ({column_sql}) VALUES ({placeholders})",
+                            [str({**row, **metadata}.get(c, "")) for c in columns],
+                        )
+                        self._after_write(table, cursor.lastrowid, "append")
+            logging.info(f"Successfully appended {len(rows)} row(s) to table: {sheet_name} (SQLite)")
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"FATAL Error during SQLite append to {sheet_name}: {e}")
+            return False
+
+    # --- Seeding ---
+
+    async def start(self) -> None:
+        """Adds any missing Config defaults, so a new database can hand out IDs straight away."""
+        await self.seed_config()
+
+    async def ensure_table(self, sheet_name: str, headers: list[str], use_cron_sheet: bool = False) -> bool:
+        """Creates the table, or adds the columns it is missing, so it has every header."""
+        try:
+            with self._lock:
+                self._ensure_columns(self.table_name(sheet_name, use_cron_sheet), headers)
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"SQLITE BACKEND: Could not create table '{sheet_name}': {e}")
+            return False
+
+    async def seed_config(self, defaults: dict[str, str] = SQLITE_CONFIG_DEFAULTS) -> list[str]:
+        """Adds the Config keys that are missing (existing values are kept). Returns the keys added."""
+        table = self.table_name(CONFIG_SHEET)
+        try:
+            with self._lock:
+                present = {_normalize_key(record.get(CONFIG_KEY_COLUMN, "")) for record in self._select(table, columns=[CONFIG_KEY_COLUMN])}
+        except sqlite3.Error as e:
+            logging.error(f"SQLITE BACKEND: Could not read {CONFIG_SHEET} to seed it: {e}")
+            return []
+        missing = [key for key in defaults if _normalize_key(key) not in present]
+        if missing and await self.append_rows(CONFIG_SHEET, [{CONFIG_KEY_COLUMN: key, CONFIG_VALUE_COLUMN: defaults[key]} for key in missing]):
+            logging.info(f"SQLITE BACKEND: Seeded {CONFIG_SHEET} with {missing}.")
+            return missing
+        return []
+
+    def load_records(self, sheet_name: str, records: list[dict], use_cron_sheet: bool = False) -> None:
+        """Replaces a table's contents with the given records (e.g. to seed it from the Google Sheet)."""
+        table = self.table_name(sheet_name, use_cron_sheet)
+        with self._lock:
+            columns = self._ensure_columns(table, [c for record in records for c in record])
+            if not columns:
+                return
+            column_sql = ", ".join(_quote(c) for c in columns)
+            placeholders = ", ".join("?" for _ in columns)
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute(f"DELETE FROM {_quote(table)}")
+                self._conn.executemany(
+                    f"INSERT INTO {_quote(table)} ({column_sql}) VALUES ({placeholders})",
+                    [[str(record.get(c, "")) for c in columns] for record in records],
+                )
+            self._bump_generation(table)
+        logging.info(f"SQLITE BACKEND: Loaded {len(records)} record(s) into '{table}'.")
@@ -0,0 +1,111 @@
+import asyncio
+from abc import ABC, abstractmethod
+
+class StorageBackend(ABC):
+    """
+    The record-level operations sheets.queries delegates to.
+
+    Records are dicts keyed by column header, and values are numericised the way gspread's
+    get_all_records does it. Tables are addressed by worksheet name; use_cron_sheet selects the
+    analytics spreadsheet instead of the bakery one. A row's ID is the value in its first column,
+    and filter/ID matches ignore case and surrounding whitespace.
+
+    Config values and unique IDs are built on top of these operations (see
+    queries.read_config_value and queries.reserve_unique_ids), so every backend supports them.
+    """
+
+    @abstractmethod
+    async def get_all_records(self, sheet_name: str, use_cron_sheet: bool = False, columns: list[str] | None = None, row_range: tuple[int, int | None] | None = None) -> list[dict] | None:
+        """
+        Returns every record of a table, or None if it is empty or could not be read.
+        columns limits each record to those keys; row_range = (first_row, last_row) uses sheet
+        row numbers (data starts at row 2, last_row None = to the end).
+        """
+
+    async def get_tail_records(self, sheet_name: str, count: int, use_cron_sheet: bool = False, columns: list[str] | None = None) -> list[dict] | None:
+        """
+        Returns the last `count` records of a table (oldest first), or None if there are none.
+        Backends should read only those rows; this default reads the whole table and slices it.
+        """
+        records = await self.get_all_records(sheet_name, use_cron_sheet, columns)
+        return records[-count:] if records and count > 0 else None
+
+    async def get_tables(self, sheet_names: list[str], use_cron_sheet: bool = False) -> dict[str, list[dict] | None]:
+        """Returns get_all_records for several tables, keyed by name. Backends can fetch them in one round trip."""
+        return {sheet_name: await self.get_all_records(sheet_name, use_cron_sheet) for sheet_name in dict.fromkeys(sheet_names)}
+
+    async def get_decoded_table(self, sheet_name: str, decoder, use_cron_sheet: bool = False, columns: list[str] | None = None):
+        """
+        Returns decoder(records) for a table. Backends with a cache can memoize it, and should return
+        None if the table could not be read; this default can't tell that from an empty table
+        (get_all_records returns None for both), so it decodes either as decoder([]).
+        """
+        records = await self.get_all_records(sheet_name, use_cron_sheet, columns)
+        return decoder(records or [])
+
+    async def get_headers(self, sheet_name: str, use_cron_sheet: bool = False) -> list[str] | None:
+        """
+        Returns a table's columns in order, or None if it could not be read. Backends should answer
+        from the header row alone; this default reads the table and returns its first record's keys.
+        """
+        records = await self.get_all_records(sheet_name, use_cron_sheet)
+        return list(records[0]) if records else None
+
+    def get_table_generation(self, sheet_name: str, use_cron_sheet: bool = False) -> int | None:
+        """
+        Returns a number that changes when a table is reloaded or changed from outside this process
+        (our own writes don't change it). None means unknown: derived state must be rebuilt.
+        """
+        return None
+
+    @abstractmethod
+    async def find_records(self, sheet_name: str, filter_column: str, filter_value: str, use_cron_sheet: bool = False, columns: list[str] | None = None) -> list[dict] | None:
+        """Returns the records (optionally only some columns) whose filter_column matches filter_value, or None if there are none."""
+
+    @abstractmethod
+    async def update_row_by_filter(self, sheet_name: str, filter_column: str, filter_value: str, updates: dict) -> bool:
+        """Updates the first row matching the filter (no audit columns are added)."""
+
+    @abstractmethod
+    async def update_row_by_id(self, sheet_name: str, row_id: str, data: dict, user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+        """Updates the row with the given ID and stamps Last_Updated / Updated_By_User."""
+
+    async def update_rows_by_id(self, sheet_name: str, row_updates: dict[str, dict], user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+        """
+        Updates several rows (row ID -> data) in one operation. Backends should check every ID first
+        and write nothing if one is missing; this default falls back to one update per row.
+        """
+        results = [await self.update_row_by_id(sheet_name, row_id, data, user_id, use_cron_sheet) for row_id, data in row_updates.items()]
+        return all(results)
+
+    @abstractmethod
+    async def append_rows(self, sheet_name: str, rows: list[dict], user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+        """Appends rows (stamped with Last_Updated / Updated_By_User) in one operation."""
+
+    async def start(self) -> None:
+        """Prepares the backend before the first request (e.g. initial sync). Nothing to do by default."""
+
+    async def ensure_table(self, sheet_name: str, headers: list[str], use_cron_sheet: bool = False) -> bool:
+        """
+        Makes sure a table exists with (at least) these columns, creating it if it is missing.
+        Returns False if it could not be created or lacks some of the columns. Assumed by default.
+        """
+        return True
+
+    async def queue_row_update(self, sheet_name: str, row_id: str, data: dict, user_id: str | int | None = None, use_cron_sheet: bool = False) -> bool:
+        """Like update_row_by_id, but the backend may batch it with other updates. Writes immediately by default."""
+        return await self.update_row_by_id(sheet_name, row_id, data, user_id, use_cron_sheet)
+
+    async def stage_row_updates(self, sheet_name: str, row_updates: dict[str, dict], user_id: str | int | None = None, use_cron_sheet: bool = False) -> asyncio.Future:
+        """
+        Like update_rows_by_id, but returns as soon as reads see the new values; the returned future
+        resolves to True once the rows are written (False if that failed). Backends with a
+        write-behind queue write them later, in a batch; this default writes them right away.
+        """
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(await self.update_rows_by_id(sheet_name, row_updates, user_id, use_cron_sheet))
+        return future
+
+    async def flush_pending_writes(self) -> bool:
+        """Writes out anything the backend is still holding (e.g. on shutdown). Returns True if all succeeded."""
+        return True
@@ -0,0 +1,116 @@
+import os
+import sys
+import asyncio
+import pytest
+
+# sheets.queries reads these at import time
+os.environ.setdefault("GOOGLE_SHEETS_NAME_BAKERY", "test-bakery")
+os.environ.setdefault("GOOGLE_SHEETS_NAME_ANALYTICS", "test-analytics")
+os.environ["STORAGE_BACKEND"] = "sheets"
+# The fake client answers instantly, so don't pace requests or wait long for write-behind batches
+os.environ["SHEETS_READ_REQUESTS_PER_MINUTE"] = "1000000"
+os.environ["SHEETS_WRITE_REQUESTS_PER_MINUTE"] = "1000000"
+os.environ["SHEETS_RATE_BURST"] = "1000000"
+os.environ["SHEETS_WRITE_BEHIND_FLUSH_SECONDS"] = "0.05"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sheets import client as sheets_client, queries
+from sheets.sqlite_backend import SQLiteBackend
+from services import alerts, ingredients, undo, units
+from tests.fake_sheets import FakeClient
+
+# --- Event Loop ---
+# Module-level locks and queues bind to the loop that first uses them, so every test shares one.
+
+@pytest.fixture(scope="session")
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+@pytest.fixture
+def run(event_loop):
+    """Runs a coroutine to completion on the shared loop."""
+    return event_loop.run_until_complete
+
+# --- Storage ---
+
+def bakery_tabs() -> dict[str, list[list]]:
+    """A small bakery spreadsheet: three ingredients, unit rules, Config counters and empty logs."""
+    return {
+        "Ingredients": [
+            ["ID", "Name", "Unit", "Quantity", "Cost Per Unit", "Last_Updated", "Updated_By_User"],
+            ["ING001", "Flour", "g", "1000.0000", "0.0050", "", ""],
+            ["ING002", "Sugar", "g", "500.0000", "0.0100", "", ""],
+            ["ING003", "Eggs", "unit", "12", "0.3000", "", ""],
+        ],
+        "Units": [
+            ["From_Unit", "To_Unit", "Conversion_Rate"],
+            ["kg", "g", "1000"], ["l", "ml", "1000"], ["lb", "g", "453.592"],
+        ],
+        "Config": [
+            ["Key", "Value", "Last_Updated", "Updated_By_User"],
+            ["NEXT_ING_ID", "ING004", "", ""], ["NEXT_RECIPE_ID", "REC001", "", ""],
+            ["NEXT_MAP_ID", "MAP001", "", ""], ["LEDGER_CHECKPOINT", "1", "", ""],
+        ],
+        "Price_History": [["ingredients_Id", "old_cost_per_unit", "new_cost_per_unit", "Last_Updated", "Updated_By_User"]],
+        "Stock_Ledger": [["Event_ID", "Ingredient_ID", "Event_Type", "Quantity_Delta", "Quantity_After", "Cost_Per_Unit", "Cost_Before", "Update_ID", "Last_Updated", "Updated_By_User"]],
+        "Undo_Index": [["User", "Transactions", "Last_Updated", "Updated_By_User"]],
+        "Recipes": [["Recipe_ID", "Name", "Yield", "Unit", "Is_Active", "Last_Updated", "Updated_By_User"]],
+        "Recipe_Ingredients_Map": [["Map_ID", "Recipe_ID", "Ingredient_ID", "Required_Quantity", "Required_Unit", "Last_Updated", "Updated_By_User"]],
+    }
+
+def _reset_state() -> None:
+    """Forgets everything the storage layer and the services keep in memory between commands."""
+    queries.invalidate_table_cache()
+    queries._table_cache_stats.clear()
+    queries._header_cache.clear()
+    queries._last_data_rows.clear()
+    queries._pending_writes.clear()
+    queries._flush_tasks.clear()
+    queries._spreadsheet_handles.clear()
+    queries._worksheet_handles.clear()
+    queries._id_blocks.clear()
+    queries.set_storage_backend(None)
+    ingredients._latest_price_changes.clear()
+    ingredients._price_history_scanned_rows = None
+    ingredients._compiled_unit_rules = None
+    ingredients._inventory = ingredients.InventoryAggregate()
+    ingredients._snapshot_lagging = False
+    undo._undo_index.clear()
+    undo._persisted_users.clear()
+    alerts._below_reorder_level.clear()
+    alerts._pending_alerts.clear()
+    units._alias_lookup = units._compile_aliases(units.DEFAULT_UNIT_ALIASES)
+
+def _cancel_background_tasks(loop: asyncio.AbstractEventLoop) -> None:
+    """Cancels what a test left running (write-behind flushes, undo saves) so it can't touch the next test."""
+    tasks = [task for task in asyncio.all_tasks(loop) if not task.done()]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+@pytest.fixture(autouse=True)
+def fresh_state(event_loop):
+    _reset_state()
+    yield
+    _cancel_background_tasks(event_loop)
+    _reset_state()
+
+@pytest.fixture
+def fake_sheets():
+    """The Google Sheets backend talking to an in-memory spreadsheet (see tests.fake_sheets)."""
+    client = FakeClient(bakery_tabs())
+    previous = sheets_client._sheets_client
+    sheets_client._sheets_client = client
+    yield client
+    sheets_client._sheets_client = previous
+
+@pytest.fixture
+def sqlite():
+    """An in-memory SQLite backend, active for the test."""
+    backend = SQLiteBackend(":memory:")
+    queries.set_storage_backend(backend)
+    return backend
@@ -0,0 +1,126 @@
+"""An in-memory stand-in for the gspread client, covering the calls sheets.queries makes."""
+import re
+import gspread
+from gspread.utils import a1_to_rowcol, column_letter_to_index, numericise_all
+
+class FakeCell:
+    def __init__(self, row: int, col: int):
+        self.row, self.col = row, col
+
+class FakeWorksheet:
+    """A worksheet held as a list of rows of strings (row 1 is the header row)."""
+
+    def __init__(self, title: str, rows: list[list], calls: list):
+        self.title = title
+        self.rows = [[str(value) for value in row] for row in rows]
+        self.calls = calls
+
+    def _log(self, method: str) -> None:
+        self.calls.append((self.title, method))
+
+    def get_all_records(self, **kwargs) -> list[dict]:
+        self._log("get_all_records")
+        return _records(self.rows)
+
+    def row_values(self, row: int) -> list[str]:
+        self._log("row_values")
+        return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def find(self, query: str, in_column: int | None = None, **kwargs) -> FakeCell | None:
+        self._log("find")
+        for row_index, row in enumerate(self.rows, start=1):
+            for col_index, value in enumerate(row, start=1):
+                if value == query and in_column in (None, col_index):
+                    return FakeCell(row_index, col_index)
+        return None
+
+    def batch_update(self, data: list[dict], **kwargs) -> None:
+        self._log("batch_update")
+        for update in data:
+            first_row, first_col = a1_to_rowcol(update["range"].split("!")[-1].split(":")[0])
+            for i, values in enumerate(update["values"]):
+                for j, value in enumerate(values):
+                    self._set(first_row + i, first_col + j, value)
+
+    def append_rows(self, values: list[list], **kwargs) -> dict:
+        self._log("append_rows")
+        first = len(self.rows) + 1
+        self.rows.extend([str(value) for value in row] for row in values)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{first}:A{len(self.rows)}"}}
+
+    def append_row(self, values: list, **kwargs) -> dict:
+        return self.append_rows([values])
+
+    def _set(self, row: int, col: int, value) -> None:
+        while len(self.rows) < row:
+            self.rows.append([])
+        cells = self.rows[row - 1]
+        while len(cells) < col:
+            cells.append("")
+        cells[col - 1] = str(value)
+
+    def get_range(self, a1_range: str) -> list[list[str]]:
+        """Values of an A1 range such as 'B2:C', 'A10:E' or '1:1' (open ends run to the last row/column)."""
+        start, _, stop = a1_range.partition(":")
+        first_row, first_col = _parse_a1(start, 1)
+        last_row, last_col = _parse_a1(stop or start, len(self.rows))
+        if not re.match(r"[A-Z]", stop or start):
+            last_col = max((len(row) for row in self.rows), default=0)
+        return [row[first_col - 1:last_col] for row in self.rows[first_row - 1:last_row]]
+
+class FakeSpreadsheet:
+    def __init__(self, tabs: dict[str, FakeWorksheet], calls: list):
+        self.tabs = tabs
+        self.calls = calls
+
+    def worksheet(self, name: str) -> FakeWorksheet:
+        if name not in self.tabs:
+            raise gspread.exceptions.WorksheetNotFound(name)
+        return self.tabs[name]
+
+    def add_worksheet(self, title: str, rows: int, cols: int, **kwargs) -> FakeWorksheet:
+        self.calls.append((title, "add_worksheet"))
+        self.tabs[title] = FakeWorksheet(title, [], self.calls)
+        return self.tabs[title]
+
+    def fetch_sheet_metadata(self, params: dict | None = None) -> dict:
+        # Real grids keep blank rows after the data
+        return {"sheets": [{"properties": {"title": title, "gridProperties": {"rowCount": len(tab.rows) + 100}}} for title, tab in self.tabs.items()]}
+
+    def values_batch_get(self, ranges: list[str], params: dict | None = None) -> dict:
+        value_ranges = []
+        for a1 in ranges:
+            title, _, cells = a1.partition("!")
+            tab = self.tabs[title.strip("'")]
+            tab._log("values_batch_get")
+            value_ranges.append({"range": a1, "values": tab.get_range(cells) if cells else [list(row) for row in tab.rows]})
+        return {"valueRanges": value_ranges}
+
+class FakeClient:
+    """One spreadsheet for every key; tabs maps worksheet name -> rows (header row first)."""
+
+    def __init__(self, tabs: dict[str, list[list]]):
+        self.calls: list[tuple[str, str]] = []
+        self.tabs = {title: FakeWorksheet(title, rows, self.calls) for title, rows in tabs.items()}
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        return FakeSpreadsheet(self.tabs, self.calls)
+
+    def rows(self, title: str) -> list[list[str]]:
+        return self.tabs[title].rows
+
+    def count(self, title: str, method: str) -> int:
+        return self.calls.count((title, method))
+
+def _parse_a1(cell: str, default_row: int) -> tuple[int, int]:
+    match = re.match(r"([A-Z]*)(\d*)", cell)
+    col = column_letter_to_index(match.group(1)) if match.group(1) else 1
+    row = int(match.group(2)) if match.group(2) else default_row
+    return row, col
+
+def _records(rows: list[list[str]]) -> list[dict]:
+    """get_all_records: one dict per data row, keyed by the header row, numericised."""
+    if not rows:
+        return []
+    headers = rows[0]
+    return [dict(zip(headers, numericise_all(row + [""] * (len(headers) - len(row)), default_blank=""))) for row in rows[1:]]
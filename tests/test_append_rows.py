@@ -0,0 +1,30 @@
+from sheets import queries
+from services import recipe
+
+def test_rows_go_out_in_one_request_in_column_order(run, fake_sheets):
+    rows = [{"Recipe_ID": "REC001", "Name": f"Loaf {i}", "Yield": i} for i in range(3)]
+    assert run(queries.append_rows("Recipes", rows, user_id="ann"))
+    assert fake_sheets.count("Recipes", "append_rows") == 1
+    written = fake_sheets.rows("Recipes")[1:]
+    assert [row[:5] for row in written] == [["REC001", f"Loaf {i}", str(i), "", ""] for i in range(3)]
+    assert all(row[6] == "ann" and row[5] for row in written)
+
+def test_empty_append_sends_nothing(run, fake_sheets):
+    assert run(queries.append_rows("Recipes", []))
+    assert fake_sheets.count("Recipes", "append_rows") == 0
+
+def test_recipe_components_are_written_in_one_append(run, fake_sheets):
+    fake_sheets.rows("Recipes").append(["REC001", "Sourdough Loaf", "2", "unit", "TRUE", "", ""])
+    success, message = run(recipe.add_recipe_components("sourdough loaf", [("Flour", 500, "g"), ("eggs", 2, "unit")], user_id="ann"))
+    assert success, message
+    assert fake_sheets.count("Recipe_Ingredients_Map", "append_rows") == 1
+    assert [row[:5] for row in fake_sheets.rows("Recipe_Ingredients_Map")[1:]] == [
+        ["MAP001", "REC001", "ING001", "500.00", "g"],
+        ["MAP002", "REC001", "ING003", "2.00", "unit"],
+    ]
+
+def test_nothing_is_written_when_a_component_is_unknown(run, fake_sheets):
+    fake_sheets.rows("Recipes").append(["REC001", "Sourdough Loaf", "2", "unit", "TRUE", "", ""])
+    success, message = run(recipe.add_recipe_components("Sourdough Loaf", [("Flour", 500, "g"), ("Saffron", 1, "g")]))
+    assert not success and "Saffron" in message
+    assert len(fake_sheets.rows("Recipe_Ingredients_Map")) == 1
@@ -0,0 +1,107 @@
+import json
+from urllib.parse import unquote
+import gspread
+import httpx
+import pytest
+from sheets import async_client, queries
+from sheets.async_client import AsyncSheetsClient
+from tests.fake_sheets import FakeClient
+from tests.conftest import bakery_tabs
+
+BASE_URL = "http://sheets.test/v4/spreadsheets"
+
+class FakeValuesApi:
+    """Serves the Sheets values API over httpx.MockTransport from a FakeClient's tabs."""
+
+    def __init__(self, client: FakeClient):
+        self.client = client
+        self.requests: list[tuple[str, str]] = []
+        self.fail_with: int | None = None
+
+    def _tab(self, a1: str):
+        title, _, cells = a1.partition("!")
+        return self.client.tabs.get(title.strip("'")), cells
+
+    def _values(self, a1: str) -> list[list[str]]:
+        tab, cells = self._tab(a1)
+        return tab.get_range(cells) if cells else [list(row) for row in tab.rows]
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        path = unquote(request.url.path)[len("/v4/spreadsheets/"):]
+        self.requests.append((request.method, path))
+        if self.fail_with is not None:
+            return httpx.Response(self.fail_with, json={"error": {"code": self.fail_with, "message": "Denied", "status": "PERMISSION_DENIED"}})
+        _, _, rest = path.partition("/values")
+        if rest == ":batchGet":
+            ranges = request.url.params.get_list("ranges")
+            return httpx.Response(200, json={"valueRanges": [{"range": a1, "values": self._values(a1)} for a1 in ranges]})
+        if rest == ":batchUpdate":
+            for update in json.loads(request.content)["data"]:
+                tab, cells = self._tab(update["range"])
+                tab.batch_update([{"range": cells, "values": update["values"]}])
+            return httpx.Response(200, json={})
+        if rest.endswith(":append"):
+            tab, _ = self._tab(rest[1:-len(":append")])
+            return httpx.Response(200, json=tab.append_rows(json.loads(request.content)["values"]))
+        tab, _ = self._tab(rest[1:])
+        if tab is None:
+            return httpx.Response(400, json={"error": {"code": 400, "message": "Unable to parse range", "status": "INVALID_ARGUMENT"}})
+        return httpx.Response(200, json={"values": self._values(rest[1:])})
+
+@pytest.fixture
+def values_api():
+    return FakeValuesApi(FakeClient(bakery_tabs()))
+
+@pytest.fixture
+def api_client(run, values_api):
+    client = AsyncSheetsClient(base_url=BASE_URL, transport=httpx.MockTransport(values_api))
+    yield client
+    run(client.aclose())
+
+@pytest.fixture
+def async_transport(monkeypatch, api_client):
+    """Routes sheets.queries through the native asyncio client instead of gspread."""
+    monkeypatch.setattr(queries, "SHEETS_TRANSPORT", "async")
+    monkeypatch.setattr(async_client, "_async_sheets_client", api_client)
+    return api_client
+
+# --- Client ---
+
+def test_values_get_and_batch_get(run, api_client):
+    values = run(api_client.values_get("key", "'Ingredients'!A1:B2"))
+    assert values == [["ID", "Name"], ["ING001", "Flour"]]
+    units, config = run(api_client.values_batch_get("key", ["'Units'!A2:A2", "'Config'!A2:B2"]))
+    assert units == [["kg"]]
+    assert config == [["NEXT_ING_ID", "ING004"]]
+
+def test_error_responses_raise_api_error(run, values_api, api_client):
+    values_api.fail_with = 403
+    with pytest.raises(gspread.exceptions.APIError) as raised:
+        run(api_client.values_get("key", "'Ingredients'"))
+    assert raised.value.response.status_code == 403
+
+def test_values_append_and_batch_update(run, values_api, api_client):
+    run(api_client.values_append("key", "'Units'!A1", [["oz", "g", "28.3495"]]))
+    run(api_client.values_batch_update("key", [{"range": "'Units'!C2", "values": [["1000.0"]]}]))
+    rows = values_api.client.rows("Units")
+    assert rows[-1] == ["oz", "g", "28.3495"]
+    assert rows[1] == ["kg", "g", "1000.0"]
+
+# --- Queries on the Async Transport ---
+
+def test_queries_read_and_write_through_the_values_api(run, values_api, async_transport):
+    records = run(queries.get_all_records("Ingredients"))
+    assert [(r["ID"], r["Quantity"]) for r in records] == [("ING001", 1000), ("ING002", 500), ("ING003", 12)]
+
+    assert run(queries.update_row_by_id("Ingredients", "ING002", {"Quantity": "450.0000"}, user_id="ann"))
+    assert run(queries.append_row("Units", {"From_Unit": "oz", "To_Unit": "g", "Conversion_Rate": "28.3495"}))
+    run(queries.flush_pending_writes())
+
+    assert values_api.client.rows("Ingredients")[2][3] == "450.0000"
+    assert values_api.client.rows("Units")[-1][:3] == ["oz", "g", "28.3495"]
+    methods = [method for method, _ in values_api.requests]
+    assert methods.count("POST") == 2 # One batchUpdate and one append
+
+def test_unreadable_tab_reads_as_none(run, values_api, async_transport):
+    values_api.fail_with = 403
+    assert run(queries.get_all_records("Ingredients")) is None
@@ -0,0 +1,52 @@
+import gspread
+from sheets import queries
+from services import ingredients
+from tests.fake_sheets import FakeSpreadsheet
+
+def _downloads(fake_sheets, title: str) -> int:
+    return fake_sheets.count(title, "get_all_records") + fake_sheets.count(title, "values_batch_get")
+
+def _count_batch_requests(monkeypatch) -> list[list[str]]:
+    """Records the ranges of every values_batch_get request (the fake logs one call per tab)."""
+    requests = []
+    original = FakeSpreadsheet.values_batch_get
+
+    def counted(self, ranges, params=None):
+        requests.append(list(ranges))
+        return original(self, ranges, params)
+
+    monkeypatch.setattr(FakeSpreadsheet, "values_batch_get", counted)
+    return requests
+
+def test_several_tabs_are_read_in_one_request(run, fake_sheets, monkeypatch):
+    requests = _count_batch_requests(monkeypatch)
+    tables = run(queries.get_tables(["Ingredients", "Units", "Config"]))
+    assert len(requests) == 1
+    assert [r["ID"] for r in tables["Ingredients"]] == ["ING001", "ING002", "ING003"]
+    assert tables["Units"][0] == {"From_Unit": "kg", "To_Unit": "g", "Conversion_Rate": 1000}
+    assert fake_sheets.count("Ingredients", "get_all_records") == 0
+
+    # The tabs are cached like get_all_records would cache them
+    run(queries.get_all_records("Units"))
+    run(queries.get_all_records("Config"))
+    assert len(requests) == 1
+
+def test_cached_tabs_are_left_out_of_the_request(run, fake_sheets, monkeypatch):
+    run(queries.get_all_records("Units"))
+    requests = _count_batch_requests(monkeypatch)
+    run(queries.get_tables(["Units", "Config", "Units"]))
+    assert requests == [[gspread.utils.absolute_range_name("Config")]]
+
+def test_empty_and_missing_tabs_read_as_none(run, fake_sheets):
+    tables = run(queries.get_tables(["Price_History", "Ingredients"]))
+    assert tables["Price_History"] is None
+    assert len(tables["Ingredients"]) == 3
+    # A tab that doesn't exist fails the whole request
+    assert run(queries.get_tables(["No_Such_Tab", "Config"])) == {"No_Such_Tab": None, "Config": None}
+
+def test_a_stock_change_downloads_its_tabs_once(run, fake_sheets, monkeypatch):
+    requests = _count_batch_requests(monkeypatch)
+    ok, _ = run(ingredients.adjust_ingredient_stock("flour", 1, "kg", True, user_id="ann"))
+    assert ok
+    assert _downloads(fake_sheets, "Ingredients") == _downloads(fake_sheets, "Units") == 1
+    assert any({"'Ingredients'", "'Units'"} <= set(ranges) for ranges in requests)
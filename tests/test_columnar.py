@@ -0,0 +1,50 @@
+import math
+import pytest
+from sheets import columnar
+from sheets.columnar import ColumnarTable
+
+RECORDS = [
+    {"ID": "ING001", "Unit": "g", "Quantity": 1000, "Cost Per Unit": 0.005},
+    {"ID": "ING002", "Unit": "g", "Quantity": "", "Cost Per Unit": 0.01},
+    {"ID": "ING003", "Unit": " unit ", "Quantity": 12, "Cost Per Unit": "n/a"},
+    {"ID": "ING004", "Unit": "ml", "Quantity": "250", "Cost Per Unit": "0.002"},
+    {"ID": "ING001", "Unit": "g", "Quantity": 10, "Cost Per Unit": 1},
+]
+
+@pytest.fixture(params=["numpy", "array"])
+def table(request, monkeypatch) -> ColumnarTable:
+    """The same records as a NumPy-backed table and as a plain 'array' one."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(columnar, "HAS_NUMPY", False)
+    return ColumnarTable.from_records(RECORDS, ["Quantity", "Cost Per Unit"], ["ID", "Unit"])
+
+def test_cells_are_typed_and_text_is_categorical(table):
+    assert len(table) == 5
+    assert table.value("Quantity", 3) == 250.0
+    assert math.isnan(table.value("Quantity", 1))
+    assert table.value("Unit", 2) == "unit"
+    assert table.categories["ID"] == ["ING001", "ING002", "ING003", "ING004"]
+    assert list(table.codes["ID"]) == [0, 1, 2, 3, 0]
+
+def test_sum_product_skips_blank_cells(table):
+    assert table.sum_product("Quantity", "Cost Per Unit") == pytest.approx(5.0 + 0.5 + 10.0)
+    mask = table.mask_positions([0, 3])
+    assert table.sum_product("Quantity", "Cost Per Unit", mask) == pytest.approx(5.5)
+    assert table.positions(mask) == [0, 3]
+    assert table.positions() == [0, 1, 2, 3, 4]
+
+def test_group_sum(table):
+    assert table.group_sum("Unit", "Quantity") == pytest.approx({"g": 1010.0, "unit": 12.0, "ml": 250.0})
+    assert table.group_sum("Unit", "Quantity", table.mask_positions([1, 2])) == {"unit": 12.0}
+
+def test_group_last(table):
+    assert table.group_last("ID") == {"ING001": 4, "ING002": 1, "ING003": 2, "ING004": 3}
+    assert table.group_last("ID", table.mask_positions([0, 1, 2])) == {"ING001": 0, "ING002": 1, "ING003": 2}
+
+def test_empty_table(table):
+    empty = ColumnarTable.from_records([], ["Quantity"], ["ID"])
+    assert len(empty) == 0
+    assert empty.sum_product("Quantity", "Quantity") == 0.0
+    assert empty.group_last("ID") == {}
@@ -0,0 +1,47 @@
+from services import ingredients
+from services.fuzzy import NameIndex, format_suggestions
+
+NAMES = ["Flour", "Whole Wheat Flour", "Sugar", "Brown Sugar", "Butter", "Eggs", "Baking Powder"]
+
+# --- Index ---
+
+def test_typos_find_the_intended_name():
+    index = NameIndex(NAMES)
+    assert index.best_match("flor")[0] == "Flour"
+    assert index.best_match("sugr")[0] == "Sugar"
+    assert index.best_match("buter")[0] == "Butter"
+    assert index.best_match("BAKING  powdr")[0] == "Baking Powder"
+
+def test_results_are_ranked_and_limited():
+    index = NameIndex(NAMES)
+    results = index.search("sugar", limit=2)
+    assert [name for name, _ in results] == ["Sugar", "Brown Sugar"]
+    assert results[0][1] == 1.0
+    assert results[0][1] > results[1][1]
+    # Weaker matches only show up below the default cut-off
+    assert [name for name, _ in index.search("flour", limit=5)] == ["Flour"]
+    assert [name for name, _ in index.search("flour", limit=5, min_score=0.1)] == ["Flour", "Whole Wheat Flour"]
+
+def test_unrelated_queries_suggest_nothing():
+    index = NameIndex(NAMES)
+    assert index.search("xylophone") == []
+    assert NameIndex([]).search("flour") == []
+
+def test_duplicate_and_blank_names_are_indexed_once():
+    assert NameIndex(["Flour", "", "Flour", "Salt"]).names == ["Flour", "Salt"]
+
+def test_suggestions_are_formatted_for_replies():
+    assert format_suggestions([]) == ""
+    assert format_suggestions(["Flour"]) == " Did you mean **Flour**?"
+    assert format_suggestions(["Sugar", "Brown Sugar", "Butter"]) == " Did you mean **Sugar**, **Brown Sugar** or **Butter**?"
+
+# --- Service Replies ---
+
+def test_unknown_ingredients_get_suggestions(run, fake_sheets):
+    assert run(ingredients.suggest_ingredient_names("suger")) == ["Sugar"]
+    ok, message = run(ingredients.get_ingredient_status("flouur"))
+    assert not ok
+    assert message.endswith("Did you mean **Flour**?")
+    ok, message = run(ingredients.adjust_ingredient_stock("egs", 2, "unit", False, user_id="ann"))
+    assert not ok
+    assert "Did you mean **Eggs**?" in message
@@ -0,0 +1,39 @@
+from sheets import queries
+
+def test_schema_maps_headers_to_cells():
+    schema = queries._SheetSchema(["ID", "Name", "ID"] + [f"C{i}" for i in range(30)])
+    assert schema.cell_a1("Name", 12) == "B12"
+    assert schema.column_indexes["ID"] == 1 # First occurrence wins
+    assert schema.cell_a1("C29", 2) == "AG2"
+
+def test_a_full_download_seeds_the_schema(run, fake_sheets):
+    run(queries.get_all_records("Ingredients"))
+    assert run(queries.update_row_by_id("Ingredients", "ING001", {"Quantity": "1"}))
+    assert fake_sheets.count("Ingredients", "row_values") == 0
+
+def test_header_row_is_read_once_for_many_writes(run, fake_sheets, monkeypatch):
+    monkeypatch.setitem(queries.TABLE_CACHE_TTL_SECONDS, "Ingredients", 0)
+    for quantity in ("1", "2", "3"):
+        assert run(queries.update_row_by_id("Ingredients", "ING001", {"Quantity": quantity}))
+    assert fake_sheets.count("Ingredients", "row_values") == 1
+    assert fake_sheets.rows("Ingredients")[1][3] == "3"
+
+def test_unknown_column_refreshes_the_header_row_once(run, fake_sheets):
+    run(queries.get_all_records("Ingredients"))
+    # Someone adds a column after the schema was cached
+    for row in fake_sheets.rows("Ingredients"):
+        row.append("Reorder Level" if row[0] == "ID" else "")
+    assert run(queries.update_row_by_id("Ingredients", "ING001", {"Reorder Level": "200"}))
+    assert fake_sheets.count("Ingredients", "row_values") == 1
+    assert fake_sheets.rows("Ingredients")[1][7] == "200"
+
+def test_fields_without_a_column_are_skipped(run, fake_sheets):
+    run(queries.get_all_records("Ingredients"))
+    assert run(queries.update_row_by_id("Ingredients", "ING001", {"Quantity": "5", "Nope": "x"}))
+    assert fake_sheets.rows("Ingredients")[1][3] == "5"
+    assert all("x" not in row for row in fake_sheets.rows("Ingredients"))
+
+def test_headers_come_from_the_schema_cache(run, fake_sheets):
+    assert run(queries.get_headers("Units")) == ["From_Unit", "To_Unit", "Conversion_Rate"]
+    assert run(queries.get_headers("Units")) == ["From_Unit", "To_Unit", "Conversion_Rate"]
+    assert fake_sheets.count("Units", "row_values") == 1
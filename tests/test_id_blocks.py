@@ -0,0 +1,50 @@
+import asyncio
+import pytest
+from sheets import queries
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(queries, "ID_BLOCK_SIZE", 3)
+
+def _config_value(fake_sheets, key: str) -> str:
+    return next(row[1] for row in fake_sheets.rows("Config") if row[0] == key)
+
+def _config_writes(fake_sheets) -> int:
+    return fake_sheets.count("Config", "batch_update")
+
+def test_ids_come_from_a_reserved_block(run, fake_sheets):
+    ids = [run(queries.get_next_unique_id("NEXT_ING_ID", "ING")) for _ in range(5)]
+    assert ids == ["ING004", "ING005", "ING006", "ING007", "ING008"]
+    # Two blocks of three: ING004..ING006, then ING007..ING009
+    assert _config_writes(fake_sheets) == 2
+    assert _config_value(fake_sheets, "NEXT_ING_ID") == "ING010"
+
+def test_concurrent_requests_never_share_an_id(run, fake_sheets):
+    async def allocate():
+        return await asyncio.gather(*[queries.get_next_unique_id("NEXT_MAP_ID", "MAP") for _ in range(7)])
+
+    ids = run(allocate())
+    assert sorted(ids) == [f"MAP{n:03d}" for n in range(1, 8)]
+    assert _config_writes(fake_sheets) == 3
+
+def test_large_requests_reserve_the_shortfall_in_one_write(run, fake_sheets):
+    assert run(queries.get_next_unique_id("NEXT_MAP_ID", "MAP")) == "MAP001"
+    ids = run(queries.reserve_unique_ids("NEXT_MAP_ID", "MAP", 10))
+    # MAP002..MAP003 from the first block, then one write for the remaining eight
+    assert ids == [f"MAP{n:03d}" for n in range(2, 12)]
+    assert _config_writes(fake_sheets) == 2
+    assert _config_value(fake_sheets, "NEXT_MAP_ID") == "MAP012"
+
+def test_a_new_block_starts_from_the_sheet_counter(run, fake_sheets):
+    for _ in range(3):
+        run(queries.get_next_unique_id("NEXT_RECIPE_ID", "REC"))
+    # Read once so Config is cached, then another process moves the counter on
+    run(queries.read_config_value("NEXT_RECIPE_ID"))
+    next(row for row in fake_sheets.rows("Config") if row[0] == "NEXT_RECIPE_ID")[1] = "REC050"
+    assert run(queries.get_next_unique_id("NEXT_RECIPE_ID", "REC")) == "REC050"
+    assert _config_value(fake_sheets, "NEXT_RECIPE_ID") == "REC053"
+
+def test_unknown_key_returns_none(run, fake_sheets):
+    assert run(queries.get_next_unique_id("NEXT_BATCH_ID", "BAT")) is None
+    assert run(queries.reserve_unique_ids("NEXT_ING_ID", "ING", 0)) == []
+    assert _config_writes(fake_sheets) == 0
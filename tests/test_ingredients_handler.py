@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("telegram")
+from bot import ingredients_handler
+from services import ingredients
+
+def _update(username: str | None = "ann", user_id: int = 7, update_id: int = 100):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id, username=username), update_id=update_id)
+
+# --- Multi-Item Parser ---
+
+def test_multi_item_message_is_recognized():
+    match = ingredients_handler.MULTI_STOCK_REGEX.match("Restocked 10kg flour and 5 kg sugar")
+    assert match and match.group("action") == "Restocked"
+    # A single item is left to the one-item commands
+    assert not ingredients_handler.MULTI_STOCK_REGEX.match("Used 500g flour")
+
+def test_items_are_split_on_commas_and_on_and_before_a_quantity():
+    items = ingredients_handler._parse_stock_items("500 Grams flour, 20g salt and pepper and 2 kg of the sugar, and 3 eggs")
+    assert items == [("flour", 500.0, "g"), ("salt and pepper", 20.0, "g"), ("sugar", 2.0, "kg"), ("eggs", 3.0, "")]
+
+def test_unreadable_item_rejects_the_list():
+    assert ingredients_handler._parse_stock_items("500g flour, some sugar") is None
+
+# --- Multi-Item Handler ---
+
+@pytest.fixture
+def bulk_calls(monkeypatch):
+    calls = []
+    async def adjust_ingredient_stock_bulk(items, is_addition, user_id=None, update_id=None):
+        calls.append((items, is_addition, user_id, update_id))
+        return True, "done"
+    monkeypatch.setattr(ingredients, "adjust_ingredient_stock_bulk", adjust_ingredient_stock_bulk)
+    return calls
+
+def test_handler_commits_all_items_in_one_call(run, bulk_calls):
+    data = ingredients_handler.MULTI_STOCK_REGEX.match("Used 500g flour, 3 eggs").groupdict()
+    assert run(ingredients_handler.handle_multi_stock_adjustment(_update(), data)) == "done"
+    assert bulk_calls == [([("flour", 500.0, "g"), ("eggs", 3.0, "")], False, "ann", 100)]
+
+def test_handler_audits_users_without_a_username_by_id(run, bulk_calls):
+    data = ingredients_handler.MULTI_STOCK_REGEX.match("Added 1kg flour and 1kg sugar").groupdict()
+    run(ingredients_handler.handle_multi_stock_adjustment(_update(username=None, user_id=42), data))
+    assert bulk_calls[0][1:3] == (True, 42)
+
+def test_handler_works_without_an_effective_user(run, bulk_calls):
+    data = ingredients_handler.MULTI_STOCK_REGEX.match("Used 1kg flour, 1kg sugar").groupdict()
+    update = SimpleNamespace(effective_user=None, update_id=5)
+    assert run(ingredients_handler.handle_multi_stock_adjustment(update, data)) == "done"
+    assert bulk_calls[0][2] is None
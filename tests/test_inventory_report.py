@@ -0,0 +1,76 @@
+import pytest
+from sheets import queries
+from services import ingredients
+
+def _downloads(fake_sheets) -> int:
+    return fake_sheets.count("Ingredients", "get_all_records") + fake_sheets.count("Ingredients", "values_batch_get")
+
+def _add_ingredients(fake_sheets, count: int) -> None:
+    for n in range(count):
+        fake_sheets.rows("Ingredients").append([f"ING{100 + n}", f"Spice {n:02d}", "g", "10", "0.1", "", ""])
+
+# --- Aggregate ---
+
+def test_totals_are_computed_from_the_tab(run, fake_sheets):
+    aggregate = run(ingredients.get_inventory_aggregate())
+    assert aggregate.item_count == 3
+    # 1000 g * 0.005 + 500 g * 0.01 + 12 * 0.30
+    assert aggregate.total_value == pytest.approx(13.6)
+    assert aggregate.unit_totals == pytest.approx({"g": 1500.0, "unit": 12.0})
+    assert [i.name for i in aggregate.page(0, page_size=2)] == ["Eggs", "Flour"]
+    assert aggregate.page_count(page_size=2) == 2
+
+def test_stock_changes_update_the_totals_without_a_reload(run, fake_sheets):
+    run(ingredients.get_inventory_aggregate())
+    downloads = _downloads(fake_sheets)
+    ok, _ = run(ingredients.adjust_ingredient_stock("flour", 1, "kg", True, user_id="ann"))
+    assert ok
+    aggregate = run(ingredients.get_inventory_aggregate())
+    assert aggregate.total_value == pytest.approx(18.6)
+    assert aggregate.unit_totals["g"] == pytest.approx(2500.0)
+    assert _downloads(fake_sheets) == downloads
+
+def test_a_reloaded_tab_rebuilds_the_aggregate(run, fake_sheets):
+    run(ingredients.get_inventory_aggregate())
+    # Edited by hand, then picked up on the next reload
+    fake_sheets.rows("Ingredients")[3][3] = "24"
+    queries.invalidate_table_cache("Ingredients")
+    aggregate = run(ingredients.get_inventory_aggregate())
+    assert aggregate.total_value == pytest.approx(17.2)
+    assert aggregate.unit_totals["unit"] == 24.0
+
+# --- Report Pages ---
+
+def test_report_pages_are_sorted_and_clamped(run, fake_sheets):
+    _add_ingredients(fake_sheets, 30)
+    ok, message, page, page_count = run(ingredients.generate_inventory_report_page(0))
+    assert ok and (page, page_count) == (0, 2)
+    assert message.index("**Eggs**") < message.index("**Flour**") < message.index("**Spice 00**")
+    assert "**Items:** 33" in message
+
+    ok, message, page, _ = run(ingredients.generate_inventory_report_page(9))
+    assert page == 1
+    assert "**Sugar**" in message and "**Flour**" not in message
+
+def test_malformed_rows_are_listed_on_the_last_page(run, fake_sheets):
+    fake_sheets.rows("Ingredients")[2][3] = "n/a"
+    ok, message, _, page_count = run(ingredients.generate_inventory_report_page(0))
+    assert ok and page_count == 1
+    assert "• **Sugar**: ⚠️ Data Error" in message
+    assert "**Items:** 2" in message
+
+def test_empty_inventory(run, fake_sheets):
+    del fake_sheets.rows("Ingredients")[1:]
+    ok, message, page, page_count = run(ingredients.generate_inventory_report_page(0))
+    assert not ok
+    assert "Inventory is Empty" in message
+
+# --- Page Buttons ---
+
+def test_page_buttons():
+    pytest.importorskip("telegram")
+    from bot.ingredients_handler import _inventory_page_keyboard
+    assert _inventory_page_keyboard(0, 1) is None
+    middle = _inventory_page_keyboard(1, 3).inline_keyboard[0]
+    assert [button.callback_data for button in middle] == ["inv_page:0", "inv_page:2"]
+    assert [button.callback_data for button in _inventory_page_keyboard(2, 3).inline_keyboard[0]] == ["inv_page:1"]
@@ -0,0 +1,84 @@
+import pytest
+from sheets import queries
+from services import alerts, ingredients
+from services.alerts import check_stock_level, flush_low_stock_alerts
+
+@pytest.fixture
+def sent(monkeypatch) -> list[str]:
+    """Messages delivered by the alert sender (the debounce window is left to the tests)."""
+    messages = []
+
+    async def sender(text: str) -> None:
+        messages.append(text)
+
+    monkeypatch.setattr(alerts, "_alert_sender", sender)
+    monkeypatch.setattr(alerts, "LOW_STOCK_ALERT_DEBOUNCE_SECONDS", 3600)
+    return messages
+
+def _check(run, ingredient_id: str, quantity: float, reorder_level: float = 100.0, name: str = "Flour") -> None:
+    async def check():
+        check_stock_level(ingredient_id, name, quantity, "g", reorder_level)
+    run(check())
+
+# --- Engine ---
+
+def test_a_drop_alerts_once_until_restocked(run, sent):
+    _check(run, "ING001", 150)
+    assert not alerts._pending_alerts
+    _check(run, "ING001", 90)
+    _check(run, "ING001", 40) # Still pending: the message reports the latest quantity
+    assert run(flush_low_stock_alerts())
+    assert sent == ["⚠️ <b>Low Stock</b>\n• <b>Flour</b>: 40.00 g left (reorder level 100.00)"]
+
+    _check(run, "ING001", 20) # Already alerted for this drop
+    assert run(flush_low_stock_alerts()) and len(sent) == 1
+
+    _check(run, "ING001", 500) # Restocked: the next drop alerts again
+    _check(run, "ING001", 100)
+    assert run(flush_low_stock_alerts()) and len(sent) == 2
+
+def test_alerts_in_one_window_are_sent_together(run, sent):
+    _check(run, "ING002", 5, name="sugar")
+    _check(run, "ING003", 0, name="<Eggs>")
+    _check(run, "ING004", 5, reorder_level=0, name="Salt") # No threshold
+    assert run(flush_low_stock_alerts())
+    assert sent == ["⚠️ <b>Low Stock</b>\n• <b>&lt;Eggs&gt;</b>: 0.00 g left (reorder level 100.00)\n• <b>sugar</b>: 5.00 g left (reorder level 100.00)"]
+
+def test_a_failed_send_is_retried_on_the_next_drop(run, monkeypatch):
+    async def broken(text: str) -> None:
+        raise RuntimeError("chat not found")
+
+    monkeypatch.setattr(alerts, "_alert_sender", broken)
+    monkeypatch.setattr(alerts, "LOW_STOCK_ALERT_DEBOUNCE_SECONDS", 3600)
+    _check(run, "ING001", 10)
+    assert not run(flush_low_stock_alerts())
+    _check(run, "ING001", 5)
+    assert "ING001" in alerts._pending_alerts
+
+# --- Stock Writes ---
+
+def _add_reorder_levels(fake_sheets, levels: list[str]) -> None:
+    rows = fake_sheets.rows("Ingredients")
+    rows[0].append("Reorder Level")
+    for row, level in zip(rows[1:], levels):
+        row.append(level)
+
+def test_stock_usage_checks_the_reorder_level(run, fake_sheets, sent):
+    _add_reorder_levels(fake_sheets, ["800", "", "6"])
+    ok, _ = run(ingredients.adjust_ingredient_stock("flour", 300, "g", False, user_id="ann"))
+    assert ok
+    ok, _ = run(ingredients.adjust_ingredient_stock("sugar", 450, "g", False, user_id="ann"))
+    assert ok
+    assert list(alerts._pending_alerts) == ["ING001"]
+    assert alerts._pending_alerts["ING001"][1] == pytest.approx(700.0)
+
+def test_reorder_level_is_only_read_when_the_tab_has_it(run, fake_sheets):
+    table = run(ingredients.get_ingredient_table())
+    assert table.by_id["ing001"].reorder_level == 0.0
+    assert "Reorder Level" not in run(ingredients._ingredient_lookup_columns())
+
+    _add_reorder_levels(fake_sheets, ["800", "", "6"])
+    queries.invalidate_table_cache("Ingredients")
+    queries.invalidate_sheet_schema("Ingredients")
+    assert "Reorder Level" in run(ingredients._ingredient_lookup_columns())
+    assert run(ingredients.get_ingredient_table()).by_id["ing003"].reorder_level == 6.0
@@ -0,0 +1,88 @@
+import pytest
+from sheets.mirror import MirrorBackend
+
+@pytest.fixture
+def mirror(run, fake_sheets):
+    """A mirror of the fake spreadsheet's Ingredients and Price_History tabs, bootstrapped by one sync."""
+    backend = MirrorBackend(":memory:", sheet_names=["Ingredients", "Price_History"])
+    assert run(backend.sync_once())
+    return backend
+
+def _sheet_row(fake_sheets, ingredient_id: str) -> list[str]:
+    return next(row for row in fake_sheets.rows("Ingredients") if row[0] == ingredient_id)
+
+def test_first_sync_pulls_the_sheet(run, mirror):
+    records = run(mirror.get_all_records("Ingredients"))
+    assert [(r["ID"], r["Quantity"]) for r in records] == [("ING001", 1000), ("ING002", 500), ("ING003", 12)]
+
+def test_local_writes_are_pushed_in_one_append_and_one_batch_update(run, fake_sheets, mirror):
+    assert run(mirror.update_row_by_id("Ingredients", "ING001", {"Quantity": "900.0000"}, user_id="ann"))
+    assert run(mirror.append_rows("Ingredients", [{"ID": "ING004", "Name": "Butter", "Unit": "g", "Quantity": "250", "Cost Per Unit": "0.02"}]))
+    fake_sheets.calls.clear()
+
+    assert run(mirror.sync_once())
+    assert fake_sheets.count("Ingredients", "append_rows") == 1
+    assert fake_sheets.count("Ingredients", "batch_update") == 1
+    assert _sheet_row(fake_sheets, "ING001")[3] == "900.0000"
+    assert _sheet_row(fake_sheets, "ING001")[6] == "ann"
+    assert _sheet_row(fake_sheets, "ING004")[:4] == ["ING004", "Butter", "g", "250"]
+
+    # Nothing left to push
+    fake_sheets.calls.clear()
+    assert run(mirror.sync_once())
+    assert fake_sheets.count("Ingredients", "append_rows") == fake_sheets.count("Ingredients", "batch_update") == 0
+
+def test_hand_edits_are_pulled(run, fake_sheets, mirror):
+    _sheet_row(fake_sheets, "ING002")[3] = "450"
+    fake_sheets.rows("Ingredients").append(["ING009", "Salt", "g", "100", "0.001", "", ""])
+    assert run(mirror.sync_once())
+    records = {r["ID"]: r for r in run(mirror.get_all_records("Ingredients"))}
+    assert records["ING002"]["Quantity"] == 450
+    assert records["ING009"]["Name"] == "Salt"
+
+def test_conflicting_edits_keep_the_newer_stamp(run, fake_sheets, mirror):
+    assert run(mirror.update_row_by_id("Ingredients", "ING003", {"Quantity": "10"}))
+    # Hand edit with an older stamp than the local write: the local change wins
+    row = _sheet_row(fake_sheets, "ING003")
+    row[3], row[5] = "11", "2000-01-01T00:00:00"
+    assert run(mirror.sync_once())
+    assert _sheet_row(fake_sheets, "ING003")[3] == "10"
+    assert run(mirror.find_records("Ingredients", "ID", "ING003"))[0]["Quantity"] == 10
+
+def test_log_tabs_are_append_only(run, fake_sheets, mirror):
+    assert run(mirror.append_rows("Price_History", [{"ingredients_Id": "ING001", "old_cost_per_unit": "0.005", "new_cost_per_unit": "0.006"}]))
+    assert run(mirror.append_rows("Price_History", [{"ingredients_Id": "ING001", "old_cost_per_unit": "0.006", "new_cost_per_unit": "0.007"}]))
+    assert run(mirror.sync_once())
+    assert [row[2] for row in fake_sheets.rows("Price_History")[1:]] == ["0.006", "0.007"]
+
+def test_a_failed_sync_keeps_local_writes_for_the_next_one(run, fake_sheets, mirror, monkeypatch):
+    assert run(mirror.update_row_by_id("Ingredients", "ING002", {"Quantity": "480"}))
+
+    def unavailable(values, **kwargs):
+        raise RuntimeError("Sheets unavailable")
+
+    monkeypatch.setattr(fake_sheets.tabs["Ingredients"], "batch_update", unavailable)
+    assert not run(mirror.sync_once())
+    # Local reads carry on during the outage
+    assert run(mirror.find_records("Ingredients", "ID", "ING002"))[0]["Quantity"] == 480
+
+    monkeypatch.undo()
+    assert run(mirror.sync_once())
+    assert _sheet_row(fake_sheets, "ING002")[3] == "480"
+
+def test_flush_pushes_what_is_left(run, fake_sheets, mirror):
+    run(mirror.start())
+    assert run(mirror.update_row_by_id("Ingredients", "ING001", {"Quantity": "750"}))
+    assert run(mirror.flush_pending_writes())
+    assert _sheet_row(fake_sheets, "ING001")[3] == "750"
+
+def test_unsynced_writes_survive_a_restart(run, fake_sheets, tmp_path):
+    path = str(tmp_path / "mirror.db")
+    backend = MirrorBackend(path, sheet_names=["Ingredients"])
+    assert run(backend.sync_once())
+    assert run(backend.update_row_by_id("Ingredients", "ING003", {"Quantity": "6"}))
+
+    # A new process opens the same database and pushes the write it never sent
+    restarted = MirrorBackend(path, sheet_names=["Ingredients"])
+    assert run(restarted.sync_once())
+    assert _sheet_row(fake_sheets, "ING003")[3] == "6"
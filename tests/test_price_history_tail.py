@@ -0,0 +1,86 @@
+import pytest
+from sheets import queries
+from services import ingredients
+from tests.fake_sheets import FakeSpreadsheet
+
+@pytest.fixture
+def batch_requests(monkeypatch) -> list[list[str]]:
+    """The ranges of every values_batch_get request made during the test."""
+    requests = []
+    original = FakeSpreadsheet.values_batch_get
+
+    def counted(self, ranges, params=None):
+        requests.append(list(ranges))
+        return original(self, ranges, params)
+
+    monkeypatch.setattr(FakeSpreadsheet, "values_batch_get", counted)
+    return requests
+
+def _fill_history(fake_sheets, count: int, first_id: str | None = None) -> None:
+    """Appends `count` price changes for ING9xx filler ingredients (the first one for first_id, if given)."""
+    for n in range(count):
+        ingredient_id = first_id if first_id and n == 0 else f"ING{900 + n % 50}"
+        fake_sheets.rows("Price_History").append([ingredient_id, "0.0100", f"{0.01 + n / 10000:.4f}", f"2024-01-01T00:{n % 60:02d}:00", "ann"])
+
+def _history_downloads(fake_sheets) -> int:
+    return fake_sheets.count("Price_History", "get_all_records") + fake_sheets.count("Price_History", "values_batch_get")
+
+# --- Tail Reads ---
+
+def test_tail_reads_skip_the_start_of_the_tab(run, fake_sheets, batch_requests):
+    _fill_history(fake_sheets, 300)
+    tail = run(queries.get_tail_records("Price_History", 3, columns=["ingredients_Id", "new_cost_per_unit"]))
+    assert tail == [
+        {"ingredients_Id": "ING947", "new_cost_per_unit": 0.0397},
+        {"ingredients_Id": "ING948", "new_cost_per_unit": 0.0398},
+        {"ingredients_Id": "ING949", "new_cost_per_unit": 0.0399},
+    ]
+    assert fake_sheets.count("Price_History", "get_all_records") == 0
+    assert not any(a1.startswith("'Price_History'!A2:") for ranges in batch_requests for a1 in ranges)
+
+def test_later_tail_reads_are_one_request(run, fake_sheets, batch_requests):
+    _fill_history(fake_sheets, 20)
+    run(queries.get_tail_records("Price_History", 2))
+    assert run(queries.append_rows("Price_History", [{"ingredients_Id": "ING001", "old_cost_per_unit": "0.005", "new_cost_per_unit": "0.006"}]))
+    batch_requests.clear()
+    tail = run(queries.get_tail_records("Price_History", 2))
+    assert [r["ingredients_Id"] for r in tail] == ["ING919", "ING001"]
+    assert len(batch_requests) == 1
+
+def test_an_empty_history_reads_as_none(run, fake_sheets):
+    assert run(queries.get_tail_records("Price_History", 5)) is None
+
+# --- Latest Price Change ---
+
+def test_old_changes_are_found_by_reading_further_back(run, fake_sheets, monkeypatch):
+    monkeypatch.setattr(ingredients, "PRICE_HISTORY_TAIL_ROWS", 10)
+    _fill_history(fake_sheets, 60, first_id="ING001")
+    entry = run(ingredients.get_latest_price_change("ing001"))
+    assert (entry.ingredient_id, entry.old_cost, entry.new_cost) == ("ING001", 0.01, 0.01)
+
+    # Every ingredient seen on the way is answered from memory
+    downloads = _history_downloads(fake_sheets)
+    assert run(ingredients.get_latest_price_change("ING949")).new_cost == pytest.approx(0.0149)
+    assert _history_downloads(fake_sheets) == downloads
+
+def test_the_scan_is_bounded_and_done_once(run, fake_sheets, monkeypatch):
+    monkeypatch.setattr(ingredients, "PRICE_HISTORY_TAIL_ROWS", 10)
+    monkeypatch.setattr(ingredients, "PRICE_HISTORY_MAX_TAIL_ROWS", 30)
+    _fill_history(fake_sheets, 100, first_id="ING001")
+    # Its only change is further back than the bound
+    assert run(ingredients.get_latest_price_change("ING001")) is None
+    assert ingredients._price_history_scanned_rows == 30
+
+    downloads = _history_downloads(fake_sheets)
+    assert run(ingredients.get_latest_price_change("ING002")) is None
+    assert _history_downloads(fake_sheets) == downloads
+
+def test_logged_changes_are_remembered_without_a_read(run, fake_sheets):
+    assert run(ingredients.log_price_history("ING002", 0.01, 0.012, user_id="ann"))
+    downloads = _history_downloads(fake_sheets)
+    entry = run(ingredients.get_latest_price_change("ING002"))
+    assert (entry.old_cost, entry.new_cost, entry.updated_by) == (0.01, 0.012, "ann")
+    assert _history_downloads(fake_sheets) == downloads
+
+    ok, message = run(ingredients.get_ingredient_status("sugar"))
+    assert ok and "**Last Price Change:** $0.0100 → $0.0120" in message
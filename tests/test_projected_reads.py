@@ -0,0 +1,53 @@
+import pytest
+from sheets import queries
+from tests.fake_sheets import FakeSpreadsheet
+
+@pytest.fixture
+def batch_requests(monkeypatch) -> list[list[str]]:
+    """The ranges of every values_batch_get request made during the test."""
+    requests = []
+    original = FakeSpreadsheet.values_batch_get
+
+    def counted(self, ranges, params=None):
+        requests.append(list(ranges))
+        return original(self, ranges, params)
+
+    monkeypatch.setattr(FakeSpreadsheet, "values_batch_get", counted)
+    return requests
+
+def test_only_the_wanted_columns_are_downloaded(run, fake_sheets, batch_requests):
+    records = run(queries.get_all_records("Ingredients", columns=["ID", "Quantity"]))
+    assert records == [{"ID": "ING001", "Quantity": 1000}, {"ID": "ING002", "Quantity": 500}, {"ID": "ING003", "Quantity": 12}]
+    assert batch_requests == [["'Ingredients'!A2:A", "'Ingredients'!D2:D"]]
+    assert fake_sheets.count("Ingredients", "get_all_records") == 0
+
+def test_adjacent_columns_are_read_as_one_range(run, fake_sheets, batch_requests):
+    records = run(queries.get_all_records("Ingredients", columns=["Name", "Unit", "Quantity"]))
+    assert records[2] == {"Name": "Eggs", "Unit": "unit", "Quantity": 12}
+    assert batch_requests == [["'Ingredients'!B2:D"]]
+
+def test_row_range_reads_only_those_rows(run, fake_sheets, batch_requests):
+    records = run(queries.get_all_records("Ingredients", columns=["ID", "Name"], row_range=(3, 4)))
+    assert records == [{"ID": "ING002", "Name": "Sugar"}, {"ID": "ING003", "Name": "Eggs"}]
+    assert batch_requests == [["'Ingredients'!A3:B4"]]
+    # The header row is never read as data
+    assert run(queries.get_all_records("Ingredients", columns=["ID"], row_range=(1, 2))) == [{"ID": "ING001"}]
+
+def test_projections_are_cached_or_cut_from_the_full_table(run, fake_sheets, batch_requests):
+    run(queries.get_all_records("Ingredients", columns=["Name"]))
+    run(queries.get_all_records("Ingredients", columns=["Name"]))
+    assert len(batch_requests) == 1
+
+    run(queries.get_all_records("Config"))
+    assert run(queries.get_all_records("Config", columns=["Value"], row_range=(2, 2))) == [{"Value": "ING004"}]
+    assert len(batch_requests) == 1
+
+def test_missing_columns_come_back_blank(run, fake_sheets, batch_requests):
+    records = run(queries.get_all_records("Ingredients", columns=["ID", "Reorder Level"]))
+    assert records[0] == {"ID": "ING001", "Reorder Level": ""}
+    assert batch_requests == [["'Ingredients'!A2:A"]]
+
+def test_find_records_projects_an_uncached_tab(run, fake_sheets, batch_requests):
+    assert run(queries.find_records("Ingredients", "Name", " SUGAR", columns=["ID", "Cost Per Unit"])) == [{"ID": "ING002", "Cost Per Unit": 0.01}]
+    assert batch_requests == [["'Ingredients'!A2:B", "'Ingredients'!E2:E"]]
+    assert run(queries.find_records("Ingredients", "Name", "salt", columns=["ID"])) is None
@@ -0,0 +1,75 @@
+import time
+import gspread
+import httpx
+import pytest
+from sheets import rate_limit
+from sheets.rate_limit import READ, WRITE, TokenBucket, call_with_rate_limit, get_rate_limit_stats, is_retryable_error
+
+def _api_error(status: int) -> gspread.exceptions.APIError:
+    return gspread.exceptions.APIError(httpx.Response(status, json={"error": {"code": status, "message": "x", "status": "x"}}))
+
+class Flaky:
+    """A request that fails with the given statuses before it succeeds."""
+
+    def __init__(self, *statuses: int):
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.statuses:
+            raise _api_error(self.statuses.pop(0))
+        return "ok"
+
+@pytest.fixture(autouse=True)
+def quick_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limit, "SHEETS_RETRY_BASE_SECONDS", 0.001)
+
+# --- Token Bucket ---
+
+def test_bucket_allows_a_burst_then_paces(run):
+    bucket = TokenBucket(requests_per_minute=600, capacity=2) # 10 per second
+
+    async def take(n: int) -> list[float]:
+        return [await bucket.acquire() for _ in range(n)]
+
+    started_at = time.monotonic()
+    waits = run(take(3))
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] > 0
+    assert time.monotonic() - started_at >= 0.09
+
+def test_drained_bucket_waits_for_a_refill(run):
+    bucket = TokenBucket(requests_per_minute=6000, capacity=5)
+    bucket.drain()
+    assert run(bucket.acquire()) > 0
+
+# --- Retries ---
+
+def test_quota_and_server_errors_are_retryable():
+    assert is_retryable_error(_api_error(429))
+    assert is_retryable_error(_api_error(503))
+    assert not is_retryable_error(_api_error(403))
+    assert not is_retryable_error(ValueError("bad"))
+
+def test_429_is_retried_until_it_succeeds(run):
+    before = get_rate_limit_stats()[READ]
+    request = Flaky(429, 500)
+    assert run(call_with_rate_limit(READ, "Ingredients", request)) == "ok"
+    assert request.calls == 3
+    after = get_rate_limit_stats()[READ]
+    assert after["retried"] - before["retried"] == 2
+    assert after["requests"] - before["requests"] == 3
+
+def test_other_errors_are_raised_at_once(run):
+    request = Flaky(403)
+    with pytest.raises(gspread.exceptions.APIError):
+        run(call_with_rate_limit(WRITE, "Ingredients", request))
+    assert request.calls == 1
+
+def test_gives_up_when_the_retry_budget_is_spent(run, monkeypatch):
+    monkeypatch.setattr(rate_limit, "SHEETS_RETRY_MAX_TOTAL_SECONDS", 0)
+    before = get_rate_limit_stats()[WRITE]["gave_up"]
+    with pytest.raises(gspread.exceptions.APIError):
+        run(call_with_rate_limit(WRITE, "Ingredients", Flaky(429, 429)))
+    assert get_rate_limit_stats()[WRITE]["gave_up"] == before + 1
@@ -0,0 +1,21 @@
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("telegram")
+from bot import recipe_handler
+from services import recipe
+
+def _update(user_id: int = 7):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id, username="ann"))
+
+def test_components_are_stored_with_canonical_units(run, monkeypatch):
+    captured = {}
+    async def add_recipe_components(recipe_name, components, user_id=None):
+        captured.update(recipe_name=recipe_name, components=components)
+        return True, "ok"
+    monkeypatch.setattr(recipe, "add_recipe_components", add_recipe_components)
+
+    match = recipe_handler.ADD_INGREDIENT_REGEX.match("To Sourdough Loaf, add 500 Grams Flour, 1 Kilograms Salt and 2 unit Eggs")
+    assert run(recipe_handler.handle_add_ingredient_to_recipe(_update(), match.groupdict())) == "ok"
+    assert captured["recipe_name"] == "Sourdough Loaf"
+    assert captured["components"] == [("Flour", 500.0, "g"), ("Salt", 1.0, "kg"), ("Eggs", 2.0, "unit")]
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+import pytest
+from sheets import executor
+from sheets.executor import get_sheets_io_stats, run_sheets_io
+
+# Stats are process-wide, so every test uses worksheet names of its own
+
+def _worksheet_stats(worksheet: str) -> dict:
+    return get_sheets_io_stats()["worksheets"][worksheet]
+
+def test_calls_run_off_the_event_loop(run):
+    loop_thread = threading.get_ident()
+    thread = run(run_sheets_io("Exec_Thread", threading.get_ident))
+    assert thread != loop_thread
+    stats = _worksheet_stats("Exec_Thread")
+    assert (stats["completed"], stats["in_flight"], stats["queued"]) == (1, 0, 0)
+
+def test_one_worksheet_is_limited_without_blocking_others(run, monkeypatch):
+    monkeypatch.setattr(executor, "SHEETS_IO_PER_WORKSHEET_LIMIT", 2)
+    release = threading.Event()
+
+    async def scenario():
+        busy = [asyncio.create_task(run_sheets_io("Exec_Busy", release.wait, 5)) for _ in range(4)]
+        # A call on another worksheet goes straight through while Exec_Busy is saturated
+        assert await run_sheets_io("Exec_Other", lambda: "done") == "done"
+        # Calls are marked started from their executor thread, so give the second one a moment
+        for _ in range(100):
+            stats = _worksheet_stats("Exec_Busy")
+            if stats["in_flight"] == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert (stats["in_flight"], stats["queued"]) == (2, 2)
+        release.set()
+        await asyncio.gather(*busy)
+
+    run(scenario())
+    stats = _worksheet_stats("Exec_Busy")
+    assert (stats["completed"], stats["in_flight"], stats["queued"]) == (4, 0, 0)
+    assert stats["max_wait_seconds"] > 0
+
+def test_failures_are_counted_and_raised(run):
+    def broken():
+        raise RuntimeError("quota")
+
+    with pytest.raises(RuntimeError):
+        run(run_sheets_io("Exec_Failing", broken))
+    stats = _worksheet_stats("Exec_Failing")
+    assert (stats["failed"], stats["completed"], stats["in_flight"]) == (1, 0, 0)
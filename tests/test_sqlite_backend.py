@@ -0,0 +1,98 @@
+from sheets import queries
+from services import ingredients
+
+INGREDIENTS = [
+    {"ID": "ING001", "Name": "Flour", "Unit": "g", "Quantity": "1000"},
+    {"ID": "ING002", "Name": "Sugar", "Unit": "g", "Quantity": "500"},
+]
+
+# --- Reads ---
+
+def test_records_are_numericised_like_get_all_records(run, sqlite):
+    sqlite.load_records("Ingredients", INGREDIENTS)
+    records = run(sqlite.get_all_records("Ingredients"))
+    assert records == [
+        {"ID": "ING001", "Name": "Flour", "Unit": "g", "Quantity": 1000},
+        {"ID": "ING002", "Name": "Sugar", "Unit": "g", "Quantity": 500},
+    ]
+
+def test_missing_table_reads_as_none(run, sqlite):
+    assert run(sqlite.get_all_records("Ingredients")) is None
+    assert run(sqlite.get_tail_records("Ingredients", 5)) is None
+    assert run(sqlite.get_headers("Ingredients")) is None
+
+def test_projection_and_row_range(run, sqlite):
+    sqlite.load_records("Ingredients", INGREDIENTS)
+    # Sheet row 3 is the second data row; unknown columns come back blank like on Sheets
+    records = run(sqlite.get_all_records("Ingredients", columns=["Name", "Reorder Level"], row_range=(3, None)))
+    assert records == [{"Name": "Sugar", "Reorder Level": ""}]
+
+def test_tail_records_are_oldest_first(run, sqlite):
+    run(sqlite.append_rows("Price_History", [{"ingredients_Id": f"ING00{i}"} for i in range(5)]))
+    tail = run(sqlite.get_tail_records("Price_History", 2, columns=["ingredients_Id"]))
+    assert tail == [{"ingredients_Id": "ING003"}, {"ingredients_Id": "ING004"}]
+
+def test_find_records_ignores_case_and_whitespace(run, sqlite):
+    sqlite.load_records("Ingredients", INGREDIENTS)
+    assert run(sqlite.find_records("Ingredients", "Name", "  sUGAR ", columns=["ID"])) == [{"ID": "ING002"}]
+    assert run(sqlite.find_records("Ingredients", "Name", "salt")) is None
+    assert run(sqlite.find_records("Ingredients", "No Such Column", "x")) is None
+
+def test_decoded_table_of_a_missing_table_decodes_nothing(run, sqlite):
+    assert run(sqlite.get_decoded_table("Ingredients", len)) == 0
+
+# --- Writes ---
+
+def test_append_stamps_audit_columns(run, sqlite):
+    assert run(sqlite.append_rows("Ingredients", INGREDIENTS[:1], user_id=42))
+    record = run(sqlite.get_all_records("Ingredients"))[0]
+    assert record["Updated_By_User"] == 42
+    assert record["Last_Updated"]
+    assert run(sqlite.get_headers("Ingredients")) == ["ID", "Name", "Unit", "Quantity", "Last_Updated", "Updated_By_User"]
+
+def test_update_row_by_id_and_filter(run, sqlite):
+    sqlite.load_records("Ingredients", INGREDIENTS)
+    assert run(sqlite.update_row_by_id("Ingredients", "ing001", {"Quantity": "900"}, user_id="ann"))
+    assert run(sqlite.update_row_by_filter("Ingredients", "Name", "sugar", {"Unit": "kg"}))
+    assert not run(sqlite.update_row_by_id("Ingredients", "ING404", {"Quantity": "1"}))
+    flour, sugar = run(sqlite.get_all_records("Ingredients"))
+    assert (flour["Quantity"], flour["Updated_By_User"]) == (900, "ann")
+    assert sugar["Unit"] == "kg"
+
+def test_bulk_update_writes_nothing_if_an_id_is_missing(run, sqlite):
+    sqlite.load_records("Ingredients", INGREDIENTS)
+    assert not run(sqlite.update_rows_by_id("Ingredients", {"ING001": {"Quantity": "1"}, "ING404": {"Quantity": "2"}}))
+    assert run(sqlite.get_all_records("Ingredients"))[0]["Quantity"] == 1000
+    assert run(sqlite.update_rows_by_id("Ingredients", {"ING001": {"Quantity": "1"}, "ING002": {"Quantity": "2"}}))
+    assert [r["Quantity"] for r in run(sqlite.get_all_records("Ingredients"))] == [1, 2]
+
+def test_load_records_moves_the_generation_but_writes_do_not(run, sqlite):
+    sqlite.load_records("Ingredients", INGREDIENTS)
+    generation = sqlite.get_table_generation("Ingredients")
+    run(sqlite.update_row_by_id("Ingredients", "ING001", {"Quantity": "1"}))
+    assert sqlite.get_table_generation("Ingredients") == generation
+    sqlite.load_records("Ingredients", INGREDIENTS)
+    assert sqlite.get_table_generation("Ingredients") == generation + 1
+
+def test_ensure_table_adds_missing_columns(run, sqlite):
+    sqlite.load_records("Stock_Ledger", [{"Event_ID": "E1"}])
+    assert run(sqlite.ensure_table("Stock_Ledger", ["Event_ID", "Ingredient_ID"]))
+    assert run(sqlite.get_headers("Stock_Ledger")) == ["Event_ID", "Ingredient_ID"]
+
+# --- Config and IDs on Top of the Backend ---
+
+def test_config_values_and_unique_ids(run, sqlite):
+    run(sqlite.start())
+    assert run(queries.update_config_value("NEXT_ING_ID", "ING007"))
+    assert run(queries.read_config_value("NEXT_ING_ID")) == "ING007"
+    assert run(queries.get_next_unique_id("NEXT_ING_ID", "ING")) == "ING007"
+    assert run(queries.get_next_unique_id("NEXT_ING_ID", "ING")) == "ING008"
+
+# --- Service Lookups on SQLite ---
+
+def test_ingredient_lookups_run_on_sqlite(run, sqlite):
+    sqlite.load_records("Ingredients", INGREDIENTS)
+    assert run(ingredients.get_ingredient_id_by_name(" flour ")) == "ING001"
+    assert run(ingredients.get_ingredient_id_by_name("salt")) is None
+    table = run(ingredients.get_ingredient_table())
+    assert table.by_id["ing002"].quantity == 500.0
@@ -0,0 +1,84 @@
+from sheets import queries
+from services import ingredients, ledger
+
+def _ingredient_row(fake_sheets, ingredient_id: str) -> list[str]:
+    return next(row for row in fake_sheets.rows("Ingredients") if row[0] == ingredient_id)
+
+def _config_value(fake_sheets, key: str) -> str | None:
+    return next((row[1] for row in fake_sheets.rows("Config") if row[0] == key), None)
+
+def _ledger_event(ingredient_id: str, event_type: str, delta: str, after: str, cost: str = "0.0050") -> list[str]:
+    return ["e1", ingredient_id, event_type, delta, after, cost, cost, "", "2024-01-01T00:00:00", "ann"]
+
+# --- Stock Changes ---
+
+def test_a_stock_change_is_one_ledger_append(run, fake_sheets):
+    ok, _ = run(ingredients.adjust_ingredient_stock("flour", 250, "g", False, user_id="ann", update_id=41))
+    assert ok
+    assert fake_sheets.count("Stock_Ledger", "append_rows") == 1
+    event = ledger.decode_stock_events(run(queries.get_all_records("Stock_Ledger")))[0]
+    assert (event.ingredient_id, event.event_type, event.quantity_delta, event.quantity_after, event.update_id) == ("ING001", "USAGE", -250.0, 750.0, "41")
+
+    # The snapshot row follows with the next write-behind batch
+    assert run(queries.flush_pending_writes())
+    assert _ingredient_row(fake_sheets, "ING001")[3] == "750.0000"
+
+# --- Materialized Snapshot ---
+
+def test_events_missing_from_the_snapshot_are_materialized(run, fake_sheets):
+    # Recorded in the ledger, but the process stopped before the Ingredients rows were written
+    fake_sheets.rows("Stock_Ledger").extend([
+        _ledger_event("ING001", "USAGE", "-100", "900"),
+        _ledger_event("ING002", "PURCHASE", "500", "1000", cost="0.0200"),
+        _ledger_event("ING001", "USAGE", "-50", "850"),
+    ])
+    assert run(ingredients.materialize_stock_snapshot())
+    assert _ingredient_row(fake_sheets, "ING001")[3] == "850.0000"
+    assert _ingredient_row(fake_sheets, "ING002")[3:5] == ["1000.0000", "0.0200"]
+    assert _config_value(fake_sheets, "LEDGER_CHECKPOINT") == "4"
+
+    # Nothing new after the checkpoint: no Ingredients write
+    fake_sheets.calls.clear()
+    assert run(ingredients.materialize_stock_snapshot())
+    assert fake_sheets.count("Ingredients", "batch_update") == 0
+
+def test_only_the_ledger_after_the_checkpoint_is_read(run, fake_sheets):
+    fake_sheets.rows("Stock_Ledger").extend([_ledger_event("ING003", "SET", "0", str(n)) for n in range(1, 6)])
+    next(row for row in fake_sheets.rows("Config") if row[0] == "LEDGER_CHECKPOINT")[1] = "4"
+    assert run(ledger.read_checkpoint()) == 4
+    events, last_row = run(ledger.read_events_after(4))
+    assert [(e.row, e.quantity_after) for e in events] == [(5, 4.0), (6, 5.0)]
+    assert last_row == 6
+    assert fake_sheets.count("Stock_Ledger", "get_all_records") == 0
+
+def test_unreadable_events_are_skipped():
+    events = ledger.decode_stock_events([
+        {"Ingredient_ID": "ING001", "Event_Type": "USAGE", "Quantity_Delta": "-1", "Quantity_After": "x"},
+        {"Ingredient_ID": "", "Event_Type": "USAGE"},
+        {"Ingredient_ID": "ING002", "Event_Type": "COST", "Quantity_After": "5", "Cost_Per_Unit": "0.5"},
+    ], first_row=10)
+    assert [(e.ingredient_id, e.row, e.cost_before) for e in events] == [("ING002", 12, 0.5)]
+
+# --- Setup ---
+
+def test_prepare_creates_the_tab_and_the_checkpoint(run, fake_sheets):
+    del fake_sheets.tabs["Stock_Ledger"]
+    fake_sheets.rows("Config")[:] = [row for row in fake_sheets.rows("Config") if row[0] != "LEDGER_CHECKPOINT"]
+    assert run(ledger.prepare_stock_ledger())
+    assert fake_sheets.rows("Stock_Ledger")[0] == ledger.LEDGER_SHEET_HEADERS
+    assert _config_value(fake_sheets, "LEDGER_CHECKPOINT") == "1"
+
+    # Already set up: nothing is written
+    fake_sheets.calls.clear()
+    assert run(ledger.prepare_stock_ledger())
+    assert fake_sheets.count("Config", "append_rows") == fake_sheets.count("Stock_Ledger", "batch_update") == 0
+
+def test_prepare_fails_on_a_ledger_tab_missing_columns(run, fake_sheets):
+    fake_sheets.rows("Stock_Ledger")[0] = ["Event_ID", "Ingredient_ID"]
+    assert not run(ledger.prepare_stock_ledger())
+
+def test_reading_a_missing_checkpoint_writes_nothing(run, fake_sheets):
+    fake_sheets.rows("Config")[:] = [row for row in fake_sheets.rows("Config") if row[0] != "LEDGER_CHECKPOINT"]
+    assert run(ledger.read_checkpoint()) is None
+    assert not run(ingredients.materialize_stock_snapshot())
+    assert _config_value(fake_sheets, "LEDGER_CHECKPOINT") is None
@@ -0,0 +1,61 @@
+import asyncio
+from sheets import queries
+
+def _downloads(fake_sheets, title: str = "Ingredients") -> int:
+    return fake_sheets.count(title, "get_all_records") + fake_sheets.count(title, "values_batch_get")
+
+def test_reads_are_served_from_the_cache_until_it_expires(run, fake_sheets):
+    first = run(queries.get_all_records("Ingredients"))
+    second = run(queries.get_all_records("Ingredients"))
+    assert first == second and _downloads(fake_sheets) == 1
+
+    queries._table_cache[(False, "Ingredients")].loaded_at -= queries.DEFAULT_TABLE_CACHE_TTL_SECONDS + 1
+    run(queries.get_all_records("Ingredients"))
+    assert _downloads(fake_sheets) == 2
+
+def test_concurrent_misses_share_one_download(run, fake_sheets):
+    async def burst():
+        return await asyncio.gather(*(queries.get_all_records("Ingredients") for _ in range(5)))
+    assert len({len(records) for records in run(burst())}) == 1
+    assert _downloads(fake_sheets) == 1
+
+def test_callers_cannot_reorder_the_cached_rows(run, fake_sheets):
+    run(queries.get_all_records("Ingredients")).reverse()
+    assert run(queries.get_all_records("Ingredients"))[0]["ID"] == "ING001"
+
+def test_row_update_patches_the_cached_copy(run, fake_sheets):
+    run(queries.get_all_records("Ingredients"))
+    assert run(queries.update_row_by_id("Ingredients", "ING002", {"Quantity": "450.5"}, user_id="ann"))
+    sugar = run(queries.get_all_records("Ingredients"))[1]
+    assert (sugar["Quantity"], sugar["Updated_By_User"]) == (450.5, "ann")
+    assert _downloads(fake_sheets) == 1
+    assert queries.get_table_cache_stats()["Ingredients"]["patches"] == 1
+
+def test_append_patches_the_cached_copy(run, fake_sheets):
+    run(queries.get_all_records("Ingredients"))
+    assert run(queries.append_row("Ingredients", {"ID": "ING004", "Name": "Butter", "Unit": "g", "Quantity": "250"}))
+    records = run(queries.get_all_records("Ingredients"))
+    assert [r["ID"] for r in records] == ["ING001", "ING002", "ING003", "ING004"]
+    assert records[3]["Cost Per Unit"] == ""
+    assert _downloads(fake_sheets) == 1
+
+def test_append_after_an_outside_append_invalidates_the_cache(run, fake_sheets):
+    run(queries.get_all_records("Ingredients"))
+    fake_sheets.rows("Ingredients").append(["ING009", "Salt", "g", "100", "0.001", "", ""])
+    assert run(queries.append_row("Ingredients", {"ID": "ING004", "Name": "Butter"}))
+    # Our row didn't land right after the cached rows, so the copy is re-read
+    assert [r["ID"] for r in run(queries.get_all_records("Ingredients"))][-2:] == ["ING009", "ING004"]
+    assert _downloads(fake_sheets) == 2
+
+def test_invalidation_forces_a_download(run, fake_sheets):
+    run(queries.get_all_records("Ingredients"))
+    fake_sheets.rows("Ingredients")[1][3] = "1"
+    assert run(queries.get_all_records("Ingredients"))[0]["Quantity"] == 1000
+    queries.invalidate_table_cache("Ingredients")
+    assert run(queries.get_all_records("Ingredients"))[0]["Quantity"] == 1
+
+def test_zero_ttl_disables_caching(run, fake_sheets, monkeypatch):
+    monkeypatch.setitem(queries.TABLE_CACHE_TTL_SECONDS, "Ingredients", 0)
+    run(queries.get_all_records("Ingredients"))
+    run(queries.get_all_records("Ingredients"))
+    assert _downloads(fake_sheets) == 2
@@ -0,0 +1,35 @@
+from sheets import queries
+from services import ingredients
+
+def test_find_records_uses_the_column_index(run, fake_sheets):
+    assert run(queries.find_records("Ingredients", "Name", " sugar "))[0]["ID"] == "ING002"
+    assert run(queries.find_records("Ingredients", "Name", "salt")) is None
+    assert "Name" in queries._table_cache[(False, "Ingredients")].indexes
+
+def test_updates_move_rows_within_the_index(run, fake_sheets):
+    run(queries.find_records("Ingredients", "Name", "sugar"))
+    assert run(queries.update_row_by_id("Ingredients", "ING002", {"Name": "Cane Sugar"}))
+    assert run(queries.find_records("Ingredients", "Name", "sugar")) is None
+    assert run(queries.find_records("Ingredients", "Name", "cane sugar"))[0]["ID"] == "ING002"
+
+def test_appended_rows_join_existing_indexes(run, fake_sheets):
+    run(queries.find_records("Ingredients", "Name", "flour"))
+    assert run(queries.append_row("Ingredients", {"ID": "ING004", "Name": "Butter"}))
+    assert run(queries.find_records("Ingredients", "Name", "BUTTER"))[0]["ID"] == "ING004"
+
+def test_row_numbers_come_from_the_cache_instead_of_a_search(run, fake_sheets):
+    run(queries.get_all_records("Ingredients"))
+    assert run(queries.update_row_by_id("Ingredients", "ing003", {"Quantity": "6"}))
+    assert fake_sheets.count("Ingredients", "find") == 0
+    assert fake_sheets.rows("Ingredients")[3][3] == "6"
+
+def test_uncached_row_numbers_fall_back_to_a_search(run, fake_sheets, monkeypatch):
+    monkeypatch.setitem(queries.TABLE_CACHE_TTL_SECONDS, "Ingredients", 0)
+    assert run(queries.update_row_by_id("Ingredients", "ING003", {"Quantity": "6"}))
+    assert fake_sheets.count("Ingredients", "find") == 1
+
+def test_ingredient_table_looks_up_by_name_and_id(run, fake_sheets):
+    table = run(ingredients.get_ingredient_table())
+    assert table.by_key[ingredients.normalize_name("  EGGS ")].id == "ING003"
+    assert table.by_id["ing001"].name == "Flour"
+    assert run(ingredients.get_ingredient_id_by_name("sugar")) == "ING002"
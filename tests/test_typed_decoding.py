@@ -0,0 +1,81 @@
+import logging
+import pytest
+from sheets import queries
+from services import ingredients
+from services.ingredients import decode_ingredients, decode_price_history, decode_unit_rules
+
+@pytest.fixture(autouse=True)
+def unreported(monkeypatch):
+    # Malformed rows are logged once per process; start each test with none reported
+    monkeypatch.setattr(ingredients, "_reported_malformed_rows", set())
+
+def _ingredient(**fields) -> dict:
+    return {"ID": "ING001", "Name": "Flour", "Unit": "g", "Quantity": 1000, "Cost Per Unit": 0.005, **fields}
+
+# --- Decoders ---
+
+def test_ingredients_are_decoded_once_into_typed_rows():
+    table = decode_ingredients([_ingredient(Name=" Flour ", Unit="Grams", Quantity="", **{"Reorder Level": "200"})])
+    flour = table.by_key["flour"]
+    assert (flour.id, flour.name, flour.quantity, flour.cost_per_unit, flour.reorder_level) == ("ING001", "Flour", 0.0, 0.005, 200.0)
+    assert flour.unit_key == "g"
+    assert table.by_id["ing001"] is flour
+    assert table.positions == {"ING001": 0}
+
+def test_malformed_ingredient_rows_are_skipped_and_reported_once(caplog):
+    records = [
+        _ingredient(),
+        _ingredient(ID="ING002", Name="Sugar", Quantity="lots"),
+        _ingredient(ID="", Name="Salt"),
+        _ingredient(ID="ING004", Name="Eggs", **{"Reorder Level": "a few"}),
+        _ingredient(ID="ING005", Name="flour", Quantity=5),
+    ]
+    with caplog.at_level(logging.WARNING):
+        table = decode_ingredients(records)
+        decode_ingredients(records)
+    assert [i.id for i in table.ingredients] == ["ING001", "ING004", "ING005"]
+    assert table.malformed == {"sugar": "Sugar"}
+    # A bad threshold only disables the alert
+    assert table.by_id["ing004"].reorder_level == 0.0
+    # The first row with a name wins
+    assert table.by_key["flour"].id == "ING001"
+    assert len([r for r in caplog.records if "DATA INTEGRITY WARNING" in r.message]) == 3
+
+def test_unit_rules_skip_invalid_rates():
+    table = decode_unit_rules([
+        {"From_Unit": "KG", "To_Unit": "grams", "Conversion_Rate": 1000},
+        {"From_Unit": "l", "To_Unit": "ml", "Conversion_Rate": "n/a"},
+        {"From_Unit": "cup", "To_Unit": "ml", "Conversion_Rate": 0},
+    ])
+    assert [(r.from_unit, r.to_unit, r.rate) for r in table.rules] == [("kg", "g", 1000.0)]
+
+def test_price_history_rows_keep_their_order():
+    entries = decode_price_history([
+        {"ingredients_Id": "ING001", "old_cost_per_unit": "0.005", "new_cost_per_unit": "0.006", "Last_Updated": "2024-01-01", "Updated_By_User": "ann"},
+        {"ingredients_Id": "ING001", "old_cost_per_unit": "x", "new_cost_per_unit": "0.007"},
+        {"ingredients_Id": " ING002 ", "old_cost_per_unit": "", "new_cost_per_unit": 0.01},
+    ])
+    assert [(e.ingredient_id, e.old_cost, e.new_cost) for e in entries] == [("ING001", 0.005, 0.006), ("ING002", 0.0, 0.01)]
+
+# --- Decoding Once per Loaded Copy ---
+
+def test_a_loaded_tab_is_decoded_once_until_it_changes(run, fake_sheets):
+    calls = []
+
+    def decoder(records):
+        calls.append(len(records))
+        return decode_ingredients(records)
+
+    first = run(queries.get_decoded_table("Ingredients", decoder))
+    assert run(queries.get_decoded_table("Ingredients", decoder)) is first
+    assert calls == [3]
+
+    # Our own write patches the cached rows, so the next read decodes the new values
+    assert run(queries.update_row_by_id("Ingredients", "ING002", {"Quantity": "450"}))
+    assert run(queries.get_decoded_table("Ingredients", decoder)).by_id["ing002"].quantity == 450.0
+    assert calls == [3, 3]
+
+def test_a_malformed_ingredient_is_not_found(run, fake_sheets):
+    fake_sheets.rows("Ingredients")[2][3] = "n/a"
+    assert run(ingredients.get_ingredient_id_by_name("sugar")) is None
+    assert run(ingredients.get_ingredient_id_by_name("flour")) == "ING001"
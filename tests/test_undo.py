@@ -0,0 +1,91 @@
+import pytest
+from sheets import queries
+from services import ingredients, undo
+
+def _stock(run, ingredient_id: str) -> tuple[float, float]:
+    ingredient = run(ingredients.get_ingredient_table()).by_id[ingredient_id.lower()]
+    return ingredient.quantity, ingredient.cost_per_unit
+
+def _ledger_types(run) -> list[str]:
+    return [r["Event_Type"] for r in run(queries.get_all_records("Stock_Ledger")) or []]
+
+def _history_reads(fake_sheets) -> int:
+    return sum(
+        fake_sheets.count(title, method)
+        for title in ("Price_History", "Stock_Ledger")
+        for method in ("get_all_records", "values_batch_get")
+    )
+
+# --- /undo ---
+
+def test_undo_reverts_the_last_usage(run, fake_sheets):
+    assert run(ingredients.adjust_ingredient_stock("flour", 300, "g", False, user_id="ann"))[0]
+    assert _stock(run, "ING001") == (700.0, 0.005)
+
+    ok, message = run(ingredients.revert_last_transaction("ann", update_id=9))
+    assert ok, message
+    assert "**Flour**: stock `1000.0000 g`" in message
+    assert _stock(run, "ING001") == (1000.0, 0.005)
+    assert _ledger_types(run) == ["USAGE", "UNDO"]
+    # The undo itself isn't undoable, and the stack is now empty
+    assert run(ingredients.revert_last_transaction("ann")) == (False, "No transactions found in your history to undo.")
+
+def test_undo_never_reads_the_history_tabs(run, fake_sheets):
+    assert run(ingredients.adjust_ingredient_stock("sugar", 100, "g", True, user_id="ann"))[0]
+    reads = _history_reads(fake_sheets)
+    assert run(ingredients.revert_last_transaction("ann"))[0]
+    assert _history_reads(fake_sheets) == reads
+
+def test_a_bulk_command_is_undone_as_one_transaction(run, fake_sheets):
+    ok, _ = run(ingredients.adjust_ingredient_stock_bulk([("flour", 100, "g"), ("eggs", 2, "unit"), ("flour", 50, "g")], False, user_id="ann"))
+    assert ok
+    assert run(ingredients.revert_last_transaction("ann"))[0]
+    assert _stock(run, "ING001")[0] == 1000.0
+    assert _stock(run, "ING003")[0] == 12.0
+
+def test_undo_restores_a_price_unless_it_changed_again(run, fake_sheets):
+    assert run(ingredients.update_ingredient_cost_per_unit("sugar", 1, "kg", 20, user_id="ann"))
+    assert _stock(run, "ING002")[1] == pytest.approx(0.02)
+    assert run(ingredients.revert_last_transaction("ann"))[0]
+    assert _stock(run, "ING002")[1] == pytest.approx(0.01)
+
+    assert run(ingredients.update_ingredient_cost_per_unit("sugar", 1, "kg", 20, user_id="ann"))
+    assert run(ingredients.update_ingredient_cost_per_unit("sugar", 1, "kg", 30, user_id="bob"))
+    ok, message = run(ingredients.revert_last_transaction("ann"))
+    assert ok and "Price kept for Sugar" in message
+    assert _stock(run, "ING002")[1] == pytest.approx(0.03)
+
+def test_users_undo_only_their_own_transactions(run, fake_sheets):
+    assert run(ingredients.adjust_ingredient_stock("flour", 100, "g", False, user_id="ann"))[0]
+    assert run(ingredients.adjust_ingredient_stock("eggs", 1, "unit", False, user_id="bob"))[0]
+    assert run(ingredients.revert_last_transaction("ann"))[0]
+    assert _stock(run, "ING001")[0] == 1000.0
+    assert _stock(run, "ING003")[0] == 11.0
+
+# --- Undo Index ---
+
+def test_stacks_are_saved_in_the_background_and_reloaded(run, fake_sheets, monkeypatch):
+    monkeypatch.setattr(undo, "UNDO_DEPTH", 2)
+    for quantity in (10, 20, 30):
+        assert run(ingredients.adjust_ingredient_stock("flour", quantity, "g", False, user_id="Ann"))[0]
+    assert run(undo.flush_undo_writes())
+    assert run(queries.flush_pending_writes())
+    rows = [row for row in fake_sheets.rows("Undo_Index")[1:] if row[0] == "ann"]
+    assert len(rows) == 1
+
+    # A restart loads the two newest transactions back
+    undo._undo_index.clear()
+    queries.invalidate_table_cache()
+    assert run(undo.load_undo_index()) == 1
+    assert [step.quantity_delta for t in undo._undo_index["ann"] for step in t.steps] == [-20.0, -30.0]
+    assert run(ingredients.revert_last_transaction("ann"))[0]
+    assert _stock(run, "ING001")[0] == 970.0
+
+def test_a_failed_undo_puts_the_transaction_back(run, fake_sheets):
+    assert run(ingredients.adjust_ingredient_stock("flour", 100, "g", False, user_id="ann"))[0]
+    # The ingredient row disappears before the undo
+    del fake_sheets.rows("Ingredients")[1]
+    queries.invalidate_table_cache()
+    ok, message = run(ingredients.revert_last_transaction("ann"))
+    assert not ok and "no longer exists" in message
+    assert len(undo._undo_index["ann"]) == 1
@@ -0,0 +1,56 @@
+import logging
+import pytest
+from services import ingredients
+from services.ingredients import decode_unit_rules, get_conversion_rate
+
+def _rules(*rules: tuple[str, str, float]) -> list[dict]:
+    return [{"From_Unit": f, "To_Unit": t, "Conversion_Rate": r} for f, t, r in rules]
+
+@pytest.fixture(autouse=True)
+def unreported(monkeypatch):
+    monkeypatch.setattr(ingredients, "_reported_malformed_rows", set())
+
+# --- Closure ---
+
+def test_chains_of_rules_are_closed_in_both_directions():
+    table = decode_unit_rules(_rules(("kg", "g", 1000), ("lb", "g", 453.592), ("oz", "g", 28.3495), ("l", "ml", 1000)))
+    assert table.rate("kg", "lb") == pytest.approx(1000 / 453.592)
+    assert table.rate("lb", "kg") == pytest.approx(0.453592)
+    assert table.rate("oz", "lb") == pytest.approx(28.3495 / 453.592)
+    # Aliases resolve before the lookup
+    assert table.rate("kilograms", "grams") == 1000
+    assert table.rate("ml", "l") == pytest.approx(0.001)
+
+def test_units_in_different_dimensions_have_no_rate():
+    table = decode_unit_rules(_rules(("kg", "g", 1000), ("l", "ml", 1000), ("dozen", "unit", 12), ("pinch", "dash", 2)))
+    assert table.rate("g", "ml") is None
+    assert (table.dimension("kg"), table.dimension("ml"), table.dimension("dozen")) == ("mass", "volume", "count")
+    # A group with no well-known unit is named after a member
+    assert table.dimension("pinch") == "dash"
+    assert table.dimension("furlong") is None
+
+def test_sheet_rules_keep_their_exact_rate():
+    table = decode_unit_rules(_rules(("kg", "g", 1000), ("lb", "g", 453.592), ("lb", "kg", 0.4536)))
+    assert table.rate("lb", "kg") == 0.4536
+    assert table.rate("kg", "lb") == pytest.approx(1 / 0.4536)
+
+def test_an_inconsistent_cycle_is_reported(caplog):
+    with caplog.at_level(logging.WARNING):
+        table = decode_unit_rules(_rules(("kg", "g", 1000), ("lb", "g", 453.592), ("lb", "kg", 0.5)))
+    assert any("inconsistent cycle" in r.message for r in caplog.records)
+    assert table.rate("kg", "g") == 1000
+
+def test_unchanged_rules_are_not_recompiled():
+    records = _rules(("kg", "g", 1000))
+    assert decode_unit_rules(records) is decode_unit_rules(list(records))
+    assert decode_unit_rules(_rules(("kg", "g", 1001))).rate("kg", "g") == 1001
+
+# --- Lookups against the Units Tab ---
+
+def test_conversion_rate_uses_the_compiled_graph(run, fake_sheets):
+    assert run(get_conversion_rate("Kilograms", "lb")) == pytest.approx(1000 / 453.592)
+    assert run(get_conversion_rate("l", "g")) is None
+    assert run(get_conversion_rate("G", "grams")) == 1.0
+    # One projected read of the three rule columns, then every lookup is in memory
+    downloads = fake_sheets.count("Units", "values_batch_get") + fake_sheets.count("Units", "get_all_records")
+    assert downloads == 1
@@ -0,0 +1,45 @@
+import asyncio
+from sheets import queries
+
+def test_updates_in_one_window_share_one_batch_update(run, fake_sheets):
+    async def burst():
+        return await asyncio.gather(
+            queries.queue_row_update("Ingredients", "ING001", {"Quantity": "900"}, user_id="ann"),
+            queries.queue_row_update("Ingredients", "ING002", {"Quantity": "400"}, user_id="bob"),
+            queries.queue_row_update("Ingredients", "ING001", {"Quantity": "800"}, user_id="ann"),
+        )
+    run(queries.get_all_records("Ingredients"))
+    fake_sheets.calls.clear()
+    assert run(burst()) == [True, True, True]
+    assert fake_sheets.count("Ingredients", "batch_update") == 1
+    # The later update of the same cell wins
+    assert [row[3] for row in fake_sheets.rows("Ingredients")[1:3]] == ["800", "400"]
+
+def test_queued_update_patches_the_cache_before_it_is_written(run, fake_sheets):
+    async def update_and_read():
+        write = asyncio.ensure_future(queries.queue_row_update("Ingredients", "ING003", {"Quantity": "6"}))
+        await asyncio.sleep(0)
+        # Not flushed yet, but reads already see it
+        records = await queries.get_all_records("Ingredients")
+        assert fake_sheets.rows("Ingredients")[3][3] == "12"
+        return records, await write
+    records, written = run(update_and_read())
+    assert records[2]["Quantity"] == 6
+    assert written and fake_sheets.rows("Ingredients")[3][3] == "6"
+
+def test_queued_update_without_a_cache_writes_directly(run, fake_sheets, monkeypatch):
+    # A TTL of 0 turns caching off for the tab, so the queue can't resolve the row
+    monkeypatch.setitem(queries.TABLE_CACHE_TTL_SECONDS, "Ingredients", 0)
+    assert run(queries.queue_row_update("Ingredients", "ING002", {"Quantity": "450"}, user_id="ann"))
+    assert fake_sheets.rows("Ingredients")[2][3] == "450"
+    assert fake_sheets.rows("Ingredients")[2][6] == "ann"
+    assert not run(queries.queue_row_update("Ingredients", "ING404", {"Quantity": "1"}))
+
+def test_failed_flush_drops_the_patched_cache(run, fake_sheets, monkeypatch):
+    run(queries.get_all_records("Ingredients"))
+    def quota_exceeded(data, **kwargs):
+        raise RuntimeError("quota")
+    monkeypatch.setattr(fake_sheets.tabs["Ingredients"], "batch_update", quota_exceeded)
+    assert not run(queries.queue_row_update("Ingredients", "ING001", {"Quantity": "1"}))
+    monkeypatch.undo()
+    assert run(queries.get_all_records("Ingredients"))[0]["Quantity"] == 1000